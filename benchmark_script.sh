@@ -0,0 +1,20 @@
+# Script used to run the benchmarks of the federated learning hot paths.
+# Each run is saved as json in benchmarks/results (the file name contains the commit)
+# and compared with the previous run, so the regressions show up between commits.
+# Use BENCHMARK_SCALE=full for multi-million parameters models and up to 500 participants.
+# The additional arguments are passed to pytest, e.g. --benchmark-compare-fail=mean:25%
+# to fail when a benchmark is slower than in the previous run
+
+pip install -r requirements/requirements-benchmark.txt
+
+COMPARE_OPTIONS=""
+if ls benchmarks/results/*/*.json > /dev/null 2>&1
+then
+  COMPARE_OPTIONS="--benchmark-compare"
+fi
+
+pytest benchmarks \
+--benchmark-autosave \
+--benchmark-storage=file://./benchmarks/results \
+$COMPARE_OPTIONS \
+"$@"
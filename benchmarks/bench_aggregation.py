@@ -0,0 +1,20 @@
+"""
+Benchmarks of the aggregation of the participants' weights
+"""
+import numpy as np
+import pytest
+
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import \
+    weighted_average_aggregation
+from synthetic import BENCHMARK_MODEL_SIZES, BENCHMARK_N_PARTICIPANTS, random_weights, \
+    skip_if_too_large
+
+
+@pytest.mark.parametrize("n_participants", BENCHMARK_N_PARTICIPANTS)
+@pytest.mark.parametrize("model_size", BENCHMARK_MODEL_SIZES)
+def bench_weighted_average_aggregation(benchmark, rng, model_size, n_participants):
+    skip_if_too_large(model_size, n_participants)
+    models_weights = [random_weights(model_size, rng) for _ in range(n_participants)]
+    alpha = np.full(n_participants, 1.0 / n_participants)
+    aggregated_weights = benchmark(weighted_average_aggregation, models_weights, alpha)
+    assert len(aggregated_weights) == len(models_weights[0])
@@ -0,0 +1,26 @@
+"""
+Benchmarks of the contribution ledger with thousands of participants and rounds
+"""
+import pytest
+
+from decentralized_smart_grid_ml.federated_learning.contribution_ledger import ContributionLedger
+
+N_ROUNDS = 1000
+
+
+@pytest.mark.parametrize("n_participants", [100, 1000, 5000])
+def bench_record_round(benchmark, rng, n_participants):
+    ledger = ContributionLedger(list(range(n_participants)), N_ROUNDS)
+    participant_ids = list(range(n_participants))
+    alpha = rng.dirichlet(rng.random(n_participants) + 0.1)
+    benchmark(ledger.record_round, 0, participant_ids, alpha, alpha)
+
+
+@pytest.mark.parametrize("n_participants", [100, 1000, 5000])
+def bench_participants_contributions(benchmark, rng, n_participants):
+    ledger = ContributionLedger(list(range(n_participants)), N_ROUNDS)
+    participant_ids = list(range(n_participants))
+    for idx_round in range(N_ROUNDS):
+        ledger.record_round(idx_round, participant_ids, rng.dirichlet(rng.random(n_participants) + 0.1))
+    contributions = benchmark(ledger.contributions)
+    assert len(contributions) == n_participants
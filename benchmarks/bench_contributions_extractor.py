@@ -0,0 +1,28 @@
+"""
+Benchmarks of the extraction of the participants' contributions
+"""
+import pytest
+
+from decentralized_smart_grid_ml.federated_learning.contributions_extractor import \
+    ContributionsExtractorEnsembleGeneral
+from synthetic import BENCHMARK_MODEL_SIZES, BENCHMARK_N_PARTICIPANTS, MODEL_SIZES, \
+    build_keras_model, random_weights, skip_if_too_large
+
+N_VALIDATION_ROWS = 2000
+
+
+@pytest.mark.parametrize("n_participants", BENCHMARK_N_PARTICIPANTS)
+@pytest.mark.parametrize("model_size", BENCHMARK_MODEL_SIZES)
+def bench_compute_contribution_ensemble_general(benchmark, rng, model_size, n_participants):
+    skip_if_too_large(model_size, n_participants)
+    n_features, _ = MODEL_SIZES[model_size]
+    x_validation = rng.standard_normal((N_VALIDATION_ROWS, n_features), dtype="float32")
+    y_validation = (x_validation.sum(axis=1) > 0).astype("float32")
+    extractor = ContributionsExtractorEnsembleGeneral(
+        build_keras_model(model_size), x_validation, y_validation
+    )
+    models_weights = [random_weights(model_size, rng) for _ in range(n_participants)]
+    # the first call builds the multi-head models, the benchmark measures the next rounds
+    extractor.compute_contribution(models_weights, 0.5)
+    alpha = benchmark(extractor.compute_contribution, models_weights, 0.5)
+    assert len(alpha) == n_participants
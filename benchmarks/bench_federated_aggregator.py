@@ -0,0 +1,52 @@
+"""
+Benchmarks of the update of the global model carried out by the aggregator at each round
+"""
+import os
+
+import pytest
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import \
+    AnnouncementConfiguration
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import Aggregator
+from synthetic import BENCHMARK_MODEL_SIZES, BENCHMARK_N_PARTICIPANTS, MODEL_SIZES, \
+    build_keras_model, random_weights, skip_if_too_large, write_classification_csv
+
+N_VALIDATION_ROWS = 2000
+N_TEST_ROWS = 2000
+
+
+@pytest.mark.parametrize("aggregation_method", ["ensemble_general", "simple_average"])
+@pytest.mark.parametrize("n_participants", BENCHMARK_N_PARTICIPANTS)
+@pytest.mark.parametrize("model_size", BENCHMARK_MODEL_SIZES)
+def bench_update_global_model(benchmark, rng, tmp_path, model_size, n_participants,
+                              aggregation_method):
+    skip_if_too_large(model_size, n_participants)
+    n_features, _ = MODEL_SIZES[model_size]
+    validation_set_path = os.path.join(tmp_path, "validation.csv")
+    test_set_path = os.path.join(tmp_path, "test.csv")
+    features_names = write_classification_csv(validation_set_path, N_VALIDATION_ROWS, n_features, rng)
+    write_classification_csv(test_set_path, N_TEST_ROWS, n_features, rng)
+    model_path = os.path.join(tmp_path, "model.keras")
+    build_keras_model(model_size).save(model_path)
+    announcement_config = AnnouncementConfiguration(
+        "benchmark task", "benchmark task description", model_path, None, None,
+        features_names, 1, 1, 32, aggregation_method
+    )
+    aggregator = Aggregator(
+        list(range(n_participants)),
+        announcement_config,
+        validation_set_path,
+        test_set_path,
+        os.path.join(tmp_path, "validator")
+    )
+    models_weights = [random_weights(model_size, rng) for _ in range(n_participants)]
+
+    def start_round():
+        aggregator.current_round = 0
+        aggregator.is_finished = False
+        aggregator.rounds2participants[0]["participant_weights"] = list(models_weights)
+        aggregator.rounds2participants[0]["participant_ids"] = list(range(n_participants))
+
+    benchmark.pedantic(aggregator.update_global_model, setup=start_round, rounds=3)
+    aggregator.close()
+    assert aggregator.is_finished
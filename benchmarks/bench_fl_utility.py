@@ -0,0 +1,27 @@
+"""
+Benchmarks of the utilities used to prepare the federated learning task
+"""
+import os
+
+import pytest
+
+from decentralized_smart_grid_ml.utils.fl_utility import split_dataset_validator_participants
+from synthetic import BENCHMARK_N_PARTICIPANTS, BENCHMARK_N_ROWS, write_classification_csv
+
+
+@pytest.mark.parametrize("unbalanced", [False, True])
+@pytest.mark.parametrize("n_participants", BENCHMARK_N_PARTICIPANTS)
+@pytest.mark.parametrize("n_rows", BENCHMARK_N_ROWS)
+def bench_split_dataset_validator_participants(benchmark, rng, tmp_path, n_rows,
+                                               n_participants, unbalanced):
+    dataset_path = os.path.join(tmp_path, "dataset.csv")
+    write_classification_csv(dataset_path, n_rows, 8, rng)
+    _, _, participants_datasets = benchmark(
+        split_dataset_validator_participants,
+        dataset_path,
+        n_participants,
+        random_state=42,
+        shuffle=True,
+        unbalanced=unbalanced
+    )
+    assert len(participants_datasets) == n_participants
@@ -0,0 +1,34 @@
+"""
+Benchmarks of the serialization of the models' weights
+"""
+import os
+
+import pytest
+
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import \
+    load_fl_model_weights, save_fl_model_weights
+from synthetic import BENCHMARK_MODEL_SIZES, SyntheticModel, random_weights
+
+WEIGHTS_EXTENSIONS = [".json", ".flw"]
+
+
+@pytest.mark.parametrize("extension", WEIGHTS_EXTENSIONS)
+@pytest.mark.parametrize("model_size", BENCHMARK_MODEL_SIZES)
+def bench_save_fl_model_weights(benchmark, rng, tmp_path, model_size, extension):
+    model = SyntheticModel(random_weights(model_size, rng))
+    weights_path = os.path.join(tmp_path, "weights" + extension)
+    benchmark(save_fl_model_weights, model, weights_path)
+
+
+@pytest.mark.parametrize("extension", WEIGHTS_EXTENSIONS)
+@pytest.mark.parametrize("model_size", BENCHMARK_MODEL_SIZES)
+def bench_load_fl_model_weights(benchmark, rng, tmp_path, model_size, extension):
+    model = SyntheticModel(random_weights(model_size, rng))
+    weights_path = os.path.join(tmp_path, "weights" + extension)
+    save_fl_model_weights(model, weights_path)
+
+    def load_and_touch():
+        # the flw layers are memory mapped: the pages are read when they are accessed
+        return [layer.sum() for layer in load_fl_model_weights(weights_path)]
+
+    benchmark(load_and_touch)
@@ -0,0 +1,10 @@
+"""
+This module contains the fixtures shared by the benchmarks
+"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(42)
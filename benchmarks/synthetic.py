@@ -0,0 +1,126 @@
+"""
+This module contains the synthetic models and datasets used by the benchmarks.
+The size of the grid is selected with the BENCHMARK_SCALE environment variable:
+"quick" (default) or "full" (multi-million parameters models and up to 500 participants)
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BENCHMARK_SCALE = os.environ.get("BENCHMARK_SCALE", "quick")
+
+# number of input features and hidden layers' widths of the synthetic dense models
+MODEL_SIZES = {
+    "tiny": (2, [8]),
+    "medium": (32, [256, 256]),
+    "large": (32, [2048, 1024]),
+}
+
+if BENCHMARK_SCALE == "full":
+    BENCHMARK_MODEL_SIZES = ["tiny", "medium", "large"]
+    BENCHMARK_N_PARTICIPANTS = [2, 10, 100, 500]
+    BENCHMARK_N_ROWS = [10_000, 1_000_000]
+else:
+    BENCHMARK_MODEL_SIZES = ["tiny", "medium"]
+    BENCHMARK_N_PARTICIPANTS = [2, 10, 100]
+    BENCHMARK_N_ROWS = [10_000]
+
+# maximum number of bytes of the participants' weights kept in memory by a benchmark
+BENCHMARK_MAX_BYTES = 2 * 1024 ** 3
+
+
+class SyntheticModel:
+    """ This class represents a model that only holds a list of weights """
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    def get_weights(self):
+        return self.weights
+
+
+def model_layers_shapes(model_size):
+    """
+    Returns the shapes of the weights of a synthetic dense model with a single output
+    :param model_size: name of the model's size
+    :return: list of the weights' shapes (kernel and bias of each layer)
+    """
+    n_features, hidden_units = MODEL_SIZES[model_size]
+    shapes = []
+    n_inputs = n_features
+    for n_units in hidden_units + [1]:
+        shapes.extend([(n_inputs, n_units), (n_units,)])
+        n_inputs = n_units
+    return shapes
+
+
+def model_n_parameters(model_size):
+    """
+    Returns the number of parameters of a synthetic dense model
+    :param model_size: name of the model's size
+    :return: number of parameters
+    """
+    return sum(int(np.prod(shape)) for shape in model_layers_shapes(model_size))
+
+
+def random_weights(model_size, rng):
+    """
+    Creates random float32 weights of a synthetic dense model
+    :param model_size: name of the model's size
+    :param rng: numpy random generator
+    :return: list of the weights
+    """
+    return [
+        rng.standard_normal(shape, dtype=np.float32)
+        for shape in model_layers_shapes(model_size)
+    ]
+
+
+def skip_if_too_large(model_size, n_participants):
+    """
+    Skips the benchmark if the participants' weights do not fit in BENCHMARK_MAX_BYTES
+    :param model_size: name of the model's size
+    :param n_participants: number of participants
+    :return:
+    """
+    n_bytes = model_n_parameters(model_size) * 4 * n_participants
+    if n_bytes > BENCHMARK_MAX_BYTES:
+        pytest.skip(
+            "%d participants with the %s model require %d bytes" % (n_participants, model_size, n_bytes)
+        )
+
+
+def build_keras_model(model_size):
+    """
+    Creates a compiled keras model with the synthetic dense architecture
+    :param model_size: name of the model's size
+    :return: compiled keras model
+    """
+    import tensorflow as tf
+    n_features, hidden_units = MODEL_SIZES[model_size]
+    layers = [tf.keras.Input(shape=(n_features,))]
+    layers.extend(tf.keras.layers.Dense(n_units, activation="relu") for n_units in hidden_units)
+    layers.append(tf.keras.layers.Dense(1, activation="sigmoid"))
+    model = tf.keras.Sequential(layers)
+    model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"])
+    return model
+
+
+def write_classification_csv(csv_path, n_rows, n_features, rng):
+    """
+    Writes a synthetic binary classification dataset
+    :param csv_path: file path of the dataset
+    :param n_rows: number of rows
+    :param n_features: number of features
+    :param rng: numpy random generator
+    :return: features names of the dataset
+    """
+    x = rng.standard_normal((n_rows, n_features), dtype=np.float32)
+    features = ["x" + str(idx) for idx in range(n_features)]
+    dataset = pd.DataFrame(x, columns=features)
+    dataset["y"] = (x.sum(axis=1) > 0).astype(int)
+    dataset.to_csv(csv_path, index=False)
+    return {"features": features, "labels": "y"}
+
@@ -16,7 +16,9 @@ class AnnouncementConfiguration:
 
     def __init__(self, task_name, task_description, baseline_model_artifact,
                  baseline_model_weights, baseline_model_config, features_names,
-                 fl_rounds, epochs, batch_size, aggregation_method):
+                 fl_rounds, epochs, batch_size, aggregation_method,
+                 weights_update_compression=None, weights_update_compression_params=None,
+                 aggregation_method_params=None, round_policy=None):
         """
         Constructor
         :param task_name: name of the task
@@ -29,6 +31,13 @@ class AnnouncementConfiguration:
         :param epochs: number of epochs
         :param batch_size: batch size
         :param aggregation_method: method used to aggregate the participants' models
+        :param weights_update_compression: (optional) compression method of the participants'
+            updates, sent as deltas from the global model. None to send the full weights
+        :param weights_update_compression_params: (optional) parameters of the compression method
+        :param aggregation_method_params: (optional) parameters of the aggregation method,
+            e.g. the time budget of "monte_carlo_shapley"
+        :param round_policy: (optional) parameters of the rounds' policy: quorum, deadline,
+            participants_per_round, late_uploads and seed
         """
         self.task_name = task_name
         self.task_description = task_description
@@ -40,6 +49,10 @@ class AnnouncementConfiguration:
         self.epochs = epochs
         self.batch_size = batch_size
         self.aggregation_method = aggregation_method
+        self.weights_update_compression = weights_update_compression
+        self.weights_update_compression_params = weights_update_compression_params or {}
+        self.aggregation_method_params = aggregation_method_params or {}
+        self.round_policy = round_policy or {}
 
     @classmethod
     def retrieve_announcement_configuration(cls, user_address, contract_instance):
@@ -77,7 +90,11 @@ class AnnouncementConfiguration:
                 json_config_task["fl_rounds"],
                 json_config_task["epochs"],
                 json_config_task["batch_size"],
-                json_config_task["aggregation_method"]
+                json_config_task["aggregation_method"],
+                json_config_task.get("weights_update_compression"),
+                json_config_task.get("weights_update_compression_params"),
+                json_config_task.get("aggregation_method_params"),
+                json_config_task.get("round_policy")
             )
         except KeyError as key_error:
             logger.error("One or more key are missing in the "
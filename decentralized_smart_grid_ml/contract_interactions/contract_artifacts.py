@@ -0,0 +1,72 @@
+"""
+This module contains the functions used to read the Truffle artifacts of the smart contracts
+"""
+import json
+import os
+from functools import lru_cache
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+def abi_sidecar_path(artifact_path):
+    """
+    Returns the path of the compact file that caches the abi of a Truffle artifact
+    :param artifact_path: file path to the Truffle artifact (json)
+    :return: file path to the abi sidecar
+    """
+    return os.path.splitext(artifact_path)[0] + ".abi.json"
+
+
+def _write_abi_sidecar(sidecar_path, abi, artifact_mtime_ns):
+    """
+    Writes (atomically) the abi sidecar of an artifact
+    :param sidecar_path: file path to the abi sidecar
+    :param abi: abi of the contract
+    :param artifact_mtime_ns: modification time of the artifact
+    :return:
+    """
+    tmp_sidecar_path = sidecar_path + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(tmp_sidecar_path, "w") as file_write:
+            json.dump({"artifact_mtime_ns": artifact_mtime_ns, "abi": abi}, file_write)
+        os.replace(tmp_sidecar_path, sidecar_path)
+    except OSError as error:
+        # the sidecar is only an optimization, e.g. the build directory can be read-only
+        logger.warning("The abi sidecar %s cannot be written: %s", sidecar_path, error)
+
+
+@lru_cache(maxsize=None)
+def _read_contract_abi(artifact_path, artifact_mtime_ns):
+    """
+    Reads the abi of a Truffle artifact, using the sidecar when it refers to the
+    same version (mtime) of the artifact and creating it otherwise
+    :param artifact_path: file path to the Truffle artifact (json)
+    :param artifact_mtime_ns: modification time of the artifact, used as cache key
+    :return: abi of the contract
+    """
+    sidecar_path = abi_sidecar_path(artifact_path)
+    try:
+        with open(sidecar_path, "r") as file_read:
+            sidecar = json.load(file_read)
+        if sidecar["artifact_mtime_ns"] == artifact_mtime_ns:
+            logger.debug("Abi loaded from the sidecar %s", sidecar_path)
+            return sidecar["abi"]
+    except (OSError, ValueError, KeyError):
+        pass
+    with open(artifact_path, "r") as file_read:
+        abi = json.load(file_read)["abi"]
+    logger.info("Abi extracted from the artifact %s", artifact_path)
+    _write_abi_sidecar(sidecar_path, abi, artifact_mtime_ns)
+    return abi
+
+
+def load_contract_abi(artifact_path):
+    """
+    Returns the abi of a contract extracted from its Truffle artifact. The abi is
+    cached in memory and in a compact sidecar file keyed by the artifact's mtime
+    :param artifact_path: file path to the Truffle artifact (json)
+    :return: abi of the contract
+    """
+    return _read_contract_abi(artifact_path, os.stat(artifact_path).st_mtime_ns)
@@ -0,0 +1,148 @@
+"""
+This module contains the client shared by the scripts to interact with the smart contracts
+"""
+import itertools
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+
+from decentralized_smart_grid_ml.contract_interactions.contract_artifacts import load_contract_abi
+from decentralized_smart_grid_ml.exceptions import ContractCallError
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+class ContractClient:
+    """
+    This class represents a client of the blockchain that reuses a pool of keep-alive
+    connections, batches the contracts' calls in a single JSON-RPC request and waits
+    for the contracts' state through a filter on the new blocks
+    """
+
+    def __init__(self, blockchain_address, pool_maxsize=4, session=None):
+        """
+        Initializes the client
+        :param blockchain_address: address of the blockchain node
+        :param pool_maxsize: maximum number of connections kept alive
+        :param session: (optional) requests session used for the HTTP requests
+        """
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.blockchain_address = blockchain_address
+        self.session = session
+        self.web3 = Web3(HTTPProvider(blockchain_address, session=session))
+        self._request_ids = itertools.count()
+        # contracts' handles already created, the key is the contract's address
+        self._contracts = {}
+        logger.info("Connected to the blockchain %s", blockchain_address)
+
+    def contract(self, address, abi):
+        """
+        Returns the handle of a deployed contract, created only once for each address
+        :param address: address of the contract
+        :param abi: abi of the contract
+        :return: contract instance
+        """
+        if address not in self._contracts:
+            self._contracts[address] = self.web3.eth.contract(address=address, abi=abi)
+        return self._contracts[address]
+
+    def contract_from_artifact(self, address, artifact_path):
+        """
+        Returns the handle of a deployed contract whose abi is in a Truffle artifact
+        :param address: address of the contract
+        :param artifact_path: file path to the Truffle artifact (json)
+        :return: contract instance
+        """
+        if address not in self._contracts:
+            self._contracts[address] = self.web3.eth.contract(
+                address=address, abi=load_contract_abi(artifact_path)
+            )
+        return self._contracts[address]
+
+    def batch_call(self, calls, from_address):
+        """
+        Executes a list of contracts' calls with a single JSON-RPC batch request
+        :param calls: list of (contract instance, function name, list of arguments)
+        :param from_address: address of the caller
+        :return: list of the results, one for each call
+        """
+        requests_ids = []
+        payload = []
+        for contract, function_name, arguments in calls:
+            request_id = next(self._request_ids)
+            requests_ids.append(request_id)
+            payload.append({
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "eth_call",
+                "params": [
+                    {
+                        "from": from_address,
+                        "to": contract.address,
+                        "data": contract.encodeABI(fn_name=function_name, args=arguments)
+                    },
+                    "latest"
+                ]
+            })
+        response = self.session.post(self.blockchain_address, json=payload)
+        response.raise_for_status()
+        id2result = {}
+        for result in response.json():
+            if "error" in result:
+                logger.error("The call %s has failed: %s", result["id"], result["error"])
+                raise ContractCallError("Error in the contract call: " + str(result["error"]))
+            id2result[result["id"]] = result["result"]
+        results = []
+        for request_id, (contract, function_name, _) in zip(requests_ids, calls):
+            output_types = [
+                output["type"]
+                for output in contract.get_function_by_name(function_name).abi["outputs"]
+            ]
+            values = self.web3.codec.decode_abi(
+                output_types, bytes.fromhex(id2result[request_id][2:])
+            )
+            results.append(values[0] if len(values) == 1 else values)
+        return results
+
+    def wait_for_condition(self, calls, from_address, condition,
+                           initial_delay=0.5, max_delay=8.0, backoff=2.0):
+        """
+        Waits until a condition on the results of some contracts' calls is satisfied.
+        The calls are executed again only when new blocks are mined, while the filter
+        on the new blocks is polled with an exponential backoff
+        :param calls: list of (contract instance, function name, list of arguments)
+        :param from_address: address of the caller
+        :param condition: function that receives the list of results and returns
+            True when the waiting is over
+        :param initial_delay: initial delay (seconds) between two polls
+        :param max_delay: maximum delay (seconds) between two polls
+        :param backoff: multiplicative factor of the delay when no block has been mined
+        :return: the list of results that satisfy the condition
+        """
+        block_filter = self.web3.eth.filter("latest")
+        results = self.batch_call(calls, from_address)
+        delay = initial_delay
+        while not condition(results):
+            logger.debug("Condition not satisfied by %s, waiting %.1f seconds", results, delay)
+            time.sleep(delay)
+            if block_filter.get_new_entries():
+                results = self.batch_call(calls, from_address)
+                delay = initial_delay
+            else:
+                delay = min(delay * backoff, max_delay)
+        self.web3.eth.uninstall_filter(block_filter.filter_id)
+        return results
+
+    def close(self):
+        """
+        Closes the pooled connections
+        :return:
+        """
+        self.session.close()
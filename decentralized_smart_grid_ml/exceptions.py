@@ -26,3 +26,20 @@ class NotValidAggregationMethod(DecentralizedSmartGridML):
 
 class MalformedConfigurationJson(DecentralizedSmartGridML):
     """ This exception arises when a json configuration file is malformed"""
+
+
+class MalformedWeightsFileError(DecentralizedSmartGridML):
+    """ This exception arises when a model's weights file is malformed """
+
+
+class ContractCallError(DecentralizedSmartGridML):
+    """ This exception arises when a call to a smart contract fails """
+
+
+class NotValidCompressionMethod(DecentralizedSmartGridML):
+    """ This exception arises when the compression method of the weights' update is not valid """
+
+
+class MalformedUploadManifestError(DecentralizedSmartGridML):
+    """ This exception arises when the manifest of an upload is malformed or does not
+    match the uploaded file """
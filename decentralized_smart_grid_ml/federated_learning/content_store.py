@@ -0,0 +1,218 @@
+"""
+This module contains the content-addressed store of the models' weights: the layers are
+saved in chunks named by the hash of their content, so identical layers (e.g. frozen
+layers or unchanged biases) are saved once across rounds and participants
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedWeightsFileError
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# default maximum size of a chunk, the layers that fit in one chunk are memory-mapped
+CONTENT_STORE_CHUNK_SIZE = 16 * 1024 ** 2
+# sub-directory of the store that contains the objects (chunks and descriptors)
+CONTENT_STORE_OBJECTS_DIRECTORY = "objects"
+# default directory of the store, next to the pointer files
+CONTENT_STORE_DEFAULT_DIRECTORY = ".weights_store"
+
+
+def compute_cid(data):
+    """
+    Computes the content identifier (CID) of some bytes
+    :param data: bytes-like object
+    :return: hexadecimal content identifier
+    """
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+def read_weights_cid(pointer_path):
+    """
+    Reads a pointer file (.cid), without resolving the weights it refers to
+    :param pointer_path: file path to the pointer file
+    :return: (content identifier of the weights, path to the store)
+    """
+    with open(pointer_path, "r") as file_read:
+        pointer = json.load(file_read)
+    try:
+        return pointer["cid"], pointer["store"]
+    except (KeyError, TypeError) as error:
+        logger.error("The pointer file %s is not valid", pointer_path)
+        raise MalformedWeightsFileError("Error in the pointer file") from error
+
+
+def write_weights_cid(pointer_path, cid, store_path):
+    """
+    Writes a pointer file (.cid) that refers to some weights of a store
+    :param pointer_path: file path to the pointer file
+    :param cid: content identifier of the weights
+    :param store_path: path to the store that contains the weights
+    :return:
+    """
+    with open(pointer_path, "w") as file_write:
+        json.dump({"cid": cid, "store": os.path.abspath(store_path)}, file_write)
+
+
+class ContentAddressedStore:
+    """
+    This class represents a content-addressed store of models' weights. Each layer is
+    split in chunks saved once under their CID, the layer is described by its dtype,
+    shape and chunks, and the model's weights by the CIDs of their layers.
+    The descriptors are objects of the store as well, so the CID of the weights
+    identifies their whole content
+    """
+
+    def __init__(self, store_path, chunk_size=CONTENT_STORE_CHUNK_SIZE):
+        """
+        Initializes the store, the directory is created if it does not exist
+        :param store_path: path to the directory of the store
+        :param chunk_size: maximum size (bytes) of a chunk
+        """
+        if chunk_size <= 0:
+            logger.error("The chunk size provided is not valid: %d is not > 0", chunk_size)
+            raise ValueError("The chunk size must be a positive integer")
+        self.store_path = store_path
+        self.chunk_size = chunk_size
+        self._objects_path = os.path.join(store_path, CONTENT_STORE_OBJECTS_DIRECTORY)
+        Path(self._objects_path).mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.written_bytes = 0
+        self.deduplicated_bytes = 0
+
+    def object_path(self, cid):
+        """
+        Returns the file path of an object, the objects are sharded by the CID prefix
+        :param cid: content identifier of the object
+        :return: file path to the object
+        """
+        return os.path.join(self._objects_path, cid[:2], cid)
+
+    def contains(self, cid):
+        """
+        Checks if an object is in the store
+        :param cid: content identifier of the object
+        :return:    True if the object is in the store
+                    False otherwise
+        """
+        return os.path.exists(self.object_path(cid))
+
+    def put_bytes(self, data):
+        """
+        Saves an object in the store if it is not already there. The object is written in
+        a temporary file and renamed, so concurrent writers of the same object are safe
+        :param data: bytes-like object
+        :return: content identifier of the object
+        """
+        data = memoryview(data).cast("B")
+        cid = compute_cid(data)
+        object_path = self.object_path(cid)
+        if os.path.exists(object_path):
+            with self._lock:
+                self.deduplicated_bytes += data.nbytes
+            return cid
+        Path(os.path.dirname(object_path)).mkdir(exist_ok=True)
+        temporary_path = object_path + "." + uuid.uuid4().hex + ".tmp"
+        with open(temporary_path, "wb") as file_write:
+            file_write.write(data)
+        os.replace(temporary_path, object_path)
+        with self._lock:
+            self.written_bytes += data.nbytes
+        return cid
+
+    def _put_descriptor(self, descriptor):
+        """
+        Saves a json descriptor in the store
+        :param descriptor: json serializable dictionary
+        :return: content identifier of the descriptor
+        """
+        return self.put_bytes(json.dumps(descriptor, sort_keys=True).encode("utf-8"))
+
+    def _get_descriptor(self, cid):
+        """
+        Loads a json descriptor from the store
+        :param cid: content identifier of the descriptor
+        :return: the descriptor
+        """
+        try:
+            with open(self.object_path(cid), "rb") as file_read:
+                return json.loads(file_read.read().decode("utf-8"))
+        except FileNotFoundError as error:
+            logger.error("The object %s is not in the store %s", cid, self.store_path)
+            raise MalformedWeightsFileError("The CID cannot be resolved") from error
+
+    def put_layer(self, layer_weights):
+        """
+        Saves the weights of a layer in chunks
+        :param layer_weights: array of the layer's weights
+        :return: content identifier of the layer
+        """
+        layer_weights = np.ascontiguousarray(layer_weights)
+        if layer_weights.dtype.kind not in "fiub":
+            layer_weights = layer_weights.astype(np.float32)
+        layer_bytes = memoryview(layer_weights.reshape(-1)).cast("B")
+        chunks = [
+            self.put_bytes(layer_bytes[start:start + self.chunk_size])
+            for start in range(0, layer_bytes.nbytes, self.chunk_size)
+        ]
+        return self._put_descriptor({
+            "dtype": layer_weights.dtype.str,
+            "shape": list(layer_weights.shape),
+            "chunks": chunks
+        })
+
+    def get_layer(self, cid):
+        """
+        Resolves the weights of a layer: a layer saved in a single chunk is a read-only
+        memory map of the chunk, while the chunks of a bigger layer are read in one array
+        :param cid: content identifier of the layer
+        :return: array of the layer's weights
+        """
+        descriptor = self._get_descriptor(cid)
+        dtype = np.dtype(descriptor["dtype"])
+        shape = tuple(descriptor["shape"])
+        if len(descriptor["chunks"]) == 0:
+            return np.empty(shape, dtype=dtype)
+        if len(descriptor["chunks"]) == 1:
+            return np.memmap(self.object_path(descriptor["chunks"][0]), dtype=dtype,
+                             mode="r", shape=shape)
+        layer_weights = np.empty(shape, dtype=dtype)
+        layer_bytes = memoryview(layer_weights.reshape(-1)).cast("B")
+        offset = 0
+        for chunk_cid in descriptor["chunks"]:
+            with open(self.object_path(chunk_cid), "rb") as file_read:
+                offset += file_read.readinto(layer_bytes[offset:])
+        if offset != layer_bytes.nbytes:
+            logger.error("The chunks of the layer %s are not complete", cid)
+            raise MalformedWeightsFileError("The layer's chunks are not valid")
+        layer_weights.flags.writeable = False
+        return layer_weights
+
+    def put_weights(self, weights, metadata=None):
+        """
+        Saves the weights of a model
+        :param weights: list of the layers' weights
+        :param metadata: (optional) json serializable dictionary saved with the weights
+        :return: content identifier of the weights
+        """
+        return self._put_descriptor({
+            "layers": [self.put_layer(layer_weights) for layer_weights in weights],
+            "metadata": metadata or {}
+        })
+
+    def get_weights(self, cid):
+        """
+        Resolves the weights of a model
+        :param cid: content identifier of the weights
+        :return: (list of the layers' weights, metadata saved with the weights)
+        """
+        descriptor = self._get_descriptor(cid)
+        return [self.get_layer(layer_cid) for layer_cid in descriptor["layers"]], \
+            descriptor.get("metadata", {})
@@ -0,0 +1,201 @@
+"""
+This module contains the ledger of the participants' contributions: the alpha, the scores
+and the arrival times of each round are kept in rounds x participants arrays, so the
+contributions are aggregated with vectorized reductions
+"""
+import threading
+
+import numpy as np
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+class ContributionLedger:
+    """
+    This class represents the ledger of the participants' contributions. Each round is a
+    row and each participant a column of the arrays, the participants absent in a round
+    are masked. The totals of the contributions are updated incrementally, so a query
+    does not scan the rounds
+    """
+
+    def __init__(self, participant_ids, n_rounds):
+        """
+        Initializes an empty ledger
+        :param participant_ids: participants' identifier, in the order of the columns
+        :param n_rounds: number of rounds
+        """
+        self.participant_ids = list(participant_ids)
+        self._participant_columns = {
+            participant_id: idx_column
+            for idx_column, participant_id in enumerate(self.participant_ids)
+        }
+        shape = (n_rounds, len(self.participant_ids))
+        # partial contribution of the participants in each round
+        self.alpha = np.zeros(shape, dtype=np.float64)
+        # scores of the participants' models computed by the contribution extractor
+        self.scores = np.full(shape, np.nan, dtype=np.float64)
+        # seconds from the beginning of the round to the participants' uploads
+        self.arrival_times = np.full(shape, np.nan, dtype=np.float64)
+        # True if the participant has been scored in the round
+        self.mask = np.zeros(shape, dtype=bool)
+        self._contribution_totals = np.zeros(len(self.participant_ids), dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def _columns(self, participant_ids):
+        """
+        Returns the columns of some participants
+        :param participant_ids: participants' identifier
+        :return: array of the columns
+        """
+        try:
+            return np.fromiter(
+                (self._participant_columns[participant_id] for participant_id in participant_ids),
+                dtype=np.intp, count=len(participant_ids)
+            )
+        except KeyError as error:
+            logger.error("The participant %s is not in the ledger", error.args[0])
+            raise ValueError("The participant is not in the ledger") from error
+
+    def record_arrival(self, idx_round, participant_id, arrival_time):
+        """
+        Records the upload of a participant in a round
+        :param idx_round: round of the upload
+        :param participant_id: identifier of the participant
+        :param arrival_time: seconds from the beginning of the round
+        :return:
+        """
+        with self._lock:
+            self.arrival_times[idx_round, self._participant_columns[participant_id]] = arrival_time
+
+    def record_round(self, idx_round, participant_ids, alpha, scores=None):
+        """
+        Records the contributions of the participants scored in a round, the previous
+        contributions of the round (if any) are replaced
+        :param idx_round: round of the contributions
+        :param participant_ids: identifiers of the participants scored in the round
+        :param alpha: partial contributions of the participants
+        :param scores: (optional) scores of the participants' models
+        :return:
+        """
+        if len(participant_ids) != len(alpha):
+            logger.error(
+                "The number of participants (%d) and the alpha cardinality (%d) "
+                "does not correspond", len(participant_ids), len(alpha)
+            )
+            raise ValueError("Error in the number of participants and/or alpha cardinality")
+        columns = self._columns(participant_ids)
+        with self._lock:
+            self._contribution_totals -= self.alpha[idx_round]
+            self.alpha[idx_round] = 0.0
+            self.alpha[idx_round, columns] = alpha
+            self._contribution_totals += self.alpha[idx_round]
+            self.mask[idx_round] = False
+            self.mask[idx_round, columns] = True
+            self.scores[idx_round] = np.nan
+            if scores is not None and len(scores) == len(columns):
+                self.scores[idx_round, columns] = scores
+
+    def round_entries(self, idx_round):
+        """
+        Returns the entries of a round for the participants that uploaded or have
+        been scored, e.g. to be saved in the journal of the rounds
+        :param idx_round: round of the entries
+        :return: dictionary with the participants' identifier and their entries
+        """
+        with self._lock:
+            columns = np.flatnonzero(
+                self.mask[idx_round] | ~np.isnan(self.arrival_times[idx_round])
+            )
+            return {
+                "participant_ids": [self.participant_ids[idx_column] for idx_column in columns],
+                "is_scored": self.mask[idx_round, columns].tolist(),
+                "alpha": self.alpha[idx_round, columns].tolist(),
+                "scores": self.scores[idx_round, columns].tolist(),
+                "arrival_times": self.arrival_times[idx_round, columns].tolist()
+            }
+
+    def restore_round(self, idx_round, round_entries):
+        """
+        Restores the entries of a round returned by round_entries
+        :param idx_round: round of the entries
+        :param round_entries: dictionary with the participants' identifier and their entries
+        :return:
+        """
+        is_scored = np.asarray(round_entries["is_scored"], dtype=bool)
+        participant_ids = round_entries["participant_ids"]
+        scored_ids = [
+            participant_id for participant_id, scored in zip(participant_ids, is_scored) if scored
+        ]
+        self.record_round(
+            idx_round, scored_ids,
+            np.asarray(round_entries["alpha"], dtype=np.float64)[is_scored],
+            np.asarray(round_entries["scores"], dtype=np.float64)[is_scored]
+        )
+        with self._lock:
+            self.arrival_times[idx_round, self._columns(participant_ids)] = \
+                round_entries["arrival_times"]
+
+    def participant_contribution(self, participant_id):
+        """
+        Returns the total contribution of a participant over the rounds recorded
+        :param participant_id: identifier of the participant
+        :return: sum of the partial contributions
+        """
+        column = self._participant_columns[participant_id]
+        with self._lock:
+            return float(self._contribution_totals[column])
+
+    def contributions(self):
+        """
+        Returns the contributions of the participants normalized over all the participants
+        :return: list of contributions (sum up to 1), in the order of participant_ids
+        """
+        with self._lock:
+            totals = self._contribution_totals.copy()
+        total = totals.sum()
+        if total <= 0.0:
+            return [0.0] * len(totals)
+        return [round(float(contribution), 2) for contribution in totals / total]
+
+    def participation_counts(self):
+        """
+        Returns the number of rounds in which each participant has been scored
+        :return: array of counts, in the order of participant_ids
+        """
+        with self._lock:
+            return self.mask.sum(axis=0)
+
+    def save(self, ledger_path):
+        """
+        Saves the ledger in a compressed numpy archive
+        :param ledger_path: file path of the archive (.npz)
+        :return:
+        """
+        with self._lock:
+            np.savez_compressed(
+                ledger_path,
+                participant_ids=np.asarray(self.participant_ids),
+                alpha=self.alpha,
+                scores=self.scores,
+                arrival_times=self.arrival_times,
+                mask=self.mask
+            )
+        logger.info("Contribution ledger saved in %s", ledger_path)
+
+    @classmethod
+    def load(cls, ledger_path):
+        """
+        Loads a ledger saved in a compressed numpy archive
+        :param ledger_path: file path of the archive (.npz)
+        :return: instance of ContributionLedger
+        """
+        with np.load(ledger_path) as archive:
+            ledger = cls(archive["participant_ids"].tolist(), archive["alpha"].shape[0])
+            ledger.alpha = archive["alpha"]
+            ledger.scores = archive["scores"]
+            ledger.arrival_times = archive["arrival_times"]
+            ledger.mask = archive["mask"]
+        ledger._contribution_totals = ledger.alpha.sum(axis=0)
+        return ledger
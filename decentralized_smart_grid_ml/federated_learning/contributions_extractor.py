@@ -1,13 +1,79 @@
 """
 This module contains classes and functions used to compute the participants' contribution
 """
+import time
 from abc import abstractmethod
+from statistics import NormalDist
+
+import numpy as np
 
 from decentralized_smart_grid_ml.exceptions import NotValidAggregationMethod
+from decentralized_smart_grid_ml.federated_learning.evaluation_cache import EvaluationCache, \
+    VALIDATION_DATASET_ID, weights_fingerprint
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import \
+    build_multi_head_model
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
 
 logger = create_logger(__name__)
 
+# maximum number of participants' models evaluated in a single multi-head pass
+BATCHED_EVALUATION_MAX_HEADS = 16
+
+# identifier of the accuracy scores computed by the multi-head models in the evaluation cache
+VALIDATION_ACCURACY_ID = VALIDATION_DATASET_ID + "/accuracy"
+
+# default parameters of the Monte Carlo estimation of the Shapley values
+SHAPLEY_TIME_BUDGET = 60.0
+SHAPLEY_MAX_PERMUTATIONS = 100
+SHAPLEY_MIN_PERMUTATIONS = 5
+SHAPLEY_TOLERANCE = 0.01
+SHAPLEY_TRUNCATION_TOLERANCE = 0.01
+
+# default parameters of the adaptive (successive halving) scoring on validation subsamples
+ADAPTIVE_INITIAL_FRACTION = 1 / 16
+ADAPTIVE_MIN_SAMPLES = 32
+ADAPTIVE_GROWTH_FACTOR = 2
+ADAPTIVE_CONFIDENCE = 0.95
+
+
+def _compiled_metric_name(model):
+    """
+    Returns the name of the first metric the model has been compiled with
+    :param model: compiled model
+    :return: name of the metric or None if it cannot be determined
+    """
+    try:
+        metrics = model.get_compile_config().get("metrics")
+    except (AttributeError, TypeError):
+        # older versions of tf.keras do not expose the compile config
+        metrics = getattr(getattr(model, "compiled_metrics", None), "_user_metrics", None)
+    if isinstance(metrics, (list, tuple)) and len(metrics) > 0:
+        metrics = metrics[0]
+    if isinstance(metrics, str):
+        return metrics
+    return None
+
+
+def accuracy_scores(predictions, y_true):
+    """
+    Computes the accuracy of a batch of predictions following the same rules
+    used by keras to resolve the "accuracy" metric (binary, sparse or categorical)
+    :param predictions: predictions of the model with shape (n_samples, n_outputs)
+    :param y_true: true labels
+    :return: boolean vector that indicates whether each sample is correctly predicted
+    """
+    predictions = np.asarray(predictions)
+    y_true = np.asarray(y_true)
+    if predictions.ndim == 1 or predictions.shape[-1] == 1:
+        # binary accuracy with threshold 0.5
+        return (predictions.reshape(len(predictions)) > 0.5) == \
+            y_true.reshape(len(y_true)).astype(bool)
+    if y_true.ndim < predictions.ndim or y_true.shape[-1] == 1:
+        # sparse categorical accuracy
+        return np.argmax(predictions, axis=-1) == y_true.reshape(len(y_true))
+    # categorical accuracy
+    return np.argmax(predictions, axis=-1) == np.argmax(y_true, axis=-1)
+
 
 class ContributionsExtractorCreator:
     """
@@ -16,20 +82,35 @@ class ContributionsExtractorCreator:
     """
 
     @staticmethod
-    def factory_method(method, model, x_validation, y_validation):
+    def factory_method(method, model, x_validation, y_validation, evaluation_cache=None,
+                       method_params=None):
         """
         Creates a ContributionsExtractor instance
         :param method: method used for the contribution extraction
         :param model: global model structure
         :param x_validation: validation features
         :param y_validation: validation labels
+        :param evaluation_cache: (optional) EvaluationCache instance shared with the aggregator
+        :param method_params: (optional) parameters of the method, used by "monte_carlo_shapley"
         :return: ContributionsExtractor instance
         """
         if method == "ensemble_general":
             # default method
-            return ContributionsExtractorEnsembleGeneral(model, x_validation, y_validation)
+            return ContributionsExtractorEnsembleGeneral(
+                model, x_validation, y_validation, evaluation_cache
+            )
         elif method == "simple_average":
-            return ContributionsExtractorSimpleAverage(model, x_validation, y_validation)
+            return ContributionsExtractorSimpleAverage(
+                model, x_validation, y_validation, evaluation_cache
+            )
+        elif method == "ensemble_general_adaptive":
+            return ContributionsExtractorEnsembleGeneralAdaptive(
+                model, x_validation, y_validation, evaluation_cache, **(method_params or {})
+            )
+        elif method == "monte_carlo_shapley":
+            return ContributionsExtractorMonteCarloShapley(
+                model, x_validation, y_validation, evaluation_cache, **(method_params or {})
+            )
         logger.error("The method '%s' is not valid", method)
         raise NotValidAggregationMethod("The given method is not valid")
 
@@ -39,12 +120,13 @@ class ContributionsExtractor:
     Superclass that represents a ContributionsExtractor
     """
 
-    def __init__(self, model, x_validation, y_validation):
+    def __init__(self, model, x_validation, y_validation, evaluation_cache=None):
         """
         Initializes the ContributionsExtractor
         :param model: global model structure
         :param x_validation: validation features
         :param y_validation: validation labels
+        :param evaluation_cache: (optional) EvaluationCache instance, if None a new one is used
         """
         if x_validation is None or y_validation is None:
             logger.error("The arguments %s are not correct", [model, x_validation, y_validation])
@@ -52,6 +134,14 @@ class ContributionsExtractor:
         self.model = model
         self.x_validation = x_validation
         self.y_validation = y_validation
+        if evaluation_cache is None:
+            evaluation_cache = EvaluationCache()
+        self.evaluation_cache = evaluation_cache
+        # confidence intervals of the participants' scores of the last round,
+        # None if the scores are exact
+        self.confidence_intervals = None
+        # scores of the participants' models of the last round, None if they are not scored
+        self.scores = None
 
     @abstractmethod
     def compute_contribution(self, models_weights, last_metric_result):
@@ -70,12 +160,143 @@ class ContributionsExtractorEnsembleGeneral(ContributionsExtractor):
     an ensemble model based on the local models' output
     """
 
+    def __init__(self, model, x_validation, y_validation, evaluation_cache=None):
+        super().__init__(model, x_validation, y_validation, evaluation_cache)
+        # multi-head models already built, the key is the number of heads
+        self._multi_head_models = {}
+
+    def _evaluate_loop(self, models_weights):
+        """
+        Evaluates the participants' models one after another
+        :param models_weights: participants models' weights
+        :return: list of the evaluations
+        """
+        evaluations = []
+        for model_weight in models_weights:
+            evaluation = self.evaluation_cache.get_or_evaluate(
+                model_weight,
+                VALIDATION_DATASET_ID,
+                lambda weights=model_weight: self._evaluate_weights(weights)
+            )
+            evaluations.append(evaluation[1])
+        return evaluations
+
+    def _evaluate_weights(self, model_weight):
+        """
+        Evaluates a participant's model on the validation set
+        :param model_weight: participant model's weights
+        :return: evaluation of the model (loss and metrics)
+        """
+        self.model.set_weights(model_weight)
+        return self.model.evaluate(self.x_validation, self.y_validation)
+
+    def _evaluate_batched(self, models_weights):
+        """
+        Evaluates the participants' models in groups of at most
+        BATCHED_EVALUATION_MAX_HEADS, each group with a single forward pass
+        of a multi-head model
+        :param models_weights: participants models' weights
+        :return: list of the evaluations
+        """
+        fingerprints = [weights_fingerprint(model_weight) for model_weight in models_weights]
+        evaluations = [
+            self.evaluation_cache.get(fingerprint, VALIDATION_ACCURACY_ID)
+            for fingerprint in fingerprints
+        ]
+        # only the models not in the cache are evaluated
+        missing_indices = [
+            idx_model for idx_model, evaluation in enumerate(evaluations) if evaluation is None
+        ]
+        missing_evaluations = self._evaluate_multi_head(
+            [models_weights[idx_model] for idx_model in missing_indices]
+        )
+        for idx_model, evaluation in zip(missing_indices, missing_evaluations):
+            evaluations[idx_model] = evaluation
+            self.evaluation_cache.put(fingerprints[idx_model], VALIDATION_ACCURACY_ID, evaluation)
+        return evaluations
+
+    def _evaluate_multi_head(self, models_weights):
+        """
+        Evaluates the participants' models with the multi-head models
+        :param models_weights: participants models' weights
+        :return: list of the evaluations
+        """
+        return [
+            float(np.mean(accuracy_scores(head_predictions, self.y_validation)))
+            for head_predictions in self._predict_multi_head(models_weights, self.x_validation)
+        ]
+
+    def _predict_multi_head(self, models_weights, x_samples):
+        """
+        Computes the predictions of the participants' models with the multi-head models
+        :param models_weights: participants models' weights
+        :param x_samples: samples to predict
+        :return: list of the predictions (one for each model)
+        """
+        predictions = []
+        for idx_start in range(0, len(models_weights), BATCHED_EVALUATION_MAX_HEADS):
+            group_weights = models_weights[idx_start:idx_start + BATCHED_EVALUATION_MAX_HEADS]
+            if len(group_weights) not in self._multi_head_models:
+                self._multi_head_models[len(group_weights)] = \
+                    build_multi_head_model(self.model, len(group_weights))
+            multi_head_model, heads = self._multi_head_models[len(group_weights)]
+            for head, model_weight in zip(heads, group_weights):
+                head.set_weights(model_weight)
+            group_predictions = multi_head_model.predict(x_samples)
+            if not isinstance(group_predictions, list):
+                group_predictions = [group_predictions]
+            predictions.extend(group_predictions)
+        return predictions
+
+    def evaluate_models(self, models_weights):
+        """
+        Evaluates the participants' models on the validation set. The models are scored
+        all together with a multi-head model when the metric is the accuracy, otherwise
+        (or if the multi-head model cannot be built) they are evaluated one after another
+        :param models_weights: participants models' weights
+        :return: list of the evaluations
+        """
+        if _compiled_metric_name(self.model) in ("accuracy", "acc") and len(models_weights) > 0:
+            try:
+                return self._evaluate_batched(models_weights)
+            except (ValueError, TypeError, AttributeError) as error:
+                logger.warning(
+                    "Batched evaluation not available (%s), "
+                    "the models will be evaluated one after another", error
+                )
+        return self._evaluate_loop(models_weights)
+
     def compute_contribution(self, models_weights, last_metric_result):
+        # the models are evaluated on the global model, whose weights are restored
+        # because they are published if the global model is not updated in the round
+        original_weights = self.model.get_weights()
+        try:
+            return self._compute_ensemble_contribution(models_weights, last_metric_result)
+        finally:
+            self.model.set_weights(original_weights)
+
+    def _compute_ensemble_contribution(self, models_weights, last_metric_result):
+        """
+        Evaluates the participants' models and computes their contribution
+        :param models_weights: participants models' weights (one for each participant in this round)
+        :param last_metric_result: score value of the last global model's measurement
+        :return: vector of the contribution
+        """
+        self.scores = list(self.evaluate_models(models_weights))
+        return self._contribution_from_evaluations(self.scores, last_metric_result)
+
+    @staticmethod
+    def _contribution_from_evaluations(evaluations, last_metric_result):
+        """
+        Computes the participants' contribution as their normalized improvements
+        over the last global model
+        :param evaluations: participants models' evaluations
+        :param last_metric_result: score value of the last global model's measurement
+        :return: vector of the contribution
+        """
         logger.debug("Last metric result: %s", last_metric_result)
         evaluation_participants = []
-        for model_weight in models_weights:
-            self.model.set_weights(model_weight)
-            evaluation_participant = self.model.evaluate(self.x_validation, self.y_validation)[1]
+        for evaluation_participant in evaluations:
             if evaluation_participant - last_metric_result > 0.0:
                 evaluation_improvement = evaluation_participant - last_metric_result
             else:
@@ -94,6 +315,228 @@ class ContributionsExtractorEnsembleGeneral(ContributionsExtractor):
         return alpha
 
 
+class ContributionsExtractorEnsembleGeneralAdaptive(ContributionsExtractorEnsembleGeneral):
+    """
+    This class contains the logic of ContributionsExtractorEnsembleGeneral with an adaptive
+    scoring: all the participants' models are first evaluated on a small stratified
+    subsample of the validation set, which is widened (successive halving) only for the
+    models whose improvement over the last global model is not settled yet by the
+    confidence interval of their accuracy. The models rejected early get no contribution,
+    the accepted ones are scored on the whole validation set
+    """
+
+    def __init__(self, model, x_validation, y_validation, evaluation_cache=None,
+                 initial_fraction=ADAPTIVE_INITIAL_FRACTION, min_samples=ADAPTIVE_MIN_SAMPLES,
+                 growth_factor=ADAPTIVE_GROWTH_FACTOR, confidence=ADAPTIVE_CONFIDENCE,
+                 seed=None):
+        """
+        Initializes the ContributionsExtractor
+        :param model: global model structure
+        :param x_validation: validation features
+        :param y_validation: validation labels
+        :param evaluation_cache: (optional) EvaluationCache instance, if None a new one is used
+        :param initial_fraction: fraction of the validation set of the first subsample
+        :param min_samples: minimum number of samples of the first subsample
+        :param growth_factor: factor by which the subsample is widened at each step
+        :param confidence: confidence level of the accuracy's intervals
+        :param seed: (optional) seed used to draw the stratified subsamples
+        """
+        super().__init__(model, x_validation, y_validation, evaluation_cache)
+        if not 0.0 < initial_fraction <= 1.0 or min_samples <= 0 \
+                or growth_factor <= 1 or not 0.0 < confidence < 1.0:
+            logger.error(
+                "The parameters of the adaptive scoring are not valid: %s",
+                [initial_fraction, min_samples, growth_factor, confidence]
+            )
+            raise ValueError("The adaptive scoring's parameters are not valid")
+        self.initial_fraction = initial_fraction
+        self.min_samples = min_samples
+        self.growth_factor = growth_factor
+        self.z_score = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.rng = np.random.default_rng(seed)
+        self._stratified_order = None
+        # number of validation samples used to score each participant in the last round
+        self.n_samples = []
+
+    def _get_stratified_order(self):
+        """
+        Returns an order of the validation samples such that each prefix is a stratified
+        subsample: the samples of each class are shuffled and spread evenly in the order
+        :return: indices of the validation samples
+        """
+        if self._stratified_order is None:
+            y_validation = np.asarray(self.y_validation)
+            if y_validation.ndim > 1 and y_validation.shape[-1] > 1:
+                # one-hot encoded labels
+                labels = np.argmax(y_validation, axis=-1)
+            else:
+                labels = y_validation.reshape(len(y_validation))
+            ranks = np.empty(len(labels))
+            for label in np.unique(labels):
+                label_indices = np.flatnonzero(labels == label)
+                ranks[self.rng.permutation(label_indices)] = \
+                    (np.arange(len(label_indices)) + self.rng.random()) / len(label_indices)
+            self._stratified_order = np.argsort(ranks, kind="stable")
+        return self._stratified_order
+
+    def _predict_correct(self, models_weights, indices):
+        """
+        Computes which samples are correctly predicted by the participants' models
+        :param models_weights: participants models' weights
+        :param indices: indices of the validation samples
+        :return: list of boolean vectors (one for each model)
+        """
+        x_samples = np.asarray(self.x_validation)[indices]
+        y_samples = np.asarray(self.y_validation)[indices]
+        try:
+            predictions = self._predict_multi_head(models_weights, x_samples)
+        except (ValueError, TypeError, AttributeError) as error:
+            logger.debug("Multi-head predictions not available (%s)", error)
+            predictions = []
+            for model_weight in models_weights:
+                self.model.set_weights(model_weight)
+                predictions.append(self.model.predict(x_samples))
+        return [accuracy_scores(model_predictions, y_samples) for model_predictions in predictions]
+
+    def _confidence_interval(self, n_correct, n_samples, n_validation):
+        """
+        Computes the confidence interval of an accuracy estimated on a subsample
+        :param n_correct: number of samples correctly predicted
+        :param n_samples: number of samples of the subsample
+        :param n_validation: number of samples of the validation set
+        :return: (lower bound, upper bound)
+        """
+        accuracy = n_correct / n_samples
+        if n_samples >= n_validation:
+            return accuracy, accuracy
+        # normal approximation with the finite population correction
+        half_width = self.z_score * np.sqrt(
+            accuracy * (1 - accuracy) / n_samples * (n_validation - n_samples) / (n_validation - 1)
+        )
+        # at least the resolution of the subsample, since the variance is 0 if accuracy is 0 or 1
+        half_width = max(half_width, 1 / n_samples)
+        return max(accuracy - half_width, 0.0), min(accuracy + half_width, 1.0)
+
+    def _rescore_accepted_models(self, models_weights, last_metric_result, fingerprints,
+                                 evaluations, n_correct, n_samples, intervals):
+        """
+        Scores on the whole validation set the models accepted on a subsample: the early
+        stopping only decides the rejection, while the contribution of the accepted models
+        is computed from their exact accuracy. The arrays are updated in place
+        :param models_weights: participants models' weights
+        :param last_metric_result: score value of the last global model's measurement
+        :param fingerprints: fingerprints of the participants' models
+        :param evaluations: accuracies of the models
+        :param n_correct: numbers of samples correctly predicted by the models
+        :param n_samples: numbers of samples on which the models have been scored
+        :param intervals: confidence intervals of the accuracies
+        :return:
+        """
+        order = self._get_stratified_order()
+        n_validation = len(order)
+        # the accepted models are grouped by the samples they have already predicted
+        evaluated_sizes2models = {}
+        for idx_model, (lower_bound, _) in enumerate(intervals):
+            if n_samples[idx_model] < n_validation and lower_bound > last_metric_result:
+                evaluated_sizes2models.setdefault(int(n_samples[idx_model]), []).append(idx_model)
+        for evaluated_size, accepted in evaluated_sizes2models.items():
+            correct_predictions = self._predict_correct(
+                [models_weights[idx_model] for idx_model in accepted], order[evaluated_size:]
+            )
+            for idx_model, correct in zip(accepted, correct_predictions):
+                n_correct[idx_model] += int(np.sum(correct))
+                n_samples[idx_model] = n_validation
+                evaluations[idx_model] = n_correct[idx_model] / n_validation
+                intervals[idx_model] = (evaluations[idx_model], evaluations[idx_model])
+                self.evaluation_cache.put(
+                    fingerprints[idx_model], VALIDATION_ACCURACY_ID, float(evaluations[idx_model])
+                )
+
+    def evaluate_models_adaptive(self, models_weights, last_metric_result):
+        """
+        Evaluates the participants' models on stratified subsamples of the validation set,
+        widened only for the models whose improvement over the last global model is
+        not settled. The models rejected keep the accuracy of their subsample, while the
+        models accepted are scored on the whole validation set
+        :param models_weights: participants models' weights
+        :param last_metric_result: score value of the last global model's measurement
+        :return: (list of the evaluations, list of the confidence intervals)
+        """
+        order = self._get_stratified_order()
+        n_validation = len(order)
+        n_models = len(models_weights)
+        fingerprints = [weights_fingerprint(model_weight) for model_weight in models_weights]
+        evaluations = np.zeros(n_models)
+        n_correct = np.zeros(n_models, dtype=np.int64)
+        n_samples = np.zeros(n_models, dtype=np.int64)
+        intervals = [None] * n_models
+        active = []
+        for idx_model, fingerprint in enumerate(fingerprints):
+            # the full evaluations already computed are exact
+            evaluation = self.evaluation_cache.get(fingerprint, VALIDATION_ACCURACY_ID)
+            if evaluation is None:
+                active.append(idx_model)
+            else:
+                evaluations[idx_model] = evaluation
+                intervals[idx_model] = (evaluation, evaluation)
+                n_samples[idx_model] = n_validation
+        subsample_size = min(
+            n_validation, max(self.min_samples, int(np.ceil(self.initial_fraction * n_validation)))
+        )
+        evaluated_size = 0
+        while len(active) > 0:
+            # only the samples not yet seen by the active models are predicted
+            correct_predictions = self._predict_correct(
+                [models_weights[idx_model] for idx_model in active],
+                order[evaluated_size:subsample_size]
+            )
+            still_active = []
+            for idx_model, correct in zip(active, correct_predictions):
+                n_correct[idx_model] += int(np.sum(correct))
+                n_samples[idx_model] = subsample_size
+                evaluations[idx_model] = n_correct[idx_model] / subsample_size
+                intervals[idx_model] = self._confidence_interval(
+                    n_correct[idx_model], subsample_size, n_validation
+                )
+                lower_bound, upper_bound = intervals[idx_model]
+                if lower_bound <= last_metric_result <= upper_bound:
+                    still_active.append(idx_model)
+            logger.debug(
+                "%d of %d models scored on %d samples, %d not settled",
+                len(active), n_models, subsample_size, len(still_active)
+            )
+            if subsample_size == n_validation:
+                for idx_model in active:
+                    self.evaluation_cache.put(
+                        fingerprints[idx_model], VALIDATION_ACCURACY_ID,
+                        float(evaluations[idx_model])
+                    )
+                break
+            active = still_active
+            evaluated_size = subsample_size
+            subsample_size = min(n_validation, int(np.ceil(subsample_size * self.growth_factor)))
+        self._rescore_accepted_models(
+            models_weights, last_metric_result, fingerprints, evaluations, n_correct, n_samples,
+            intervals
+        )
+        self.n_samples = n_samples.tolist()
+        return evaluations.tolist(), [(float(lower), float(upper)) for lower, upper in intervals]
+
+    def _compute_ensemble_contribution(self, models_weights, last_metric_result):
+        if _compiled_metric_name(self.model) not in ("accuracy", "acc") \
+                or len(models_weights) == 0:
+            # the confidence intervals are computed only for the accuracy
+            self.confidence_intervals = None
+            return super()._compute_ensemble_contribution(models_weights, last_metric_result)
+        evaluations, self.confidence_intervals = self.evaluate_models_adaptive(
+            models_weights, last_metric_result
+        )
+        self.scores = evaluations
+        logger.debug("Confidence intervals of the participants' accuracy: %s",
+                     self.confidence_intervals)
+        return self._contribution_from_evaluations(evaluations, last_metric_result)
+
+
 class ContributionsExtractorSimpleAverage(ContributionsExtractor):
     """
     This class contains the logic to extract the participants' contribution using
@@ -101,7 +544,179 @@ class ContributionsExtractorSimpleAverage(ContributionsExtractor):
     """
     def compute_contribution(self, models_weights, last_metric_result):
         n_participants = len(models_weights)
+        if n_participants == 0:
+            return []
         eval_participant = round(1.0 / n_participants, 2)
         alpha = [eval_participant for _ in range(n_participants)]
         logger.debug("The contribution vector computed is %s", alpha)
         return alpha
+
+
+class ContributionsExtractorMonteCarloShapley(ContributionsExtractor):
+    """
+    This class contains the logic to extract the participants' contribution as their
+    Shapley values, estimated with truncated Monte Carlo sampling of the permutations.
+    The value of a coalition is the validation metric of the average of its participants'
+    models: the coalitions of a permutation are built incrementally with running sums
+    and the evaluation of each coalition is computed only once per round
+    """
+
+    def __init__(self, model, x_validation, y_validation, evaluation_cache=None,
+                 time_budget=SHAPLEY_TIME_BUDGET, max_permutations=SHAPLEY_MAX_PERMUTATIONS,
+                 min_permutations=SHAPLEY_MIN_PERMUTATIONS, tolerance=SHAPLEY_TOLERANCE,
+                 truncation_tolerance=SHAPLEY_TRUNCATION_TOLERANCE, seed=None):
+        """
+        Initializes the ContributionsExtractor
+        :param model: global model structure
+        :param x_validation: validation features
+        :param y_validation: validation labels
+        :param evaluation_cache: (optional) EvaluationCache instance, if None a new one is used
+        :param time_budget: maximum number of seconds spent sampling the permutations
+        :param max_permutations: maximum number of permutations sampled
+        :param min_permutations: minimum number of permutations sampled before
+            checking the convergence
+        :param tolerance: the sampling stops when the mean absolute change of the
+            estimates, relative to their mean absolute value, is below this tolerance
+        :param truncation_tolerance: a permutation is truncated when the value of the
+            coalition is within this relative tolerance from the value of all the participants
+        :param seed: (optional) seed of the permutations' generator
+        """
+        super().__init__(model, x_validation, y_validation, evaluation_cache)
+        if time_budget <= 0 or max_permutations <= 0 or min_permutations <= 0 \
+                or tolerance < 0 or truncation_tolerance < 0:
+            logger.error(
+                "The parameters of the Monte Carlo Shapley values are not valid: %s",
+                [time_budget, max_permutations, min_permutations, tolerance,
+                 truncation_tolerance]
+            )
+            raise ValueError("The Monte Carlo Shapley values' parameters are not valid")
+        self.time_budget = time_budget
+        self.max_permutations = max_permutations
+        self.min_permutations = min_permutations
+        self.tolerance = tolerance
+        self.truncation_tolerance = truncation_tolerance
+        self.rng = np.random.default_rng(seed)
+        # estimates of the last round, the value of a participant can be negative
+        self.shapley_values = []
+        self.n_permutations = 0
+
+    def _evaluate_coalition(self, coalition_weights):
+        """
+        Evaluates the average model of a coalition on the validation set
+        :param coalition_weights: weights of the coalition's average model
+        :return: metric of the coalition's model
+        """
+        self.model.set_weights(coalition_weights)
+        return self.model.evaluate(self.x_validation, self.y_validation)[1]
+
+    def _coalition_value(self, coalition, running_sums, layers_dtypes, coalitions2values):
+        """
+        Returns the value of a coalition, evaluating its average model only
+        if the coalition has not been evaluated yet in this round
+        :param coalition: frozenset of the participants' indices in the coalition
+        :param running_sums: sums of the coalition's participants' weights (float64)
+        :param layers_dtypes: dtypes of the model's layers
+        :param coalitions2values: values of the coalitions already evaluated
+        :return: value of the coalition
+        """
+        if coalition not in coalitions2values:
+            coalition_weights = [
+                (layer_sum / len(coalition)).astype(layer_dtype, copy=False)
+                for layer_sum, layer_dtype in zip(running_sums, layers_dtypes)
+            ]
+            coalitions2values[coalition] = self._evaluate_coalition(coalition_weights)
+        return coalitions2values[coalition]
+
+    def compute_contribution(self, models_weights, last_metric_result):
+        if len(models_weights) == 0:
+            return []
+        # the coalitions are evaluated on the global model, whose weights are restored
+        # because they are published if the global model is not updated in the round
+        original_weights = self.model.get_weights()
+        try:
+            return self._compute_shapley_contribution(models_weights, last_metric_result)
+        finally:
+            self.model.set_weights(original_weights)
+
+    def _compute_shapley_contribution(self, models_weights, last_metric_result):
+        """
+        Estimates the participants' Shapley values and computes their contribution
+        :param models_weights: participants models' weights (one for each participant in this round)
+        :param last_metric_result: score value of the last global model's measurement
+        :return: vector of the contribution
+        """
+        n_participants = len(models_weights)
+        models_weights = [
+            [np.asarray(layer_weights) for layer_weights in model_weights]
+            for model_weights in models_weights
+        ]
+        layers_dtypes = [layer_weights.dtype for layer_weights in models_weights[0]]
+        running_sums = [
+            np.zeros(layer_weights.shape, dtype=np.float64) for layer_weights in models_weights[0]
+        ]
+        # the empty coalition corresponds to the global model of the last round
+        coalitions2values = {frozenset(): last_metric_result}
+        all_participants = frozenset(range(n_participants))
+        for idx_participant in all_participants:
+            for layer_sum, layer_weights in zip(running_sums, models_weights[idx_participant]):
+                np.add(layer_sum, layer_weights, out=layer_sum)
+        grand_value = self._coalition_value(
+            all_participants, running_sums, layers_dtypes, coalitions2values
+        )
+        truncation_threshold = self.truncation_tolerance * abs(grand_value)
+        shapley_values = np.zeros(n_participants)
+        n_permutations = 0
+        start_time = time.perf_counter()
+        while n_permutations < self.max_permutations:
+            for layer_sum in running_sums:
+                layer_sum.fill(0.0)
+            coalition = frozenset()
+            previous_value = last_metric_result
+            marginal_contributions = np.zeros(n_participants)
+            for idx_participant in self.rng.permutation(n_participants):
+                if coalition and abs(grand_value - previous_value) <= truncation_threshold:
+                    # the remaining participants do not change the value significantly,
+                    # the empty coalition is never truncated
+                    break
+                for layer_sum, layer_weights in zip(
+                        running_sums, models_weights[idx_participant]):
+                    np.add(layer_sum, layer_weights, out=layer_sum)
+                coalition = coalition | {idx_participant}
+                value = self._coalition_value(
+                    coalition, running_sums, layers_dtypes, coalitions2values
+                )
+                marginal_contributions[idx_participant] = value - previous_value
+                previous_value = value
+            n_permutations += 1
+            previous_estimates = shapley_values
+            # running mean of the marginal contributions
+            shapley_values = shapley_values + \
+                (marginal_contributions - shapley_values) / n_permutations
+            if n_permutations >= self.min_permutations:
+                mean_change = np.mean(np.abs(shapley_values - previous_estimates))
+                mean_value = np.mean(np.abs(shapley_values))
+                if mean_value == 0.0 or mean_change / mean_value <= self.tolerance:
+                    logger.debug("Shapley values converged after %d permutations",
+                                 n_permutations)
+                    break
+            if time.perf_counter() - start_time > self.time_budget:
+                logger.warning(
+                    "Time budget of the Shapley values exhausted after %d permutations",
+                    n_permutations
+                )
+                break
+        self.shapley_values = shapley_values.tolist()
+        self.scores = self.shapley_values
+        self.n_permutations = n_permutations
+        logger.debug(
+            "Shapley values %s estimated with %d permutations and %d coalitions' evaluations",
+            self.shapley_values, n_permutations, len(coalitions2values) - 1
+        )
+        positive_values = np.clip(shapley_values, 0.0, None)
+        sum_values = positive_values.sum()
+        if sum_values == 0.0:
+            alpha = [0 for _ in range(n_participants)]
+        else:
+            alpha = (positive_values / sum_values).tolist()
+        logger.debug("The contribution vector computed is %s", alpha)
+        return alpha
@@ -0,0 +1,122 @@
+"""
+This module contains the data source used to stream the csv datasets in chunks
+"""
+import numpy as np
+import pandas as pd
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# number of rows read from the csv file at once
+CSV_CHUNK_SIZE = 65536
+
+
+class CsvDataSource:
+    """
+    This class represents a csv dataset read in chunks: only the features and labels
+    columns are parsed, directly in a compact dtype, so the memory used does not
+    depend on the size of the file
+    """
+
+    def __init__(self, csv_path, features_names, chunk_size=CSV_CHUNK_SIZE, dtype=np.float32):
+        """
+        Initializes the data source
+        :param csv_path: file path to the csv dataset
+        :param features_names: features name of the dataset (features and labels)
+        :param chunk_size: number of rows read at once
+        :param dtype: dtype of both features and labels
+        """
+        if chunk_size <= 0:
+            logger.error("The chunk size provided is not valid: %d is not > 0", chunk_size)
+            raise ValueError("The chunk size must be a positive integer")
+        self.csv_path = csv_path
+        self.features = list(features_names["features"])
+        self.labels = features_names["labels"]
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        # a single label column (string) gives one-dimensional labels as pandas does
+        labels_columns = [self.labels] if isinstance(self.labels, str) else list(self.labels)
+        self.usecols = self.features + [
+            column for column in labels_columns if column not in self.features
+        ]
+
+    def iter_chunks(self):
+        """
+        Reads the csv file one chunk at a time
+        :return: generator of (features, labels) arrays
+        """
+        chunks = pd.read_csv(
+            self.csv_path,
+            usecols=self.usecols,
+            dtype={column: self.dtype for column in self.usecols},
+            chunksize=self.chunk_size
+        )
+        for chunk in chunks:
+            yield chunk[self.features].to_numpy(), chunk[self.labels].to_numpy()
+
+    def iter_batches(self, batch_size):
+        """
+        Reads the csv file one batch at a time, the rows of a batch may span two chunks
+        :param batch_size: number of rows of each batch (the last one may be smaller)
+        :return: generator of (features, labels) arrays
+        """
+        pending_x, pending_y = None, None
+        for x_chunk, y_chunk in self.iter_chunks():
+            if pending_x is not None:
+                x_chunk = np.concatenate([pending_x, x_chunk])
+                y_chunk = np.concatenate([pending_y, y_chunk])
+            n_full_rows = len(x_chunk) - len(x_chunk) % batch_size
+            for start in range(0, n_full_rows, batch_size):
+                yield x_chunk[start:start + batch_size], y_chunk[start:start + batch_size]
+            pending_x, pending_y = x_chunk[n_full_rows:], y_chunk[n_full_rows:]
+        if pending_x is not None and len(pending_x) > 0:
+            yield pending_x, pending_y
+
+    def count_rows(self):
+        """
+        Counts the rows of the csv file, reading one chunk at a time
+        :return: number of rows
+        """
+        return sum(len(y_chunk) for _, y_chunk in self.iter_chunks())
+
+    def as_dataset(self, batch_size, shuffle_buffer_size=None):
+        """
+        Creates a tf.data pipeline that reads the batches in background (prefetching)
+        while the model consumes the previous ones. It can be iterated once per epoch
+        :param batch_size: number of rows of each batch
+        :param shuffle_buffer_size: (optional) number of samples shuffled together, the
+            samples are shuffled before being grouped in batches
+        :return: tf.data.Dataset of (features, labels) batches
+        """
+        # tensorflow is imported only when a pipeline is created
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+        labels_shape = (None,) if isinstance(self.labels, str) else (None, len(self.labels))
+        dataset = tf.data.Dataset.from_generator(
+            lambda: self.iter_batches(batch_size),
+            output_signature=(
+                tf.TensorSpec(shape=(None, len(self.features)), dtype=self.dtype),
+                tf.TensorSpec(shape=labels_shape, dtype=self.dtype)
+            )
+        )
+        if shuffle_buffer_size:
+            # the rows are read in batches, then shuffled one by one and batched again,
+            # so the time-ordered rows of a file are mixed inside each batch
+            dataset = dataset.unbatch().shuffle(shuffle_buffer_size).batch(batch_size)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def to_arrays(self):
+        """
+        Reads the whole csv file in memory, chunk by chunk
+        :return: (features, labels) arrays
+        """
+        x_chunks, y_chunks = [], []
+        for x_chunk, y_chunk in self.iter_chunks():
+            x_chunks.append(x_chunk)
+            y_chunks.append(y_chunk)
+        if len(x_chunks) == 0:
+            logger.warning("The dataset %s is empty", self.csv_path)
+            labels_shape = (0,) if isinstance(self.labels, str) else (0, len(self.labels))
+            return np.empty((0, len(self.features)), dtype=self.dtype), \
+                np.empty(labels_shape, dtype=self.dtype)
+        return np.concatenate(x_chunks), np.concatenate(y_chunks)
@@ -0,0 +1,110 @@
+"""
+This module contains the cache of the models' evaluations shared by the aggregator
+and the contribution extractors
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# identifiers of the datasets used for the evaluations
+VALIDATION_DATASET_ID = "validation"
+TEST_DATASET_ID = "test"
+
+# default maximum number of evaluations kept in the cache
+EVALUATION_CACHE_MAX_SIZE = 256
+
+
+def weights_fingerprint(weights):
+    """
+    Computes a fingerprint of a model's weights hashing the buffers of the layers
+    (with their dtype and shape) without copying them
+    :param weights: list of the layers' weights
+    :return: hexadecimal fingerprint
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for layer_weights in weights:
+        layer_weights = np.ascontiguousarray(layer_weights)
+        digest.update(str(layer_weights.dtype).encode("utf-8"))
+        digest.update(str(layer_weights.shape).encode("utf-8"))
+        digest.update(memoryview(layer_weights.reshape(-1)))
+    return digest.hexdigest()
+
+
+class EvaluationCache:
+    """
+    This class represents a LRU cache of the models' evaluations. The key of an
+    evaluation is the fingerprint of the model's weights and the identifier of the
+    dataset, so the same model evaluated again on the same dataset is not recomputed
+    """
+
+    def __init__(self, max_size=EVALUATION_CACHE_MAX_SIZE):
+        """
+        Initializes the cache
+        :param max_size: maximum number of evaluations kept in the cache
+        """
+        if max_size <= 0:
+            logger.error("The cache size provided is not valid: %d is not > 0", max_size)
+            raise ValueError("The cache size must be a positive integer")
+        self.max_size = max_size
+        self._evaluations = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint, dataset_id):
+        """
+        Returns a cached evaluation
+        :param fingerprint: fingerprint of the model's weights
+        :param dataset_id: identifier of the dataset
+        :return: the evaluation or None if it is not in the cache
+        """
+        key = (fingerprint, dataset_id)
+        with self._lock:
+            if key not in self._evaluations:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._evaluations.move_to_end(key)
+            return self._evaluations[key]
+
+    def put(self, fingerprint, dataset_id, evaluation):
+        """
+        Adds an evaluation in the cache, evicting the least recently used one if it is full
+        :param fingerprint: fingerprint of the model's weights
+        :param dataset_id: identifier of the dataset
+        :param evaluation: evaluation of the model on the dataset
+        :return:
+        """
+        key = (fingerprint, dataset_id)
+        with self._lock:
+            self._evaluations[key] = evaluation
+            self._evaluations.move_to_end(key)
+            while len(self._evaluations) > self.max_size:
+                self._evaluations.popitem(last=False)
+
+    def get_or_evaluate(self, weights, dataset_id, evaluate_function):
+        """
+        Returns the evaluation of a model, computing it only if it is not in the cache
+        :param weights: list of the layers' weights of the model
+        :param dataset_id: identifier of the dataset
+        :param evaluate_function: function without arguments that evaluates the model
+        :return: the evaluation of the model on the dataset
+        """
+        fingerprint = weights_fingerprint(weights)
+        evaluation = self.get(fingerprint, dataset_id)
+        if evaluation is None:
+            evaluation = evaluate_function()
+            self.put(fingerprint, dataset_id, evaluation)
+        else:
+            logger.debug("Evaluation on the %s set found in the cache", dataset_id)
+        return evaluation
+
+    def __len__(self):
+        with self._lock:
+            return len(self._evaluations)
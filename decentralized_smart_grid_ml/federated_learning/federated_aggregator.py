@@ -4,23 +4,186 @@ in the global one
 """
 import json
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
-import pandas as pd
+import numpy as np
 
-from decentralized_smart_grid_ml.exceptions import NotValidParticipantsModelsError, \
-    NotValidAlphaVectorError
+from decentralized_smart_grid_ml.exceptions import DecentralizedSmartGridML, \
+    MalformedWeightsFileError, NotValidParticipantsModelsError, NotValidAlphaVectorError
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore, \
+    read_weights_cid
+from decentralized_smart_grid_ml.federated_learning.contribution_ledger import ContributionLedger
 from decentralized_smart_grid_ml.federated_learning.contributions_extractor import \
     ContributionsExtractorCreator
+from decentralized_smart_grid_ml.federated_learning.csv_data_source import CsvDataSource
+from decentralized_smart_grid_ml.federated_learning.evaluation_cache import EvaluationCache, \
+    TEST_DATASET_ID, VALIDATION_DATASET_ID
 from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model, \
-    load_fl_model_weights, save_fl_model_weights
+    load_fl_model_weights, save_fl_model_weights, WeightsLoadingPool, CID_FORMAT, \
+    PROCESS_DECODED_FORMATS
+from decentralized_smart_grid_ml.federated_learning.round_journal import RoundJournal, \
+    file_digest, ROUND_RECORD, TEST_EVALUATION_RECORD
+from decentralized_smart_grid_ml.federated_learning.round_policy import RoundPolicy, \
+    LATE_UPLOADS_DROP
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import UploadIndex, \
+    UploadManifest, legacy_upload_manifest, load_verified_weights, read_upload_manifest, \
+    round_manifest_file_name, upload_manifest_path, verify_weights_file, \
+    write_round_manifest, MANIFEST_FORMAT
+from decentralized_smart_grid_ml.federated_learning.weights_compression import load_weights_update
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+from decentralized_smart_grid_ml.utils.instrumentation import RoundInstrumentation
 
 logger = create_logger(__name__)
 
 
-def _index_in_list(a_list, index):
-    return index < len(a_list)
+# maximum number of bytes of a single stacked layer (participants x layer size)
+# for which the aggregation is carried out with a single tensordot
+STACKED_AGGREGATION_MAX_BYTES = 64 * 1024 ** 2
+
+
+class WeightedAverageAccumulator:
+    """
+    This class computes the weighted average of the participants' weights
+    incrementally: the weights of each participant are folded in preallocated
+    float64 buffers, so only one model (plus the buffers) is in memory at once
+    """
+
+    def __init__(self):
+        """
+        Initializes the accumulator
+        """
+        self.aggregated_weights = None
+        self._scaled_weights = None
+        self.alpha_sum = 0.0
+        self.n_participants = 0
+
+    def begin(self, template_weights=None):
+        """
+        Starts a new aggregation
+        :param template_weights: (optional) weights used to preallocate the buffers,
+            otherwise the buffers are allocated when the first participant is added
+        :return:
+        """
+        self.aggregated_weights = None
+        self._scaled_weights = None
+        self.alpha_sum = 0.0
+        self.n_participants = 0
+        if template_weights is not None:
+            self._allocate_buffers(template_weights)
+
+    def _allocate_buffers(self, template_weights):
+        """
+        Allocates the float64 buffers according to the shapes of the given weights
+        :param template_weights: weights that define the shapes of the buffers
+        :return:
+        """
+        self.aggregated_weights = [
+            np.zeros(np.shape(layer_weights), dtype=np.float64)
+            for layer_weights in template_weights
+        ]
+        self._scaled_weights = [
+            np.empty(np.shape(layer_weights), dtype=np.float64)
+            for layer_weights in template_weights
+        ]
+
+    def add(self, local_weights, alpha):
+        """
+        Folds the weights of a participant in the weighted average
+        :param local_weights: weights of the participant's model
+        :param alpha: weight of the participant in the average
+        :return:
+        """
+        if self.aggregated_weights is None:
+            self._allocate_buffers(local_weights)
+        if len(local_weights) != len(self.aggregated_weights):
+            logger.error(
+                "The number of layers of participant %d does not correspond to the "
+                "number of layers of the global model: %d != %d",
+                self.n_participants, len(local_weights), len(self.aggregated_weights)
+            )
+            raise NotValidParticipantsModelsError
+        for idx_layer, local_layer_weights in enumerate(local_weights):
+            if self.aggregated_weights[idx_layer].shape != np.shape(local_layer_weights):
+                logger.error(
+                    "The shape of the layer %d, participant %d "
+                    "does not correspond to the layer shape of the global model: %s != %s",
+                    idx_layer,
+                    self.n_participants,
+                    np.shape(local_layer_weights),
+                    self.aggregated_weights[idx_layer].shape
+                )
+                raise NotValidParticipantsModelsError
+            np.multiply(local_layer_weights, alpha, out=self._scaled_weights[idx_layer])
+            np.add(
+                self.aggregated_weights[idx_layer],
+                self._scaled_weights[idx_layer],
+                out=self.aggregated_weights[idx_layer]
+            )
+        logger.debug("Update layers related to participant %d", self.n_participants)
+        self.alpha_sum += alpha
+        self.n_participants += 1
+
+    def finalize(self, normalize=False):
+        """
+        Finishes the aggregation and returns the weighted average
+        :param normalize: if it is True, the weighted sum is divided by the sum of alpha,
+            otherwise alpha has to be a probability vector
+        :return: weighted average of weights
+        """
+        if normalize and self.alpha_sum > 0.0:
+            for aggregated_layer_weights in self.aggregated_weights:
+                np.divide(aggregated_layer_weights, self.alpha_sum, out=aggregated_layer_weights)
+        elif round(self.alpha_sum, 2) != 1:
+            logger.error("The vector alpha is not valid, its sum is %s", self.alpha_sum)
+            raise NotValidAlphaVectorError("Error in the alpha vector")
+        aggregated_weights = self.aggregated_weights
+        self.begin()
+        return aggregated_weights
+
+
+def _stacked_weighted_average(models_weights, alpha):
+    """
+    Computes the weighted average of the participants' weights layer by layer,
+    stacking the layers of all participants and contracting them with alpha
+    :param models_weights: weights of the participants' models
+    :param alpha: probability vector for the weighted average
+    :return: weighted average of weights
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)
+    aggregated_weights = []
+    for idx_layer, template_layer_weights in enumerate(models_weights[0]):
+        for idx_participant, local_weights in enumerate(models_weights):
+            if len(local_weights) != len(models_weights[0]) or \
+                    np.shape(local_weights[idx_layer]) != np.shape(template_layer_weights):
+                logger.error(
+                    "The layer %d of participant %d does not correspond "
+                    "to the layer of the global model",
+                    idx_layer, idx_participant
+                )
+                raise NotValidParticipantsModelsError
+        stacked_layer_weights = np.stack(
+            [local_weights[idx_layer] for local_weights in models_weights]
+        )
+        aggregated_weights.append(np.tensordot(alpha, stacked_layer_weights, axes=1))
+    return aggregated_weights
+
+
+def _fits_stacked_aggregation(models_weights):
+    """
+    Checks if the stacked layers of all participants fit in the memory budget
+    of the stacked aggregation
+    :param models_weights: weights of the participants' models
+    :return:    True if the biggest stacked layer fits in STACKED_AGGREGATION_MAX_BYTES
+                False otherwise
+    """
+    largest_layer_size = max(
+        (np.size(layer_weights) for layer_weights in models_weights[0]),
+        default=0
+    )
+    return len(models_weights) * largest_layer_size * 8 <= STACKED_AGGREGATION_MAX_BYTES
 
 
 def weighted_average_aggregation(models_weights, alpha):
@@ -43,27 +206,14 @@ def weighted_average_aggregation(models_weights, alpha):
             "Error in the number of weights and/or alpha cardinality"
         )
     logger.info("Start models' weights aggregation of %d participants", len(alpha))
-    aggregated_weights = []
-    for idx_participant, local_weights in enumerate(models_weights):
-        for idx_layer, local_layer_weights in enumerate(local_weights):
-            if not _index_in_list(aggregated_weights, idx_layer):
-                aggregated_layer_weights = local_layer_weights * alpha[idx_participant]
-                aggregated_weights.append(aggregated_layer_weights)
-            else:
-                if aggregated_weights[idx_layer].shape != local_layer_weights.shape:
-                    logger.error(
-                        "The shape of the layer %d, participant %d "
-                        "does not correspond to the layer shape of the global model: %s != %s",
-                        idx_layer,
-                        idx_participant,
-                        local_layer_weights.shape,
-                        aggregated_weights[idx_layer].shape
-                    )
-                    raise NotValidParticipantsModelsError
-                aggregated_weights[idx_layer] = \
-                    aggregated_weights[idx_layer] + \
-                    local_layer_weights * alpha[idx_participant]
-            logger.debug("Update layer %d related to participant %d", idx_layer, idx_participant)
+    if _fits_stacked_aggregation(models_weights):
+        aggregated_weights = _stacked_weighted_average(models_weights, alpha)
+    else:
+        accumulator = WeightedAverageAccumulator()
+        accumulator.begin()
+        for local_weights, participant_alpha in zip(models_weights, alpha):
+            accumulator.add(local_weights, participant_alpha)
+        aggregated_weights = accumulator.finalize()
     logger.info("Finish models' weights aggregation of %d participants", len(alpha))
     return aggregated_weights
 
@@ -72,7 +222,9 @@ class Aggregator:
     """ This class is responsible for the participant models' aggregation """
 
     def __init__(self, participant_ids, announcement_config, validation_set_path,
-                 test_set_path, model_weights_new_round_path):
+                 test_set_path, model_weights_new_round_path, max_loading_workers=None,
+                 prometheus_textfile_path=None, content_store_path=None, journal_path=None,
+                 checkpoint_interval=1, resume=False, require_upload_manifests=False):
         """
         Initializes the aggregator
         :param participant_ids: participants' identifier
@@ -80,28 +232,108 @@ class Aggregator:
         :param validation_set_path: file path to the validation set
         :param test_set_path: file path to the test set
         :param model_weights_new_round_path: path to the directory that will contain the
-            new model's weights (one for each round)
+            new model's weights (one for each round) or None to keep them only in memory
+        :param max_loading_workers: maximum number of workers used to load
+            the participants' weights
+        :param prometheus_textfile_path: (optional) file path in which the timings of the
+            rounds are exported in the Prometheus text format at the end of each round
+        :param content_store_path: (optional) path to the content-addressed store in which the
+            new model's weights are saved, referred by cid pointer files
+        :param journal_path: (optional) file path to the journal of the rounds, the
+            checkpoints of the global model's weights are saved in its directory
+        :param checkpoint_interval: number of rounds between two checkpoints
+        :param resume: if it is True, the rounds completed in the journal are not executed again
+        :param require_upload_manifests: if it is True, only the uploads published with a
+            manifest are added, otherwise the participant and the round of the weights files
+            without a manifest are read from their path (participant_<id>/weights_round_<round>)
         """
         self.participant_ids = participant_ids
         self.announcement_config = announcement_config
         self.global_model = load_fl_model(announcement_config.baseline_model_artifact)
-        test_set_df = pd.read_csv(test_set_path)
-        validation_set_df = pd.read_csv(validation_set_path)
-        self.x_val = validation_set_df[self.announcement_config.features_names["features"]].values
-        self.y_val = validation_set_df[self.announcement_config.features_names["labels"]].values
-        self.x_test = test_set_df[self.announcement_config.features_names["features"]].values
-        self.y_test = test_set_df[self.announcement_config.features_names["labels"]].values
+        # the validation set is evaluated many times per round (contributions), so it is
+        # kept in memory, while the test set is streamed from the csv file
+        self.x_val, self.y_val = CsvDataSource(
+            validation_set_path, self.announcement_config.features_names
+        ).to_arrays()
+        self.test_data_source = CsvDataSource(
+            test_set_path, self.announcement_config.features_names
+        )
+        # participants sampled for each round, quorum and deadline of the rounds
+        self.round_policy = RoundPolicy.from_config(announcement_config.round_policy)
         self.rounds2participants = {}
         self._initialize_rounds2participants()
         self.current_round = 0
         self.model_weights_new_round_path = model_weights_new_round_path
+        # evaluations of the models shared with the contribution extractor, so a model
+        # is not evaluated twice on the same dataset
+        self.evaluation_cache = EvaluationCache()
         self.contribution_extractor = ContributionsExtractorCreator.factory_method(
             announcement_config.aggregation_method,
             self.global_model,
             self.x_val,
-            self.y_val
+            self.y_val,
+            self.evaluation_cache,
+            announcement_config.aggregation_method_params
         )
         self.is_finished = False
+        self.weights_loading_pool = WeightsLoadingPool(max_loading_workers)
+        # weights of the global model from which the participants start the current round,
+        # used to reconstruct the updates uploaded as deltas
+        self.reference_weights = self.global_model.get_weights()
+        # weights of the global model of the previous round, used to reconstruct
+        # the late updates carried into the current round
+        self.previous_reference_weights = self.reference_weights
+        # global models' weights of the last rounds, from which the asynchronous
+        # updates may have been trained
+        self.rounds2global_weights = {0: self.reference_weights}
+        # protects the rounds2participants bookkeeping from concurrent updates
+        self.rounds_lock = threading.Lock()
+        # timings and resources spent in the phases of each round
+        self.instrumentation = RoundInstrumentation()
+        self.prometheus_textfile_path = prometheus_textfile_path
+        self.round_start_time = time.perf_counter()
+        # the test set evaluation does not affect the next round, so it is carried out
+        # in background on a dedicated model after the new weights are published
+        self.test_evaluation_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="test_evaluation"
+        )
+        self.test_model = None
+        self.rounds2test_evaluations = {}
+        self.content_store = None
+        if content_store_path is not None:
+            self.content_store = ContentAddressedStore(content_store_path)
+        # CID of the last global model saved in the store
+        self.global_weights_cid = None
+        # futures of the uploads referred by a CID, so the identical uploads of a round
+        # are detected and loaded once: (round, CID, reference weights' id) -> future
+        self.uploads_cids2weights = {}
+        self.require_upload_manifests = require_upload_manifests
+        # uploads received by round and participant, including the ones of the next rounds
+        self.upload_index = UploadIndex()
+        # alpha, scores and arrival times of the participants for each round
+        self.contribution_ledger = ContributionLedger(
+            self._contributor_ids(participant_ids), announcement_config.fl_rounds
+        )
+        self.round_journal = None
+        if journal_path is not None:
+            self.round_journal = RoundJournal(journal_path, checkpoint_interval)
+            if resume:
+                self._resume_from_journal()
+            else:
+                # the records of a previous federation are discarded
+                self.round_journal.rollback(0)
+        if self.model_weights_new_round_path is not None and not self.is_finished:
+            # the participants selected for the first round (or the resumed one)
+            Path(self.model_weights_new_round_path).mkdir(parents=True, exist_ok=True)
+            self._write_round_manifest()
+
+    def _contributor_ids(self, participant_ids):
+        """
+        Returns the identifiers of the participants to which the contributions are attributed
+        :param participant_ids: identifiers of the participants that upload their weights
+        :return: participants' identifier
+        """
+        return participant_ids
 
     def _initialize_rounds2participants(self):
         """
@@ -110,10 +342,10 @@ class Aggregator:
         """
         for idx_round in range(self.announcement_config.fl_rounds):
             self.rounds2participants[idx_round] = {
-                # here the first key is not need for our purpose. In a future,
-                # it will be possible to use it to take only a subset
-                # of participants for each round
-                "valid_participant_ids": self.participant_ids,
+                # participants sampled for the round
+                "valid_participant_ids": self.round_policy.sample_participants(
+                    self.participant_ids, idx_round
+                ),
                 "participant_weights": [],
                 "participant_ids": []
             }
@@ -122,149 +354,978 @@ class Aggregator:
         """
         Checks if the local training of participants is completed
         :param idx_round: round that you want to check
-        :return:    True if all the participants are published their model's weights
+        :return:    True if all the participants are published their model's weights,
+                    or the quorum of the round policy is reached (after its deadline)
                     False otherwise
         """
-        is_completed = \
-            len(self.rounds2participants[idx_round]["participant_ids"]) \
-            == \
-            len(self.rounds2participants[idx_round]["valid_participant_ids"])
+        is_completed = self.round_policy.is_round_completed(
+            len(self.rounds2participants[idx_round]["participant_ids"]),
+            self.round_policy.round_size(
+                len(self.rounds2participants[idx_round]["valid_participant_ids"])
+            ),
+            time.perf_counter() - self.round_start_time
+        )
         return is_completed
 
+    def is_round_closable(self):
+        """
+        Checks if the current round can be closed, e.g. because its deadline expired
+        after the quorum has been reached
+        :return:    True if the global model can be updated
+                    False otherwise
+        """
+        with self.rounds_lock:
+            return not self.is_finished and self._local_training_is_completed(self.current_round)
+
+    def _read_upload(self, path_file_created):
+        """
+        Reads the manifest of an upload: the manifest file or, if the manifests are not
+        required, the one derived from the path of a weights file
+        :param path_file_created: file path to the manifest or to the weights file
+        :return: instance of UploadManifest or None if the file is not a valid upload
+        """
+        if Path(path_file_created).suffix == MANIFEST_FORMAT:
+            try:
+                # the weights file is checked against its hash by the decoding worker
+                upload = read_upload_manifest(path_file_created)
+            except (OSError, DecentralizedSmartGridML) as error:
+                logger.warning(
+                    "The upload manifest %s is not valid (%s), Skipping...",
+                    path_file_created, error
+                )
+                return None
+            return upload
+        if self.require_upload_manifests:
+            logger.debug("The file %s is not an upload manifest, Skipping...", path_file_created)
+            return None
+        upload = legacy_upload_manifest(path_file_created)
+        if upload is None:
+            logger.warning("Malformed path %s, Skipping...", path_file_created)
+        return upload
+
     def add_participant_weights(self, path_file_created):
         """
         Adds the local weights (if valid) of a participant (if valid) in the current round
-        :param path_file_created: file path to the local model's weights of the participant
+        :param path_file_created: file path to the manifest of the upload or, if the
+            manifests are not required, to the local model's weights of the participant
         :return:    True if all the participant already publish their local model's weights
                     False otherwise
         """
-        file_name_without_extension = Path(path_file_created).stem
-        if file_name_without_extension.endswith("round_" + str(self.current_round)):
-            directory = path_file_created.split("/")[-2]
-            try:
-                participant_id = int(directory[-1])
-            except ValueError:
+        upload = self._read_upload(path_file_created)
+        if upload is None:
+            return False
+        with self.rounds_lock, \
+                self.instrumentation.span(self.current_round, "add_participant_weights"):
+            return self._admit_upload(upload)
+
+    def _admit_upload(self, upload, local_weights=None):
+        """
+        Admits an upload according to its round: the uploads of the next rounds are
+        deferred, the duplicates are skipped and the other ones are added in the current
+        round (the late and stale uploads according to the round policy)
+        :param upload: instance of UploadManifest
+        :param local_weights: (optional) local model's weights already in memory,
+            if None they are loaded from the weights file of the upload
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        if upload.round not in self.rounds2participants:
+            logger.warning(
+                "The upload of participant %s does not correspond to the current round (%d), "
+                "Skipping...", upload.participant_id, self.current_round
+            )
+            return False
+        if upload.round > self.current_round:
+            if local_weights is not None:
+                # the weights in memory are not kept until their round starts
                 logger.warning(
-                    "Malformed path %s, Skipping...",
-                    path_file_created
+                    "The update of participant %s for round %d is ahead of the current round "
+                    "(%d), Skipping...", upload.participant_id, upload.round, self.current_round
                 )
                 return False
-            if \
-                    participant_id in \
-                    self.rounds2participants[self.current_round]["valid_participant_ids"] \
-                    and participant_id not in \
-                    self.rounds2participants[self.current_round]["participant_ids"]:
-                self.rounds2participants[self.current_round]["participant_weights"].append(
-                    load_fl_model_weights(path_file_created)
-                )
-                self.rounds2participants[self.current_round]["participant_ids"].append(
-                    participant_id
+            # e.g. the global model has been ingested late, the upload waits for its round
+            if self.upload_index.defer(upload):
+                logger.info(
+                    "The upload of participant %s for round %d is deferred",
+                    upload.participant_id, upload.round
                 )
-                is_completed = self._local_training_is_completed(self.current_round)
-            else:
-                logger.warning(
-                    "The participant_id %s is not valid for the current round (%d), Skipping...",
-                    participant_id,
-                    self.current_round
-                )
-                is_completed = False
-        else:
+            return False
+        if not self.upload_index.add(upload):
             logger.warning(
-                "The path %s does not correspond to the current round (%d), Skipping...",
-                path_file_created, self.current_round
+                "The upload of participant %s for round %d was already received, Skipping...",
+                upload.participant_id, upload.round
             )
-            is_completed = False
+            return False
+        return self._add_upload(upload, local_weights)
+
+    def _add_upload(self, upload, local_weights=None):
+        """
+        Adds an upload of the current round or of a previous one
+        :param upload: instance of UploadManifest
+        :param local_weights: (optional) local model's weights already in memory,
+            if None they are loaded from the weights file of the upload
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        if upload.round < self.current_round and self.round_policy.asynchronous:
+            return self._add_stale_participant_weights(upload, local_weights)
+        if upload.round < self.current_round:
+            return self._add_late_participant_weights(upload, local_weights)
+        if not self._is_expected_participant(upload.participant_id):
+            return False
+        # the weights are decoded in background, the future is joined
+        # when the global model is updated
+        return self._add_round_participant(
+            upload.participant_id,
+            self._upload_weights(upload, local_weights),
+            self._base_round(upload.round),
+            upload.weights_path
+        )
+
+    def _upload_weights(self, upload, local_weights, reference_weights=None):
+        """
+        Returns the weights of an upload: the weights already in memory or the future
+        of the loading of its weights file
+        :param upload: instance of UploadManifest
+        :param local_weights: local model's weights already in memory or None
+        :param reference_weights: (optional) weights from which the participant's update
+            has been computed, the global model's weights of the current round if None
+        :return: participant's weights or future of the participant's weights
+        """
+        if local_weights is not None:
+            return local_weights
+        return self._submit_participant_weights(
+            upload.weights_path, reference_weights, upload.weights_hash
+        )
+
+    def _add_deferred_uploads(self):
+        """
+        Adds the uploads received before the current round started
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        # the uploads of the older rounds are only kept to discard their duplicates
+        self.upload_index.discard_rounds_before(
+            self.current_round - max(1, self.round_policy.max_staleness)
+        )
+        if self.is_finished:
+            return False
+        is_completed = False
+        for upload in self.upload_index.pop_deferred(self.current_round):
+            logger.info(
+                "The deferred upload of participant %s is added in round %d",
+                upload.participant_id, self.current_round
+            )
+            is_completed = self._add_upload(upload) or is_completed
         return is_completed
 
-    def update_global_model(self):
+    def _add_late_participant_weights(self, upload, local_weights=None):
         """
-        Updates the global model and save both contribution and the evalution of the new model
+        Handles the weights of a participant uploaded after its round has been closed:
+        according to the round policy they are dropped or used in the current round
+        :param upload: instance of UploadManifest, of a round before the current one
+        :param local_weights: (optional) local model's weights already in memory
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        participant_id, upload_round = upload.participant_id, upload.round
+        round_participants = self.rounds2participants[upload_round]
+        if participant_id not in round_participants["valid_participant_ids"] \
+                or participant_id in round_participants["participant_ids"]:
+            logger.warning(
+                "The upload of participant %s for round %d does not correspond to the "
+                "current round (%d), Skipping...", participant_id, upload_round, self.current_round
+            )
+            return False
+        round_participants.setdefault("late_participant_ids", []).append(participant_id)
+        # only the updates of the previous round can be reconstructed from their reference
+        if self.round_policy.late_uploads == LATE_UPLOADS_DROP \
+                or upload_round != self.current_round - 1 \
+                or self.previous_reference_weights is None:
+            logger.warning(
+                "Late upload of participant %s for round %d dropped",
+                participant_id, upload_round
+            )
+            return False
+        if not self._is_expected_participant(participant_id):
+            return False
+        logger.info(
+            "Late upload of participant %s for round %d carried into round %d",
+            participant_id, upload_round, self.current_round
+        )
+        return self._add_round_participant(
+            participant_id,
+            self._upload_weights(upload, local_weights, self.previous_reference_weights),
+            path_file_created=upload.weights_path,
+            upload_round=upload_round
+        )
+
+    def _add_stale_participant_weights(self, upload, local_weights=None):
+        """
+        Adds in the current asynchronous round the weights of a participant trained
+        from the global model of a previous round
+        :param upload: instance of UploadManifest, its round is the one of the global model
+            the participant started from
+        :param local_weights: (optional) local model's weights already in memory
+        :return:    True if the buffer of the current round is full
+                    False otherwise
+        """
+        participant_id, upload_round = upload.participant_id, upload.round
+        if upload_round not in self.rounds2global_weights:
+            logger.warning(
+                "The upload of participant %s for round %d is too stale for the current "
+                "round (%d), Skipping...", participant_id, upload_round, self.current_round
+            )
+            return False
+        if not self._is_expected_participant(participant_id):
+            return False
+        return self._add_round_participant(
+            participant_id,
+            self._upload_weights(upload, local_weights, self.rounds2global_weights[upload_round]),
+            upload_round,
+            upload.weights_path,
+            upload_round
+        )
+
+    def _base_round(self, upload_round):
+        """
+        Returns the round of the global model an upload has been trained from,
+        tracked only in the asynchronous mode
+        :param upload_round: round of the upload
+        :return: round of the upload or None in the synchronous mode
+        """
+        return upload_round if self.round_policy.asynchronous else None
+
+    def add_participant_local_weights(self, participant_id, local_weights, upload_round=None):
+        """
+        Adds the local weights, already in memory, of a participant (if valid). They are
+        admitted as the uploaded files, according to their round and the round policy
+        :param participant_id: identifier of the participant
+        :param local_weights: local model's weights of the participant
+        :param upload_round: (optional) round of the local weights, the current round if None
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        with self.rounds_lock:
+            if upload_round is None:
+                upload_round = self.current_round
+            return self._admit_upload(
+                UploadManifest(participant_id, upload_round, None), local_weights
+            )
+
+    def _is_expected_participant(self, participant_id):
+        """
+        Checks if a participant is valid for the current round and has not already
+        published its local model's weights
+        :param participant_id: identifier of the participant
+        :return:    True if the participant's weights can be added in the current round
+                    False otherwise
+        """
+        round_participants = self.rounds2participants[self.current_round]
+        if participant_id in round_participants["valid_participant_ids"] \
+                and participant_id not in round_participants["participant_ids"]:
+            return True
+        logger.warning(
+            "The participant_id %s is not valid for the current round (%d), Skipping...",
+            participant_id,
+            self.current_round
+        )
+        return False
+
+    def _add_round_participant(self, participant_id, participant_weights, base_round=None,
+                               path_file_created=None, upload_round=None):
+        """
+        Adds the weights of a participant in the current round
+        :param participant_id: identifier of the participant
+        :param participant_weights: participant's weights or future of the participant's weights
+        :param base_round: (optional) round of the global model the participant started from,
+            tracked in the asynchronous mode
+        :param path_file_created: (optional) file path to the participant's weights, tracked
+            in the journal of the rounds
+        :param upload_round: (optional) round of the participant's weights, if it is not
+            the current round (late and stale uploads)
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        if path_file_created is not None and self.round_journal is not None:
+            self.rounds2participants[self.current_round].setdefault(
+                "participant_files", {}
+            )[participant_id] = {
+                "path": path_file_created,
+                "round": self.current_round if upload_round is None else upload_round
+            }
+        if base_round is not None:
+            self.rounds2participants[self.current_round].setdefault(
+                "participant_base_rounds", []
+            ).append(base_round)
+        self._record_arrival(participant_id)
+        self.rounds2participants[self.current_round]["participant_weights"].append(
+            participant_weights
+        )
+        self.rounds2participants[self.current_round]["participant_ids"].append(participant_id)
+        return self._local_training_is_completed(self.current_round)
+
+    def _record_arrival(self, participant_id):
+        """
+        Records in the ledger the upload time of a participant in the current round
+        :param participant_id: identifier of the participant
         :return:
         """
-        if self.current_round == 0:
-            validation_results = self.global_model.evaluate(self.x_val, self.y_val)
-            alpha = self.contribution_extractor.compute_contribution(
-                self.rounds2participants[self.current_round]["participant_weights"],
-                validation_results[1]
+        self.contribution_ledger.record_arrival(
+            self.current_round, participant_id, time.perf_counter() - self.round_start_time
+        )
+
+    def _submit_participant_weights(self, path_file_created, reference_weights=None,
+                                    weights_hash=None):
+        """
+        Schedules the loading of the participant's weights. The json files contain the
+        full weights, while the other formats may contain a delta from the reference weights
+        :param path_file_created: file path to the local model's weights of the participant
+        :param reference_weights: (optional) weights from which the participant's update
+            has been computed, the global model's weights of the current round if None
+        :param weights_hash: (optional) hash of the weights file in its manifest, checked
+            by the worker before decoding
+        :return: future of the participant's weights
+        """
+        if Path(path_file_created).suffix in PROCESS_DECODED_FORMATS:
+            return self._submit_loading(path_file_created, weights_hash, load_fl_model_weights)
+        if reference_weights is None:
+            reference_weights = self.reference_weights
+        if Path(path_file_created).suffix == CID_FORMAT:
+            return self._submit_participant_weights_cid(
+                path_file_created, reference_weights, weights_hash
             )
-        else:
-            alpha = self.contribution_extractor.compute_contribution(
-                self.rounds2participants[self.current_round]["participant_weights"],
-                self.rounds2participants[self.current_round-1]["validation_results"][1],
+        return self._submit_loading(
+            path_file_created, weights_hash, load_weights_update, reference_weights
+        )
+
+    def _submit_loading(self, path_file_created, weights_hash, load_function, *args):
+        """
+        Schedules the loading of a weights file in the loading pool. If its hash is known,
+        the file is hashed by the worker, so the hashing does not delay the ingestion
+        :param path_file_created: file path to the weights
+        :param weights_hash: hash of the weights file or None if it is not checked
+        :param load_function: function that loads the weights, it receives the file path
+            followed by args
+        :param args: additional arguments of load_function
+        :return: future of the weights
+        """
+        if weights_hash is None:
+            return self.weights_loading_pool.submit(path_file_created, load_function, *args)
+        return self.weights_loading_pool.submit(
+            path_file_created, load_verified_weights, weights_hash, load_function, *args
+        )
+
+    def _submit_participant_weights_cid(self, path_file_created, reference_weights,
+                                        weights_hash=None):
+        """
+        Schedules the loading of the participant's weights saved in a content-addressed
+        store. The CID is read from the pointer file, so the uploads identical to another
+        upload of the round (or to the global model) are detected before any decoding.
+        The identical uploads share the same future, and only the first one is kept
+        in the round when the weights are joined
+        :param path_file_created: file path to the pointer file of the participant
+        :param reference_weights: weights from which the participant's update has been computed
+        :param weights_hash: (optional) hash of the pointer file in its manifest
+        :return: future of the participant's weights
+        """
+        try:
+            # the pointer file is small, so it is checked before reading its CID
+            if weights_hash is not None:
+                verify_weights_file(path_file_created, weights_hash)
+            cid, _ = read_weights_cid(path_file_created)
+        except (OSError, ValueError, DecentralizedSmartGridML) as error:
+            weights_future = Future()
+            weights_future.set_exception(error)
+            return weights_future
+        if cid == self.global_weights_cid:
+            logger.warning(
+                "The upload %s is identical to the global model of the round", path_file_created
             )
+        upload_key = (self.current_round, cid, id(reference_weights))
+        if upload_key in self.uploads_cids2weights:
+            logger.warning(
+                "The upload %s is identical to a previous upload of the round %d, "
+                "it is excluded from the round", path_file_created, self.current_round
+            )
+            self.rounds2participants[self.current_round].setdefault(
+                "duplicate_uploads", []
+            ).append(path_file_created)
+            return self.uploads_cids2weights[upload_key]
+        # the futures of the previous rounds are released
+        self.uploads_cids2weights = {
+            key: weights_future for key, weights_future in self.uploads_cids2weights.items()
+            if key[0] == self.current_round
+        }
+        weights_future = self.weights_loading_pool.submit(
+            path_file_created, load_weights_update, reference_weights
+        )
+        self.uploads_cids2weights[upload_key] = weights_future
+        return weights_future
+
+    def _join_participant_weights(self, idx_round):
+        """
+        Waits for the loading of the participants' weights of a given round. The
+        participants whose weights cannot be loaded are removed from the round, as the
+        participants whose upload is identical to a previous upload of the round (same
+        future), so the copies of a model are neither aggregated nor credited twice
+        :param idx_round: round of the participants' weights
+        :return:
+        """
+        round_participants = self.rounds2participants[idx_round]
+        participant_weights = []
+        participant_ids = []
+        joined_futures = set()
+        base_rounds = round_participants.get("participant_base_rounds")
+        participant_base_rounds = []
+        for idx_participant, (participant_id, weights) in enumerate(zip(
+                round_participants["participant_ids"],
+                round_participants["participant_weights"]
+        )):
+            if isinstance(weights, Future):
+                if id(weights) in joined_futures:
+                    logger.warning(
+                        "The upload of participant %s is identical to a previous upload "
+                        "of the round %d, Skipping...", participant_id, idx_round
+                    )
+                    round_participants.setdefault(
+                        "duplicate_participant_ids", []
+                    ).append(participant_id)
+                    continue
+                joined_futures.add(id(weights))
+                try:
+                    weights = weights.result()
+                except (OSError, ValueError, DecentralizedSmartGridML) as error:
+                    logger.error(
+                        "The weights of the participant %s cannot be loaded (%s), Skipping...",
+                        participant_id, error
+                    )
+                    continue
+            participant_weights.append(weights)
+            participant_ids.append(participant_id)
+            if base_rounds is not None:
+                participant_base_rounds.append(base_rounds[idx_participant])
+        round_participants["participant_weights"] = participant_weights
+        round_participants["participant_ids"] = participant_ids
+        if base_rounds is not None:
+            round_participants["participant_base_rounds"] = participant_base_rounds
+
+    def _rebase_stale_updates(self, idx_round):
+        """
+        Applies the updates of the asynchronous round trained from the global models of
+        the previous rounds to the current global model: local - base + current
+        :param idx_round: round of the participants' weights
+        :return: list of the staleness of the participants' updates
+        """
+        round_participants = self.rounds2participants[idx_round]
+        staleness = []
+        rebased_weights = []
+        for weights, base_round in zip(
+                round_participants["participant_weights"],
+                round_participants.get("participant_base_rounds", [])
+        ):
+            if base_round != idx_round:
+                weights = self._rebase_weights(weights, self.rounds2global_weights[base_round])
+            rebased_weights.append(weights)
+            staleness.append(idx_round - base_round)
+        round_participants["participant_weights"] = rebased_weights
+        round_participants["staleness"] = staleness
+        return staleness
+
+    def _rebase_weights(self, weights, base_weights):
+        """
+        Applies an update trained from the global model of a previous round to the
+        current global model: local - base + current
+        :param weights: weights of the participant's model
+        :param base_weights: weights of the global model the participant started from
+        :return: rebased weights
+        """
+        return [
+            np.add(current_layer, np.subtract(local_layer, base_layer))
+            for current_layer, local_layer, base_layer in zip(
+                self.reference_weights, weights, base_weights
+            )
+        ]
+
+    def update_global_model(self):
+        """
+        Updates the global model and save both contribution and the evalution of the new model
+        :return:
+        """
+        idx_round = self.current_round
+        # time spent waiting for the participants (stragglers included)
+        self.instrumentation.record(
+            idx_round, "waiting_participants", time.perf_counter() - self.round_start_time
+        )
+        with self.instrumentation.span(idx_round, "join_participant_weights"):
+            self._join_participant_weights(idx_round)
+            if self.round_policy.asynchronous:
+                staleness = self._rebase_stale_updates(idx_round)
+        with self.instrumentation.span(idx_round, "contribution_scoring"):
+            if idx_round == 0:
+                validation_results = self._evaluate_validation_set()
+                alpha = self.contribution_extractor.compute_contribution(
+                    self.rounds2participants[idx_round]["participant_weights"],
+                    validation_results[1]
+                )
+            else:
+                alpha = self.contribution_extractor.compute_contribution(
+                    self.rounds2participants[idx_round]["participant_weights"],
+                    self.rounds2participants[idx_round-1]["validation_results"][1],
+                )
         logger.info(
             "Alpha vector for round %d is %s relative to participant ids %s",
-            self.current_round, alpha,
-            self.rounds2participants[self.current_round]["participant_ids"]
+            idx_round, alpha,
+            self.rounds2participants[idx_round]["participant_ids"]
         )
+        if self.round_policy.asynchronous and sum(alpha) > 0.0:
+            # the stale updates are down-weighted in the aggregation
+            weighted_alpha = [
+                participant_alpha * staleness_weight for participant_alpha, staleness_weight
+                in zip(alpha, self.round_policy.staleness_weights(staleness))
+            ]
+            alpha = [
+                participant_alpha / sum(weighted_alpha) for participant_alpha in weighted_alpha
+            ]
+            logger.info("Alpha vector for round %d weighted by staleness is %s", idx_round, alpha)
+        alpha = self._aggregation_alpha(idx_round, alpha)
         # save the alpha vector (contribution) in the dictionary
-        self.rounds2participants[self.current_round]["alpha"] = alpha
+        self.rounds2participants[idx_round]["alpha"] = alpha
+        if self.contribution_extractor.confidence_intervals is not None:
+            self.rounds2participants[idx_round]["confidence_intervals"] = \
+                self.contribution_extractor.confidence_intervals
+        participant_ids, contributions = self._round_contributions(idx_round)
+        self.contribution_ledger.record_round(
+            idx_round, participant_ids, contributions, self._round_scores()
+        )
+        self.previous_reference_weights = self.reference_weights
         if sum(alpha) > 0.0:
             # update the model
-            global_weights = weighted_average_aggregation(
-                self.rounds2participants[self.current_round]["participant_weights"],
-                alpha
-            )
-            self.global_model.set_weights(global_weights)
+            with self.instrumentation.span(idx_round, "aggregation"):
+                global_weights = weighted_average_aggregation(
+                    self.rounds2participants[idx_round]["participant_weights"],
+                    alpha
+                )
+                self.global_model.set_weights(global_weights)
+                self.reference_weights = self.global_model.get_weights()
             logger.debug("The global model has been updated with the new weights")
         else:
             logger.debug("The global model has not been updated because alpha is %s", alpha)
-        validation_results = self.global_model.evaluate(self.x_val, self.y_val)
+        with self.instrumentation.span(idx_round, "validation_evaluation"):
+            validation_results = self._evaluate_validation_set()
         logger.info(
             "Evaluation of the global model on the validation set at round %d: %s",
-            self.current_round,
+            idx_round,
             validation_results
         )
-        self.rounds2participants[self.current_round]["validation_results"] = validation_results
-        test_results = self.global_model.evaluate(self.x_test, self.y_test)
+        self.rounds2participants[idx_round]["validation_results"] = validation_results
+        # next round can start
+        self.current_round += 1
+        self.is_finished = self.current_round == self.announcement_config.fl_rounds
+        if self.round_policy.asynchronous:
+            self._update_rounds2global_weights()
+        # the new global model is only kept in memory if there is no output directory
+        if self.model_weights_new_round_path is not None:
+            with self.instrumentation.span(idx_round, "write_weights"):
+                self._save_global_model_weights()
+        if self.round_journal is not None:
+            with self.instrumentation.span(idx_round, "journal"):
+                self._journal_round(idx_round)
+        self.round_start_time = time.perf_counter()
+        with self.rounds_lock:
+            is_next_round_completed = self._add_deferred_uploads()
+        # the participants can already train on the new weights
+        self.rounds2test_evaluations[idx_round] = self.test_evaluation_executor.submit(
+            self._evaluate_test_set, idx_round, self.global_model.get_weights()
+        )
+        self._export_instrumentation()
+        if is_next_round_completed:
+            # the uploads deferred to the new round already complete it, no other upload
+            # would trigger its update
+            logger.info("The round %d is completed by the deferred uploads", self.current_round)
+            self.update_global_model()
+
+    def _evaluate_test_set(self, idx_round, global_weights):
+        """
+        Evaluates the global model of a round on the test set (executed in background)
+        :param idx_round: round of the global model
+        :param global_weights: weights of the global model at the end of the round
+        :return: evaluation of the global model on the test set
+        """
+        with self.instrumentation.span(idx_round, "test_evaluation"):
+            test_results = self.evaluation_cache.get_or_evaluate(
+                global_weights,
+                TEST_DATASET_ID,
+                lambda: self._evaluate_test_model(global_weights)
+            )
         logger.info(
             "Evaluation of the global model on the test set at round %d: %s",
-            self.current_round,
-            validation_results
+            idx_round,
+            test_results
         )
-        self.rounds2participants[self.current_round]["test_results"] = test_results
-        # next round can start
-        self.current_round += 1
-        if self.current_round == self.announcement_config.fl_rounds:
+        if self.round_journal is not None:
+            self.round_journal.append({
+                "type": TEST_EVALUATION_RECORD, "round": idx_round, "test_results": test_results
+            })
+        self._export_instrumentation()
+        return test_results
+
+    def _evaluate_test_model(self, global_weights):
+        """
+        Evaluates the given weights on the test set using the model dedicated to the
+        test evaluations, so the global model can be used by the next round meanwhile
+        :param global_weights: weights of the global model
+        :return: evaluation of the model on the test set
+        """
+        if self.test_model is None:
+            self.test_model = load_fl_model(self.announcement_config.baseline_model_artifact)
+        self.test_model.set_weights(global_weights)
+        return self.test_model.evaluate(
+            self.test_data_source.as_dataset(self.announcement_config.batch_size)
+        )
+
+    def join_test_evaluations(self):
+        """
+        Waits for the test set evaluations in background and saves their results
+        in the rounds' statistics
+        :return:
+        """
+        for idx_round in sorted(self.rounds2test_evaluations):
+            test_results = self.rounds2test_evaluations.pop(idx_round).result()
+            self.rounds2participants[idx_round]["test_results"] = test_results
+
+    def _export_instrumentation(self):
+        """
+        Exports the timings of the rounds in the Prometheus text format (if required)
+        :return:
+        """
+        if self.prometheus_textfile_path is not None:
+            self.instrumentation.write_prometheus(
+                self.prometheus_textfile_path, {"role": "validator"}
+            )
+
+    def _evaluate_validation_set(self):
+        """
+        Evaluates the global model on the validation set, the evaluation is taken
+        from the cache if the model has already been evaluated
+        :return: evaluation of the global model (loss and metrics)
+        """
+        return self.evaluation_cache.get_or_evaluate(
+            self.global_model.get_weights(),
+            VALIDATION_DATASET_ID,
+            lambda: self.global_model.evaluate(self.x_val, self.y_val)
+        )
+
+    def _update_rounds2global_weights(self):
+        """
+        Keeps the global model's weights of the new round and releases the ones
+        older than the maximum staleness of the asynchronous updates
+        :return:
+        """
+        self.rounds2global_weights[self.current_round] = self.reference_weights
+        for idx_round in list(self.rounds2global_weights):
+            if idx_round < self.current_round - self.round_policy.max_staleness:
+                del self.rounds2global_weights[idx_round]
+
+    def _save_global_model_weights(self):
+        """
+        Saves the weights of the global model for the next round (or the final ones)
+        :return:
+        """
+        # the weights saved in the store are referred by a pointer file
+        extension = ".json" if self.content_store is None else CID_FORMAT
+        if self.is_finished:
             baseline_file_name = os.path.join(
                 self.model_weights_new_round_path,
-                "validator_weights_final.json"
+                "validator_weights_final" + extension
             )
-            self.is_finished = True
         else:
             baseline_file_name = os.path.join(
                 self.model_weights_new_round_path,
-                "validator_weights_round_" + str(self.current_round) + ".json"
+                "validator_weights_round_" + str(self.current_round) + extension
             )
         output_folder = Path(self.model_weights_new_round_path)
         output_folder.mkdir(parents=True, exist_ok=True)
-        save_fl_model_weights(self.global_model, baseline_file_name)
+        if not self.is_finished:
+            # the participants read the manifest when the global model is published
+            self._write_round_manifest()
+        if self.content_store is None:
+            save_fl_model_weights(self.global_model, baseline_file_name)
+        else:
+            save_fl_model_weights(self.global_model, baseline_file_name, self.content_store)
+            self.global_weights_cid, _ = read_weights_cid(baseline_file_name)
+
+    def round_participant_ids(self, idx_round):
+        """
+        Returns the participants selected for a round, published with its global model
+        :param idx_round: round of the selection
+        :return: list of the participants' identifier
+        """
+        return list(self.rounds2participants[idx_round]["valid_participant_ids"])
+
+    def _write_round_manifest(self):
+        """
+        Writes the manifest of the current round with the participants selected for it,
+        so the participants not selected skip the round
+        :return:
+        """
+        participant_ids = self.round_participant_ids(self.current_round)
+        if participant_ids is not None:
+            write_round_manifest(
+                os.path.join(
+                    self.model_weights_new_round_path,
+                    round_manifest_file_name(self.current_round)
+                ),
+                self.current_round,
+                participant_ids
+            )
+
+    def _journal_round(self, idx_round):
+        """
+        Appends the record of a closed round to the journal: statistics, timings, hashes
+        of the participants' files and (periodically) the checkpoint of the global model
+        :param idx_round: round closed
+        :return:
+        """
+        round_participants = self.rounds2participants[idx_round]
+        record = {
+            key: value for key, value in round_participants.items()
+            if key not in ("participant_weights", "participant_files")
+        }
+        record["type"] = ROUND_RECORD
+        record["round"] = idx_round
+        record["timings"] = self.instrumentation.round_spans(idx_round)
+        record["ledger"] = self.contribution_ledger.round_entries(idx_round)
+        # the hashes let the rounds after the last checkpoint be replayed from the same files
+        record["participant_files"] = {}
+        for participant_id, participant_file in round_participants.get(
+                "participant_files", {}
+        ).items():
+            if participant_id not in round_participants["participant_ids"]:
+                continue
+            try:
+                record["participant_files"][str(participant_id)] = dict(
+                    participant_file, hash=file_digest(participant_file["path"])
+                )
+            except OSError:
+                logger.warning("The file %s cannot be journaled", participant_file["path"])
+        if self.round_journal.is_checkpoint_round(idx_round, self.is_finished):
+            record["checkpoint"] = self.round_journal.write_checkpoint(
+                idx_round, self.reference_weights
+            )
+        self.round_journal.append(record)
+
+    def _resume_from_journal(self):
+        """
+        Rebuilds the state of the aggregator from the journal: the global model's weights
+        are loaded from the last valid checkpoint and the next rounds are replayed from the
+        journaled participants' files and alpha, without scoring them again. The rounds
+        that cannot be replayed are discarded and executed again
+        :return:
+        """
+        rounds2records = {}
+        rounds2test_results = {}
+        for record in self.round_journal.read_records():
+            if record["type"] == ROUND_RECORD:
+                rounds2records[record["round"]] = record
+            elif record["type"] == TEST_EVALUATION_RECORD:
+                rounds2test_results[record["round"]] = record["test_results"]
+        n_journaled_rounds = 0
+        while n_journaled_rounds in rounds2records:
+            n_journaled_rounds += 1
+        # global model's weights at the beginning of each round
+        rounds2weights = {0: self.reference_weights}
+        resumed_round = self._load_last_checkpoint(
+            rounds2records, n_journaled_rounds, rounds2weights
+        )
+        for idx_round in range(resumed_round, n_journaled_rounds):
+            try:
+                rounds2weights[idx_round + 1] = self._replay_round(
+                    rounds2records[idx_round], rounds2weights
+                )
+            except (OSError, KeyError, ValueError, DecentralizedSmartGridML) as error:
+                logger.warning(
+                    "The round %d cannot be replayed (%s), it will be executed again",
+                    idx_round, error
+                )
+                break
+            resumed_round = idx_round + 1
+        if any(idx_round >= resumed_round for idx_round in rounds2records):
+            self.round_journal.rollback(resumed_round)
+        for idx_round in range(resumed_round):
+            round_participants = dict(rounds2records[idx_round])
+            for key in ("type", "round", "checkpoint"):
+                round_participants.pop(key, None)
+            self.instrumentation.restore_round_spans(
+                idx_round, round_participants.pop("timings", {})
+            )
+            self.contribution_ledger.restore_round(idx_round, round_participants.pop("ledger"))
+            round_participants["participant_files"] = {
+                int(participant_id): {
+                    "path": participant_file["path"], "round": participant_file.get("round")
+                }
+                for participant_id, participant_file
+                in round_participants["participant_files"].items()
+            }
+            round_participants["participant_weights"] = []
+            if idx_round in rounds2test_results:
+                round_participants["test_results"] = rounds2test_results[idx_round]
+            elif idx_round + 1 in rounds2weights:
+                self.rounds2test_evaluations[idx_round] = self.test_evaluation_executor.submit(
+                    self._evaluate_test_set, idx_round, rounds2weights[idx_round + 1]
+                )
+            self.rounds2participants[idx_round] = round_participants
+        self.current_round = resumed_round
+        self.is_finished = self.current_round == self.announcement_config.fl_rounds
+        self.global_model.set_weights(rounds2weights[resumed_round])
+        self.reference_weights = self.global_model.get_weights()
+        # the late uploads cannot be reconstructed without the previous global model
+        self.previous_reference_weights = rounds2weights.get(resumed_round - 1)
+        self.rounds2global_weights = {
+            idx_round: weights for idx_round, weights in rounds2weights.items()
+            if idx_round >= resumed_round - self.round_policy.max_staleness
+        }
+        self.rounds2global_weights[resumed_round] = self.reference_weights
+        logger.info("The aggregator has been resumed at round %d", resumed_round)
+
+    def _load_last_checkpoint(self, rounds2records, n_journaled_rounds, rounds2weights):
+        """
+        Loads the last valid checkpoint of the journaled rounds and the previous one
+        :param rounds2records: journaled records of the rounds
+        :param n_journaled_rounds: number of consecutive rounds journaled
+        :param rounds2weights: global model's weights at the beginning of each round,
+            updated with the loaded checkpoints
+        :return: first round after the checkpoint, 0 if there is no valid checkpoint
+        """
+        for idx_round in reversed(range(n_journaled_rounds)):
+            checkpoint = rounds2records[idx_round].get("checkpoint")
+            if checkpoint is None:
+                continue
+            try:
+                rounds2weights[idx_round + 1] = RoundJournal.read_checkpoint(checkpoint)
+            except (OSError, DecentralizedSmartGridML) as error:
+                logger.warning("The checkpoint of round %d is not valid (%s)", idx_round, error)
+                continue
+            previous_checkpoint = rounds2records[idx_round - 1].get("checkpoint") \
+                if idx_round > 0 else None
+            if previous_checkpoint is not None:
+                try:
+                    rounds2weights[idx_round] = RoundJournal.read_checkpoint(previous_checkpoint)
+                except (OSError, DecentralizedSmartGridML):
+                    logger.warning("The checkpoint of round %d is not valid", idx_round - 1)
+            return idx_round + 1
+        return 0
+
+    def _replay_round(self, record, rounds2weights):
+        """
+        Computes again the global model of a journaled round from the participants' files
+        and the journaled alpha, the files are checked against their hashes
+        :param record: journaled record of the round
+        :param rounds2weights: global model's weights at the beginning of each round
+        :return: global model's weights at the end of the round
+        """
+        idx_round = record["round"]
+        self.current_round = idx_round
+        self.reference_weights = rounds2weights[idx_round]
+        if sum(record["alpha"]) <= 0.0:
+            return self.reference_weights
+        participant_weights = []
+        for participant_id in record["participant_ids"]:
+            participant_file = record["participant_files"][str(participant_id)]
+            if file_digest(participant_file["path"]) != participant_file["hash"]:
+                logger.error("The file %s does not match its hash", participant_file["path"])
+                raise MalformedWeightsFileError("The participant's file has been modified")
+            upload_round = participant_file["round"]
+            weights = self._load_journaled_weights(
+                participant_file["path"], rounds2weights[upload_round]
+            )
+            if self.round_policy.asynchronous and upload_round != idx_round:
+                weights = self._rebase_weights(weights, rounds2weights[upload_round])
+            participant_weights.append(weights)
+        self.global_model.set_weights(
+            weighted_average_aggregation(participant_weights, record["alpha"])
+        )
+        logger.info("The round %d has been replayed from the journal", idx_round)
+        return self.global_model.get_weights()
+
+    def _load_journaled_weights(self, path_file_created, reference_weights):
+        """
+        Loads the weights of a participant's file replayed from the journal
+        :param path_file_created: file path to the local model's weights of the participant
+        :param reference_weights: weights from which the participant's update has been computed
+        :return: participant's weights
+        """
+        return self._submit_participant_weights(path_file_created, reference_weights).result()
+
+    def current_round_uploads(self, participant_weights_path):
+        """
+        Lists the uploads of the current round already on disk, e.g. uploaded before
+        the aggregator has been resumed, so they can be added without retraining
+        :param participant_weights_path: directory that contains the participants' files
+        :return: sorted list of the file paths (manifests or weights files without a manifest)
+        """
+        upload_paths = []
+        for path in sorted(Path(participant_weights_path).rglob("*")):
+            if not path.is_file():
+                continue
+            if path.suffix == MANIFEST_FORMAT:
+                try:
+                    upload = read_upload_manifest(str(path))
+                except (OSError, DecentralizedSmartGridML):
+                    continue
+            elif self.require_upload_manifests \
+                    or os.path.exists(upload_manifest_path(str(path))):
+                continue
+            else:
+                upload = legacy_upload_manifest(str(path))
+            if upload is not None and upload.round == self.current_round:
+                upload_paths.append(str(path))
+        return upload_paths
+
+    def close(self):
+        """
+        Releases the workers used to load the participants' weights and waits
+        for the test set evaluations in background
+        :return:
+        """
+        self.weights_loading_pool.shutdown()
+        self.test_evaluation_executor.shutdown(wait=True)
+
+    def _aggregation_alpha(self, idx_round, alpha):
+        """
+        Returns the weights of the participants' models in the aggregation of a given round
+        :param idx_round: round of the aggregation
+        :param alpha: alpha vector of the round
+        :return: alpha vector used in the aggregation, the contribution vector by default
+        """
+        return alpha
+
+    def _round_contributions(self, idx_round):
+        """
+        Returns the partial contributions of the participants at a given round
+        :param idx_round: round of the contributions
+        :return: (participants' identifier, alpha vector of the round)
+        """
+        return (
+            self.rounds2participants[idx_round]["participant_ids"],
+            self.rounds2participants[idx_round]["alpha"]
+        )
+
+    def _round_scores(self):
+        """
+        Returns the scores of the participants' models of the round just scored
+        :return: list of scores (same positions of the round's participants) or None
+        """
+        return self.contribution_extractor.scores
 
     def get_participants_contributions(self):
         """
         Computes the participants' contribution considering the partial
-        contribution obtained at each round
+        contribution obtained at each round, from the totals kept by the ledger
         :return: list of contributions (sum up to 1). The i-th contribution
             corresponds to the i-th participants (same positions of self.participant_ids)
         """
-        participant_id2contributions_count = {}
-        for participant_id in self.participant_ids:
-            # here the key is the participant id while
-            # the value is the sum of the participants' contribution
-            participant_id2contributions_count[participant_id] = 0
-        for idx_round in range(self.announcement_config.fl_rounds):
-            fl_round_participants = self.rounds2participants[idx_round]["participant_ids"]
-            contributions = self.rounds2participants[idx_round]["alpha"]
-            for participant_id, contribution in zip(fl_round_participants, contributions):
-                participant_id2contributions_count[participant_id] += contribution
-        weighted_contributions = []
-        totals = sum(participant_id2contributions_count.values())
-        for participant_id, total_contribution in \
-                participant_id2contributions_count.items():
-            weighted_contributions.append(round(
-                total_contribution / totals, 2)
-            )
-        return weighted_contributions
+        return self.contribution_ledger.contributions()
 
     def write_statistics(self, output_file_path):
         """
@@ -272,10 +1333,15 @@ class Aggregator:
         :param output_file_path: output file path
         :return:
         """
-        copy_statistics = self.rounds2participants.copy()
+        self.join_test_evaluations()
+        # the rounds are copied, so the statistics are not removed from the aggregator
+        copy_statistics = {}
         for idx_round in range(self.announcement_config.fl_rounds):
-            del copy_statistics[idx_round]["participant_weights"]
-            del copy_statistics[idx_round]["valid_participant_ids"]
+            copy_statistics[idx_round] = {
+                key: value for key, value in self.rounds2participants[idx_round].items()
+                if key not in ("participant_weights", "valid_participant_ids")
+            }
+            copy_statistics[idx_round]["timings"] = self.instrumentation.round_spans(idx_round)
         with open(output_file_path, "w") as file_read:
             json.dump(copy_statistics, file_read, indent="\t")
         logger.info("Aggregator's statistics saved in %s", output_file_path)
@@ -5,20 +5,32 @@ import json
 import os
 from pathlib import Path
 
-import pandas as pd
-
+from decentralized_smart_grid_ml.exceptions import MalformedUploadManifestError
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore
+from decentralized_smart_grid_ml.federated_learning.csv_data_source import CsvDataSource
 from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model, \
-    load_fl_model_weights, save_fl_model_weights
+    load_fl_model_weights, save_fl_model_weights, CID_FORMAT
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import \
+    read_round_participants, round_from_file_name, round_manifest_file_name, \
+    write_upload_manifest, ROUND_MANIFEST_FORMAT
+from decentralized_smart_grid_ml.federated_learning.weights_compression import \
+    WeightsCompressorCreator, save_weights_update
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+from decentralized_smart_grid_ml.utils.instrumentation import RoundInstrumentation
 
 logger = create_logger(__name__)
 
+# number of samples of the training set shuffled together at each epoch
+TRAIN_SHUFFLE_BUFFER_SAMPLES = 16384
+
 
 class FederatedLocalTrainer:
     """ This class is responsible for the training of the local participant's model """
 
     def __init__(self, participant_id, announcement_config,
-                 train_set_path, local_model_weights_path):
+                 train_set_path, local_model_weights_path, local_model=None,
+                 prometheus_textfile_path=None, content_store_path=None,
+                 global_model_weights_path=None):
         """
         Initialized the local trainer
         :param participant_id: id of the participant
@@ -26,18 +38,46 @@ class FederatedLocalTrainer:
         :param train_set_path: file path to the training set
         :param local_model_weights_path: path to the directory that will contain the
             local model's weights(one for each round)
+        :param local_model: (optional) compiled model used for the local training, it may be
+            shared with other trainers. If None the baseline model's artifact is loaded
+        :param prometheus_textfile_path: (optional) file path in which the timings of the
+            rounds are exported in the Prometheus text format at the end of each round
+        :param content_store_path: (optional) path to the content-addressed store in which the
+            local model's weights are saved, referred by cid pointer files
+        :param global_model_weights_path: (optional) path to the directory in which the
+            validator publishes the global models, used to check if the participant is
+            selected for the first round. The participant trains the first round if None
         """
         self.participant_id = participant_id
         self.announcement_config = announcement_config
-        self.local_model = load_fl_model(announcement_config.baseline_model_artifact)
-        train_set_df = pd.read_csv(train_set_path)
-        self.x_train = train_set_df[self.announcement_config.features_names["features"]].values
-        self.y_train = train_set_df[self.announcement_config.features_names["labels"]].values
+        if local_model is None:
+            local_model = load_fl_model(announcement_config.baseline_model_artifact)
+        self.local_model = local_model
+        # the training set is streamed from the csv file at each epoch
+        self.train_data_source = CsvDataSource(
+            train_set_path, self.announcement_config.features_names
+        )
+        # number of rows of the training set, counted when the first upload is published
+        self.train_samples = None
         self.local_model_weights_path = local_model_weights_path
         self.rounds2history = {}
         self._initialize_rounds2history()
         self.current_round = 0
         self.is_finished = False
+        # timings and resources spent in the phases of each round
+        self.instrumentation = RoundInstrumentation()
+        self.prometheus_textfile_path = prometheus_textfile_path
+        # None if the full local model's weights are uploaded at each round
+        self.weights_compressor = None
+        if announcement_config.weights_update_compression is not None:
+            self.weights_compressor = WeightsCompressorCreator.factory_method(
+                announcement_config.weights_update_compression,
+                **announcement_config.weights_update_compression_params
+            )
+        self.content_store = None
+        if content_store_path is not None:
+            self.content_store = ContentAddressedStore(content_store_path)
+        self.global_model_weights_path = global_model_weights_path
 
     def _initialize_rounds2history(self):
         """
@@ -47,6 +87,64 @@ class FederatedLocalTrainer:
         for idx_round in range(self.announcement_config.fl_rounds):
             self.rounds2history[idx_round] = None
 
+    def _train_dataset(self):
+        """
+        Creates the pipeline that streams the training set in batches
+        :return: tf.data.Dataset of the training set
+        """
+        return self.train_data_source.as_dataset(
+            self.announcement_config.batch_size,
+            shuffle_buffer_size=TRAIN_SHUFFLE_BUFFER_SAMPLES
+        )
+
+    def _is_selected(self, round_manifest_path):
+        """
+        Checks if the participant is selected for a round
+        :param round_manifest_path: file path to the manifest of the round
+        :return:    True if the participant is selected or the manifest is not available
+                    False otherwise
+        """
+        try:
+            participant_ids = read_round_participants(round_manifest_path)
+        except (OSError, MalformedUploadManifestError) as error:
+            logger.warning(
+                "The round manifest %s cannot be read (%s), the round is not skipped",
+                round_manifest_path, error
+            )
+            return True
+        return participant_ids is None or self.participant_id in participant_ids
+
+    def _skip_round(self):
+        """
+        Skips the current round, for which the participant is not selected
+        :return:
+        """
+        logger.info(
+            "Participant %s: not selected for round %d, Skipping...",
+            self.participant_id, self.current_round
+        )
+        self.current_round += 1
+
+    def train_round(self, global_weights):
+        """
+        Carries out the training of the local model for the current round in memory,
+        starting from the given global model's weights
+        :param global_weights: weights of the global model for the current round
+        :return: weights of the local model trained
+        """
+        self.local_model.set_weights(global_weights)
+        with self.instrumentation.span(self.current_round, "local_training"):
+            history = self.local_model.fit(
+                self._train_dataset(),
+                epochs=self.announcement_config.epochs
+            )
+        self.rounds2history[self.current_round] = history.history
+        logger.info("Participant %s: end FL round %s", self.participant_id, self.current_round)
+        self.current_round += 1
+        self.is_finished = self.current_round == self.announcement_config.fl_rounds
+        self._export_instrumentation()
+        return self.local_model.get_weights()
+
     def fit_local_model(self, path_file_created):
         """
         Carries out the training of the local model for one round
@@ -57,51 +155,142 @@ class FederatedLocalTrainer:
                     False otherwise
         """
         history = None
+        reference_weights = None
+        if path_file_created is not None and Path(path_file_created).stem.endswith("final"):
+            # the validator published the final model, the missing rounds are skipped
+            logger.info("Participant %s: the federated learning is finished", self.participant_id)
+            self.is_finished = True
+            return self.is_finished
+        if path_file_created is not None \
+                and Path(path_file_created).suffix == ROUND_MANIFEST_FORMAT:
+            # the manifest is read when the global model of its round is published
+            return self.is_finished
         if path_file_created is not None:
             # try to load the aggregated new baseline model and start the local training
-            round_baseline_model = Path(path_file_created).stem[-1]
-            try:
-                if int(round_baseline_model) == self.current_round:
-                    aggregated_weights = load_fl_model_weights(path_file_created)
-                    # update the weights of the new baseline model for this round
-                    self.local_model.set_weights(aggregated_weights)
-                    # fit the local model
-                    history = self.local_model.fit(
-                        self.x_train, self.y_train,
-                        epochs=self.announcement_config.epochs,
-                        batch_size=self.announcement_config.batch_size
-                    )
-                else:
-                    logger.warning(
-                        "The path %s does not correspond to the current round (%d), Skipping...",
-                        path_file_created, self.current_round
-                    )
-            except ValueError:
+            round_baseline_model = round_from_file_name(Path(path_file_created).stem)
+            if round_baseline_model is None:
                 logger.warning(
                     "Malformed path %s, Skipping...",
                     path_file_created
                 )
+            elif round_baseline_model < self.current_round:
+                logger.warning(
+                    "The path %s does not correspond to the current round (%d), Skipping...",
+                    path_file_created, self.current_round
+                )
+            else:
+                if round_baseline_model > self.current_round:
+                    # the rounds closed by the validator without this participant are skipped
+                    logger.warning(
+                        "Participant %s: skipping from round %d to round %d",
+                        self.participant_id, self.current_round, round_baseline_model
+                    )
+                    self.current_round = round_baseline_model
+                if not self._is_selected(os.path.join(
+                        os.path.dirname(path_file_created),
+                        round_manifest_file_name(round_baseline_model)
+                )):
+                    self._skip_round()
+                else:
+                    with self.instrumentation.span(self.current_round, "load_global_weights"):
+                        aggregated_weights = load_fl_model_weights(path_file_created)
+                        # update the weights of the new baseline model for this round
+                        self.local_model.set_weights(aggregated_weights)
+                    reference_weights = aggregated_weights
+                    # fit the local model
+                    with self.instrumentation.span(self.current_round, "local_training"):
+                        history = self.local_model.fit(
+                            self._train_dataset(),
+                            epochs=self.announcement_config.epochs
+                        )
+        elif self.global_model_weights_path is not None and not self._is_selected(
+                os.path.join(self.global_model_weights_path, round_manifest_file_name(0))
+        ):
+            self._skip_round()
         else:
             # first round: the baseline model is in global_model_path
-            history = self.local_model.fit(
-                self.x_train, self.y_train,
-                epochs=self.announcement_config.epochs,
-                batch_size=self.announcement_config.batch_size
-            )
+            if self.weights_compressor is not None:
+                reference_weights = self.local_model.get_weights()
+            with self.instrumentation.span(self.current_round, "local_training"):
+                history = self.local_model.fit(
+                    self._train_dataset(),
+                    epochs=self.announcement_config.epochs
+                )
         if history is not None:
-            local_model_weights_path = os.path.join(
-                self.local_model_weights_path,
-                "weights_round_" + str(self.current_round) + ".json"
-            )
             output_folder = Path(self.local_model_weights_path)
             output_folder.mkdir(parents=True, exist_ok=True)
             self.rounds2history[self.current_round] = history.history
             logger.info("Participant %s: end FL round %s", self.participant_id, self.current_round)
             self.current_round += 1
-            save_fl_model_weights(self.local_model, local_model_weights_path)
+            with self.instrumentation.span(self.current_round - 1, "write_weights"):
+                self._save_local_model_weights(self.current_round - 1, reference_weights)
+            self._export_instrumentation()
         self.is_finished = self.current_round == self.announcement_config.fl_rounds
         return self.is_finished
 
+    def _export_instrumentation(self):
+        """
+        Exports the timings of the rounds in the Prometheus text format (if required)
+        :return:
+        """
+        if self.prometheus_textfile_path is not None:
+            self.instrumentation.write_prometheus(
+                self.prometheus_textfile_path,
+                {"role": "participant", "participant_id": self.participant_id}
+            )
+
+    def _save_local_model_weights(self, idx_round, reference_weights):
+        """
+        Saves the local model's weights of a round: the full weights in a json file or,
+        if a compression method is configured, the compressed delta from the
+        reference weights in a flw file. If a content-addressed store is configured,
+        the weights (or the delta) are saved in the store and referred by a cid file.
+        The upload is published by the manifest written next to the weights file
+        :param idx_round: round of the local training
+        :param reference_weights: weights from which the local training of the round started
+        :return: file path to the manifest of the upload
+        """
+        if self.content_store is not None:
+            extension = CID_FORMAT
+        else:
+            extension = ".json" if self.weights_compressor is None else ".flw"
+        local_model_weights_path = os.path.join(
+            self.local_model_weights_path,
+            "weights_round_" + str(idx_round) + extension
+        )
+        if self.weights_compressor is None and self.content_store is None:
+            save_fl_model_weights(self.local_model, local_model_weights_path)
+        elif self.weights_compressor is None:
+            save_fl_model_weights(self.local_model, local_model_weights_path, self.content_store)
+        else:
+            save_weights_update(
+                self.local_model.get_weights(),
+                reference_weights,
+                local_model_weights_path,
+                self.weights_compressor,
+                self.content_store
+            )
+        if self.train_samples is None:
+            self.train_samples = self.train_data_source.count_rows()
+        return write_upload_manifest(
+            local_model_weights_path, self.participant_id, idx_round, self.train_samples
+        )
+
+    def get_statistics(self):
+        """
+        Returns the statistics computed during the framework execution: the training
+        history of each round with the timings of its phases
+        :return: dictionary round -> statistics of the round
+        """
+        statistics = {}
+        for idx_round, history in self.rounds2history.items():
+            timings = self.instrumentation.round_spans(idx_round)
+            if timings:
+                statistics[idx_round] = dict(history or {}, timings=timings)
+            else:
+                statistics[idx_round] = history
+        return statistics
+
     def write_statistics(self, output_file_path):
         """
         Writes in output the statistics computed during the framework execution
@@ -109,7 +298,7 @@ class FederatedLocalTrainer:
         :return:
         """
         with open(output_file_path, "w") as file_read:
-            json.dump(self.rounds2history, file_read, indent="\t")
+            json.dump(self.get_statistics(), file_read, indent="\t")
         logger.info(
             "Participant_%s's statistics saved in %s",
             self.participant_id, output_file_path
@@ -0,0 +1,172 @@
+"""
+This module contains the engine used to simulate the federated learning of many
+participants and the validator in a single process
+"""
+import json
+import os
+from pathlib import Path
+
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import Aggregator
+from decentralized_smart_grid_ml.federated_learning.federated_local_trainer import \
+    FederatedLocalTrainer
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+def _optimizer_variables(model):
+    """
+    Returns the variables of the model's optimizer (iterations, moments, ...)
+    :param model: compiled model
+    :return: list of the optimizer's variables
+    """
+    optimizer = getattr(model, "optimizer", None)
+    variables = getattr(optimizer, "variables", None)
+    if callable(variables):
+        # the legacy tf.keras optimizers expose the variables with a method
+        variables = variables()
+    return list(variables or [])
+
+
+def _build_optimizer(model):
+    """
+    Creates the optimizer's variables before the first training, so the initial
+    state of the optimizer can be saved
+    :param model: compiled model
+    :return:
+    """
+    optimizer = getattr(model, "optimizer", None)
+    if optimizer is not None and hasattr(optimizer, "build") \
+            and not getattr(optimizer, "built", True):
+        optimizer.build(model.trainable_variables)
+
+
+class FederatedSimulation:
+    """
+    This class is responsible for the simulation of the federated learning life cycle in a
+    single process: the participants' trainers share one compiled model, whose weights and
+    optimizer's state are swapped for each participant, and the local models' weights
+    are handed to the aggregator in memory
+    """
+
+    def __init__(self, announcement_config, train_set_paths, validation_set_path,
+                 test_set_path, model_weights_new_round_path=None):
+        """
+        Initializes the simulation
+        :param announcement_config: instance of AnnouncementConfiguration class
+        :param train_set_paths: file paths to the participants' training sets,
+            the participant's identifier is the index in the list
+        :param validation_set_path: file path to the validation set
+        :param test_set_path: file path to the test set
+        :param model_weights_new_round_path: (optional) path to the directory that will
+            contain the new model's weights (one for each round)
+        """
+        if len(train_set_paths) == 0:
+            logger.error("The simulation requires at least one participant")
+            raise ValueError("The list of the training sets is empty")
+        self.announcement_config = announcement_config
+        self.shared_model = load_fl_model(announcement_config.baseline_model_artifact)
+        _build_optimizer(self.shared_model)
+        self._initial_optimizer_state = self._get_optimizer_state()
+        self.trainers = [
+            FederatedLocalTrainer(
+                participant_id,
+                announcement_config,
+                train_set_path,
+                None,
+                local_model=self.shared_model
+            )
+            for participant_id, train_set_path in enumerate(train_set_paths)
+        ]
+        self.aggregator = Aggregator(
+            list(range(len(train_set_paths))),
+            announcement_config,
+            validation_set_path,
+            test_set_path,
+            model_weights_new_round_path
+        )
+        # optimizer's state of each participant after its last local training
+        self.participants_optimizer_states = {}
+        logger.info("Simulation with %d participants initialized", len(self.trainers))
+
+    def _get_optimizer_state(self):
+        """
+        Copies the state of the shared model's optimizer
+        :return: list of the optimizer's variables values
+        """
+        return [variable.numpy() for variable in _optimizer_variables(self.shared_model)]
+
+    def _set_optimizer_state(self, optimizer_state):
+        """
+        Restores the state of the shared model's optimizer
+        :param optimizer_state: list of the optimizer's variables values
+        :return:
+        """
+        variables = _optimizer_variables(self.shared_model)
+        if len(variables) != len(optimizer_state):
+            logger.warning(
+                "The optimizer's state cannot be restored: %d variables instead of %d",
+                len(optimizer_state), len(variables)
+            )
+            return
+        for variable, value in zip(variables, optimizer_state):
+            variable.assign(value)
+
+    def run_round(self):
+        """
+        Carries out a federated round: each participant sampled for the round trains the
+        shared model starting from the global weights, then the aggregator updates
+        the global model
+        :return:
+        """
+        idx_round = self.aggregator.current_round
+        global_weights = self.aggregator.global_model.get_weights()
+        # only the participants sampled by the round policy train in the round
+        round_participant_ids = \
+            self.aggregator.rounds2participants[idx_round]["valid_participant_ids"]
+        for trainer in self.trainers:
+            if trainer.participant_id not in round_participant_ids:
+                continue
+            trainer.current_round = idx_round
+            self._set_optimizer_state(self.participants_optimizer_states.get(
+                trainer.participant_id, self._initial_optimizer_state
+            ))
+            local_weights = trainer.train_round(global_weights)
+            self.participants_optimizer_states[trainer.participant_id] = \
+                self._get_optimizer_state()
+            self.aggregator.add_participant_local_weights(trainer.participant_id, local_weights)
+        self.aggregator.update_global_model()
+        logger.info("Simulation: end FL round %d", idx_round)
+
+    def run(self):
+        """
+        Runs all the federated rounds
+        :return: final participants' contributions
+        """
+        try:
+            while not self.aggregator.is_finished:
+                self.run_round()
+        finally:
+            self.aggregator.close()
+        return self.aggregator.get_participants_contributions()
+
+    def write_statistics(self, output_directory_path):
+        """
+        Writes in output the statistics of the validator and of each participant
+        :param output_directory_path: path to the directory that will contain the statistics
+        :return:
+        """
+        Path(output_directory_path).mkdir(parents=True, exist_ok=True)
+        self.aggregator.write_statistics(
+            os.path.join(output_directory_path, "statistics.json")
+        )
+        participants_statistics = {
+            trainer.participant_id: trainer.get_statistics() for trainer in self.trainers
+        }
+        participants_statistics_path = os.path.join(
+            output_directory_path, "participants_statistics.json"
+        )
+        with open(participants_statistics_path, "w") as file_write:
+            json.dump(participants_statistics, file_write, indent="\t")
+        logger.info("Participants' statistics saved in %s", participants_statistics_path)
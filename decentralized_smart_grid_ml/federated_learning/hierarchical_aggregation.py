@@ -0,0 +1,386 @@
+"""
+This module contains the aggregators of the hierarchical (multi-tier) topology: the
+regional aggregators pre-aggregate the weights of their sites and forward a weighted
+partial sum upstream, while the root aggregator merges the regions' partial aggregates
+and attributes the contributions down to the individual participants
+"""
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import Aggregator, \
+    WeightedAverageAccumulator
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import \
+    load_fl_model_weights, load_fl_weights, save_fl_weights
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import round_from_file_name, \
+    write_upload_manifest
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# prefix of the global models' weights files published by the root aggregator
+GLOBAL_MODEL_FILE_PREFIX = "validator_weights_"
+# prefix of the sub-directory of each region in the root aggregator's input directory
+REGION_DIRECTORY_PREFIX = "region_"
+# prefix of the partial aggregates' files forwarded by the regional aggregators
+PARTIAL_AGGREGATE_FILE_PREFIX = "partial_aggregate_round_"
+
+
+def save_partial_aggregate(partial_sum, partial_aggregate_path, region_id, participant_ids,
+                           alpha):
+    """
+    Saves the partial aggregate of a region: the weighted sum of its participants'
+    weights (float64) and, in the header, the attribution of the region's participants
+    :param partial_sum: list of the layers of the weighted sum of the participants' weights
+    :param partial_aggregate_path: file path in which the partial aggregate will be saved
+        (flw file)
+    :param region_id: identifier of the region
+    :param participant_ids: identifiers of the region's participants
+    :param alpha: weights of the region's participants in the weighted sum
+    :return:
+    """
+    metadata = {
+        "region_id": region_id,
+        "participant_ids": [int(participant_id) for participant_id in participant_ids],
+        "alpha": [float(participant_alpha) for participant_alpha in alpha],
+        "alpha_sum": float(sum(alpha)),
+        "n_participants": len(participant_ids)
+    }
+    save_fl_weights(partial_sum, partial_aggregate_path, metadata)
+
+
+def load_partial_aggregate(partial_aggregate_path, reference_weights):
+    """
+    Loads the partial aggregate of a region and normalizes it in the region's model
+    :param partial_aggregate_path: file path in which the partial aggregate has been saved
+    :param reference_weights: weights of the global model of the round, used as the region's
+        model if none of its participants contributed
+    :return: (list of the layers' weights of the region's model, attribution of the region)
+    """
+    partial_sum, metadata = load_fl_weights(partial_aggregate_path)
+    if metadata["alpha_sum"] <= 0.0:
+        return reference_weights, metadata
+    regional_weights = [
+        (np.asarray(layer_sum, dtype=np.float64) / metadata["alpha_sum"]).astype(
+            np.asarray(reference_layer).dtype, copy=False
+        )
+        for layer_sum, reference_layer in zip(partial_sum, reference_weights)
+    ]
+    return regional_weights, metadata
+
+
+class RegionalAggregator(Aggregator):
+    """
+    This class is responsible for the pre-aggregation of the weights of a region's sites.
+    At the end of each round the sites are scored on the region's validation set and their
+    weighted sum is forwarded to the root aggregator, whose global model starts the next round
+    """
+
+    def __init__(self, region_id, participant_ids, announcement_config, validation_set_path,
+                 test_set_path, partial_aggregates_path, max_loading_workers=None,
+                 prometheus_textfile_path=None, require_upload_manifests=False):
+        """
+        Initializes the regional aggregator
+        :param region_id: identifier of the region
+        :param participant_ids: identifiers of the region's participants
+        :param announcement_config: instance of AnnouncementConfiguration class
+        :param validation_set_path: file path to the region's validation set
+        :param test_set_path: file path to the test set (not evaluated by the region)
+        :param partial_aggregates_path: path to the input directory of the root aggregator,
+            the partial aggregates are saved in its sub-directory of the region
+        :param max_loading_workers: maximum number of workers used to load
+            the participants' weights
+        :param prometheus_textfile_path: (optional) file path in which the timings of the
+            rounds are exported in the Prometheus text format at the end of each round
+        :param require_upload_manifests: if it is True, only the sites' uploads published
+            with a manifest are added
+        """
+        super().__init__(
+            participant_ids, announcement_config, validation_set_path, test_set_path, None,
+            max_loading_workers, prometheus_textfile_path,
+            require_upload_manifests=require_upload_manifests
+        )
+        if self.round_policy.asynchronous:
+            logger.error("The asynchronous mode is not supported by the regional aggregators")
+            raise ValueError("The regional aggregators require synchronous rounds")
+        self.region_id = region_id
+        self.partial_aggregates_path = os.path.join(
+            partial_aggregates_path, REGION_DIRECTORY_PREFIX + str(region_id)
+        )
+        # the next round starts when the root aggregator publishes the new global model
+        self.is_waiting_global_model = False
+        # uploads of the next round received before its global model
+        self.pending_paths = []
+
+    def add_participant_weights(self, path_file_created):
+        """
+        Adds the local weights of a site in the current round, or starts the next round
+        if the file is a global model published by the root aggregator
+        :param path_file_created: file path to the local model's weights of the site
+            or to the global model's weights
+        :return:    True if all the participant already publish their local model's weights
+                    False otherwise
+        """
+        if Path(path_file_created).stem.startswith(GLOBAL_MODEL_FILE_PREFIX):
+            return self.add_global_model_weights(path_file_created)
+        if self.is_waiting_global_model:
+            # the weights may be a delta from the global model that is not available yet
+            self.pending_paths.append(path_file_created)
+            return False
+        return super().add_participant_weights(path_file_created)
+
+    def add_global_model_weights(self, path_file_created):
+        """
+        Starts the current round from the global model published by the root aggregator
+        :param path_file_created: file path to the global model's weights
+        :return:    True if the pending uploads already complete the round
+                    False otherwise
+        """
+        global_round = round_from_file_name(Path(path_file_created).stem)
+        if not self.is_waiting_global_model or global_round != self.current_round:
+            logger.debug("The global model %s is not expected, Skipping...", path_file_created)
+            return False
+        self.global_model.set_weights(load_fl_model_weights(path_file_created))
+        with self.rounds_lock:
+            self.previous_reference_weights = self.reference_weights
+            self.reference_weights = self.global_model.get_weights()
+            self.is_waiting_global_model = False
+            self.round_start_time = time.perf_counter()
+        logger.info(
+            "Region %s: global model of round %d received", self.region_id, self.current_round
+        )
+        pending_paths, self.pending_paths = self.pending_paths, []
+        is_completed = False
+        for pending_path in pending_paths:
+            is_completed = super().add_participant_weights(pending_path) or is_completed
+        with self.rounds_lock:
+            is_completed = self._add_deferred_uploads() or is_completed
+        return is_completed
+
+    def update_global_model(self):
+        """
+        Scores the sites of the current round and forwards their weighted sum
+        to the root aggregator
+        :return:
+        """
+        idx_round = self.current_round
+        self.instrumentation.record(
+            idx_round, "waiting_participants", time.perf_counter() - self.round_start_time
+        )
+        round_participants = self.rounds2participants[idx_round]
+        with self.instrumentation.span(idx_round, "join_participant_weights"):
+            self._join_participant_weights(idx_round)
+        with self.instrumentation.span(idx_round, "contribution_scoring"):
+            # the baseline of the round is the global model received from the root
+            validation_results = self._evaluate_validation_set()
+            alpha = self.contribution_extractor.compute_contribution(
+                round_participants["participant_weights"], validation_results[1]
+            )
+        logger.info(
+            "Region %s: alpha vector for round %d is %s relative to participant ids %s",
+            self.region_id, idx_round, alpha, round_participants["participant_ids"]
+        )
+        round_participants["alpha"] = alpha
+        round_participants["validation_results"] = validation_results
+        if self.contribution_extractor.confidence_intervals is not None:
+            round_participants["confidence_intervals"] = \
+                self.contribution_extractor.confidence_intervals
+        self.contribution_ledger.record_round(
+            idx_round, round_participants["participant_ids"], alpha, self._round_scores()
+        )
+        with self.instrumentation.span(idx_round, "partial_aggregation"):
+            accumulator = WeightedAverageAccumulator()
+            accumulator.begin(self.reference_weights)
+            for local_weights, participant_alpha in zip(
+                    round_participants["participant_weights"], alpha
+            ):
+                accumulator.add(local_weights, participant_alpha)
+            partial_sum = accumulator.aggregated_weights
+        with self.instrumentation.span(idx_round, "write_weights"):
+            Path(self.partial_aggregates_path).mkdir(parents=True, exist_ok=True)
+            partial_aggregate_path = os.path.join(
+                self.partial_aggregates_path,
+                PARTIAL_AGGREGATE_FILE_PREFIX + str(idx_round) + ".flw"
+            )
+            save_partial_aggregate(
+                partial_sum,
+                partial_aggregate_path,
+                self.region_id,
+                round_participants["participant_ids"],
+                alpha
+            )
+            # the root aggregator identifies the region's upload from its manifest
+            write_upload_manifest(partial_aggregate_path, self.region_id, idx_round)
+        self.current_round += 1
+        self.is_finished = self.current_round == self.announcement_config.fl_rounds
+        self.is_waiting_global_model = not self.is_finished
+        self._export_instrumentation()
+
+
+class RootAggregator(Aggregator):
+    """
+    This class is responsible for the aggregation of the regions' partial aggregates in
+    the global model. The regions are scored as the participants of a flat aggregator and
+    weighted by their number of participants, then the contribution of each region is split
+    among its participants proportionally to their contribution in the region
+    """
+
+    def __init__(self, region_ids, participant_ids, announcement_config, validation_set_path,
+                 test_set_path, model_weights_new_round_path, max_loading_workers=None,
+                 prometheus_textfile_path=None, content_store_path=None, journal_path=None,
+                 checkpoint_interval=1, resume=False, require_upload_manifests=False):
+        """
+        Initializes the root aggregator
+        :param region_ids: regions' identifier
+        :param participant_ids: identifiers of the participants of all the regions
+        :param announcement_config: instance of AnnouncementConfiguration class
+        :param validation_set_path: file path to the validation set
+        :param test_set_path: file path to the test set
+        :param model_weights_new_round_path: path to the directory that will contain the
+            new model's weights (one for each round) or None to keep them only in memory
+        :param max_loading_workers: maximum number of workers used to load
+            the partial aggregates
+        :param prometheus_textfile_path: (optional) file path in which the timings of the
+            rounds are exported in the Prometheus text format at the end of each round
+        :param content_store_path: (optional) path to the content-addressed store in which the
+            new model's weights are saved, referred by cid pointer files
+        :param journal_path: (optional) file path to the journal of the rounds
+        :param checkpoint_interval: number of rounds between two checkpoints
+        :param resume: if it is True, the rounds completed in the journal are not executed again
+        :param require_upload_manifests: if it is True, only the partial aggregates published
+            with a manifest are added
+        """
+        self.region_ids = region_ids
+        self._site_participant_ids = participant_ids
+        super().__init__(
+            region_ids, announcement_config, validation_set_path, test_set_path,
+            model_weights_new_round_path, max_loading_workers, prometheus_textfile_path,
+            content_store_path, journal_path, checkpoint_interval, resume,
+            require_upload_manifests
+        )
+        # the contributions are attributed to the participants, not to the regions
+        self.participant_ids = participant_ids
+
+    def _submit_participant_weights(self, path_file_created, reference_weights=None,
+                                    weights_hash=None):
+        """
+        Schedules the loading of a region's partial aggregate
+        :param path_file_created: file path to the partial aggregate of the region
+        :param reference_weights: (optional) weights of the global model the region started
+            from, the global model's weights of the current round if None
+        :param weights_hash: (optional) hash of the partial aggregate in its manifest,
+            checked by the worker before decoding
+        :return: future of the region's weights and attribution
+        """
+        if reference_weights is None:
+            reference_weights = self.reference_weights
+        return self._submit_loading(
+            path_file_created, weights_hash, load_partial_aggregate, reference_weights
+        )
+
+    def _contributor_ids(self, participant_ids):
+        """
+        Returns the identifiers of the participants of all the regions, to which
+        the contributions of the regions are attributed
+        :param participant_ids: regions' identifier
+        :return: participants' identifier
+        """
+        return self._site_participant_ids
+
+    def round_participant_ids(self, idx_round):
+        """
+        The root aggregator samples the regions, not their participants, so its selection
+        is not published to the participants
+        :param idx_round: round of the selection
+        :return: None
+        """
+        return None
+
+    def _record_arrival(self, participant_id):
+        """
+        The arrival times are tracked per participant, so the regions' uploads are not recorded
+        :param participant_id: identifier of the region
+        :return:
+        """
+
+    def _round_scores(self):
+        """
+        The scores of the regions are not attributed to their participants
+        :return: None
+        """
+        return None
+
+    def _load_journaled_weights(self, path_file_created, reference_weights):
+        """
+        Loads the weights of a region's partial aggregate replayed from the journal,
+        its attribution is already in the journal
+        :param path_file_created: file path to the partial aggregate of the region
+        :param reference_weights: weights of the global model the region started from
+        :return: region's weights
+        """
+        weights, _ = super()._load_journaled_weights(path_file_created, reference_weights)
+        return weights
+
+    def _join_participant_weights(self, idx_round):
+        """
+        Waits for the loading of the regions' partial aggregates of a given round and keeps
+        the attribution of each region apart from its weights
+        :param idx_round: round of the partial aggregates
+        :return:
+        """
+        super()._join_participant_weights(idx_round)
+        round_participants = self.rounds2participants[idx_round]
+        round_participants["region_attributions"] = [
+            attribution for _, attribution in round_participants["participant_weights"]
+        ]
+        round_participants["participant_weights"] = [
+            weights for weights, _ in round_participants["participant_weights"]
+        ]
+
+    def _aggregation_alpha(self, idx_round, alpha):
+        """
+        Weights the alpha of each region by its number of participants, so a partial
+        aggregate counts as many times as the local models it averages
+        :param idx_round: round of the aggregation
+        :param alpha: alpha vector of the regions at the round
+        :return: alpha vector of the regions weighted by their size (normalized)
+        """
+        weighted_alpha = [
+            region_alpha * attribution["n_participants"] for region_alpha, attribution in zip(
+                alpha, self.rounds2participants[idx_round]["region_attributions"]
+            )
+        ]
+        if sum(weighted_alpha) <= 0.0:
+            return alpha
+        weighted_alpha = [region_alpha / sum(weighted_alpha) for region_alpha in weighted_alpha]
+        logger.info(
+            "Alpha vector for round %d weighted by the regions' size is %s",
+            idx_round, weighted_alpha
+        )
+        return weighted_alpha
+
+    def _round_contributions(self, idx_round):
+        """
+        Returns the partial contributions of the participants at a given round: the
+        contribution of each region is split among its participants
+        :param idx_round: round of the contributions
+        :return: (participants' identifier, alpha vector of the round)
+        """
+        round_participants = self.rounds2participants[idx_round]
+        participant_ids = []
+        contributions = []
+        for region_alpha, attribution in zip(
+                round_participants["alpha"], round_participants.get("region_attributions", [])
+        ):
+            if attribution["alpha_sum"] <= 0.0:
+                continue
+            for participant_id, participant_alpha in zip(
+                    attribution["participant_ids"], attribution["alpha"]
+            ):
+                participant_ids.append(participant_id)
+                contributions.append(
+                    region_alpha * participant_alpha / attribution["alpha_sum"]
+                )
+        return participant_ids, contributions
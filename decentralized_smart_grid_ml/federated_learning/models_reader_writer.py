@@ -2,16 +2,38 @@
 Utility to save and load models' config and weights
 """
 import json
+import multiprocessing
+import os
 import pathlib
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
-from tensorflow.keras import models as tf_models
 
-from decentralized_smart_grid_ml.exceptions import IncorrectExtensionFileError
+from decentralized_smart_grid_ml.exceptions import IncorrectExtensionFileError, \
+    MalformedWeightsFileError
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore, \
+    CONTENT_STORE_DEFAULT_DIRECTORY, read_weights_cid, write_weights_cid
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
 
 logger = create_logger(__name__)
 
+# binary weights format (flw): magic number, header length and alignment of the layers
+FLW_MAGIC = b"FLW1"
+FLW_HEADER_LENGTH = struct.Struct("<I")
+FLW_ALIGNMENT = 64
+
+
+def _import_keras():
+    """
+    Imports keras only when a model has to be handled, so that the utilities for
+    the weights can be used in processes that never load tensorflow
+    :return: (keras layers module, keras models module)
+    """
+    # pylint: disable=import-outside-toplevel
+    from tensorflow.keras import layers as tf_layers, models as tf_models
+    return tf_layers, tf_models
+
 
 def save_fl_model(model, model_path):
     """
@@ -30,11 +52,32 @@ def load_fl_model(model_path):
     :param model_path: directory path in which the model has been saved
     :return: loaded model
     """
+    _, tf_models = _import_keras()
     model = tf_models.load_model(model_path)
     logger.info("Load model from  %s", model_path)
     return model
 
 
+def build_multi_head_model(model, n_heads):
+    """
+    Builds a model with n_heads copies of the given model that share the same input,
+    so that the predictions of n_heads sets of weights are computed in a single pass
+    :param model: model to replicate
+    :param n_heads: number of copies of the model
+    :return: (multi-head model, list of the heads) where the i-th head is the
+        sub-model whose weights have to be set for the i-th output
+    """
+    tf_layers, tf_models = _import_keras()
+    inputs = tf_layers.Input(model.input_shape[1:])
+    heads = [
+        tf_models.Sequential([tf_models.clone_model(model)], name="head_" + str(idx_head))
+        for idx_head in range(n_heads)
+    ]
+    multi_head_model = tf_models.Model(inputs, [head(inputs) for head in heads])
+    logger.info("Built multi-head model with %d heads", n_heads)
+    return multi_head_model, heads
+
+
 def save_fl_model_config(model, model_path):
     """
     Saves the configuration of the model in a json file
@@ -63,38 +106,390 @@ def load_fl_model_config(model_path):
     with open(model_path, "r") as file_read:
         model_json = json.dumps(json.load(file_read))
     logger.info("Loaded model's config from  %s", model_path)
+    _, tf_models = _import_keras()
     model_json = tf_models.model_from_json(model_json)
     return model_json
 
 
-def save_fl_model_weights(model, model_weights_path):
+def _save_json_weights(weights_model, model_weights_path, metadata=None):
     """
-    Saves the model's weights in a json file
-    :param model: model that contains the weights to save
-    :param model_weights_path: file path in which the model's weights will be saved
+    Saves a list of layers' weights in a json file
+    :param weights_model: list of the layers' weights
+    :param model_weights_path: file path in which the weights will be saved
+    :param metadata: not supported by the json format, it has to be None
     :return:
     """
-    if pathlib.Path(model_weights_path).suffix != ".json":
-        logger.error("The file path %s is not a json file", model_weights_path)
-        raise IncorrectExtensionFileError("Error in the file extension, json is required")
-    weights_model = model.get_weights()
+    if metadata is not None:
+        logger.error("The json file %s cannot contain metadata", model_weights_path)
+        raise IncorrectExtensionFileError("Error in the file extension, flw is required")
     lists_weights_model = [layer_weights.tolist() for layer_weights in weights_model]
     with open(model_weights_path, "w") as file_write:
         json.dump(lists_weights_model, file_write, indent=1)
+
+
+def _load_json_weights(model_weights_path):
+    """
+    Loads a list of layers' weights from a json file
+    :param model_weights_path: file path in which the weights have been saved
+    :return: (list of the layers' weights, empty metadata)
+    """
+    with open(model_weights_path, "r") as file_read:
+        model_weights = json.load(file_read)
+    return [np.array(layer_weights) for layer_weights in model_weights], {}
+
+
+def _align_offset(offset):
+    """
+    Rounds up an offset to the alignment used by the binary weights format
+    :param offset: offset in bytes
+    :return: the aligned offset
+    """
+    return -(-offset // FLW_ALIGNMENT) * FLW_ALIGNMENT
+
+
+def flw_layout(weights_model, metadata=None):
+    """
+    Computes the layout of a list of layers' weights in the binary weights format (flw):
+    a magic number, the length of the json header, the header (dtype, shape and offset
+    of each layer, optional metadata) and the contiguous payload of the layers
+    :param weights_model: list of the layers' weights
+    :param metadata: (optional) json serializable dictionary saved in the header
+    :return: (contiguous layers, layers' header, encoded header, payload offset,
+        total size in bytes)
+    """
+    layers = []
+    layers_header = []
+    payload_size = 0
+    for layer_weights in weights_model:
+        layer_weights = np.ascontiguousarray(layer_weights)
+        if layer_weights.dtype.kind not in "fiub":
+            layer_weights = layer_weights.astype(np.float32)
+        payload_size = _align_offset(payload_size)
+        layers_header.append({
+            "dtype": layer_weights.dtype.str,
+            "shape": list(layer_weights.shape),
+            "offset": payload_size
+        })
+        layers.append(layer_weights)
+        payload_size += layer_weights.nbytes
+    header = json.dumps({"layers": layers_header, "metadata": metadata or {}}).encode("utf-8")
+    payload_offset = _align_offset(len(FLW_MAGIC) + FLW_HEADER_LENGTH.size + len(header))
+    return layers, layers_header, header, payload_offset, payload_offset + payload_size
+
+
+def write_flw_buffer(buffer, weights_layout):
+    """
+    Writes a list of layers' weights in the binary weights format (flw) in a buffer,
+    e.g. a shared memory segment
+    :param buffer: writable buffer of at least the total size of the layout
+    :param weights_layout: layout of the weights computed by flw_layout
+    :return:
+    """
+    layers, layers_header, header, payload_offset, _ = weights_layout
+    buffer = memoryview(buffer).cast("B")
+    buffer[:len(FLW_MAGIC)] = FLW_MAGIC
+    header_start = len(FLW_MAGIC) + FLW_HEADER_LENGTH.size
+    buffer[len(FLW_MAGIC):header_start] = FLW_HEADER_LENGTH.pack(len(header))
+    buffer[header_start:header_start + len(header)] = header
+    for layer_weights, layer_header in zip(layers, layers_header):
+        layer_start = payload_offset + layer_header["offset"]
+        buffer[layer_start:layer_start + layer_weights.nbytes] = \
+            memoryview(layer_weights.reshape(-1)).cast("B")
+
+
+def read_flw_buffer(buffer):
+    """
+    Reads a list of layers' weights in the binary weights format (flw) from a buffer.
+    The layers are views on the buffer, so no data is copied
+    :param buffer: buffer that contains the weights, e.g. a shared memory segment
+    :return: (list of the layers' weights, metadata saved in the header)
+    """
+    buffer = memoryview(buffer).cast("B")
+    if bytes(buffer[:len(FLW_MAGIC)]) != FLW_MAGIC:
+        logger.error("The buffer does not contain valid flw weights")
+        raise MalformedWeightsFileError("Error in the flw buffer, the magic number is not valid")
+    header_start = len(FLW_MAGIC) + FLW_HEADER_LENGTH.size
+    header_length = FLW_HEADER_LENGTH.unpack(buffer[len(FLW_MAGIC):header_start])[0]
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]).decode("utf-8"))
+    payload_offset = _align_offset(header_start + header_length)
+    loaded_model_weights = []
+    for layer in header["layers"]:
+        dtype = np.dtype(layer["dtype"])
+        layer_start = payload_offset + layer["offset"]
+        loaded_model_weights.append(np.frombuffer(
+            buffer, dtype=dtype, count=int(np.prod(layer["shape"])), offset=layer_start
+        ).reshape(layer["shape"]))
+    return loaded_model_weights, header.get("metadata", {})
+
+
+def _save_flw_weights(weights_model, model_weights_path, metadata=None):
+    """
+    Saves a list of layers' weights in the binary weights format (flw).
+    The file contains a magic number, the length of the json header, the header
+    (dtype, shape and offset of each layer, optional metadata) and the contiguous
+    payload of the layers
+    :param weights_model: list of the layers' weights
+    :param model_weights_path: file path in which the weights will be saved
+    :param metadata: (optional) json serializable dictionary saved in the header
+    :return:
+    """
+    layers, layers_header, header, payload_offset, total_size = \
+        flw_layout(weights_model, metadata)
+    with open(model_weights_path, "wb") as file_write:
+        file_write.write(FLW_MAGIC)
+        file_write.write(FLW_HEADER_LENGTH.pack(len(header)))
+        file_write.write(header)
+        for layer_weights, layer_header in zip(layers, layers_header):
+            file_write.seek(payload_offset + layer_header["offset"])
+            file_write.write(layer_weights.tobytes())
+        file_write.truncate(total_size)
+
+
+def _load_flw_weights(model_weights_path):
+    """
+    Loads a list of layers' weights from a file in the binary weights format (flw).
+    The layers are read-only views on a memory map of the file, so no data is
+    parsed nor copied
+    :param model_weights_path: file path in which the weights have been saved
+    :return: (list of the layers' weights, metadata saved in the header)
+    """
+    with open(model_weights_path, "rb") as file_read:
+        prefix = file_read.read(len(FLW_MAGIC) + FLW_HEADER_LENGTH.size)
+        if prefix[:len(FLW_MAGIC)] != FLW_MAGIC:
+            logger.error("The file %s is not a valid flw file", model_weights_path)
+            raise MalformedWeightsFileError("Error in the flw file, the magic number is not valid")
+        header_length = FLW_HEADER_LENGTH.unpack(prefix[len(FLW_MAGIC):])[0]
+        header = json.loads(file_read.read(header_length).decode("utf-8"))
+    payload_offset = _align_offset(len(FLW_MAGIC) + FLW_HEADER_LENGTH.size + header_length)
+    payload_size = max(
+        [
+            layer["offset"] + np.dtype(layer["dtype"]).itemsize * int(np.prod(layer["shape"]))
+            for layer in header["layers"]
+        ],
+        default=0
+    )
+    if payload_size == 0:
+        payload = np.empty(0, dtype=np.uint8)
+    else:
+        payload = np.memmap(
+            model_weights_path, dtype=np.uint8, mode="r",
+            offset=payload_offset, shape=(payload_size,)
+        )
+    loaded_model_weights = []
+    for layer in header["layers"]:
+        dtype = np.dtype(layer["dtype"])
+        layer_size = dtype.itemsize * int(np.prod(layer["shape"]))
+        layer_bytes = payload[layer["offset"]:layer["offset"] + layer_size]
+        loaded_model_weights.append(layer_bytes.view(dtype).reshape(layer["shape"]))
+    return loaded_model_weights, header.get("metadata", {})
+
+
+def _save_cid_weights(weights_model, model_weights_path, metadata=None, content_store=None):
+    """
+    Saves a list of layers' weights in a content-addressed store and writes the pointer
+    file (.cid) that refers to them
+    :param weights_model: list of the layers' weights
+    :param model_weights_path: file path of the pointer file
+    :param metadata: (optional) json serializable dictionary saved with the weights
+    :param content_store: (optional) instance of ContentAddressedStore, if None the store
+        in the directory of the pointer file is used
+    :return:
+    """
+    if content_store is None:
+        content_store = ContentAddressedStore(os.path.join(
+            os.path.dirname(os.path.abspath(model_weights_path)), CONTENT_STORE_DEFAULT_DIRECTORY
+        ))
+    cid = content_store.put_weights(weights_model, metadata)
+    write_weights_cid(model_weights_path, cid, content_store.store_path)
+
+
+def _load_cid_weights(model_weights_path):
+    """
+    Loads a list of layers' weights referred by a pointer file (.cid), the layers
+    are read-only memory maps of the store's chunks
+    :param model_weights_path: file path of the pointer file
+    :return: (list of the layers' weights, metadata saved with the weights)
+    """
+    cid, store_path = read_weights_cid(model_weights_path)
+    return ContentAddressedStore(store_path).get_weights(cid)
+
+
+# weights' file formats supported, the key is the file extension while the
+# value is the pair (saver, loader)
+WEIGHTS_FORMATS = {
+    ".json": (_save_json_weights, _load_json_weights),
+    ".flw": (_save_flw_weights, _load_flw_weights),
+    ".cid": (_save_cid_weights, _load_cid_weights),
+}
+# extension of the pointer files to the weights saved in a content-addressed store
+CID_FORMAT = ".cid"
+# weights' file formats whose decoding holds the GIL, so they are decoded in processes
+PROCESS_DECODED_FORMATS = {".json"}
+
+
+def _get_weights_format(model_weights_path):
+    """
+    Returns the pair (saver, loader) related to the extension of a weights' file
+    :param model_weights_path: file path to the model's weights
+    :return: (saver, loader) functions of the weights' format
+    """
+    suffix = pathlib.Path(model_weights_path).suffix
+    if suffix not in WEIGHTS_FORMATS:
+        logger.error("The file path %s is not a valid weights file", model_weights_path)
+        raise IncorrectExtensionFileError(
+            "Error in the file extension, one of %s is required" % list(WEIGHTS_FORMATS)
+        )
+    return WEIGHTS_FORMATS[suffix]
+
+
+def _check_content_store(weights_path, content_store):
+    """
+    Checks that a content-addressed store is given only for the pointer files
+    :param weights_path: file path to the weights
+    :param content_store: instance of ContentAddressedStore or None
+    :return:
+    """
+    if content_store is not None and pathlib.Path(weights_path).suffix != CID_FORMAT:
+        logger.error("The file path %s is not a pointer to a store", weights_path)
+        raise IncorrectExtensionFileError("Error in the file extension, cid is required")
+
+
+def save_fl_weights(weights, weights_path, metadata=None, content_store=None):
+    """
+    Saves a list of layers' weights in a json file, in a binary flw file or in a
+    content-addressed store (cid pointer file), according to the extension of the file path
+    :param weights: list of the layers' weights
+    :param weights_path: file path in which the weights will be saved
+    :param metadata: (optional) dictionary saved with the weights, json files do not support it
+    :param content_store: (optional) instance of ContentAddressedStore used by the cid files
+    :return:
+    """
+    save_weights, _ = _get_weights_format(weights_path)
+    _check_content_store(weights_path, content_store)
+    if content_store is None:
+        save_weights(weights, weights_path, metadata)
+    else:
+        save_weights(weights, weights_path, metadata, content_store)
+    logger.info("Weights saved in %s", weights_path)
+
+
+def load_fl_weights(weights_path):
+    """
+    Loads a list of layers' weights from a json file, from a binary flw file or from a
+    content-addressed store (cid pointer file), according to the extension of the file path
+    :param weights_path: file path in which the weights have been saved
+    :return: (list of the layers' weights, metadata saved with the weights)
+    """
+    _, load_weights = _get_weights_format(weights_path)
+    weights, metadata = load_weights(weights_path)
+    logger.info("Loaded weights from %s", weights_path)
+    return weights, metadata
+
+
+def float32_weights(weights):
+    """
+    Narrows to float32 the floating layers wider than float32, the other layers
+    (integer or float16 ones, e.g. the compressed updates) are kept as they are
+    :param weights: list of the layers' weights
+    :return: list of the layers' weights
+    """
+    return [
+        layer_weights.astype(np.float32)
+        if layer_weights.dtype.kind == "f" and layer_weights.dtype.itemsize > 4
+        else layer_weights
+        for layer_weights in map(np.asarray, weights)
+    ]
+
+
+def save_fl_model_weights(model, model_weights_path, content_store=None):
+    """
+    Saves the model's weights in a json file, in a binary flw file or in a
+    content-addressed store (cid pointer file), according to the extension of the file path
+    :param model: model that contains the weights to save
+    :param model_weights_path: file path in which the model's weights will be saved
+    :param content_store: (optional) instance of ContentAddressedStore used by the cid files
+    :return:
+    """
+    save_weights, _ = _get_weights_format(model_weights_path)
+    _check_content_store(model_weights_path, content_store)
+    # the model's weights are saved in float32, whatever the dtype they have been computed in
+    model_weights = float32_weights(model.get_weights())
+    if content_store is None:
+        save_weights(model_weights, model_weights_path)
+    else:
+        save_weights(model_weights, model_weights_path, None, content_store)
     logger.info("Model's weights saved in %s", model_weights_path)
 
 
 def load_fl_model_weights(model_weights_path):
     """
-    Loads the model's weights
+    Loads the model's weights from a json file, from a binary flw file or from a
+    content-addressed store (cid pointer file), according to the extension of the file path
     :param model_weights_path: file path in which the model's weights has been saved
     :return: loaded model's weights
     """
-    if pathlib.Path(model_weights_path).suffix != ".json":
-        logger.error("The file path %s is not a json file", model_weights_path)
-        raise IncorrectExtensionFileError("Error in the file extension, json is required")
-    with open(model_weights_path, "r") as file_read:
-        model_weights = json.load(file_read)
+    _, load_weights = _get_weights_format(model_weights_path)
+    loaded_model_weights, _ = load_weights(model_weights_path)
     logger.info("Loaded model's weights from %s", model_weights_path)
-    loaded_model_weights = [np.array(layer_weights) for layer_weights in model_weights]
     return loaded_model_weights
+
+
+class WeightsLoadingPool:
+    """ This class is responsible to load the models' weights in background:
+    the formats that have to be parsed (json) are decoded in a pool of processes,
+    while the binary formats are loaded in a pool of threads """
+
+    def __init__(self, max_workers=None):
+        """
+        Initializes the pool, the executors are created at the first request
+        :param max_workers: maximum number of workers of each executor
+        """
+        self.max_workers = max_workers
+        self._process_executor = None
+        self._thread_executor = None
+
+    def _get_executor(self, model_weights_path):
+        """
+        Returns the executor used to load a given weights' file
+        :param model_weights_path: file path to the model's weights
+        :return: the executor
+        """
+        if pathlib.Path(model_weights_path).suffix in PROCESS_DECODED_FORMATS:
+            if self._process_executor is None:
+                # spawn avoids forking a process that already runs tensorflow threads
+                self._process_executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._process_executor
+        if self._thread_executor is None:
+            self._thread_executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="weights-loading"
+            )
+        return self._thread_executor
+
+    def submit(self, model_weights_path, load_function, *args):
+        """
+        Schedules the loading of the model's weights
+        :param model_weights_path: file path in which the model's weights has been saved
+        :param load_function: function that loads the weights (e.g. load_fl_model_weights),
+            it receives the file path followed by args
+        :param args: additional arguments of load_function
+        :return: future of the loaded model's weights
+        """
+        # the extension is checked immediately, not in the worker
+        _get_weights_format(model_weights_path)
+        return self._get_executor(model_weights_path).submit(
+            load_function, model_weights_path, *args
+        )
+
+    def shutdown(self, wait=True):
+        """
+        Shuts down the executors
+        :param wait: if it is True, waits for the pending loadings
+        :return:
+        """
+        for executor in (self._process_executor, self._thread_executor):
+            if executor is not None:
+                executor.shutdown(wait=wait)
+        self._process_executor = None
+        self._thread_executor = None
@@ -0,0 +1,190 @@
+"""
+This module contains the journal of the federated rounds: an append-only file with one
+json record for each round closed by the aggregator (contributions, evaluations, timings,
+hashes of the uploads), plus the periodic checkpoints of the global model's weights,
+from which a crashed aggregator resumes without rerunning the completed rounds
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedWeightsFileError
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import float32_weights, \
+    load_fl_weights, save_fl_weights
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# record of a closed round
+ROUND_RECORD = "round"
+# record of the evaluation on the test set of a round's global model
+TEST_EVALUATION_RECORD = "test_evaluation"
+# record that discards the previous records of the given round and of the next ones
+ROLLBACK_RECORD = "rollback"
+# sub-directory of the journal's directory that contains the checkpoints
+CHECKPOINTS_DIRECTORY = "checkpoints"
+# number of checkpoints kept, the older ones are removed
+CHECKPOINTS_KEPT = 2
+# size of the blocks read to compute the hash of a file
+FILE_DIGEST_BLOCK_SIZE = 1024 ** 2
+
+
+def file_digest(file_path):
+    """
+    Computes the hash of the content of a file
+    :param file_path: path to the file
+    :return: hexadecimal hash of the file
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, "rb") as file_read:
+        for block in iter(lambda: file_read.read(FILE_DIGEST_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    """
+    Converts the numpy values of the records in json serializable values
+    :param value: value not serializable by the json module
+    :return: serializable value
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"The value {value!r} is not json serializable")
+
+
+class RoundJournal:
+    """
+    This class represents the journal of the rounds. Each record is appended as a json
+    line and flushed to the disk, so a crash can only truncate the last record, which is
+    ignored when the journal is read. The checkpoints of the global model's weights are
+    saved next to the journal and referred by the records with their hash
+    """
+
+    def __init__(self, journal_path, checkpoint_interval=1):
+        """
+        Initializes the journal, its directory is created if it does not exist
+        :param journal_path: file path to the journal
+        :param checkpoint_interval: number of rounds between two checkpoints of the
+            global model's weights (the final weights are always saved)
+        """
+        if checkpoint_interval <= 0:
+            logger.error("The checkpoint interval provided is not valid: %d is not > 0",
+                         checkpoint_interval)
+            raise ValueError("The checkpoint interval must be a positive integer")
+        self.journal_path = journal_path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints_path = os.path.join(
+            os.path.dirname(os.path.abspath(journal_path)), CHECKPOINTS_DIRECTORY
+        )
+        Path(self.checkpoints_path).mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        """
+        Appends a record to the journal and flushes it to the disk
+        :param record: json serializable dictionary with the type of the record
+        :return:
+        """
+        line = json.dumps(record, default=_json_default) + "\n"
+        with self._lock, open(self.journal_path, "a") as file_append:
+            file_append.write(line)
+            file_append.flush()
+            os.fsync(file_append.fileno())
+
+    def rollback(self, idx_round):
+        """
+        Discards the records of a round and of the next ones, e.g. because they have to
+        be executed again
+        :param idx_round: first round discarded
+        :return:
+        """
+        self.append({"type": ROLLBACK_RECORD, "round": idx_round})
+
+    def read_records(self):
+        """
+        Reads the records of the journal that have not been discarded by a rollback.
+        A malformed record (e.g. truncated by a crash) ends the journal
+        :return: list of the records in the order they have been appended
+        """
+        records = []
+        if not os.path.exists(self.journal_path):
+            return records
+        with open(self.journal_path, "r") as file_read:
+            for idx_line, line in enumerate(file_read):
+                try:
+                    record = json.loads(line)
+                    record_type, idx_round = record["type"], record["round"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(
+                        "The record %d of the journal %s is malformed, the next records "
+                        "are ignored", idx_line, self.journal_path
+                    )
+                    break
+                if record_type == ROLLBACK_RECORD:
+                    records = [
+                        kept_record for kept_record in records if kept_record["round"] < idx_round
+                    ]
+                else:
+                    records.append(record)
+        return records
+
+    def is_checkpoint_round(self, idx_round, is_final):
+        """
+        Checks if the global model's weights at the end of a round have to be saved
+        :param idx_round: round closed
+        :param is_final: True if it is the last round
+        :return:    True if a checkpoint has to be saved
+                    False otherwise
+        """
+        return is_final or (idx_round + 1) % self.checkpoint_interval == 0
+
+    def _checkpoint_file_path(self, idx_round):
+        """
+        Returns the file path of the checkpoint saved at the end of a round
+        :param idx_round: round of the checkpoint
+        :return: file path to the checkpoint
+        """
+        return os.path.join(self.checkpoints_path, "checkpoint_round_" + str(idx_round) + ".flw")
+
+    def write_checkpoint(self, idx_round, weights):
+        """
+        Saves the global model's weights at the end of a round. The checkpoint is written
+        in a temporary file and renamed, and the older checkpoints are removed
+        :param idx_round: round closed
+        :param weights: weights of the global model
+        :return: dictionary with the path and the hash of the checkpoint
+        """
+        checkpoint_path = self._checkpoint_file_path(idx_round)
+        temporary_path = os.path.join(
+            self.checkpoints_path, ".checkpoint_round_" + str(idx_round) + ".flw"
+        )
+        save_fl_weights(float32_weights(weights), temporary_path, {"round": idx_round})
+        os.replace(temporary_path, checkpoint_path)
+        checkpoint_paths = sorted(
+            Path(self.checkpoints_path).glob("checkpoint_round_*.flw"),
+            key=lambda path: int(path.stem.rsplit("_", 1)[1])
+        )
+        for old_checkpoint_path in checkpoint_paths[:-CHECKPOINTS_KEPT]:
+            os.remove(old_checkpoint_path)
+        return {"path": checkpoint_path, "hash": file_digest(checkpoint_path)}
+
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        """
+        Loads the weights of a checkpoint, checking its hash
+        :param checkpoint: dictionary with the path and the hash of the checkpoint
+        :return: list of the layers' weights
+        """
+        if file_digest(checkpoint["path"]) != checkpoint["hash"]:
+            logger.error("The checkpoint %s does not match its hash", checkpoint["path"])
+            raise MalformedWeightsFileError("The checkpoint has been modified")
+        weights, _ = load_fl_weights(checkpoint["path"])
+        # the checkpoint may be removed while the weights are in use
+        return [np.array(layer_weights) for layer_weights in weights]
@@ -0,0 +1,158 @@
+"""
+This module contains the policy used by the aggregator to select the participants
+of each round and to close a round without waiting for the stragglers, in the
+synchronous mode or in the buffered asynchronous one
+"""
+import math
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedConfigurationJson
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# the late uploads are discarded
+LATE_UPLOADS_DROP = "drop"
+# the late uploads are used as the participants' uploads of the next round
+LATE_UPLOADS_NEXT_ROUND = "next_round"
+
+# default maximum number of rounds between the global model an asynchronous update
+# has been trained from and the global model it is merged into
+ASYNCHRONOUS_MAX_STALENESS = 4
+# default exponent of the polynomial down-weighting of the stale updates
+ASYNCHRONOUS_STALENESS_EXPONENT = 0.5
+
+
+class RoundPolicy:
+    """
+    This class represents the policy of the federated rounds: the participants
+    sampled for each round, the minimum quorum of uploads and the wall-clock deadline
+    after which a round is closed with the uploads received so far.
+    In the asynchronous mode (FedBuff) a round is closed every buffer_size uploads,
+    which can be trained from the global models of the previous rounds: their weight
+    in the aggregation is reduced according to their staleness
+    """
+
+    def __init__(self, quorum=1.0, deadline=None, participants_per_round=None,
+                 late_uploads=LATE_UPLOADS_DROP, seed=None, asynchronous=False,
+                 buffer_size=None, max_staleness=ASYNCHRONOUS_MAX_STALENESS,
+                 staleness_exponent=ASYNCHRONOUS_STALENESS_EXPONENT):
+        """
+        Initializes the policy
+        :param quorum: minimum fraction of the round's participants whose uploads are
+            required to close the round
+        :param deadline: (optional) seconds after which the round is closed as soon as the
+            quorum is reached. If None the round is closed as soon as the quorum is reached
+        :param participants_per_round: (optional) number of participants randomly sampled
+            for each round, if None all the participants take part in each round
+        :param late_uploads: policy of the uploads received after the round is closed,
+            "drop" to discard them or "next_round" to use them in the next round
+        :param seed: (optional) seed used to sample the participants of the rounds
+        :param asynchronous: if True the global model is updated every buffer_size uploads,
+            trained from any of the last max_staleness global models
+        :param buffer_size: (optional) number of uploads merged in each asynchronous round,
+            if None the number of participants
+        :param max_staleness: maximum staleness of the asynchronous uploads,
+            the older ones are dropped
+        :param staleness_exponent: exponent a of the weight 1 / (1 + staleness) ** a
+            of the asynchronous uploads
+        """
+        if not 0.0 < quorum <= 1.0 or (deadline is not None and deadline < 0) \
+                or (participants_per_round is not None and participants_per_round <= 0) \
+                or late_uploads not in (LATE_UPLOADS_DROP, LATE_UPLOADS_NEXT_ROUND) \
+                or (buffer_size is not None and buffer_size <= 0) \
+                or max_staleness < 0 or staleness_exponent < 0:
+            logger.error(
+                "The round policy is not valid: %s",
+                [quorum, deadline, participants_per_round, late_uploads, buffer_size,
+                 max_staleness, staleness_exponent]
+            )
+            raise ValueError("The round policy's parameters are not valid")
+        self.quorum = quorum
+        self.deadline = deadline
+        self.participants_per_round = participants_per_round
+        self.late_uploads = late_uploads
+        self.seed = seed
+        self.asynchronous = asynchronous
+        self.buffer_size = buffer_size
+        self.max_staleness = max_staleness
+        self.staleness_exponent = staleness_exponent
+
+    @classmethod
+    def from_config(cls, round_policy_config):
+        """
+        Creates the policy from the round policy of an announcement's configuration
+        :param round_policy_config: dictionary with the policy's parameters
+        :return: instance of RoundPolicy class
+        """
+        try:
+            return cls(**round_policy_config)
+        except TypeError as type_error:
+            logger.error("The round policy %s contains unknown keys", round_policy_config)
+            raise MalformedConfigurationJson from type_error
+
+    def sample_participants(self, participant_ids, idx_round):
+        """
+        Samples the participants of a round, the sampling of each round is
+        reproducible if a seed is given
+        :param participant_ids: participants' identifier
+        :param idx_round: round of the sampling
+        :return: list of the participants' identifier of the round
+        """
+        # in the asynchronous mode any participant can upload at any time
+        if self.asynchronous or self.participants_per_round is None \
+                or self.participants_per_round >= len(participant_ids):
+            return participant_ids
+        seed = None if self.seed is None else [self.seed, idx_round]
+        sampled_indices = np.random.default_rng(seed).choice(
+            len(participant_ids), self.participants_per_round, replace=False
+        )
+        return [participant_ids[idx_participant] for idx_participant in sorted(sampled_indices)]
+
+    def round_size(self, n_participants):
+        """
+        Returns the number of uploads expected in a round
+        :param n_participants: number of participants of the round
+        :return: number of uploads, buffer_size in the asynchronous mode
+        """
+        if self.asynchronous and self.buffer_size is not None:
+            # each participant uploads at most once in a round
+            return min(self.buffer_size, n_participants)
+        return n_participants
+
+    def staleness_weights(self, staleness):
+        """
+        Computes the weights of the asynchronous uploads according to their staleness
+        :param staleness: list of the rounds elapsed since the global model each
+            upload has been trained from
+        :return: list of the weights, 1 for the uploads trained from the current global model
+        """
+        return [
+            (1.0 + upload_staleness) ** -self.staleness_exponent
+            for upload_staleness in staleness
+        ]
+
+    def quorum_size(self, n_participants):
+        """
+        Returns the minimum number of uploads required to close a round
+        :param n_participants: number of participants of the round
+        :return: minimum number of uploads
+        """
+        return min(n_participants, max(1, math.ceil(self.quorum * n_participants)))
+
+    def is_round_completed(self, n_uploads, n_participants, elapsed_time):
+        """
+        Checks if a round can be closed
+        :param n_uploads: number of uploads received in the round
+        :param n_participants: number of participants of the round
+        :param elapsed_time: seconds elapsed since the start of the round
+        :return:    True if all the participants uploaded their weights or the quorum is
+                    reached (after the deadline if any)
+                    False otherwise
+        """
+        if n_uploads >= n_participants:
+            return True
+        if n_uploads < self.quorum_size(n_participants):
+            return False
+        return self.deadline is None or elapsed_time >= self.deadline
@@ -0,0 +1,256 @@
+"""
+This module contains the transport of the models' weights between processes of the same
+host: the weights are written in named shared memory segments (binary weights format)
+and the processes are notified through a multiprocessing connection
+"""
+import threading
+import time
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import flw_layout, \
+    read_flw_buffer, write_flw_buffer
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# type of the message sent by the validator when the global model of a round is published
+GLOBAL_MODEL_MESSAGE = "global_model"
+# type of the message sent by a participant when its local model of a round is published
+LOCAL_UPDATE_MESSAGE = "local_update"
+# default seconds waited for the validator's notification channel
+NOTIFICATION_CONNECT_TIMEOUT = 60.0
+
+# names of the segments created by this process, that are tracked until they are unlinked
+_created_segment_names = set()
+
+
+def parse_notification_address(address):
+    """
+    Parses the address of a notification channel
+    :param address: "host:port" for a TCP socket, otherwise the path of a Unix socket
+    :return: address accepted by multiprocessing.connection
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def write_weights_segment(weights, segment_name, metadata=None):
+    """
+    Creates a shared memory segment that contains the weights in the binary weights format.
+    The caller owns the segment and has to unlink it when it is not needed anymore
+    :param weights: list of the layers' weights
+    :param segment_name: name of the segment
+    :param metadata: (optional) json serializable dictionary saved with the weights
+    :return: instance of SharedMemory
+    """
+    weights_layout = flw_layout(weights, metadata)
+    segment = SharedMemory(name=segment_name, create=True, size=max(1, weights_layout[-1]))
+    _created_segment_names.add(segment.name)
+    write_flw_buffer(segment.buf, weights_layout)
+    logger.debug("Weights written in the shared memory segment %s", segment_name)
+    return segment
+
+
+def _attach_segment(segment_name):
+    """
+    Attaches an existing shared memory segment without tracking it, so the segment is not
+    unlinked when the process that only reads it exits
+    :param segment_name: name of the segment
+    :return: instance of SharedMemory
+    """
+    try:
+        return SharedMemory(name=segment_name, track=False)
+    except TypeError:
+        # the track argument is available from python 3.13
+        segment = SharedMemory(name=segment_name)
+        if segment.name not in _created_segment_names:
+            resource_tracker.unregister(segment._name, "shared_memory")  # pylint: disable=protected-access
+        return segment
+
+
+def read_weights_segment(segment_name):
+    """
+    Maps the weights of a shared memory segment, the layers are views on the segment so
+    no data is copied. The segment can be closed only after the views are released
+    :param segment_name: name of the segment
+    :return: (instance of SharedMemory, list of the layers' weights, metadata)
+    """
+    segment = _attach_segment(segment_name)
+    weights, metadata = read_flw_buffer(segment.buf)
+    return segment, weights, metadata
+
+
+def release_segment(segment, unlink=False):
+    """
+    Closes a shared memory segment and optionally removes it
+    :param segment: instance of SharedMemory
+    :param unlink: if it is True, the segment is removed (only by its owner)
+    :return:
+    """
+    try:
+        segment.close()
+    except BufferError:
+        # a view on the segment is still referenced, the mapping is released with it
+        logger.warning("The shared memory segment %s is still in use", segment.name)
+    if unlink:
+        _created_segment_names.discard(segment.name)
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            logger.debug("The shared memory segment %s was already removed", segment.name)
+
+
+class NotificationServer:
+    """
+    This class represents the side of the notification channel that accepts the
+    connections (validator): each message received is passed to a callback, while
+    the messages sent are broadcast to all the connected processes
+    """
+
+    def __init__(self, address, authkey, on_message):
+        """
+        Initializes the server and starts accepting the connections
+        :param address: address of the channel (see parse_notification_address)
+        :param authkey: bytes used to authenticate the connections
+        :param on_message: function called with each message received
+        """
+        self.address = parse_notification_address(address)
+        self._authkey = authkey
+        self._listener = Listener(self.address, authkey=authkey)
+        self._on_message = on_message
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._is_closed = False
+        self._accept_thread = threading.Thread(
+            target=self._accept_connections, name="notification-accept", daemon=True
+        )
+        self._accept_thread.start()
+
+    def _accept_connections(self):
+        """
+        Accepts the connections until the server is closed
+        :return:
+        """
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError:
+                logger.warning("A connection to the notification channel was not authenticated")
+                continue
+            except OSError:
+                return
+            if self._is_closed:
+                connection.close()
+                return
+            with self._connections_lock:
+                self._connections.append(connection)
+            threading.Thread(
+                target=self._receive_messages, args=(connection,),
+                name="notification-receive", daemon=True
+            ).start()
+
+    def _receive_messages(self, connection):
+        """
+        Receives the messages of a connection until it is closed
+        :param connection: connection of a process
+        :return:
+        """
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                self._on_message(message)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The message %s cannot be processed", message)
+        with self._connections_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def broadcast(self, message):
+        """
+        Sends a message to all the connected processes
+        :param message: picklable message
+        :return:
+        """
+        with self._connections_lock:
+            for connection in list(self._connections):
+                try:
+                    connection.send(message)
+                except OSError:
+                    logger.warning("A process of the notification channel is disconnected")
+                    self._connections.remove(connection)
+
+    def close(self):
+        """
+        Stops accepting the connections and closes the connected ones
+        :return:
+        """
+        self._is_closed = True
+        try:
+            # the blocking accept is woken up by a last connection
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._accept_thread.join()
+        self._listener.close()
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
+class NotificationClient:
+    """
+    This class represents the side of the notification channel that connects to the
+    server (participant)
+    """
+
+    def __init__(self, address, authkey, connect_timeout=NOTIFICATION_CONNECT_TIMEOUT):
+        """
+        Initializes the client, waiting for the server to be available
+        :param address: address of the channel (see parse_notification_address)
+        :param authkey: bytes used to authenticate the connection
+        :param connect_timeout: maximum seconds waited for the server
+        """
+        address = parse_notification_address(address)
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self._connection = Client(address, authkey=authkey)
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                if time.monotonic() >= deadline:
+                    logger.error("The notification channel %s is not available", address)
+                    raise
+                time.sleep(0.5)
+
+    def send(self, message):
+        """
+        Sends a message to the server
+        :param message: picklable message
+        :return:
+        """
+        self._connection.send(message)
+
+    def receive(self, timeout=None):
+        """
+        Receives a message from the server
+        :param timeout: (optional) maximum seconds waited, if None waits indefinitely
+        :return: the message or None if the timeout expired
+        """
+        if timeout is not None and not self._connection.poll(timeout):
+            return None
+        return self._connection.recv()
+
+    def close(self):
+        """
+        Closes the connection
+        :return:
+        """
+        self._connection.close()
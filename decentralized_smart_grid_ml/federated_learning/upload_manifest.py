@@ -0,0 +1,311 @@
+"""
+This module contains the manifests of the participants' uploads: the local model's weights
+file is published with a small json manifest next to it (participant, round, number of
+training samples, hash and format of the weights file), so the aggregator identifies the
+uploads from their content instead of parsing the file paths. The aggregator publishes
+the participants selected for each round in a round manifest next to the global model
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+from decentralized_smart_grid_ml.exceptions import MalformedUploadManifestError
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import WEIGHTS_FORMATS
+from decentralized_smart_grid_ml.federated_learning.round_journal import file_digest
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# extension of the manifests' files
+MANIFEST_FORMAT = ".manifest"
+# extension of the round manifests' files, published with the global models
+ROUND_MANIFEST_FORMAT = ".round"
+# trailing identifier of a directory name, e.g. participant_12 or region_3
+_DIRECTORY_ID_PATTERN = re.compile(r"_(\d+)$")
+
+
+def round_from_file_name(file_name_without_extension):
+    """
+    Extracts the round from the name of a model's weights file
+    :param file_name_without_extension: file name, e.g. weights_round_12
+    :return: round of the file or None if the name is malformed
+    """
+    name_parts = file_name_without_extension.rsplit("round_", 1)
+    if len(name_parts) != 2 or not name_parts[1].isdigit():
+        return None
+    return int(name_parts[1])
+
+
+def upload_manifest_path(weights_path):
+    """
+    Returns the file path of the manifest of a weights file
+    :param weights_path: file path to the local model's weights
+    :return: file path to the manifest, next to the weights file
+    """
+    return os.path.splitext(weights_path)[0] + MANIFEST_FORMAT
+
+
+def round_manifest_file_name(idx_round):
+    """
+    Returns the file name of the manifest of a round, published by the aggregator
+    :param idx_round: round of the manifest
+    :return: file name of the manifest, e.g. validator_weights_round_12.round
+    """
+    return "validator_weights_round_" + str(idx_round) + ROUND_MANIFEST_FORMAT
+
+
+def write_round_manifest(manifest_path, idx_round, participant_ids):
+    """
+    Writes the manifest of a round, before its global model is published
+    :param manifest_path: file path to the manifest
+    :param idx_round: round of the manifest
+    :param participant_ids: identifiers of the participants selected for the round
+    :return:
+    """
+    manifest = {
+        "round": idx_round,
+        "participant_ids": [int(participant_id) for participant_id in participant_ids]
+    }
+    with open(manifest_path, "w") as file_write:
+        json.dump(manifest, file_write)
+
+
+def read_round_participants(manifest_path):
+    """
+    Reads the participants selected for a round from its manifest
+    :param manifest_path: file path to the manifest
+    :return: identifiers of the participants selected or None if the manifest does not exist
+    """
+    try:
+        with open(manifest_path, "r") as file_read:
+            manifest = json.load(file_read)
+    except FileNotFoundError:
+        return None
+    except ValueError as error:
+        logger.error("The round manifest %s is not a json file", manifest_path)
+        raise MalformedUploadManifestError("Error in the round manifest") from error
+    participant_ids = manifest.get("participant_ids") if isinstance(manifest, dict) else None
+    if not isinstance(participant_ids, list):
+        logger.error("The round manifest %s is not valid", manifest_path)
+        raise MalformedUploadManifestError("Error in the round manifest")
+    return participant_ids
+
+
+class UploadManifest:
+    """
+    This class represents the manifest of an upload, i.e. the local model's weights
+    of a participant in a round
+    """
+
+    def __init__(self, participant_id, idx_round, weights_path, weights_hash=None,
+                 sample_count=None):
+        """
+        Initializes the manifest
+        :param participant_id: identifier of the participant
+        :param idx_round: round of the upload
+        :param weights_path: file path to the local model's weights
+        :param weights_hash: (optional) hash of the weights file, None if it is not known
+        :param sample_count: (optional) number of samples the local model has been trained on
+        """
+        self.participant_id = participant_id
+        self.round = idx_round
+        self.weights_path = weights_path
+        self.weights_hash = weights_hash
+        self.sample_count = sample_count
+
+    @property
+    def weights_format(self):
+        """
+        Returns the format of the weights file
+        :return: extension of the weights file
+        """
+        return Path(self.weights_path).suffix
+
+    def verify_weights(self):
+        """
+        Checks that the weights file has not been modified since the manifest was written
+        :return:
+        """
+        if self.weights_hash is not None:
+            verify_weights_file(self.weights_path, self.weights_hash)
+
+
+def verify_weights_file(weights_path, weights_hash):
+    """
+    Checks that a weights file matches the hash of its manifest
+    :param weights_path: file path to the weights
+    :param weights_hash: hash of the weights file in its manifest
+    :return:
+    """
+    if file_digest(weights_path) != weights_hash:
+        logger.error("The file %s does not match the hash of its manifest", weights_path)
+        raise MalformedUploadManifestError("The uploaded file does not match its manifest")
+
+
+def load_verified_weights(weights_path, weights_hash, load_function, *args):
+    """
+    Checks a weights file against the hash of its manifest, then loads it. It is executed
+    by the workers of the loading pool, so the file is hashed off the ingestion's thread
+    :param weights_path: file path to the weights
+    :param weights_hash: hash of the weights file in its manifest
+    :param load_function: function that loads the weights, it receives the file path
+        followed by args
+    :param args: additional arguments of load_function
+    :return: loaded weights
+    """
+    verify_weights_file(weights_path, weights_hash)
+    return load_function(weights_path, *args)
+
+
+def write_upload_manifest(weights_path, participant_id, idx_round, sample_count=None):
+    """
+    Writes the manifest of a weights file, once the weights file is complete
+    :param weights_path: file path to the local model's weights
+    :param participant_id: identifier of the participant
+    :param idx_round: round of the upload
+    :param sample_count: (optional) number of samples the local model has been trained on
+    :return: file path to the manifest
+    """
+    manifest_path = upload_manifest_path(weights_path)
+    manifest = {
+        "participant_id": participant_id,
+        "round": idx_round,
+        "sample_count": sample_count,
+        "weights_file": os.path.basename(weights_path),
+        "format": Path(weights_path).suffix,
+        "hash": file_digest(weights_path)
+    }
+    with open(manifest_path, "w") as file_write:
+        json.dump(manifest, file_write)
+    return manifest_path
+
+
+def read_upload_manifest(manifest_path):
+    """
+    Reads the manifest of an upload, the weights file is resolved in the manifest's directory
+    :param manifest_path: file path to the manifest
+    :return: instance of UploadManifest
+    """
+    with open(manifest_path, "r") as file_read:
+        try:
+            manifest = json.load(file_read)
+        except ValueError as error:
+            logger.error("The manifest %s is not a json file", manifest_path)
+            raise MalformedUploadManifestError("Error in the manifest") from error
+    try:
+        participant_id, idx_round = manifest["participant_id"], manifest["round"]
+        weights_file, weights_format = manifest["weights_file"], manifest["format"]
+        weights_hash, sample_count = manifest["hash"], manifest.get("sample_count")
+    except (KeyError, TypeError) as error:
+        logger.error("The manifest %s is not valid", manifest_path)
+        raise MalformedUploadManifestError("Error in the manifest") from error
+    if not all(isinstance(value, int) and not isinstance(value, bool)
+               for value in (participant_id, idx_round)) or idx_round < 0 \
+            or weights_format not in WEIGHTS_FORMATS \
+            or Path(weights_file).suffix != weights_format \
+            or os.path.basename(weights_file) != weights_file:
+        logger.error("The manifest %s is not valid", manifest_path)
+        raise MalformedUploadManifestError("Error in the manifest")
+    return UploadManifest(
+        participant_id, idx_round,
+        os.path.join(os.path.dirname(manifest_path), weights_file),
+        weights_hash, sample_count
+    )
+
+
+def legacy_upload_manifest(weights_path):
+    """
+    Builds the manifest of a weights file uploaded without it, from its path:
+    <directory>_<participant id>/<name>_round_<round>.<format>
+    :param weights_path: file path to the local model's weights
+    :return: instance of UploadManifest (without hash) or None if the path is malformed
+    """
+    path = Path(weights_path)
+    directory_id = _DIRECTORY_ID_PATTERN.search(path.parent.name)
+    idx_round = round_from_file_name(path.stem)
+    if directory_id is None or idx_round is None:
+        return None
+    return UploadManifest(int(directory_id.group(1)), idx_round, weights_path)
+
+
+class UploadIndex:
+    """
+    This class represents the index of the uploads received by an aggregator, by round
+    and participant. The uploads of a round that has not started yet are deferred until
+    the round starts. The index is not thread safe, the caller serializes the updates
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty index
+        """
+        # round -> participant's identifier -> manifest
+        self._rounds2uploads = {}
+        # round -> manifests deferred to the round
+        self._rounds2deferred = {}
+
+    def __len__(self):
+        return sum(len(uploads) for uploads in self._rounds2uploads.values())
+
+    def get(self, idx_round, participant_id):
+        """
+        Returns the upload of a participant in a round
+        :param idx_round: round of the upload
+        :param participant_id: identifier of the participant
+        :return: instance of UploadManifest or None if it has not been received
+        """
+        return self._rounds2uploads.get(idx_round, {}).get(participant_id)
+
+    def add(self, upload):
+        """
+        Indexes an upload
+        :param upload: instance of UploadManifest
+        :return:    True if the upload has been indexed
+                    False if the participant's upload of the round was already received
+        """
+        round_uploads = self._rounds2uploads.setdefault(upload.round, {})
+        if upload.participant_id in round_uploads:
+            return False
+        round_uploads[upload.participant_id] = upload
+        return True
+
+    def defer(self, upload):
+        """
+        Indexes an upload of a round that has not started yet
+        :param upload: instance of UploadManifest
+        :return:    True if the upload has been indexed
+                    False if the participant's upload of the round was already received
+        """
+        if not self.add(upload):
+            return False
+        self._rounds2deferred.setdefault(upload.round, []).append(upload)
+        return True
+
+    def pop_deferred(self, idx_round):
+        """
+        Returns the uploads deferred to a round, that is starting
+        :param idx_round: round of the uploads
+        :return: list of the manifests, in the order they have been received
+        """
+        return self._rounds2deferred.pop(idx_round, [])
+
+    def round_uploads(self, idx_round):
+        """
+        Returns the uploads received for a round
+        :param idx_round: round of the uploads
+        :return: list of the manifests, in the order they have been received
+        """
+        return list(self._rounds2uploads.get(idx_round, {}).values())
+
+    def discard_rounds_before(self, idx_round):
+        """
+        Removes the uploads of the rounds before a given one
+        :param idx_round: first round kept
+        :return:
+        """
+        for old_round in [
+            indexed_round for indexed_round in self._rounds2uploads if indexed_round < idx_round
+        ]:
+            del self._rounds2uploads[old_round]
+            self._rounds2deferred.pop(old_round, None)
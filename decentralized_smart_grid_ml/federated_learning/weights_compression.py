@@ -0,0 +1,238 @@
+"""
+This module contains the classes and functions used to upload the local model's
+update as a compressed delta from the global model's weights
+"""
+from abc import abstractmethod
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import NotValidCompressionMethod, \
+    MalformedWeightsFileError
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import \
+    load_fl_weights, save_fl_weights
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+class WeightsCompressorCreator:
+    """
+    This class contains the factory method used to create a
+    WeightsCompressor
+    """
+
+    @staticmethod
+    def factory_method(method, **compression_params):
+        """
+        Creates a WeightsCompressor instance
+        :param method: method used for the compression of the deltas
+        :param compression_params: parameters of the compression method
+        :return: WeightsCompressor instance
+        """
+        if method not in WEIGHTS_COMPRESSORS:
+            logger.error("The compression method '%s' is not valid", method)
+            raise NotValidCompressionMethod("The given compression method is not valid")
+        return WEIGHTS_COMPRESSORS[method](**compression_params)
+
+
+class WeightsCompressor:
+    """
+    Superclass that represents a WeightsCompressor. The compressed delta of each layer
+    is a fixed number of arrays, the information required to decompress it is saved
+    in the metadata of the weights file
+    """
+
+    method = None
+
+    @abstractmethod
+    def compress(self, delta_weights):
+        """
+        Compresses the delta of the model's weights
+        :param delta_weights: list of the layers' deltas
+        :return: (list of the compressed arrays, metadata of the compression)
+        """
+
+    @classmethod
+    @abstractmethod
+    def decompress(cls, compressed_arrays, metadata):
+        """
+        Decompresses the delta of the model's weights
+        :param compressed_arrays: list of the compressed arrays
+        :param metadata: metadata of the compression
+        :return: list of the layers' deltas
+        """
+
+
+class NoneCompressor(WeightsCompressor):
+    """
+    This class writes the delta of the model's weights without compression
+    """
+
+    method = "none"
+
+    def compress(self, delta_weights):
+        return list(delta_weights), {}
+
+    @classmethod
+    def decompress(cls, compressed_arrays, metadata):
+        return list(compressed_arrays)
+
+
+class Float16Compressor(WeightsCompressor):
+    """
+    This class casts the delta of the model's weights to half precision
+    """
+
+    method = "float16"
+
+    def compress(self, delta_weights):
+        compressed_arrays = [
+            np.asarray(layer_delta).astype(np.float16) for layer_delta in delta_weights
+        ]
+        return compressed_arrays, {}
+
+    @classmethod
+    def decompress(cls, compressed_arrays, metadata):
+        return [layer_delta.astype(np.float32) for layer_delta in compressed_arrays]
+
+
+class TopKCompressor(WeightsCompressor):
+    """
+    This class keeps only the largest (in absolute value) entries of the delta
+    of each layer. The entries discarded are accumulated in a residual added to
+    the delta of the next round (error feedback), so they are eventually sent
+    """
+
+    method = "topk"
+
+    def __init__(self, ratio=0.01):
+        """
+        Initializes the compressor
+        :param ratio: fraction of the entries of each layer that are sent
+        """
+        if not 0.0 < ratio <= 1.0:
+            logger.error("The ratio provided is not valid: %s is not in (0, 1]", ratio)
+            raise ValueError("The ratio must be in (0, 1]")
+        self.ratio = ratio
+        self.residuals = None
+
+    def compress(self, delta_weights):
+        if self.residuals is None:
+            self.residuals = [np.zeros(np.shape(layer_delta), dtype=np.float32)
+                              for layer_delta in delta_weights]
+        compressed_arrays = []
+        shapes = []
+        for layer_delta, residual in zip(delta_weights, self.residuals):
+            corrected_delta = (np.asarray(layer_delta, dtype=np.float32) + residual).ravel()
+            n_kept = max(1, int(np.ceil(self.ratio * corrected_delta.size)))
+            if n_kept < corrected_delta.size:
+                indices = np.argpartition(np.abs(corrected_delta), -n_kept)[-n_kept:]
+            else:
+                indices = np.arange(corrected_delta.size)
+            indices = np.sort(indices).astype(np.uint32)
+            values = corrected_delta[indices]
+            # the entries sent are removed from the residual
+            corrected_delta[indices] = 0.0
+            residual[...] = corrected_delta.reshape(residual.shape)
+            compressed_arrays.extend([indices, values])
+            shapes.append(list(np.shape(layer_delta)))
+        return compressed_arrays, {"shapes": shapes}
+
+    @classmethod
+    def decompress(cls, compressed_arrays, metadata):
+        delta_weights = []
+        for idx_layer, shape in enumerate(metadata["shapes"]):
+            indices = compressed_arrays[2 * idx_layer]
+            values = compressed_arrays[2 * idx_layer + 1]
+            layer_delta = np.zeros(int(np.prod(shape)), dtype=np.float32)
+            layer_delta[indices] = values
+            delta_weights.append(layer_delta.reshape(shape))
+        return delta_weights
+
+
+class Int8Compressor(WeightsCompressor):
+    """
+    This class quantizes the delta of each layer to 8 bits with a symmetric
+    per-layer scale
+    """
+
+    method = "int8"
+
+    def compress(self, delta_weights):
+        compressed_arrays = []
+        scales = []
+        for layer_delta in delta_weights:
+            layer_delta = np.asarray(layer_delta, dtype=np.float32)
+            max_abs = float(np.max(np.abs(layer_delta))) if layer_delta.size > 0 else 0.0
+            scale = max_abs / 127.0 if max_abs > 0.0 else 1.0
+            compressed_arrays.append(
+                np.clip(np.rint(layer_delta / scale), -127, 127).astype(np.int8)
+            )
+            scales.append(scale)
+        return compressed_arrays, {"scales": scales}
+
+    @classmethod
+    def decompress(cls, compressed_arrays, metadata):
+        return [
+            layer_delta.astype(np.float32) * np.float32(scale)
+            for layer_delta, scale in zip(compressed_arrays, metadata["scales"])
+        ]
+
+
+WEIGHTS_COMPRESSORS = {
+    compressor.method: compressor
+    for compressor in (NoneCompressor, Float16Compressor, TopKCompressor, Int8Compressor)
+}
+
+
+def save_weights_update(local_weights, reference_weights, weights_path, compressor,
+                        content_store=None):
+    """
+    Saves the update of the local model as the compressed delta from the reference weights
+    :param local_weights: list of the layers' weights of the local model
+    :param reference_weights: list of the layers' weights from which the local training started
+    :param weights_path: file path in which the update will be saved (flw or cid file)
+    :param compressor: WeightsCompressor instance
+    :param content_store: (optional) instance of ContentAddressedStore used by the cid files
+    :return:
+    """
+    delta_weights = [
+        np.asarray(local_layer, dtype=np.float32) - np.asarray(reference_layer, dtype=np.float32)
+        for local_layer, reference_layer in zip(local_weights, reference_weights)
+    ]
+    compressed_arrays, metadata = compressor.compress(delta_weights)
+    metadata["update"] = "delta"
+    metadata["compression"] = compressor.method
+    save_fl_weights(compressed_arrays, weights_path, metadata, content_store)
+
+
+def load_weights_update(weights_path, reference_weights):
+    """
+    Loads the weights of a local model: if the file contains a delta, the weights
+    are reconstructed adding it to the reference weights
+    :param weights_path: file path in which the update has been saved
+    :param reference_weights: list of the layers' weights from which the local training started
+    :return: list of the layers' weights of the local model
+    """
+    weights, metadata = load_fl_weights(weights_path)
+    if metadata.get("update") != "delta":
+        return weights
+    compression_method = metadata.get("compression")
+    if compression_method not in WEIGHTS_COMPRESSORS:
+        logger.error("The compression method of %s is not valid: %s",
+                     weights_path, compression_method)
+        raise MalformedWeightsFileError("The compression method is not valid")
+    delta_weights = WEIGHTS_COMPRESSORS[compression_method].decompress(weights, metadata)
+    if len(delta_weights) != len(reference_weights):
+        logger.error("The delta in %s has %d layers instead of %d",
+                     weights_path, len(delta_weights), len(reference_weights))
+        raise MalformedWeightsFileError("The delta does not match the reference weights")
+    reconstructed_weights = []
+    for layer_delta, reference_layer in zip(delta_weights, reference_weights):
+        if np.shape(layer_delta) != np.shape(reference_layer):
+            logger.error("The delta in %s does not match the reference weights", weights_path)
+            raise MalformedWeightsFileError("The delta does not match the reference weights")
+        reconstructed_weights.append(
+            (reference_layer + layer_delta).astype(np.asarray(reference_layer).dtype, copy=False)
+        )
+    return reconstructed_weights
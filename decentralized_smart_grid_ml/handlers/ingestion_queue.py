@@ -0,0 +1,246 @@
+"""
+This module contains the ingestion queue used by the handlers to process the files
+completed in a watched directory with a pool of worker threads
+"""
+import os
+import queue
+import threading
+from abc import abstractmethod
+
+from watchdog.events import FileSystemEventHandler
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# seconds between two checks of the size of the files still being written
+FILE_STABILITY_INTERVAL = 1.0
+
+
+class IngestionQueue:
+    """ This class is responsible to hand the completed files to a pool of workers
+    through a bounded queue. A path already waiting in the queue is not enqueued
+    twice (debouncing of the repeated events of the same file) """
+
+    def __init__(self, process_path, n_workers=1, max_size=128):
+        """
+        Initializes the ingestion queue and starts the workers
+        :param process_path: function called by the workers with the path of each file
+        :param n_workers: number of worker threads
+        :param max_size: maximum number of paths waiting in the queue
+        """
+        if n_workers <= 0:
+            logger.error("The number of workers provided is not valid: %d is not > 0", n_workers)
+            raise ValueError("The number of workers must be a positive integer")
+        self.process_path = process_path
+        self._paths_queue = queue.Queue(maxsize=max_size)
+        self._pending_paths = set()
+        self._pending_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name="ingestion-worker-" + str(idx), daemon=True)
+            for idx in range(n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, path):
+        """
+        Enqueues a path, blocking if the queue is full
+        :param path: path of the completed file
+        :return:    True if the path has been enqueued
+                    False if it was already waiting in the queue
+        """
+        with self._pending_lock:
+            if path in self._pending_paths:
+                logger.debug("The file %s is already in the queue, Skipping...", path)
+                return False
+            self._pending_paths.add(path)
+        self._paths_queue.put(path)
+        return True
+
+    def _work(self):
+        """
+        Processes the paths in the queue until the sentinel value None is received
+        :return:
+        """
+        while True:
+            path = self._paths_queue.get()
+            try:
+                if path is None:
+                    return
+                with self._pending_lock:
+                    self._pending_paths.discard(path)
+                self.process_path(path)
+            except Exception as error:  # pylint: disable=broad-except
+                # a failure must not stop the worker, the other files still have to be processed
+                logger.exception("Error processing the file %s: %s", path, error)
+            finally:
+                self._paths_queue.task_done()
+
+    def join(self):
+        """
+        Blocks until all the paths in the queue have been processed
+        :return:
+        """
+        self._paths_queue.join()
+
+    def stop(self):
+        """
+        Stops the workers after the paths already in the queue have been processed
+        :return:
+        """
+        for _ in self._workers:
+            self._paths_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+class IngestionHandler(FileSystemEventHandler):
+    """ This class is responsible to hand the files to an ingestion queue as soon as they
+    are completed, i.e. when they are closed after writing or atomically renamed
+    in the watched directory. The closed events are emitted only by the inotify observer
+    (Linux): on the other platforms the created and modified files are completed when
+    their size and modification time do not change between two checks """
+
+    def __init__(self, n_workers=1, max_queue_size=128,
+                 stability_interval=FILE_STABILITY_INTERVAL):
+        """
+        Initializes the handler
+        :param n_workers: number of worker threads that process the files
+        :param max_queue_size: maximum number of files waiting to be processed
+        :param stability_interval: seconds between two checks of the files being written,
+            used only if the observer does not emit the closed events
+        """
+        self.ingestion_queue = IngestionQueue(self.process_path, n_workers, max_queue_size)
+        self.stability_interval = stability_interval
+        # the fallback is disabled as soon as the observer emits a closed event
+        self._closed_events_seen = False
+        # path -> (size, modification time) at the last check of the files being written
+        self._unstable_paths = {}
+        self._unstable_paths_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stability_watcher = threading.Thread(
+            target=self._watch_unstable_paths, name="ingestion-stability-watcher", daemon=True
+        )
+        self._stability_watcher.start()
+        super().__init__()
+
+    def on_closed(self, event):
+        """
+        Enqueues a file closed after writing
+        :param event: event generated
+        :return:
+        """
+        if not event.is_directory:
+            with self._unstable_paths_lock:
+                self._closed_events_seen = True
+                self._unstable_paths.clear()
+            self.submit_path(event.src_path)
+
+    def on_moved(self, event):
+        """
+        Enqueues a file renamed in the watched directory (atomic write)
+        :param event: event generated
+        :return:
+        """
+        if not event.is_directory:
+            with self._unstable_paths_lock:
+                self._unstable_paths.pop(event.src_path, None)
+                self._unstable_paths.pop(event.dest_path, None)
+            self.submit_path(event.dest_path)
+
+    def on_created(self, event):
+        """
+        Watches the size of a file created, if the observer does not emit the closed events
+        :param event: event generated
+        :return:
+        """
+        self._watch_path(event)
+
+    def on_modified(self, event):
+        """
+        Watches the size of a file modified, if the observer does not emit the closed events
+        :param event: event generated
+        :return:
+        """
+        self._watch_path(event)
+
+    def _watch_path(self, event):
+        """
+        Adds a file being written to the files checked by the stability watcher
+        :param event: event generated
+        :return:
+        """
+        if event.is_directory:
+            return
+        with self._unstable_paths_lock:
+            if not self._closed_events_seen:
+                # the file is completed only after a full interval without changes
+                self._unstable_paths[event.src_path] = None
+
+    def _check_unstable_paths(self):
+        """
+        Enqueues the files whose size and modification time did not change since
+        the previous check, the files removed are not watched anymore
+        :return:
+        """
+        stable_paths = []
+        with self._unstable_paths_lock:
+            for path, last_stat in list(self._unstable_paths.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self._unstable_paths[path]
+                    continue
+                current_stat = (stat.st_size, stat.st_mtime_ns)
+                if current_stat == last_stat and stat.st_size > 0:
+                    del self._unstable_paths[path]
+                    stable_paths.append(path)
+                else:
+                    self._unstable_paths[path] = current_stat
+        for path in stable_paths:
+            logger.debug("The size of the file %s is stable", path)
+            self.submit_path(path)
+
+    def _watch_unstable_paths(self):
+        """
+        Checks the files being written at each interval until the handler is stopped
+        :return:
+        """
+        while not self._stopped.wait(self.stability_interval):
+            try:
+                self._check_unstable_paths()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Error checking the files being written: %s", error)
+
+    def submit_path(self, path):
+        """
+        Enqueues a completed file
+        :param path: path of the completed file
+        :return:
+        """
+        self.ingestion_queue.submit(path)
+
+    @abstractmethod
+    def process_path(self, path):
+        """
+        Processes a completed file
+        :param path: path of the file
+        :return:
+        """
+
+    def join(self):
+        """
+        Blocks until all the enqueued files have been processed
+        :return:
+        """
+        self.ingestion_queue.join()
+
+    def stop(self):
+        """
+        Stops the stability watcher and the workers of the ingestion queue
+        :return:
+        """
+        self._stopped.set()
+        self._stability_watcher.join()
+        self.ingestion_queue.stop()
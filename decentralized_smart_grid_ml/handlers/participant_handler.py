@@ -2,35 +2,59 @@
 This module contains the Participant Handler class used to trigger the functions
 used to train the local model when a new global model is available
 """
-from time import sleep
-
-from watchdog.events import FileSystemEventHandler
+import os
+import threading
 
+from decentralized_smart_grid_ml.handlers.ingestion_queue import IngestionHandler
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
 
 logger = create_logger(__name__)
 
 
-class ParticipantHandler(FileSystemEventHandler):
-    """ This class is responsible to trigger Aggregator actions when a new file is created
-    in a given path """
+class ParticipantHandler(IngestionHandler):
+    """ This class is responsible to trigger FederatedLocalTrainer actions when a new file
+    is completed in a given path """
 
-    def __init__(self, federated_local_trainer):
+    def __init__(self, federated_local_trainer, max_queue_size=128):
         """
         Initializes the handler
         :param federated_local_trainer: instance of FederatedLocalTrainer
+        :param max_queue_size: maximum number of files waiting to be processed
         """
         self.federated_local_trainer = federated_local_trainer
-        super().__init__()
+        # last file completed for each (directory, extension), the older ones waiting
+        # in the queue are skipped so the participant trains on the newest global model
+        self._newest_paths = {}
+        self._newest_paths_lock = threading.Lock()
+        # the local training is sequential, a single worker processes the files
+        super().__init__(1, max_queue_size)
+
+    @staticmethod
+    def _path_kind(path):
+        """
+        Returns the kind of a file, i.e. its directory and extension
+        :param path: path of the file
+        :return: (directory, extension)
+        """
+        return os.path.dirname(path), os.path.splitext(path)[1]
+
+    def submit_path(self, path):
+        with self._newest_paths_lock:
+            self._newest_paths[self._path_kind(path)] = path
+        super().submit_path(path)
 
-    def on_created(self, event):
+    def process_path(self, path):
         """
         Triggers an update in the FederatedLocalTrainer
-        :param event: event generated
+        :param path: path of the completed file
         :return:
         """
-        sleep(1)
+        with self._newest_paths_lock:
+            newest_path = self._newest_paths.get(self._path_kind(path), path)
+        if newest_path != path:
+            logger.info("The file %s is superseded by %s, Skipping...", path, newest_path)
+            return
         if not self.federated_local_trainer.is_finished:
-            logger.info("The file %s has been created", event.src_path)
-            if self.federated_local_trainer.fit_local_model(event.src_path):
+            logger.info("The file %s has been completed", path)
+            if self.federated_local_trainer.fit_local_model(path):
                 logger.info("The handler of the participant has terminated his work")
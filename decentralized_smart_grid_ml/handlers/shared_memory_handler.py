@@ -0,0 +1,252 @@
+"""
+This module contains the handlers used when the validator and the participants run on the
+same host: the weights are exchanged in shared memory segments and the handlers are
+triggered by the notification channel instead of the file system events
+"""
+import secrets
+import threading
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.shared_memory_transport import \
+    GLOBAL_MODEL_MESSAGE, LOCAL_UPDATE_MESSAGE, NOTIFICATION_CONNECT_TIMEOUT, \
+    NotificationClient, NotificationServer, read_weights_segment, release_segment, \
+    write_weights_segment
+from decentralized_smart_grid_ml.handlers.validator_handler import close_round_on_deadline
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+# prefix of the names of the shared memory segments
+SEGMENT_NAME_PREFIX = "dsg_"
+
+
+def _segment_name_prefix():
+    """
+    Returns a random prefix for the segments of a process, so the processes of
+    different federations on the same host do not collide
+    :return: prefix of the segments' names
+    """
+    return SEGMENT_NAME_PREFIX + secrets.token_hex(4)
+
+
+class ValidatorSharedMemoryHandler:
+    """ This class is responsible to trigger Aggregator actions when a participant notifies
+    its local model's weights in shared memory, and to publish the global model's weights """
+
+    def __init__(self, aggregator, address, authkey):
+        """
+        Initializes the handler and starts the notification channel
+        :param aggregator: instance of Aggregator
+        :param address: address of the notification channel
+        :param authkey: bytes used to authenticate the participants
+        """
+        self.aggregator = aggregator
+        self._aggregator_lock = threading.Lock()
+        self._segment_name_prefix = _segment_name_prefix()
+        # segments of the global models that the participants may still map
+        self._global_segments = {}
+        self.notification_server = NotificationServer(address, authkey, self.process_message)
+
+    def process_message(self, message):
+        """
+        Adds the local weights notified by a participant in the current round
+        :param message: message of the notification channel
+        :return:
+        """
+        if message.get("type") != LOCAL_UPDATE_MESSAGE:
+            logger.warning("Unexpected message %s, Skipping...", message)
+            return
+        with self._aggregator_lock:
+            if self.aggregator.is_finished:
+                return
+            try:
+                segment, weights, _ = read_weights_segment(message["segment"])
+            except FileNotFoundError:
+                logger.warning("The segment %s is not available, Skipping...", message["segment"])
+                return
+            # the aggregator keeps the weights in the round's statistics, so they are copied
+            # (without decoding) and the participant's segment is released immediately
+            local_weights = [np.array(layer_weights) for layer_weights in weights]
+            del weights
+            release_segment(segment)
+            logger.info("The update of participant %s has been received", message["participant_id"])
+            # the update is admitted as an uploaded file: late and stale updates
+            # are handled by the round policy
+            if self.aggregator.add_participant_local_weights(
+                    message["participant_id"], local_weights, message["round"]
+            ):
+                self._update_global_model()
+
+    def check_round_deadline(self):
+        """
+        Triggers an update in the aggregator if the current round can be closed
+        without waiting for the remaining participants (e.g. its deadline expired)
+        :return:
+        """
+        with self._aggregator_lock:
+            close_round_on_deadline(self.aggregator, self._update_global_model)
+
+    def _update_global_model(self):
+        """
+        Updates the global model and publishes it to the participants
+        :return:
+        """
+        self.aggregator.update_global_model()
+        self.publish_global_model()
+
+    def publish_global_model(self):
+        """
+        Writes the global model's weights of the current round in a new segment
+        and notifies the participants
+        :return:
+        """
+        idx_round = self.aggregator.current_round
+        segment_name = self._segment_name_prefix + "_g" + str(idx_round)
+        self._global_segments[idx_round] = write_weights_segment(
+            self.aggregator.global_model.get_weights(), segment_name
+        )
+        # only the participants of the previous round may still map the older segments
+        for old_round in list(self._global_segments):
+            if old_round < idx_round - 1:
+                release_segment(self._global_segments.pop(old_round), unlink=True)
+        self.notification_server.broadcast({
+            "type": GLOBAL_MODEL_MESSAGE,
+            "round": idx_round,
+            "segment": segment_name,
+            "is_final": self.aggregator.is_finished,
+            # participants selected for the round, None if the selection is not published
+            "participant_ids": None if self.aggregator.is_finished
+            else self.aggregator.round_participant_ids(idx_round)
+        })
+
+    def stop(self):
+        """
+        Closes the notification channel and removes the segments of the global models
+        :return:
+        """
+        self.notification_server.close()
+        for segment in self._global_segments.values():
+            release_segment(segment, unlink=True)
+        self._global_segments = {}
+
+
+class ParticipantSharedMemoryHandler:
+    """ This class is responsible to trigger FederatedLocalTrainer actions when the validator
+    notifies a new global model in shared memory, and to publish the local model's weights """
+
+    def __init__(self, federated_local_trainer, address, authkey,
+                 connect_timeout=NOTIFICATION_CONNECT_TIMEOUT):
+        """
+        Initializes the handler and connects to the notification channel
+        :param federated_local_trainer: instance of FederatedLocalTrainer
+        :param address: address of the validator's notification channel
+        :param authkey: bytes used to authenticate the participant
+        :param connect_timeout: maximum seconds waited for the validator's channel
+        """
+        self.federated_local_trainer = federated_local_trainer
+        self._segment_name_prefix = _segment_name_prefix()
+        # segments of the local models, released when the next one is published
+        self._update_segments = []
+        # the last update is kept until the validator publishes the final model
+        self.is_final_model_received = False
+        self.notification_client = NotificationClient(address, authkey, connect_timeout)
+
+    def run(self):
+        """
+        Trains the local model for each round, starting from the baseline model,
+        until the validator publishes the final global model
+        :return:
+        """
+        self._train_round(self.federated_local_trainer.local_model.get_weights())
+        while not self.is_final_model_received:
+            try:
+                message = self.notification_client.receive()
+            except EOFError:
+                logger.warning("The notification channel has been closed by the validator")
+                break
+            self.process_message(message)
+        logger.info("The handler of the participant has terminated his work")
+
+    def process_message(self, message):
+        """
+        Trains the local model on the global model notified by the validator
+        :param message: message of the notification channel
+        :return:
+        """
+        trainer = self.federated_local_trainer
+        if message.get("type") != GLOBAL_MODEL_MESSAGE:
+            logger.warning("Unexpected message %s, Skipping...", message)
+            return
+        if message["is_final"]:
+            logger.info("Participant %s: the federated learning is finished",
+                        trainer.participant_id)
+            trainer.is_finished = True
+            self.is_final_model_received = True
+            return
+        if trainer.is_finished or message["round"] < trainer.current_round:
+            logger.warning(
+                "The global model of round %d does not correspond to the current round (%d), "
+                "Skipping...", message["round"], trainer.current_round
+            )
+            return
+        if message["round"] > trainer.current_round:
+            # the rounds closed by the validator without this participant are skipped
+            logger.warning(
+                "Participant %s: skipping from round %d to round %d",
+                trainer.participant_id, trainer.current_round, message["round"]
+            )
+            trainer.current_round = message["round"]
+        if message.get("participant_ids") is not None \
+                and trainer.participant_id not in message["participant_ids"]:
+            logger.info(
+                "Participant %s: not selected for round %d, Skipping...",
+                trainer.participant_id, trainer.current_round
+            )
+            trainer.current_round += 1
+            return
+        try:
+            segment, global_weights, _ = read_weights_segment(message["segment"])
+        except FileNotFoundError:
+            logger.warning("The segment %s is not available, Skipping...", message["segment"])
+            return
+        try:
+            # the global model's weights are views on the segment, copied only in the model
+            self._train_round(global_weights)
+        finally:
+            del global_weights
+            release_segment(segment)
+
+    def _train_round(self, global_weights):
+        """
+        Trains the local model of the current round and publishes its weights
+        :param global_weights: weights of the global model of the round
+        :return:
+        """
+        trainer = self.federated_local_trainer
+        idx_round = trainer.current_round
+        local_weights = trainer.train_round(global_weights)
+        segment_name = self._segment_name_prefix + "_p" + str(trainer.participant_id) + \
+            "_r" + str(idx_round)
+        segment = write_weights_segment(local_weights, segment_name)
+        # the validator copies each update when it is notified, or skips it if its round
+        # is closed, so the previous updates are not needed anymore
+        for old_segment in self._update_segments:
+            release_segment(old_segment, unlink=True)
+        self._update_segments = [segment]
+        self.notification_client.send({
+            "type": LOCAL_UPDATE_MESSAGE,
+            "participant_id": trainer.participant_id,
+            "round": idx_round,
+            "segment": segment_name
+        })
+
+    def stop(self):
+        """
+        Closes the notification channel and removes the segments of the local models
+        :return:
+        """
+        self.notification_client.close()
+        for segment in self._update_segments:
+            release_segment(segment, unlink=True)
+        self._update_segments = []
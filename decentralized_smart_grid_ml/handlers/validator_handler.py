@@ -2,36 +2,67 @@
 This module contains the Validator Handler class used to trigger the functions
 used to compute the aggregated model at each round
 """
-from time import sleep
-
-from watchdog.events import FileSystemEventHandler
+import threading
 
+from decentralized_smart_grid_ml.handlers.ingestion_queue import IngestionHandler
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
 
 logger = create_logger(__name__)
 
 
-class ValidatorHandler(FileSystemEventHandler):
-    """ This class is responsible to trigger Aggregator actions when a new file is created
-    in a given path """
+def close_round_on_deadline(aggregator, update_global_model):
+    """
+    Closes the current round if it can be closed without waiting for the remaining
+    participants (e.g. its deadline expired), the caller holds the aggregator's lock
+    :param aggregator: instance of Aggregator
+    :param update_global_model: function that updates (and publishes) the global model
+    :return:    True if the round has been closed
+                False otherwise
+    """
+    if not aggregator.is_round_closable():
+        return False
+    logger.info("The round %d has been closed by the round policy", aggregator.current_round)
+    update_global_model()
+    return True
+
 
-    def __init__(self, aggregator):
+class ValidatorHandler(IngestionHandler):
+    """ This class is responsible to trigger Aggregator actions when a new file is completed
+    in a given path. The aggregator is not thread safe, so its updates are serialized by a
+    lock: the participants' weights are decoded in background by the aggregator's loading
+    pool, and with more than one worker the handler only overlaps the I/O of the files
+    waiting for the lock, not the aggregator's work """
+
+    def __init__(self, aggregator, n_workers=1, max_queue_size=128):
         """
         Initializes the handler
         :param aggregator: instance of Aggregator
+        :param n_workers: number of worker threads that process the files (their updates
+            of the aggregator are serialized)
+        :param max_queue_size: maximum number of files waiting to be processed
         """
         self.aggregator = aggregator
-        super().__init__()
+        self._aggregator_lock = threading.Lock()
+        super().__init__(n_workers, max_queue_size)
 
-    def on_created(self, event):
+    def process_path(self, path):
         """
         Triggers an update in the aggregator
-        :param event: event generated
+        :param path: path of the completed file
+        :return:
+        """
+        with self._aggregator_lock:
+            if not self.aggregator.is_finished:
+                logger.info("The file %s has been completed", path)
+                round_is_completed = self.aggregator.add_participant_weights(path)
+                if round_is_completed:
+                    self.aggregator.update_global_model()
+
+    def check_round_deadline(self):
+        """
+        Triggers an update in the aggregator if the current round can be closed
+        without waiting for the remaining participants (e.g. its deadline expired)
         :return:
         """
-        sleep(1)
-        if not self.aggregator.is_finished:
-            logger.info("The file %s has been created", event.src_path)
-            round_is_completed = self.aggregator.add_participant_weights(event.src_path)
-            if round_is_completed:
-                self.aggregator.update_global_model()
+        with self._aggregator_lock:
+            close_round_on_deadline(self.aggregator, self.aggregator.update_global_model)
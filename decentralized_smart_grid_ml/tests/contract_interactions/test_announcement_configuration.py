@@ -83,3 +83,4 @@ class TestAnnouncementConfiguration(unittest.TestCase):
         self.assertEqual(2, announcement_config.fl_rounds)
         self.assertEqual(2, announcement_config.epochs)
         self.assertEqual(32, announcement_config.batch_size)
+        self.assertDictEqual({}, announcement_config.aggregation_method_params)
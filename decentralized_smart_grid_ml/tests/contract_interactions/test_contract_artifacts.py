@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from decentralized_smart_grid_ml.contract_interactions.contract_artifacts import load_contract_abi, \
+    abi_sidecar_path
+
+artifact = {
+    "contractName": "Announcement",
+    "abi": [{"name": "isFinished", "type": "function", "outputs": [{"type": "bool"}]}],
+    "bytecode": "0x" + "00" * 1024,
+    "ast": {"nodes": []}
+}
+
+
+class TestContractArtifacts(unittest.TestCase):
+
+    def test_abi_sidecar_path(self):
+        self.assertEqual(
+            "/build/contracts/Announcement.abi.json",
+            abi_sidecar_path("/build/contracts/Announcement.json")
+        )
+
+    def test_load_contract_abi(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_path = os.path.join(tmp_dir, "Announcement.json")
+            with open(artifact_path, "w") as file_write:
+                json.dump(artifact, file_write)
+            abi = load_contract_abi(artifact_path)
+            self.assertListEqual(artifact["abi"], abi)
+            # the sidecar contains only the abi
+            with open(abi_sidecar_path(artifact_path), "r") as file_read:
+                sidecar = json.load(file_read)
+            self.assertListEqual(artifact["abi"], sidecar["abi"])
+            self.assertEqual(os.stat(artifact_path).st_mtime_ns, sidecar["artifact_mtime_ns"])
+            # the abi is cached in memory
+            with patch("decentralized_smart_grid_ml.contract_interactions.contract_artifacts.open") as open_mock:
+                self.assertListEqual(artifact["abi"], load_contract_abi(artifact_path))
+                open_mock.assert_not_called()
+
+    def test_load_contract_abi_artifact_updated(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_path = os.path.join(tmp_dir, "Announcement.json")
+            with open(artifact_path, "w") as file_write:
+                json.dump(artifact, file_write)
+            load_contract_abi(artifact_path)
+            # a new compilation of the contract changes both the abi and the mtime
+            new_artifact = dict(artifact, abi=[{"name": "endTask", "type": "function", "outputs": []}])
+            with open(artifact_path, "w") as file_write:
+                json.dump(new_artifact, file_write)
+            os.utime(artifact_path, ns=(0, os.stat(artifact_path).st_mtime_ns + 1))
+            self.assertListEqual(new_artifact["abi"], load_contract_abi(artifact_path))
+
+    def test_load_contract_abi_sidecar_valid(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_path = os.path.join(tmp_dir, "GreenDEX.json")
+            with open(artifact_path, "w") as file_write:
+                json.dump(artifact, file_write)
+            # sidecar written by another process for the same artifact's version
+            sidecar_abi = [{"name": "buy", "type": "function", "outputs": []}]
+            with open(abi_sidecar_path(artifact_path), "w") as file_write:
+                json.dump({
+                    "artifact_mtime_ns": os.stat(artifact_path).st_mtime_ns,
+                    "abi": sidecar_abi
+                }, file_write)
+            self.assertListEqual(sidecar_abi, load_contract_abi(artifact_path))
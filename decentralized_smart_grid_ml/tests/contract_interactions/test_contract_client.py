@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from decentralized_smart_grid_ml.contract_interactions.contract_client import ContractClient
+from decentralized_smart_grid_ml.exceptions import ContractCallError
+
+
+def _encode_uint(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def _decode_uints(output_types, data):
+    return [int.from_bytes(data[idx * 32:(idx + 1) * 32], "big") for idx in range(len(output_types))]
+
+
+class FakeGanacheSession:
+    """ Local stand-in of a Ganache node that answers the JSON-RPC eth_call batches """
+
+    def __init__(self, function_name2results):
+        self.function_name2results = function_name2results
+        self.payloads = []
+
+    def post(self, url, json):
+        self.payloads.append(json)
+        response = MagicMock()
+        results = []
+        for request in json:
+            function_name = request["params"][0]["data"]
+            values = self.function_name2results[function_name]
+            if isinstance(values, list):
+                value = values.pop(0) if len(values) > 1 else values[0]
+            else:
+                value = values
+            if value is None:
+                results.append({"jsonrpc": "2.0", "id": request["id"], "error": {"message": "revert"}})
+            else:
+                results.append({"jsonrpc": "2.0", "id": request["id"], "result": _encode_uint(value)})
+        # the node may answer the requests of a batch in any order
+        response.json.return_value = list(reversed(results))
+        return response
+
+    def close(self):
+        pass
+
+
+def _contract_mock():
+    contract_mock = MagicMock()
+    contract_mock.address = "0xContract"
+    # the encoded data is the function name, so that the fake node can answer
+    contract_mock.encodeABI.side_effect = lambda fn_name, args: fn_name
+    contract_mock.get_function_by_name.return_value.abi = {"outputs": [{"type": "uint8"}]}
+    return contract_mock
+
+
+@patch("decentralized_smart_grid_ml.contract_interactions.contract_client.HTTPProvider")
+@patch("decentralized_smart_grid_ml.contract_interactions.contract_client.Web3")
+class TestContractClient(unittest.TestCase):
+
+    def test_contract_client_constructor(self, web3_mock, http_provider_mock):
+        contract_client = ContractClient("http://127.0.0.1:7545")
+        http_provider_mock.assert_called_with("http://127.0.0.1:7545", session=contract_client.session)
+        self.assertEqual(web3_mock.return_value, contract_client.web3)
+        contract_client.close()
+
+    def test_contract(self, web3_mock, http_provider_mock):
+        contract_client = ContractClient("http://127.0.0.1:7545", session=FakeGanacheSession({}))
+        contract = contract_client.contract("0xContract", ["abi"])
+        web3_mock.return_value.eth.contract.assert_called_with(address="0xContract", abi=["abi"])
+        self.assertEqual(web3_mock.return_value.eth.contract.return_value, contract)
+
+    def test_contract_memoized(self, web3_mock, http_provider_mock):
+        contract_client = ContractClient("http://127.0.0.1:7545", session=FakeGanacheSession({}))
+        web3_mock.return_value.eth.contract.side_effect = lambda address, abi: (address, abi)
+        contract = contract_client.contract("0xContract", ["abi"])
+        self.assertIs(contract, contract_client.contract("0xContract", ["abi"]))
+        web3_mock.return_value.eth.contract.assert_called_once()
+
+    @patch("decentralized_smart_grid_ml.contract_interactions.contract_client.load_contract_abi")
+    def test_contract_from_artifact(self, load_contract_abi_mock, web3_mock, http_provider_mock):
+        load_contract_abi_mock.return_value = ["abi"]
+        contract_client = ContractClient("http://127.0.0.1:7545", session=FakeGanacheSession({}))
+        contract = contract_client.contract_from_artifact("0xContract", "/build/contracts/Announcement.json")
+        contract_client.contract_from_artifact("0xContract", "/build/contracts/Announcement.json")
+        load_contract_abi_mock.assert_called_once_with("/build/contracts/Announcement.json")
+        web3_mock.return_value.eth.contract.assert_called_once_with(address="0xContract", abi=["abi"])
+        self.assertEqual(web3_mock.return_value.eth.contract.return_value, contract)
+
+    def test_batch_call(self, web3_mock, http_provider_mock):
+        web3_mock.return_value.codec.decode_abi.side_effect = _decode_uints
+        session = FakeGanacheSession({"maxNumberParticipant": 4, "currentNumberParticipant": 2})
+        contract_client = ContractClient("http://127.0.0.1:7545", session=session)
+        contract = _contract_mock()
+        results = contract_client.batch_call(
+            [(contract, "maxNumberParticipant", []), (contract, "currentNumberParticipant", [])],
+            "0xUser"
+        )
+        self.assertListEqual([4, 2], results)
+        # a single HTTP request for both the calls
+        self.assertEqual(1, len(session.payloads))
+        self.assertEqual(2, len(session.payloads[0]))
+        self.assertEqual("0xUser", session.payloads[0][0]["params"][0]["from"])
+
+    def test_batch_call_error(self, web3_mock, http_provider_mock):
+        session = FakeGanacheSession({"isFinished": None})
+        contract_client = ContractClient("http://127.0.0.1:7545", session=session)
+        with self.assertRaises(ContractCallError):
+            contract_client.batch_call([(_contract_mock(), "isFinished", [])], "0xUser")
+
+    @patch("decentralized_smart_grid_ml.contract_interactions.contract_client.time.sleep")
+    def test_wait_for_condition(self, sleep_mock, web3_mock, http_provider_mock):
+        web3_mock.return_value.codec.decode_abi.side_effect = _decode_uints
+        block_filter = web3_mock.return_value.eth.filter.return_value
+        # no block, no block, new block
+        block_filter.get_new_entries.side_effect = [[], [], ["0xBlock"]]
+        session = FakeGanacheSession({"maxNumberParticipant": 2, "currentNumberParticipant": [1, 2]})
+        contract_client = ContractClient("http://127.0.0.1:7545", session=session)
+        contract = _contract_mock()
+        results = contract_client.wait_for_condition(
+            [(contract, "maxNumberParticipant", []), (contract, "currentNumberParticipant", [])],
+            "0xUser",
+            lambda values: values[0] == values[1],
+            initial_delay=1, max_delay=3, backoff=2
+        )
+        self.assertListEqual([2, 2], results)
+        # the contract is called again only when a new block is mined
+        self.assertEqual(2, len(session.payloads))
+        self.assertListEqual([1, 2, 3], [call_args[0][0] for call_args in sleep_mock.call_args_list])
+        web3_mock.return_value.eth.uninstall_filter.assert_called_with(block_filter.filter_id)
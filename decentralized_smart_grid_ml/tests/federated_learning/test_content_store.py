@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedWeightsFileError
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore, compute_cid, \
+    read_weights_cid, write_weights_cid
+
+
+class TestContentAddressedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp_dir.name, "store")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_bytes(self):
+        content_store = ContentAddressedStore(self.store_path)
+        cid = content_store.put_bytes(b"layer")
+        self.assertEqual(compute_cid(b"layer"), cid)
+        self.assertTrue(content_store.contains(cid))
+        self.assertEqual(cid, content_store.put_bytes(b"layer"))
+        self.assertEqual(5, content_store.written_bytes)
+        self.assertEqual(5, content_store.deduplicated_bytes)
+        with self.assertRaises(ValueError):
+            ContentAddressedStore(self.store_path, chunk_size=0)
+
+    def test_weights(self):
+        content_store = ContentAddressedStore(self.store_path)
+        weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.zeros(3, dtype=np.float32)]
+        cid = content_store.put_weights(weights, {"update": "full"})
+        loaded_weights, metadata = content_store.get_weights(cid)
+        self.assertDictEqual({"update": "full"}, metadata)
+        for layer_weights, loaded_layer_weights in zip(weights, loaded_weights):
+            np.testing.assert_array_equal(layer_weights, loaded_layer_weights)
+            self.assertEqual(layer_weights.dtype, loaded_layer_weights.dtype)
+            # the layers are read-only memory maps of the chunks
+            self.assertIsInstance(loaded_layer_weights, np.memmap)
+            self.assertFalse(loaded_layer_weights.flags.writeable)
+        # the chunk and the descriptor of the unchanged layer are not written again
+        deduplicated_bytes = content_store.deduplicated_bytes
+        new_cid = content_store.put_weights([weights[0] + 1, weights[1]])
+        self.assertNotEqual(cid, new_cid)
+        self.assertGreater(content_store.deduplicated_bytes - deduplicated_bytes, weights[1].nbytes)
+        self.assertEqual(cid, content_store.put_weights(weights, {"update": "full"}))
+        with self.assertRaises(MalformedWeightsFileError):
+            content_store.get_weights(compute_cid(b"missing"))
+
+    def test_chunked_layer(self):
+        content_store = ContentAddressedStore(self.store_path, chunk_size=16)
+        layer_weights = np.arange(10, dtype=np.float64)
+        # the layer is split in 5 chunks of 16 bytes, the last 2 chunks of the other layer are equal
+        other_layer_weights = np.concatenate([layer_weights[:6] + 10, layer_weights[6:]])
+        cid = content_store.put_layer(layer_weights)
+        deduplicated_bytes = content_store.deduplicated_bytes
+        content_store.put_layer(other_layer_weights)
+        self.assertEqual(32, content_store.deduplicated_bytes - deduplicated_bytes)
+        loaded_layer_weights = content_store.get_layer(cid)
+        np.testing.assert_array_equal(layer_weights, loaded_layer_weights)
+        self.assertFalse(loaded_layer_weights.flags.writeable)
+
+    def test_pointer_file(self):
+        pointer_path = os.path.join(self.tmp_dir.name, "weights_round_0.cid")
+        write_weights_cid(pointer_path, "abc", self.store_path)
+        self.assertEqual(("abc", os.path.abspath(self.store_path)), read_weights_cid(pointer_path))
+        with open(pointer_path, "w") as file_write:
+            file_write.write("[]")
+        with self.assertRaises(MalformedWeightsFileError):
+            read_weights_cid(pointer_path)
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.contribution_ledger import ContributionLedger
+
+
+class TestContributionLedger(unittest.TestCase):
+
+    def test_record_round(self):
+        ledger = ContributionLedger([10, 11, 12], 2)
+        ledger.record_arrival(0, 11, 1.5)
+        ledger.record_round(0, [11, 12], [0.6, 0.4], [0.9, 0.8])
+        ledger.record_round(1, [10, 11], [0.5, 0.5])
+        np.testing.assert_array_equal([[False, True, True], [True, True, False]], ledger.mask)
+        np.testing.assert_array_equal([np.nan, 0.9, 0.8], ledger.scores[0])
+        self.assertEqual(1.5, ledger.arrival_times[0, 1])
+        self.assertAlmostEqual(1.1, ledger.participant_contribution(11))
+        self.assertListEqual([0.25, 0.55, 0.2], ledger.contributions())
+        np.testing.assert_array_equal([1, 2, 1], ledger.participation_counts())
+        # the round recorded again replaces its previous contributions
+        ledger.record_round(1, [10], [1.0])
+        self.assertAlmostEqual(0.6, ledger.participant_contribution(11))
+        self.assertFalse(ledger.mask[1, 1])
+        with self.assertRaises(ValueError):
+            ledger.record_round(1, [13], [1.0])
+        with self.assertRaises(ValueError):
+            ledger.record_round(1, [10, 11], [1.0])
+        self.assertListEqual([0.0, 0.0], ContributionLedger([0, 1], 1).contributions())
+
+    def test_round_entries(self):
+        ledger = ContributionLedger([0, 1, 2], 1)
+        ledger.record_arrival(0, 2, 3.0)
+        ledger.record_arrival(0, 0, 1.0)
+        ledger.record_round(0, [0], [1.0], [0.7])
+        round_entries = ledger.round_entries(0)
+        self.assertListEqual([0, 2], round_entries["participant_ids"])
+        self.assertListEqual([True, False], round_entries["is_scored"])
+        restored_ledger = ContributionLedger([0, 1, 2], 1)
+        restored_ledger.restore_round(0, round_entries)
+        for array_name in ("alpha", "scores", "arrival_times", "mask"):
+            np.testing.assert_array_equal(getattr(ledger, array_name), getattr(restored_ledger, array_name))
+        self.assertListEqual(ledger.contributions(), restored_ledger.contributions())
+
+    def test_save_load(self):
+        ledger = ContributionLedger([0, 1], 2)
+        ledger.record_arrival(1, 0, 2.0)
+        ledger.record_round(1, [0, 1], [0.75, 0.25], [0.6, 0.5])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ledger_path = os.path.join(tmp_dir, "ledger.npz")
+            ledger.save(ledger_path)
+            loaded_ledger = ContributionLedger.load(ledger_path)
+        self.assertListEqual([0, 1], loaded_ledger.participant_ids)
+        np.testing.assert_array_equal(ledger.scores, loaded_ledger.scores)
+        np.testing.assert_array_equal(ledger.arrival_times, loaded_ledger.arrival_times)
+        self.assertEqual(0.75, loaded_ledger.participant_contribution(0))
+        self.assertListEqual([0.75, 0.25], loaded_ledger.contributions())
+
+
+if __name__ == '__main__':
+    unittest.main()
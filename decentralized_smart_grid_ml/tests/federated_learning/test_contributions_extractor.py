@@ -1,9 +1,13 @@
 import unittest
-from unittest.mock import patch, call
+from unittest.mock import patch, call, MagicMock
+
+import numpy as np
 
 from decentralized_smart_grid_ml.exceptions import NotValidAggregationMethod
+from decentralized_smart_grid_ml.federated_learning.evaluation_cache import EvaluationCache
 from decentralized_smart_grid_ml.federated_learning.contributions_extractor import ContributionsExtractorCreator, \
-    ContributionsExtractor, ContributionsExtractorEnsembleGeneral, ContributionsExtractorSimpleAverage
+    ContributionsExtractor, ContributionsExtractorEnsembleGeneral, ContributionsExtractorSimpleAverage, \
+    ContributionsExtractorMonteCarloShapley, ContributionsExtractorEnsembleGeneralAdaptive, accuracy_scores
 
 
 class TestContributionsExtractor(unittest.TestCase):
@@ -23,6 +27,23 @@ class TestContributionsExtractor(unittest.TestCase):
             "y_validation"
         )
         self.assertIsInstance(contributions_extractor_method, ContributionsExtractorSimpleAverage)
+        contributions_extractor_method = ContributionsExtractorCreator.factory_method(
+            "monte_carlo_shapley",
+            "test_model",
+            "x_validation",
+            "y_validation",
+            method_params={"time_budget": 10.0, "seed": 0}
+        )
+        self.assertIsInstance(contributions_extractor_method, ContributionsExtractorMonteCarloShapley)
+        self.assertEqual(10.0, contributions_extractor_method.time_budget)
+        contributions_extractor_method = ContributionsExtractorCreator.factory_method(
+            "ensemble_general_adaptive",
+            "test_model",
+            "x_validation",
+            "y_validation",
+            method_params={"initial_fraction": 0.5}
+        )
+        self.assertIsInstance(contributions_extractor_method, ContributionsExtractorEnsembleGeneralAdaptive)
         with self.assertRaises(NotValidAggregationMethod):
             ContributionsExtractorCreator.factory_method(
                 "not_existing_method",
@@ -63,6 +84,106 @@ class TestContributionsExtractor(unittest.TestCase):
         ])
         self.assertListEqual(alpha_expected, alpha)
 
+    def test_compute_contribution_ensemble_general_restores_model_weights(self):
+        model_mock = model_average_value_mock()
+        global_weights = [np.array([0.5])]
+        model_mock.set_weights(global_weights)
+        participants_weights = [[np.array([0.2])], [np.array([0.4])]]
+        contributions_extractor = ContributionsExtractorEnsembleGeneral(
+            model_mock, "x_validation", "y_validation"
+        )
+        self.assertListEqual([0, 0], contributions_extractor.compute_contribution(participants_weights, 0.9))
+        self.assertListEqual([0.2, 0.4], contributions_extractor.scores)
+        # the global model is published unchanged when alpha is zero
+        self.assertIs(global_weights, model_mock.get_weights())
+
+    @patch("tensorflow.keras.Sequential")
+    def test_compute_contribution_ensemble_general_cached(self, model_mock):
+        x_val = [[1, 2], [2, 3]]
+        y_val = [0, 1]
+        participants_weights = [[np.array([1, 2])], [np.array([3, 4])]]
+        evaluation_cache = EvaluationCache()
+        contributions_extractor = ContributionsExtractorEnsembleGeneral(
+            model_mock, x_val, y_val, evaluation_cache
+        )
+        self.assertIs(evaluation_cache, contributions_extractor.evaluation_cache)
+        model_mock.evaluate.side_effect = [
+            ["loss0", 1.0],
+            ["loss1", 0.0],
+        ]
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        # the same models are scored again: the evaluations come from the cache
+        alpha_cached = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        self.assertEqual(2, model_mock.evaluate.call_count)
+        self.assertListEqual([1.0, 0.0], alpha)
+        self.assertListEqual(alpha, alpha_cached)
+        self.assertEqual(2, evaluation_cache.hits)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.contributions_extractor.BATCHED_EVALUATION_MAX_HEADS", 2)
+    @patch("decentralized_smart_grid_ml.federated_learning.contributions_extractor.build_multi_head_model")
+    @patch("tensorflow.keras.Sequential")
+    def test_compute_contribution_ensemble_general_batched(self, model_mock, build_multi_head_model_mock):
+        x_val = np.array([[1, 2], [2, 3], [3, 4]])
+        y_val = np.array([[1], [0], [1]])
+        participants_weights = [[1, 2], [3, 4], [5, 6]]
+        model_mock.get_compile_config.return_value = {"metrics": ["accuracy"]}
+        heads_two = [MagicMock(), MagicMock()]
+        multi_head_two = MagicMock()
+        multi_head_two.predict.return_value = [
+            np.array([[0.9], [0.1], [0.8]]),    # accuracy 1.0
+            np.array([[0.9], [0.9], [0.8]]),    # accuracy 0.66
+        ]
+        heads_one = [MagicMock()]
+        multi_head_one = MagicMock()
+        multi_head_one.predict.return_value = np.array([[0.1], [0.9], [0.1]])    # accuracy 0.0
+        build_multi_head_model_mock.side_effect = [
+            (multi_head_two, heads_two),
+            (multi_head_one, heads_one)
+        ]
+        contributions_extractor = ContributionsExtractorEnsembleGeneral(model_mock, x_val, y_val)
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        build_multi_head_model_mock.assert_has_calls([call(model_mock, 2), call(model_mock, 1)])
+        heads_two[0].set_weights.assert_called_with(participants_weights[0])
+        heads_two[1].set_weights.assert_called_with(participants_weights[1])
+        heads_one[0].set_weights.assert_called_with(participants_weights[2])
+        model_mock.evaluate.assert_not_called()
+        np.testing.assert_allclose([0.75, 0.25, 0.0], alpha)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.contributions_extractor.build_multi_head_model")
+    @patch("tensorflow.keras.Sequential")
+    def test_compute_contribution_ensemble_general_batched_fallback(self, model_mock,
+                                                                    build_multi_head_model_mock):
+        x_val = [[1, 2], [2, 3]]
+        y_val = [0, 1]
+        participants_weights = [[1, 2], [3, 4]]
+        model_mock.get_compile_config.return_value = {"metrics": "accuracy"}
+        build_multi_head_model_mock.side_effect = ValueError("model not clonable")
+        model_mock.evaluate.side_effect = [
+            ["loss0", 1.0],
+            ["loss1", 0.0],
+        ]
+        contributions_extractor = ContributionsExtractorEnsembleGeneral(model_mock, x_val, y_val)
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        self.assertEqual(2, model_mock.evaluate.call_count)
+        self.assertListEqual([1.0, 0], alpha)
+
+    def test_accuracy_scores(self):
+        # binary
+        np.testing.assert_array_equal(
+            [True, False],
+            accuracy_scores(np.array([[0.7], [0.7]]), np.array([1, 0]))
+        )
+        # sparse categorical
+        np.testing.assert_array_equal(
+            [True, False],
+            accuracy_scores(np.array([[0.1, 0.9], [0.8, 0.2]]), np.array([1, 1]))
+        )
+        # categorical
+        np.testing.assert_array_equal(
+            [False, True],
+            accuracy_scores(np.array([[0.1, 0.9], [0.8, 0.2]]), np.array([[1, 0], [1, 0]]))
+        )
+
     def test_compute_contribution_simple_average(self):
         x_val = [[1, 2], [2, 3]]
         y_val = [0, 1]
@@ -71,3 +192,185 @@ class TestContributionsExtractor(unittest.TestCase):
         alpha_expected = [0.5, 0.5]
         alpha = contributions_extractor.compute_contribution(participants_weights, 0)
         self.assertListEqual(alpha_expected, alpha)
+
+
+def model_average_value_mock():
+    """ Model mock whose evaluation is the first value of the weights set """
+    model_mock = MagicMock()
+    model_weights = {}
+
+    def set_weights(weights):
+        model_weights["weights"] = weights
+
+    model_mock.set_weights.side_effect = set_weights
+    model_mock.get_weights.side_effect = lambda: model_weights.get("weights")
+    model_mock.evaluate.side_effect = lambda x, y: ["loss", float(model_weights["weights"][0][0])]
+    return model_mock
+
+
+class TestContributionsExtractorMonteCarloShapley(unittest.TestCase):
+
+    def test_not_valid_parameters(self):
+        with self.assertRaises(ValueError):
+            ContributionsExtractorMonteCarloShapley("model", "x_validation", "y_validation", time_budget=0)
+        with self.assertRaises(ValueError):
+            ContributionsExtractorMonteCarloShapley("model", "x_validation", "y_validation", tolerance=-1)
+
+    def test_compute_contribution(self):
+        model_mock = model_average_value_mock()
+        participants_weights = [[np.array([1.0])], [np.array([0.0])]]
+        contributions_extractor = ContributionsExtractorMonteCarloShapley(
+            model_mock, "x_validation", "y_validation", max_permutations=20, seed=0
+        )
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.0)
+        # the marginal contribution of the second participant is never positive
+        self.assertListEqual([1.0, 0.0], alpha)
+        self.assertGreater(contributions_extractor.shapley_values[0], 0.5)
+        self.assertLessEqual(contributions_extractor.shapley_values[1], 0.0)
+        # the coalitions are evaluated only once: {0, 1}, {0} and {1}
+        self.assertLessEqual(model_mock.evaluate.call_count, 3)
+        self.assertEqual([], contributions_extractor.compute_contribution([], 0.0))
+
+    def test_compute_contribution_truncation(self):
+        model_mock = model_average_value_mock()
+        participants_weights = [[np.array([1.0], dtype=np.float32)] for _ in range(3)]
+        contributions_extractor = ContributionsExtractorMonteCarloShapley(
+            model_mock, "x_validation", "y_validation", max_permutations=50, tolerance=0.0, seed=0
+        )
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.0)
+        self.assertAlmostEqual(1.0, sum(alpha))
+        self.assertEqual(50, contributions_extractor.n_permutations)
+        # after the first participant the coalition reaches the value of all the participants,
+        # so only the grand coalition and the single participants are evaluated
+        self.assertLessEqual(model_mock.evaluate.call_count, 4)
+        self.assertEqual(np.float32, model_mock.set_weights.call_args_list[0][0][0][0].dtype)
+
+    def test_compute_contribution_no_improvement(self):
+        model_mock = model_average_value_mock()
+        participants_weights = [[np.array([0.2])], [np.array([0.4])]]
+        contributions_extractor = ContributionsExtractorMonteCarloShapley(
+            model_mock, "x_validation", "y_validation", seed=0
+        )
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.9)
+        self.assertListEqual([0, 0], alpha)
+
+    def test_compute_contribution_last_metric_close_to_grand_coalition(self):
+        model_mock = model_average_value_mock()
+        participants_weights = [[np.array([0.915])], [np.array([0.895])], [np.array([0.905])]]
+        contributions_extractor = ContributionsExtractorMonteCarloShapley(
+            model_mock, "x_validation", "y_validation", max_permutations=30, tolerance=0.0,
+            truncation_tolerance=0.01, seed=0
+        )
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.90)
+        # the first participant of each permutation is always evaluated, so the
+        # contributions are not truncated to zero by the last global model's metric
+        self.assertAlmostEqual(1.0, sum(alpha))
+        self.assertGreater(alpha[0], alpha[1])
+        self.assertGreater(model_mock.evaluate.call_count, 1)
+
+    def test_compute_contribution_restores_model_weights(self):
+        model_mock = model_average_value_mock()
+        global_weights = [np.array([0.5])]
+        model_mock.set_weights(global_weights)
+        participants_weights = [[np.array([0.2])], [np.array([0.4])]]
+        contributions_extractor = ContributionsExtractorMonteCarloShapley(
+            model_mock, "x_validation", "y_validation", seed=0
+        )
+        self.assertListEqual([0, 0], contributions_extractor.compute_contribution(participants_weights, 0.9))
+        # the global model is published unchanged when alpha is zero
+        self.assertIs(global_weights, model_mock.get_weights())
+
+
+def threshold_model_mock():
+    """
+    Model mock that predicts the label (second feature) of the samples whose first
+    feature is below the threshold set as weights, and the wrong label otherwise
+    """
+    model_mock = MagicMock()
+    model_mock.get_compile_config.return_value = {"metrics": ["accuracy"]}
+    model_weights = {}
+
+    def set_weights(weights):
+        model_weights["threshold"] = weights[0][0]
+
+    def predict(x_samples):
+        return np.where(
+            x_samples[:, 0] < model_weights["threshold"], x_samples[:, 1], 1 - x_samples[:, 1]
+        ).reshape(-1, 1)
+
+    model_mock.set_weights.side_effect = set_weights
+    model_mock.predict.side_effect = predict
+    return model_mock
+
+
+@patch("decentralized_smart_grid_ml.federated_learning.contributions_extractor.build_multi_head_model",
+       side_effect=ValueError("model not clonable"))
+class TestContributionsExtractorEnsembleGeneralAdaptive(unittest.TestCase):
+
+    def setUp(self):
+        n_validation = 1024
+        self.y_val = (np.arange(n_validation) % 2).reshape(-1, 1)
+        self.x_val = np.column_stack([np.linspace(0.0, 1.0, n_validation, endpoint=False), self.y_val])
+
+    def test_not_valid_parameters(self, build_multi_head_model_mock):
+        with self.assertRaises(ValueError):
+            ContributionsExtractorEnsembleGeneralAdaptive("model", self.x_val, self.y_val, growth_factor=1)
+        with self.assertRaises(ValueError):
+            ContributionsExtractorEnsembleGeneralAdaptive("model", self.x_val, self.y_val, initial_fraction=0)
+
+    def test_stratified_order(self, build_multi_head_model_mock):
+        contributions_extractor = ContributionsExtractorEnsembleGeneralAdaptive(
+            "model", self.x_val, self.y_val, seed=0
+        )
+        order = contributions_extractor._get_stratified_order()
+        self.assertListEqual(list(range(len(self.y_val))), sorted(order))
+        # each prefix contains both classes in the same proportion
+        self.assertLessEqual(abs(int(np.sum(self.y_val[order[:64]])) - 32), 1)
+
+    def test_compute_contribution(self, build_multi_head_model_mock):
+        model_mock = threshold_model_mock()
+        evaluation_cache = EvaluationCache()
+        contributions_extractor = ContributionsExtractorEnsembleGeneralAdaptive(
+            model_mock, self.x_val, self.y_val, evaluation_cache, seed=0
+        )
+        # accuracy 1.0, 0.0 and 0.5 (same as the last global model)
+        participants_weights = [[np.array([1.0])], [np.array([0.0])], [np.array([0.5])]]
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        self.assertListEqual([1.0, 0, 0], alpha)
+        n_samples = contributions_extractor.n_samples
+        # the clearly worse model is rejected on the first subsample, while the accepted
+        # model is scored on the whole validation set
+        self.assertListEqual([len(self.y_val), 64, len(self.y_val)], n_samples)
+        intervals = contributions_extractor.confidence_intervals
+        self.assertEqual((1.0, 1.0), intervals[0])
+        self.assertLess(intervals[1][1], 0.5)
+        self.assertEqual((0.5, 0.5), intervals[2])
+        # the full evaluations are cached and reused in the next round
+        self.assertEqual(2, len(evaluation_cache))
+        contributions_extractor.compute_contribution(participants_weights, 0.5)
+        self.assertEqual(len(self.y_val), contributions_extractor.n_samples[2])
+
+    def test_compute_contribution_accepted_full_accuracy(self, build_multi_head_model_mock):
+        model_mock = threshold_model_mock()
+        contributions_extractor = ContributionsExtractorEnsembleGeneralAdaptive(
+            model_mock, self.x_val, self.y_val, seed=0
+        )
+        # accuracy about 0.9 and 1.0 on the whole validation set, both accepted early
+        participants_weights = [[np.array([0.9])], [np.array([1.0])]]
+        alpha = contributions_extractor.compute_contribution(participants_weights, 0.5)
+        self.assertListEqual([len(self.y_val)] * 2, contributions_extractor.n_samples)
+        full_accuracy = np.mean(self.x_val[:, 0] < 0.9)
+        np.testing.assert_allclose([full_accuracy, 1.0], contributions_extractor.scores)
+        improvements = np.array([full_accuracy - 0.5, 0.5])
+        np.testing.assert_allclose(improvements / np.sum(improvements), alpha)
+
+    def test_compute_contribution_not_accuracy(self, build_multi_head_model_mock):
+        model_mock = MagicMock()
+        model_mock.get_compile_config.return_value = {"metrics": ["mae"]}
+        model_mock.evaluate.side_effect = [["loss0", 1.0], ["loss1", 0.0]]
+        contributions_extractor = ContributionsExtractorEnsembleGeneralAdaptive(
+            model_mock, self.x_val, self.y_val
+        )
+        alpha = contributions_extractor.compute_contribution([[np.array([1])], [np.array([2])]], 0.5)
+        self.assertListEqual([1.0, 0], alpha)
+        self.assertIsNone(contributions_extractor.confidence_intervals)
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from decentralized_smart_grid_ml.federated_learning.csv_data_source import CsvDataSource
+
+
+class TestCsvDataSource(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "dataset.csv")
+        pd.DataFrame({
+            "x1": np.arange(10, dtype=np.float64),
+            "x2": np.arange(10, 20, dtype=np.float64),
+            "ignored": ["text"] * 10,
+            "y": [0, 1] * 5
+        }).to_csv(self.csv_path, index=False)
+        self.features_names = {
+            "features": ["x1", "x2"],
+            "labels": "y"
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_to_arrays(self):
+        data_source = CsvDataSource(self.csv_path, self.features_names, chunk_size=3)
+        x, y = data_source.to_arrays()
+        self.assertEqual((10, 2), x.shape)
+        self.assertEqual((10,), y.shape)
+        self.assertEqual(np.float32, x.dtype)
+        self.assertEqual(np.float32, y.dtype)
+        np.testing.assert_array_equal(np.arange(10, 20), x[:, 1])
+        np.testing.assert_array_equal([0, 1] * 5, y)
+
+    def test_count_rows(self):
+        data_source = CsvDataSource(self.csv_path, self.features_names, chunk_size=3)
+        self.assertEqual(10, data_source.count_rows())
+
+    def test_iter_batches(self):
+        data_source = CsvDataSource(self.csv_path, self.features_names, chunk_size=3)
+        batches = list(data_source.iter_batches(4))
+        # the batches span the chunks, only the last one is smaller
+        self.assertListEqual([4, 4, 2], [len(x_batch) for x_batch, _ in batches])
+        np.testing.assert_array_equal(
+            np.arange(10),
+            np.concatenate([x_batch[:, 0] for x_batch, _ in batches])
+        )
+
+    def test_as_dataset(self):
+        data_source = CsvDataSource(
+            self.csv_path,
+            {"features": ["x1"], "labels": ["x2", "y"]},
+            chunk_size=4
+        )
+        dataset = data_source.as_dataset(3)
+        # the dataset can be iterated more than once (one for each epoch)
+        for _ in range(2):
+            batches = [(x_batch.numpy(), y_batch.numpy()) for x_batch, y_batch in dataset]
+            self.assertListEqual([3, 3, 3, 1], [len(x_batch) for x_batch, _ in batches])
+            self.assertEqual((3, 2), batches[0][1].shape)
+
+    def test_as_dataset_shuffle(self):
+        data_source = CsvDataSource(self.csv_path, self.features_names, chunk_size=4)
+        dataset = data_source.as_dataset(5, shuffle_buffer_size=10)
+        rows_orders = []
+        for _ in range(10):
+            batches = [x_batch.numpy()[:, 0] for x_batch, _ in dataset]
+            self.assertListEqual([5, 5], [len(x_batch) for x_batch in batches])
+            np.testing.assert_array_equal(np.arange(10), np.sort(np.concatenate(batches)))
+            rows_orders.extend(batches)
+        # the samples are shuffled inside the batches, not only the batches' order
+        self.assertTrue(any(
+            not np.array_equal(np.sort(x_batch), x_batch) for x_batch in rows_orders
+        ))
+        self.assertTrue(any(
+            not np.array_equal(np.sort(x_batch), np.arange(5)) and
+            not np.array_equal(np.sort(x_batch), np.arange(5, 10)) for x_batch in rows_orders
+        ))
+
+    def test_chunk_size_not_valid(self):
+        with self.assertRaises(ValueError):
+            CsvDataSource(self.csv_path, self.features_names, chunk_size=0)
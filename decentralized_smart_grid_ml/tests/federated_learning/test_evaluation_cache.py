@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.evaluation_cache import EvaluationCache, \
+    weights_fingerprint, VALIDATION_DATASET_ID, TEST_DATASET_ID
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def test_weights_fingerprint(self):
+        weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.ones(3, dtype=np.float32)]
+        weights_copy = [layer_weights.copy() for layer_weights in weights]
+        self.assertEqual(weights_fingerprint(weights), weights_fingerprint(weights_copy))
+        # a different value, shape or dtype changes the fingerprint
+        weights_copy[1][0] = 2.0
+        self.assertNotEqual(weights_fingerprint(weights), weights_fingerprint(weights_copy))
+        weights_reshaped = [weights[0].reshape(3, 2), weights[1]]
+        self.assertNotEqual(weights_fingerprint(weights), weights_fingerprint(weights_reshaped))
+        weights_float64 = [layer_weights.astype(np.float64) for layer_weights in weights]
+        self.assertNotEqual(weights_fingerprint(weights), weights_fingerprint(weights_float64))
+        # non contiguous arrays are hashed as their contiguous copies
+        weights_transposed = [weights[0].T, weights[1]]
+        weights_transposed_copy = [np.ascontiguousarray(weights[0].T), weights[1]]
+        self.assertEqual(
+            weights_fingerprint(weights_transposed), weights_fingerprint(weights_transposed_copy)
+        )
+
+    def test_evaluation_cache_not_valid_size(self):
+        with self.assertRaises(ValueError):
+            EvaluationCache(0)
+
+    def test_get_or_evaluate(self):
+        evaluation_cache = EvaluationCache()
+        weights = [np.ones((2, 2))]
+        evaluate_function = MagicMock(return_value=[0.3, 0.9])
+        self.assertListEqual(
+            [0.3, 0.9],
+            evaluation_cache.get_or_evaluate(weights, VALIDATION_DATASET_ID, evaluate_function)
+        )
+        self.assertListEqual(
+            [0.3, 0.9],
+            evaluation_cache.get_or_evaluate(
+                [np.ones((2, 2))], VALIDATION_DATASET_ID, evaluate_function
+            )
+        )
+        evaluate_function.assert_called_once()
+        # the same model on a different dataset is evaluated again
+        evaluation_cache.get_or_evaluate(weights, TEST_DATASET_ID, evaluate_function)
+        self.assertEqual(2, evaluate_function.call_count)
+        self.assertEqual(1, evaluation_cache.hits)
+        self.assertEqual(2, evaluation_cache.misses)
+        self.assertEqual(2, len(evaluation_cache))
+
+    def test_least_recently_used_eviction(self):
+        evaluation_cache = EvaluationCache(2)
+        evaluation_cache.put("a", VALIDATION_DATASET_ID, 1)
+        evaluation_cache.put("b", VALIDATION_DATASET_ID, 2)
+        # "a" becomes the most recently used one
+        self.assertEqual(1, evaluation_cache.get("a", VALIDATION_DATASET_ID))
+        evaluation_cache.put("c", VALIDATION_DATASET_ID, 3)
+        self.assertEqual(2, len(evaluation_cache))
+        self.assertIsNone(evaluation_cache.get("b", VALIDATION_DATASET_ID))
+        self.assertEqual(1, evaluation_cache.get("a", VALIDATION_DATASET_ID))
+        self.assertEqual(3, evaluation_cache.get("c", VALIDATION_DATASET_ID))
@@ -1,12 +1,40 @@
+import os
 import pathlib
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, call, mock_open
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import patch, call, mock_open, MagicMock
 
 import numpy as np
-import pandas as pd
 
 from decentralized_smart_grid_ml.exceptions import NotValidAlphaVectorError, NotValidParticipantsModelsError
-from decentralized_smart_grid_ml.federated_learning.federated_aggregator import weighted_average_aggregation, Aggregator
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore
+from decentralized_smart_grid_ml.federated_learning.contribution_ledger import ContributionLedger
+from decentralized_smart_grid_ml.federated_learning.contributions_extractor import ContributionsExtractorSimpleAverage
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import weighted_average_aggregation, Aggregator, \
+    WeightedAverageAccumulator
+from decentralized_smart_grid_ml.federated_learning.evaluation_cache import EvaluationCache
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model_weights, \
+    save_fl_weights
+from decentralized_smart_grid_ml.federated_learning.round_policy import RoundPolicy
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import UploadIndex, UploadManifest, \
+    load_verified_weights, write_upload_manifest
+from decentralized_smart_grid_ml.utils.instrumentation import RoundInstrumentation
+
+
+def track_model_weights(model_mock, initial_weights):
+    """ Makes get_weights of a model mock return the weights last set """
+    model_weights = {"weights": initial_weights}
+
+    def set_weights(weights):
+        model_weights["weights"] = weights
+
+    model_mock.set_weights.side_effect = set_weights
+    model_mock.get_weights.side_effect = lambda: [
+        np.asarray(layer_weights) for layer_weights in model_weights["weights"]
+    ]
 
 
 class TestFederatedAggregator(unittest.TestCase):
@@ -58,12 +86,72 @@ class TestFederatedAggregator(unittest.TestCase):
         with self.assertRaises(NotValidParticipantsModelsError):
             weighted_average_aggregation([w1, w2], alpha)
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.STACKED_AGGREGATION_MAX_BYTES", 0)
+    def test_weighted_average_aggregation_streaming(self):
+        # the stacked layers do not fit in memory, the accumulator is used
+        alpha = [0.25, 0.75]
+        w1 = [
+            np.array([[1, 2], [3, 4]]),
+            np.array([4, 5]),
+        ]
+        w2 = [
+            np.array([[5, 6], [7, 8]]),
+            np.array([8, 9]),
+        ]
+        expected_aggregated_weights = [
+            np.array([[4, 5], [6, 7]]),
+            np.array([7, 8])
+        ]
+        aggregated_weights = weighted_average_aggregation([w1, w2], alpha)
+        for expected_layer_weights, layer_weights in zip(expected_aggregated_weights, aggregated_weights):
+            np.testing.assert_array_equal(expected_layer_weights, layer_weights)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.STACKED_AGGREGATION_MAX_BYTES", 0)
+    def test_weighted_average_aggregation_streaming_different_shapes(self):
+        alpha = [0.5, 0.5]
+        w1 = [np.array([1, 2, 3])]
+        w2 = [np.array([3, 4])]
+        with self.assertRaises(NotValidParticipantsModelsError):
+            weighted_average_aggregation([w1, w2], alpha)
+        w2 = [np.array([1, 2, 3]), np.array([6, 7])]
+        with self.assertRaises(NotValidParticipantsModelsError):
+            weighted_average_aggregation([w1, w2], alpha)
+
+    def test_weighted_average_accumulator(self):
+        accumulator = WeightedAverageAccumulator()
+        accumulator.begin([np.zeros(3), np.zeros(2)])
+        accumulator.add([np.array([1, 2, 3]), np.array([4, 5])], 0.5)
+        accumulator.add([np.array([3, 4, 5]), np.array([6, 7])], 0.5)
+        self.assertEqual(2, accumulator.n_participants)
+        aggregated_weights = accumulator.finalize()
+        np.testing.assert_array_equal(np.array([2, 3, 4]), aggregated_weights[0])
+        np.testing.assert_array_equal(np.array([5, 6]), aggregated_weights[1])
+        self.assertEqual(np.float64, aggregated_weights[0].dtype)
+        # the accumulator is ready for a new aggregation
+        self.assertIsNone(accumulator.aggregated_weights)
+        self.assertEqual(0, accumulator.n_participants)
+
+    def test_weighted_average_accumulator_normalize(self):
+        accumulator = WeightedAverageAccumulator()
+        accumulator.begin()
+        accumulator.add([np.array([1, 2])], 2.0)
+        accumulator.add([np.array([4, 8])], 1.0)
+        aggregated_weights = accumulator.finalize(normalize=True)
+        np.testing.assert_array_equal(np.array([2, 4]), aggregated_weights[0])
+
+    def test_weighted_average_accumulator_error_alpha(self):
+        accumulator = WeightedAverageAccumulator()
+        accumulator.begin()
+        accumulator.add([np.array([1, 2])], 0.3)
+        with self.assertRaises(NotValidAlphaVectorError):
+            accumulator.finalize()
+
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
-    @patch("pandas.read_csv")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.CsvDataSource")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.load_fl_model")
-    def test_aggregator_constructor(self, load_fl_model_mock, read_csv_mock, announcement_config_mock):
+    def test_aggregator_constructor(self, load_fl_model_mock, csv_data_source_mock, announcement_config_mock):
         participant_ids = [0, 1, 2]
         global_model_path = "/path/to/model"
         announcement_config_mock.fl_rounds = 2
@@ -73,22 +161,14 @@ class TestFederatedAggregator(unittest.TestCase):
             "labels": "y"
         }
         announcement_config_mock.aggregation_method = "ensemble_general"
+        announcement_config_mock.round_policy = {}
         validation_set_path = "/path/to/validation.csv"
         test_set_path = "/path/to/test.csv"
         model_weights_new_round_path = "/path/to/new_model_weights"
-        read_csv_mock.side_effect = [
-            pd.DataFrame({
-                "x1": [0, 1],
-                "x2": [1, 2],
-                "y": [0, 1]
-            }),
-            pd.DataFrame({
-                "x1": [0, 1],
-                "x2": [1, 2],
-                "y": [0, 1]
-            })
-        ]
-        model_artifact = "expected model"
+        x_val = np.array([[0, 1], [1, 2]], dtype=np.float32)
+        y_val = np.array([0, 1], dtype=np.float32)
+        csv_data_source_mock.return_value.to_arrays.return_value = (x_val, y_val)
+        model_artifact = MagicMock()
         load_fl_model_mock.return_value = model_artifact
         rounds2participants_expected = {
             0: {
@@ -109,21 +189,34 @@ class TestFederatedAggregator(unittest.TestCase):
             test_set_path,
             model_weights_new_round_path
         )
-        read_csv_mock.has_calls(
-            call(test_set_path),
-            call(validation_set_path)
-        )
+        csv_data_source_mock.assert_has_calls([
+            call(validation_set_path, announcement_config_mock.features_names),
+            call(test_set_path, announcement_config_mock.features_names)
+        ], any_order=True)
+        self.assertIs(x_val, aggregator.x_val)
+        self.assertIs(y_val, aggregator.y_val)
+        self.assertEqual(csv_data_source_mock.return_value, aggregator.test_data_source)
         load_fl_model_mock.assert_called_with(global_model_path)
         self.assertDictEqual(rounds2participants_expected, aggregator.rounds2participants)
 
-    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.load_fl_model_weights")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
-    def test_add_participant_weights(self, aggregator_init_mock, load_fl_model_weights_mock):
+    def test_add_participant_weights(self, aggregator_init_mock):
         # simulate correct file path for participant 0, round 0
         path_file_created = "/participants/participant_0/weights_round_0.json"
-        load_fl_model_weights_mock.return_value = [1, 2]
+        weights_future = Future()
+        weights_future.set_result([1, 2])
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = weights_future
         aggregator.rounds2participants = {
             0: {
                 "valid_participant_ids": [0],
@@ -134,31 +227,214 @@ class TestFederatedAggregator(unittest.TestCase):
         rounds2participants_expected = {
             0: {
                 "valid_participant_ids": [0],
-                "participant_weights": [[1, 2]],
+                "participant_weights": [weights_future],
                 "participant_ids": [0]
             }
         }
         is_completed = aggregator.add_participant_weights(path_file_created)
-        load_fl_model_weights_mock.called_with(path_file_created)
+        aggregator.weights_loading_pool.submit.assert_called_with(path_file_created, load_fl_model_weights)
         self.assertDictEqual(rounds2participants_expected, aggregator.rounds2participants)
         self.assertEqual(True, is_completed)
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_duplicate_cid(self, aggregator_init_mock):
+        weights_future = Future()
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
+        aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.reference_weights = [np.zeros(2)]
+        aggregator.global_weights_cid = None
+        aggregator.uploads_cids2weights = {}
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = weights_future
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1, 2],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            content_store = ContentAddressedStore(os.path.join(tmp_dir, "store"))
+            paths = []
+            for participant_id, weights in enumerate([[np.ones(2)], [np.ones(2)], [np.full(2, 2.0)]]):
+                os.makedirs(os.path.join(tmp_dir, "participant_" + str(participant_id)))
+                paths.append(os.path.join(tmp_dir, "participant_" + str(participant_id), "weights_round_0.cid"))
+                save_fl_weights(weights, paths[-1], None, content_store)
+            aggregator.add_participant_weights(paths[0])
+            aggregator.add_participant_weights(paths[1])
+            # the identical upload is detected from the pointer file and not loaded again
+            self.assertEqual(1, aggregator.weights_loading_pool.submit.call_count)
+            self.assertListEqual([paths[1]], aggregator.rounds2participants[0]["duplicate_uploads"])
+            self.assertIs(weights_future, aggregator.rounds2participants[0]["participant_weights"][1])
+            self.assertEqual(True, aggregator.add_participant_weights(paths[2]))
+            self.assertEqual(2, aggregator.weights_loading_pool.submit.call_count)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_update_global_model_duplicate_uploads(self, aggregator_init_mock):
+        original_future, copied_future = Future(), Future()
+        original_future.set_result([np.ones(2)])
+        copied_future.set_result([np.full(2, 3.0)])
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = ContributionLedger([0, 1, 2], 1)
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.current_round = 0
+        aggregator.is_finished = False
+        aggregator.announcement_config = MagicMock(fl_rounds=1)
+        aggregator.model_weights_new_round_path = None
+        aggregator.reference_weights = [np.zeros(2)]
+        aggregator.global_model = MagicMock()
+        aggregator.contribution_extractor = ContributionsExtractorSimpleAverage("model", [], [])
+        aggregator.test_evaluation_executor = MagicMock()
+        aggregator.rounds2test_evaluations = {}
+        aggregator.prometheus_textfile_path = None
+        # the participant 1 uploaded the same content of the participant 0
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1, 2],
+                "participant_weights": [original_future, original_future, copied_future],
+                "participant_ids": [0, 1, 2]
+            }
+        }
+        with patch.object(Aggregator, "_evaluate_validation_set", return_value=[0.5, 0.5]):
+            aggregator.update_global_model()
+        round_participants = aggregator.rounds2participants[0]
+        self.assertListEqual([0, 2], round_participants["participant_ids"])
+        self.assertListEqual([1], round_participants["duplicate_participant_ids"])
+        self.assertListEqual([0.5, 0.5], round_participants["alpha"])
+        # the copy is aggregated once and the duplicate upload gets no contribution
+        np.testing.assert_allclose(
+            np.full(2, 2.0), aggregator.global_model.set_weights.call_args[0][0][0]
+        )
+        self.assertListEqual([0.5, 0.0, 0.5], aggregator.get_participants_contributions())
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_manifests(self, aggregator_init_mock):
+        weights_future = Future()
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = True
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
+        aggregator.is_finished = False
+        aggregator.current_round = 10
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = weights_future
+        aggregator.rounds2participants = {
+            idx_round: {
+                "valid_participant_ids": [12, 120],
+                "participant_weights": [],
+                "participant_ids": []
+            } for idx_round in [10, 11]
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            uploads = {}
+            for participant_id, idx_round in [(12, 10), (120, 11)]:
+                participant_path = os.path.join(tmp_dir, "participant_" + str(participant_id))
+                os.makedirs(participant_path)
+                weights_path = os.path.join(participant_path, "weights_round_" + str(idx_round) + ".json")
+                save_fl_weights([np.ones(2)], weights_path)
+                uploads[participant_id] = (
+                    weights_path, write_upload_manifest(weights_path, participant_id, idx_round, 100)
+                )
+            # the weights file is added only through its manifest
+            self.assertFalse(aggregator.add_participant_weights(uploads[12][0]))
+            aggregator.weights_loading_pool.submit.assert_not_called()
+            self.assertFalse(aggregator.add_participant_weights(uploads[12][1]))
+            # the weights file is checked against the manifest's hash by the loading worker
+            aggregator.weights_loading_pool.submit.assert_called_once_with(
+                uploads[12][0], load_verified_weights,
+                aggregator.upload_index.get(10, 12).weights_hash, load_fl_model_weights
+            )
+            self.assertFalse(aggregator.add_participant_weights(uploads[12][1]))
+            self.assertEqual(1, aggregator.weights_loading_pool.submit.call_count)
+            self.assertListEqual([12], aggregator.rounds2participants[10]["participant_ids"])
+            # the upload of the next round waits for its round
+            self.assertFalse(aggregator.add_participant_weights(uploads[120][1]))
+            self.assertListEqual([], aggregator.rounds2participants[11]["participant_ids"])
+            aggregator.current_round = 11
+            self.assertFalse(aggregator._add_deferred_uploads())
+            self.assertListEqual([120], aggregator.rounds2participants[11]["participant_ids"])
+            aggregator.weights_loading_pool.submit.assert_called_with(
+                uploads[120][0], load_verified_weights,
+                aggregator.upload_index.get(11, 120).weights_hash, load_fl_model_weights
+            )
+            self.assertEqual(100, aggregator.upload_index.get(11, 120).sample_count)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_join_participant_weights(self, aggregator_init_mock):
+        loaded_future = Future()
+        loaded_future.set_result([1, 2])
+        failed_future = Future()
+        failed_future.set_exception(ValueError("malformed json"))
+        aggregator = Aggregator()
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1, 2],
+                "participant_weights": [loaded_future, failed_future, [3, 4]],
+                "participant_ids": [0, 1, 2]
+            }
+        }
+        aggregator._join_participant_weights(0)
+        # the participant whose weights cannot be loaded is removed from the round
+        self.assertListEqual([[1, 2], [3, 4]], aggregator.rounds2participants[0]["participant_weights"])
+        self.assertListEqual([0, 2], aggregator.rounds2participants[0]["participant_ids"])
+
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
     def test_add_participant_weights_wrong_round(self, aggregator_init_mock):
         # simulate wrong file path for not existing round 1
         path_file_created = "/participants/participant_0/weights_round_1.json"
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
         is_completed = aggregator.add_participant_weights(path_file_created)
         self.assertEqual(False, is_completed)
 
-    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.load_fl_model_weights")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
-    def test_add_participant_weights_wrong_participant_id(self, aggregator_init_mock, load_fl_model_weights_mock):
+    def test_add_participant_weights_wrong_participant_id(self, aggregator_init_mock):
         # simulate wrong file path for not existing participant 1
         path_file_created = "/participants/participant_1/weights_round_0.json"
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.weights_loading_pool = MagicMock()
         aggregator.rounds2participants = {
             0: {
                 # the participant id 1 is not present in the valid ones
@@ -168,15 +444,219 @@ class TestFederatedAggregator(unittest.TestCase):
             }
         }
         is_completed = aggregator.add_participant_weights(path_file_created)
+        aggregator.weights_loading_pool.submit.assert_not_called()
         self.assertEqual(False, is_completed)
 
-    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.load_fl_model_weights")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
-    def test_add_participant_weights_wrong_malformed_path(self, aggregator_init_mock, load_fl_model_weights_mock):
+    def test_add_participant_local_weights(self, aggregator_init_mock):
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
+        aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        self.assertEqual(False, aggregator.add_participant_local_weights(1, [1, 2]))
+        # the weights of a participant are added only once
+        self.assertEqual(False, aggregator.add_participant_local_weights(1, [3, 4]))
+        self.assertEqual(False, aggregator.add_participant_local_weights(2, [3, 4]))
+        self.assertEqual(True, aggregator.add_participant_local_weights(0, [5, 6]))
+        self.assertListEqual([[1, 2], [5, 6]], aggregator.rounds2participants[0]["participant_weights"])
+        self.assertListEqual([1, 0], aggregator.rounds2participants[0]["participant_ids"])
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_local_weights_late(self, aggregator_init_mock):
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy(late_uploads="next_round")
+        aggregator.current_round = 1
+        aggregator.previous_reference_weights = [np.zeros(2)]
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.rounds2participants = {
+            0: {"valid_participant_ids": [0, 1], "participant_weights": [[1, 2]], "participant_ids": [0]},
+            1: {"valid_participant_ids": [0, 1], "participant_weights": [], "participant_ids": []},
+            2: {"valid_participant_ids": [0, 1], "participant_weights": [], "participant_ids": []}
+        }
+        # the update of round 0 is carried into the current round, as a late upload
+        self.assertEqual(False, aggregator.add_participant_local_weights(1, [3, 4], 0))
+        self.assertListEqual([1], aggregator.rounds2participants[0]["late_participant_ids"])
+        self.assertListEqual([[3, 4]], aggregator.rounds2participants[1]["participant_weights"])
+        self.assertListEqual([1], aggregator.rounds2participants[1]["participant_ids"])
+        # the updates already received and the ones ahead of the current round are skipped
+        self.assertEqual(False, aggregator.add_participant_local_weights(1, [5, 6], 0))
+        self.assertEqual(False, aggregator.add_participant_local_weights(0, [5, 6], 2))
+        self.assertEqual(True, aggregator.add_participant_local_weights(0, [7, 8], 1))
+        self.assertListEqual([1, 0], aggregator.rounds2participants[1]["participant_ids"])
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_local_weights_quorum(self, aggregator_init_mock):
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = time.perf_counter()
+        aggregator.round_policy = RoundPolicy(quorum=0.5, deadline=3600)
+        aggregator.current_round = 0
+        aggregator.is_finished = False
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1, 2, 3],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        self.assertEqual(False, aggregator.add_participant_local_weights(0, [1, 2]))
+        self.assertEqual(False, aggregator.add_participant_local_weights(1, [3, 4]))
+        # the quorum is reached but the deadline has not expired yet
+        self.assertEqual(False, aggregator.is_round_closable())
+        aggregator.round_start_time -= 3600
+        self.assertEqual(True, aggregator.is_round_closable())
+        aggregator.is_finished = True
+        self.assertEqual(False, aggregator.is_round_closable())
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_late(self, aggregator_init_mock):
+        path_file_created = "/participants/participant_1/weights_round_0.flw"
+        weights_future = Future()
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy(late_uploads="next_round")
+        aggregator.current_round = 1
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.reference_weights = [np.ones(2)]
+        aggregator.previous_reference_weights = [np.zeros(2)]
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = weights_future
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [[1, 2]],
+                "participant_ids": [0]
+            },
+            1: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        is_completed = aggregator.add_participant_weights(path_file_created)
+        self.assertEqual(False, is_completed)
+        # the update of round 0 is reconstructed from the global model of round 0
+        submit_args = aggregator.weights_loading_pool.submit.call_args[0]
+        self.assertEqual(path_file_created, submit_args[0])
+        self.assertIs(aggregator.previous_reference_weights, submit_args[2])
+        self.assertListEqual([1], aggregator.rounds2participants[0]["late_participant_ids"])
+        self.assertListEqual([1], aggregator.rounds2participants[1]["participant_ids"])
+        self.assertListEqual([weights_future], aggregator.rounds2participants[1]["participant_weights"])
+        # the same late upload is not counted twice
+        self.assertEqual(False, aggregator.add_participant_weights(path_file_created))
+        self.assertListEqual([1], aggregator.rounds2participants[1]["participant_ids"])
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_late_dropped(self, aggregator_init_mock):
+        path_file_created = "/participants/participant_1/weights_round_0.json"
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
+        aggregator.current_round = 1
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [[1, 2]],
+                "participant_ids": [0]
+            },
+            1: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        self.assertEqual(False, aggregator.add_participant_weights(path_file_created))
+        aggregator.weights_loading_pool.submit.assert_not_called()
+        self.assertListEqual([1], aggregator.rounds2participants[0]["late_participant_ids"])
+        self.assertListEqual([], aggregator.rounds2participants[1]["participant_ids"])
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_asynchronous(self, aggregator_init_mock):
+        weights_future = Future()
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy(asynchronous=True, buffer_size=2, max_staleness=1)
+        aggregator.current_round = 2
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.reference_weights = [np.full(2, 2.0)]
+        aggregator.rounds2global_weights = {1: [np.ones(2)], 2: aggregator.reference_weights}
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = weights_future
+        aggregator.rounds2participants = {
+            idx_round: {
+                "valid_participant_ids": [0, 1, 2],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+            for idx_round in range(3)
+        }
+        # too stale: the global model of round 0 is not available anymore
+        self.assertEqual(False, aggregator.add_participant_weights("/participants/participant_0/weights_round_0.flw"))
+        aggregator.weights_loading_pool.submit.assert_not_called()
+        self.assertEqual(False, aggregator.add_participant_weights("/participants/participant_0/weights_round_1.flw"))
+        self.assertIs(
+            aggregator.rounds2global_weights[1], aggregator.weights_loading_pool.submit.call_args[0][2]
+        )
+        # the buffer is full after two uploads
+        self.assertEqual(True, aggregator.add_participant_weights("/participants/participant_2/weights_round_2.flw"))
+        self.assertIs(aggregator.reference_weights, aggregator.weights_loading_pool.submit.call_args[0][2])
+        self.assertListEqual([0, 2], aggregator.rounds2participants[2]["participant_ids"])
+        self.assertListEqual([1, 2], aggregator.rounds2participants[2]["participant_base_rounds"])
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_add_participant_weights_wrong_malformed_path(self, aggregator_init_mock):
         # simulate wrong file path for not existing participant 1
         path_file_created = "/participants/weights_round_0.json"
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 0
+        aggregator.rounds_lock = threading.Lock()
         is_completed = aggregator.add_participant_weights(path_file_created)
         self.assertEqual(False, is_completed)
 
@@ -201,34 +681,57 @@ class TestFederatedAggregator(unittest.TestCase):
         test_results = [0.8, 0.7]
         x_val = [[2, 1], [3, 4]]
         y_val = [1, 1]
-        x_test = [[1, 2], [2, 3]]
-        y_test = [0, 1]
+        test_data_source_mock = MagicMock()
+        test_dataset = "test dataset"
+        test_data_source_mock.as_dataset.return_value = test_dataset
         global_model_mock.evaluate.side_effect = (
             validation_results,
-            validation_results,
-            test_results
+            validation_results
         )
+        test_model_mock = MagicMock()
+        test_model_mock.evaluate.return_value = test_results
         global_weights = [2, 3]
         weighted_average_aggregation_mock.return_value = global_weights
+        contributions_extractor_mock.confidence_intervals = None
         contributions_extractor_mock.compute_contribution.return_value = [0.5, 0.5]
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.prometheus_textfile_path = None
+        aggregator.round_start_time = 0.0
+        aggregator.reference_weights = [[1, 1]]
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 0
         aggregator.announcement_config = announcement_config_mock
-        aggregator.x_test = x_test
-        aggregator.y_test = y_test
+        aggregator.test_data_source = test_data_source_mock
         aggregator.x_val = x_val
         aggregator.y_val = y_val
         aggregator.is_finished = False
         aggregator.contribution_extractor = contributions_extractor_mock
         aggregator.model_weights_new_round_path = model_weights_new_round_path
+        aggregator.content_store = None
         aggregator.rounds2participants = {
             0: {
                 "valid_participant_ids": [0, 1],
                 "participant_weights": [[1, 2], [3, 4]],
                 "participant_ids": [0, 1]
+            },
+            1: {
+                "valid_participant_ids": [1],
+                "participant_weights": [],
+                "participant_ids": []
             }
         }
         aggregator.global_model = global_model_mock
+        aggregator.evaluation_cache = EvaluationCache()
+        track_model_weights(global_model_mock, [[1, 1]])
+        aggregator.test_model = test_model_mock
+        aggregator.test_evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        aggregator.rounds2test_evaluations = {}
         rounds2participants_expected = {
             0: {
                 "valid_participant_ids": [0, 1],
@@ -237,9 +740,25 @@ class TestFederatedAggregator(unittest.TestCase):
                 "alpha": [0.5, 0.5],
                 "validation_results": validation_results,
                 "test_results": validation_results
+            },
+            1: {
+                "valid_participant_ids": [1],
+                "participant_weights": [],
+                "participant_ids": []
             }
         }
-        aggregator.update_global_model()
+        with patch(
+                "decentralized_smart_grid_ml.federated_learning.federated_aggregator.write_round_manifest"
+        ) as write_round_manifest_mock:
+            aggregator.update_global_model()
+        # the participants selected for the next round are published with its global model
+        write_round_manifest_mock.assert_called_once_with(
+            model_weights_new_round_path + "validator_weights_round_1.round", 1, [1]
+        )
+        # the weights of the next round are published before the test evaluation
+        aggregator.join_test_evaluations()
+        aggregator.test_evaluation_executor.shutdown()
+        test_model_mock.evaluate.assert_called_once_with(test_dataset)
         weighted_average_aggregation_mock.assert_called_with(
             [[1, 2], [3, 4]],   # participants' weights
             [0.5, 0.5]          # computed contributions
@@ -247,7 +766,7 @@ class TestFederatedAggregator(unittest.TestCase):
         global_model_mock.set_weights.assert_called_with(global_weights)
         global_model_mock.evaluate.has_calls(
             call(x_val, y_val),
-            call(x_test, y_test),
+            call(test_dataset),
         )
         save_fl_model_weights_mock.assert_called_with(
             global_model_mock,
@@ -260,6 +779,82 @@ class TestFederatedAggregator(unittest.TestCase):
         self.assertEqual(1, aggregator.current_round)
         self.assertEqual(False, aggregator.is_finished)
 
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.contributions_extractor.ContributionsExtractor"
+    )
+    @patch(
+        "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
+    )
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.weighted_average_aggregation")
+    @patch("tensorflow.keras.Sequential")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_update_global_model_deferred_completion(self, aggregator_init_mock, global_model_mock,
+                                                     weighted_average_aggregation_mock,
+                                                     announcement_config_mock,
+                                                     contributions_extractor_mock):
+        announcement_config_mock.fl_rounds = 2
+        test_data_source_mock = MagicMock()
+        test_data_source_mock.as_dataset.return_value = "test dataset"
+        global_model_mock.evaluate.side_effect = [[0.8, 0.7], [0.8, 0.6], [0.8, 0.5]]
+        test_model_mock = MagicMock()
+        test_model_mock.evaluate.return_value = [0.8, 0.7]
+        weighted_average_aggregation_mock.side_effect = [[2, 3], [4, 5]]
+        contributions_extractor_mock.confidence_intervals = None
+        contributions_extractor_mock.compute_contribution.side_effect = [[0.5, 0.5], [1.0]]
+        deferred_future = Future()
+        deferred_future.set_result([5, 6])
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.prometheus_textfile_path = None
+        aggregator.round_start_time = 0.0
+        aggregator.reference_weights = [[1, 1]]
+        aggregator.round_policy = RoundPolicy()
+        aggregator.current_round = 0
+        aggregator.announcement_config = announcement_config_mock
+        aggregator.test_data_source = test_data_source_mock
+        aggregator.x_val = [[2, 1], [3, 4]]
+        aggregator.y_val = [1, 1]
+        aggregator.is_finished = False
+        aggregator.contribution_extractor = contributions_extractor_mock
+        aggregator.model_weights_new_round_path = None
+        aggregator.content_store = None
+        aggregator.weights_loading_pool = MagicMock()
+        aggregator.weights_loading_pool.submit.return_value = deferred_future
+        aggregator.rounds2participants = {
+            0: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [[1, 2], [3, 4]],
+                "participant_ids": [0, 1]
+            },
+            1: {
+                "valid_participant_ids": [1],
+                "participant_weights": [],
+                "participant_ids": []
+            }
+        }
+        aggregator.global_model = global_model_mock
+        aggregator.evaluation_cache = EvaluationCache()
+        track_model_weights(global_model_mock, [[1, 1]])
+        aggregator.test_model = test_model_mock
+        aggregator.test_evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        aggregator.rounds2test_evaluations = {}
+        # the only participant of the next round uploaded its weights before the round started
+        aggregator.upload_index.defer(UploadManifest(1, 1, "/participant_1/weights_round_1.flw"))
+        aggregator.update_global_model()
+        aggregator.join_test_evaluations()
+        aggregator.test_evaluation_executor.shutdown()
+        # the next round is closed as soon as it starts, without waiting for another upload
+        self.assertEqual(2, aggregator.current_round)
+        self.assertTrue(aggregator.is_finished)
+        self.assertListEqual([1], aggregator.rounds2participants[1]["participant_ids"])
+        weighted_average_aggregation_mock.assert_called_with([[5, 6]], [1.0])
+        self.assertEqual([0.8, 0.5], aggregator.rounds2participants[1]["validation_results"])
+
     @patch(
         "decentralized_smart_grid_ml.federated_learning.contributions_extractor.ContributionsExtractor"
     )
@@ -281,25 +876,38 @@ class TestFederatedAggregator(unittest.TestCase):
         announcement_config_mock.fl_rounds = 2
         x_val = [[1, 2], [2, 3]]
         y_val = [0, 1]
-        x_test = [[1, 2], [2, 3]]
-        y_test = [0, 1]
+        test_data_source_mock = MagicMock()
+        test_dataset = "test dataset"
+        test_data_source_mock.as_dataset.return_value = test_dataset
+        contributions_extractor_mock.confidence_intervals = None
         contributions_extractor_mock.compute_contribution.return_value = [0.5, 0.5]
         global_model_mock.evaluate.side_effect = [
-            validation_results,
-            test_results
+            validation_results
         ]
+        test_model_mock = MagicMock()
+        test_model_mock.evaluate.return_value = test_results
         global_weights = [2, 3]
         weighted_average_aggregation_mock.return_value = global_weights
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.prometheus_textfile_path = None
+        aggregator.round_start_time = 0.0
+        aggregator.reference_weights = [[1, 1]]
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 1
         aggregator.announcement_config = announcement_config_mock
         aggregator.x_val = x_val
         aggregator.y_val = y_val
-        aggregator.x_test = x_test
-        aggregator.y_test = y_test
+        aggregator.test_data_source = test_data_source_mock
         aggregator.is_finished = False
         aggregator.contribution_extractor = contributions_extractor_mock
         aggregator.model_weights_new_round_path = model_weights_new_round_path
+        aggregator.content_store = None
         aggregator.rounds2participants = {
             0: {
                 "valid_participant_ids": [0, 1],
@@ -316,6 +924,11 @@ class TestFederatedAggregator(unittest.TestCase):
             }
         }
         aggregator.global_model = global_model_mock
+        aggregator.evaluation_cache = EvaluationCache()
+        track_model_weights(global_model_mock, [[1, 1]])
+        aggregator.test_model = test_model_mock
+        aggregator.test_evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        aggregator.rounds2test_evaluations = {}
         rounds2participants_expected = {
             0: {
                 "valid_participant_ids": [0, 1],
@@ -335,10 +948,14 @@ class TestFederatedAggregator(unittest.TestCase):
             }
         }
         aggregator.update_global_model()
+        # the weights of the next round are published before the test evaluation
+        aggregator.join_test_evaluations()
+        aggregator.test_evaluation_executor.shutdown()
+        test_model_mock.evaluate.assert_called_once_with(test_dataset)
         global_model_mock.set_weights.assert_called_with(global_weights)
         global_model_mock.evaluate.has_calls(
             call(x_val, y_val),
-            call(x_test, y_test),
+            call(test_dataset),
         )
         save_fl_model_weights_mock.assert_called_with(
             global_model_mock,
@@ -360,22 +977,12 @@ class TestFederatedAggregator(unittest.TestCase):
         announcement_config_mock.fl_rounds = 3
         aggregator.announcement_config = announcement_config_mock
         aggregator.participant_ids = [0, 1, 2]
+        aggregator.contribution_ledger = ContributionLedger(aggregator.participant_ids, 3)
         # here we assume that it is possible to take only a subset of participants
         # for each round (general case)
-        aggregator.rounds2participants = {
-            0: {
-                "participant_ids": [1, 2],
-                "alpha": [0.6, 0.4]
-            },
-            1: {
-                "participant_ids": [0, 1, 2],
-                "alpha": [0.3, 0.4, 0.3]
-            },
-            2: {
-                "participant_ids": [0, 1],
-                "alpha": [0.7, 0.3]
-            }
-        }
+        aggregator.contribution_ledger.record_round(0, [1, 2], [0.6, 0.4])
+        aggregator.contribution_ledger.record_round(1, [0, 1, 2], [0.3, 0.4, 0.3])
+        aggregator.contribution_ledger.record_round(2, [0, 1], [0.7, 0.3])
         final_contributions_expected = [0.33, 0.43, 0.23]
         final_contributions = aggregator.get_participants_contributions()
         self.assertListEqual(final_contributions_expected, final_contributions)
@@ -389,6 +996,15 @@ class TestFederatedAggregator(unittest.TestCase):
         file_output_path = "test/output.json"
         m_o = mock_open()
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.instrumentation.record(0, "aggregation", 0.5, 0.25, 10, 20, 30)
+        test_evaluation = Future()
+        test_evaluation.set_result("test tests")
+        aggregator.rounds2test_evaluations = {0: test_evaluation}
         announcement_config_mock.fl_rounds = 1
         aggregator.announcement_config = announcement_config_mock
         aggregator.rounds2participants = {
@@ -396,7 +1012,6 @@ class TestFederatedAggregator(unittest.TestCase):
                 "participant_ids": "test participants ids",
                 "alpha": "test alpha",
                 "validation_results": "test validation",
-                "test_results": "test tests",
                 "participant_weights": "test weights",
                 "valid_participant_ids": "test valid participant ids"
             }
@@ -407,6 +1022,16 @@ class TestFederatedAggregator(unittest.TestCase):
                 "alpha": "test alpha",
                 "validation_results": "test validation",
                 "test_results": "test tests",
+                "timings": {
+                    "aggregation": {
+                        "count": 1,
+                        "wall_time": 0.5,
+                        "cpu_time": 0.25,
+                        "bytes_read": 10,
+                        "bytes_written": 20,
+                        "peak_rss": 30
+                    }
+                }
             }
         }
         with patch('decentralized_smart_grid_ml.federated_learning.federated_aggregator.open', m_o):
@@ -414,6 +1039,10 @@ class TestFederatedAggregator(unittest.TestCase):
             m_o.assert_called_with(file_output_path, "w")
             handle = m_o()
             json_dump_mock.assert_called_with(statistics_expected, handle, indent="\t")
+        # the statistics of the aggregator are not modified
+        self.assertIn("participant_weights", aggregator.rounds2participants[0])
+        self.assertIn("valid_participant_ids", aggregator.rounds2participants[0])
+        self.assertNotIn("timings", aggregator.rounds2participants[0])
 
     @patch(
         "decentralized_smart_grid_ml.federated_learning.contributions_extractor.ContributionsExtractor"
@@ -437,25 +1066,38 @@ class TestFederatedAggregator(unittest.TestCase):
         announcement_config_mock.fl_rounds = 2
         x_val = [[1, 2], [2, 3]]
         y_val = [0, 1]
-        x_test = [[1, 2], [2, 3]]
-        y_test = [0, 1]
+        test_data_source_mock = MagicMock()
+        test_dataset = "test dataset"
+        test_data_source_mock.as_dataset.return_value = test_dataset
+        contributions_extractor_mock.confidence_intervals = None
         contributions_extractor_mock.compute_contribution.return_value = [0, 0]
         global_model_mock.evaluate.side_effect = [
-            validation_results,
-            test_results
+            validation_results
         ]
+        test_model_mock = MagicMock()
+        test_model_mock.evaluate.return_value = test_results
         global_weights = [2, 3]
         weighted_average_aggregation_mock.return_value = global_weights
         aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.prometheus_textfile_path = None
+        aggregator.round_start_time = 0.0
+        aggregator.reference_weights = [[1, 1]]
+        aggregator.round_policy = RoundPolicy()
         aggregator.current_round = 1
         aggregator.announcement_config = announcement_config_mock
         aggregator.x_val = x_val
         aggregator.y_val = y_val
-        aggregator.x_test = x_test
-        aggregator.y_test = y_test
+        aggregator.test_data_source = test_data_source_mock
         aggregator.is_finished = False
         aggregator.contribution_extractor = contributions_extractor_mock
         aggregator.model_weights_new_round_path = model_weights_new_round_path
+        aggregator.content_store = None
         aggregator.rounds2participants = {
             0: {
                 "valid_participant_ids": [0, 1],
@@ -472,6 +1114,11 @@ class TestFederatedAggregator(unittest.TestCase):
             }
         }
         aggregator.global_model = global_model_mock
+        aggregator.evaluation_cache = EvaluationCache()
+        track_model_weights(global_model_mock, [[1, 1]])
+        aggregator.test_model = test_model_mock
+        aggregator.test_evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        aggregator.rounds2test_evaluations = {}
         rounds2participants_expected = {
             0: {
                 "valid_participant_ids": [0, 1],
@@ -491,11 +1138,71 @@ class TestFederatedAggregator(unittest.TestCase):
             }
         }
         aggregator.update_global_model()
+        # the weights of the next round are published before the test evaluation
+        aggregator.join_test_evaluations()
+        aggregator.test_evaluation_executor.shutdown()
+        test_model_mock.evaluate.assert_called_once_with(test_dataset)
         global_model_mock.evaluate.has_calls(
             call(x_val, y_val),
-            call(x_test, y_test),
+            call(test_dataset),
         )
         self.assertDictEqual(
             rounds2participants_expected,
             aggregator.rounds2participants
-        )
\ No newline at end of file
+        )
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.save_fl_model_weights")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator.__init__", return_value=None)
+    def test_update_global_model_asynchronous(self, aggregator_init_mock, save_fl_model_weights_mock):
+        announcement_config_mock = MagicMock()
+        announcement_config_mock.fl_rounds = 3
+        global_model_mock = MagicMock()
+        global_model_mock.evaluate.return_value = [0.1, 0.9]
+        contributions_extractor_mock = MagicMock()
+        contributions_extractor_mock.confidence_intervals = None
+        contributions_extractor_mock.compute_contribution.return_value = [0.5, 0.5]
+        aggregator = Aggregator()
+        aggregator.instrumentation = RoundInstrumentation()
+        aggregator.round_journal = None
+        aggregator.require_upload_manifests = False
+        aggregator.upload_index = UploadIndex()
+        aggregator.rounds_lock = threading.Lock()
+        aggregator.contribution_ledger = MagicMock()
+        aggregator.prometheus_textfile_path = None
+        aggregator.round_start_time = 0.0
+        aggregator.round_policy = RoundPolicy(asynchronous=True, buffer_size=2, max_staleness=1)
+        aggregator.current_round = 1
+        aggregator.is_finished = False
+        aggregator.announcement_config = announcement_config_mock
+        aggregator.contribution_extractor = contributions_extractor_mock
+        aggregator.model_weights_new_round_path = None
+        aggregator.global_model = global_model_mock
+        aggregator.evaluation_cache = EvaluationCache()
+        aggregator.test_model = MagicMock()
+        aggregator.test_evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        aggregator.rounds2test_evaluations = {}
+        aggregator.reference_weights = [np.ones(2)]
+        aggregator.rounds2global_weights = {0: [np.zeros(2)], 1: aggregator.reference_weights}
+        aggregator.x_val, aggregator.y_val = None, None
+        track_model_weights(global_model_mock, aggregator.reference_weights)
+        aggregator.rounds2participants = {
+            0: {"validation_results": [0.2, 0.8]},
+            1: {
+                "valid_participant_ids": [0, 1],
+                "participant_weights": [[np.full(2, 2.0)], [np.full(2, 4.0)]],
+                "participant_ids": [0, 1],
+                "participant_base_rounds": [1, 0]
+            }
+        }
+        aggregator.update_global_model()
+        aggregator.test_evaluation_executor.shutdown()
+        round_participants = aggregator.rounds2participants[1]
+        # the stale update (+4 from the global model of round 0) is applied to the current one
+        np.testing.assert_allclose([5.0, 5.0], round_participants["participant_weights"][1][0])
+        self.assertListEqual([0, 1], round_participants["staleness"])
+        # the stale update is down-weighted by 1 / sqrt(2)
+        np.testing.assert_allclose([1 / (1 + 2 ** -0.5), 2 ** -0.5 / (1 + 2 ** -0.5)], round_participants["alpha"])
+        expected_global_weights = round_participants["alpha"][0] * 2.0 + round_participants["alpha"][1] * 5.0
+        np.testing.assert_allclose(np.full(2, expected_global_weights), global_model_mock.get_weights()[0])
+        self.assertEqual(2, aggregator.current_round)
+        # the global model of round 0 is released
+        self.assertListEqual([1, 2], sorted(aggregator.rounds2global_weights))
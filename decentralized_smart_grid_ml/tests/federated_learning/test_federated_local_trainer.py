@@ -1,10 +1,14 @@
+import os
 import pathlib
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open, MagicMock
 
-import pandas as pd
-
-from decentralized_smart_grid_ml.federated_learning.federated_local_trainer import FederatedLocalTrainer
+from decentralized_smart_grid_ml.federated_learning.federated_local_trainer import FederatedLocalTrainer, \
+    TRAIN_SHUFFLE_BUFFER_SAMPLES
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import round_manifest_file_name, \
+    write_round_manifest
+from decentralized_smart_grid_ml.utils.instrumentation import RoundInstrumentation
 
 
 class TestFederatedLocalTrainer(unittest.TestCase):
@@ -12,26 +16,22 @@ class TestFederatedLocalTrainer(unittest.TestCase):
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
-    @patch("pandas.read_csv")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.CsvDataSource")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.load_fl_model")
-    def test_federated_local_trainer_constructor(self, load_fl_model_mock, read_csv_mock,
+    def test_federated_local_trainer_constructor(self, load_fl_model_mock, csv_data_source_mock,
                                                  announcement_config_mock):
         participant_id = 0
         announcement_config_mock.fl_rounds = 2
         announcement_config_mock.epochs = 5
         announcement_config_mock.batch_size = 32
         announcement_config_mock.baseline_model_artifact = "/path/to/model"
+        announcement_config_mock.weights_update_compression = None
         announcement_config_mock.features_names = {
             "features": ["x1", "x2"],
             "labels": "y"
         }
         train_set_path = "/path/to/train.csv"
         local_model_weights_path = "/path/to/participant_directory"
-        read_csv_mock.return_value = pd.DataFrame({
-            "x1": [0, 1],
-            "x2": [1, 2],
-            "y": [0, 1]
-        })
         model_artifact = "expected local model"
         load_fl_model_mock.return_value = model_artifact
         rounds2history_expected = {
@@ -44,12 +44,14 @@ class TestFederatedLocalTrainer(unittest.TestCase):
             train_set_path,
             local_model_weights_path
         )
-        read_csv_mock.assert_called_with(train_set_path)
+        csv_data_source_mock.assert_called_with(train_set_path, announcement_config_mock.features_names)
+        self.assertEqual(csv_data_source_mock.return_value, flt.train_data_source)
         load_fl_model_mock.assert_called_with("/path/to/model")
         self.assertEqual(model_artifact, flt.local_model)
         self.assertEqual(0, flt.current_round)
         self.assertDictEqual(rounds2history_expected, flt.rounds2history)
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.write_upload_manifest")
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
@@ -63,15 +65,16 @@ class TestFederatedLocalTrainer(unittest.TestCase):
     )
     def test_fit_local_model_completed(self, federated_local_trainer_mock, load_fl_model_weights_mock,
                                        save_fl_model_weights_mock, local_model_mock, mkdir_mock,
-                                       announcement_config_mock):
+                                       announcement_config_mock, write_upload_manifest_mock):
         current_round = 1
         announcement_config_mock.fl_rounds = 2
         announcement_config_mock.epochs = 5
         announcement_config_mock.batch_size = 32
         path_file_created = "validator/validator_weights_round_1.json"
         baseline_model_weights = "baseline model weights"
-        x_train = "train x"
-        y_train = "train y"
+        train_data_source_mock = MagicMock()
+        train_dataset = "train dataset"
+        train_data_source_mock.as_dataset.return_value = train_dataset
         local_model_weights_path = "participants/participant_0/"
         local_model_trained_path = local_model_weights_path + "weights_round_" + str(current_round) + ".json"
         load_fl_model_weights_mock.return_value = baseline_model_weights
@@ -84,28 +87,42 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         }
         local_model_mock.fit.return_value = expected_history_mock
         flt = FederatedLocalTrainer()
-        flt.x_train = x_train
-        flt.y_train = y_train
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
+        flt.train_data_source = train_data_source_mock
         flt.current_round = current_round
         flt.local_model = local_model_mock
         flt.participant_id = 0
         flt.announcement_config = announcement_config_mock
         flt.local_model_weights_path = local_model_weights_path
+        flt.weights_compressor = None
+        flt.content_store = None
+        flt.global_model_weights_path = None
+        flt.train_samples = 64
         flt.rounds2history = {
             0: None,
             1: None
         }
         is_completed = flt.fit_local_model(path_file_created)
         local_model_mock.fit.assert_called_with(
-            x_train, y_train,
-            epochs=announcement_config_mock.epochs,
-            batch_size=announcement_config_mock.batch_size
+            train_dataset,
+            epochs=announcement_config_mock.epochs
+        )
+        train_data_source_mock.as_dataset.assert_called_with(
+            announcement_config_mock.batch_size,
+            shuffle_buffer_size=TRAIN_SHUFFLE_BUFFER_SAMPLES
         )
         local_model_mock.set_weights.assert_called_with(baseline_model_weights)
         save_fl_model_weights_mock.assert_called_with(local_model_mock, local_model_trained_path)
+        write_upload_manifest_mock.assert_called_with(local_model_trained_path, 0, current_round, 64)
         self.assertDictEqual(rounds2history_expected, flt.rounds2history)
         self.assertEqual(True, is_completed)
+        self.assertListEqual(
+            ["load_global_weights", "local_training", "write_weights"],
+            sorted(flt.instrumentation.round_spans(current_round))
+        )
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.write_upload_manifest")
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
@@ -119,15 +136,16 @@ class TestFederatedLocalTrainer(unittest.TestCase):
     )
     def test_fit_local_model_not_completed(self, federated_local_trainer_mock, load_fl_model_weights_mock,
                                            save_fl_model_weights_mock, local_model_mock, mkdir_mock,
-                                           announcement_config_mock):
+                                           announcement_config_mock, write_upload_manifest_mock):
         current_round = 1
         announcement_config_mock.fl_rounds = 3
         announcement_config_mock.epochs = 5
         announcement_config_mock.batch_size = 32
         path_file_created = "validator/validator_weights_round_1.json"
         baseline_model_weights = "baseline model weights"
-        x_train = "train x"
-        y_train = "train y"
+        train_data_source_mock = MagicMock()
+        train_dataset = "train dataset"
+        train_data_source_mock.as_dataset.return_value = train_dataset
         local_model_weights_path = "participants/participant_0/"
         local_model_trained_path = local_model_weights_path + "weights_round_" + str(current_round) + ".json"
         load_fl_model_weights_mock.return_value = baseline_model_weights
@@ -141,13 +159,18 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         }
         local_model_mock.fit.return_value = expected_history_mock
         flt = FederatedLocalTrainer()
-        flt.x_train = x_train
-        flt.y_train = y_train
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
+        flt.train_data_source = train_data_source_mock
         flt.current_round = current_round
         flt.local_model = local_model_mock
         flt.participant_id = 0
         flt.announcement_config = announcement_config_mock
         flt.local_model_weights_path = local_model_weights_path
+        flt.weights_compressor = None
+        flt.content_store = None
+        flt.global_model_weights_path = None
+        flt.train_samples = 64
         flt.rounds2history = {
             0: None,
             1: None,
@@ -155,15 +178,19 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         }
         is_completed = flt.fit_local_model(path_file_created)
         local_model_mock.fit.assert_called_with(
-            x_train, y_train,
-            epochs=announcement_config_mock.epochs,
-            batch_size=announcement_config_mock.batch_size
+            train_dataset,
+            epochs=announcement_config_mock.epochs
+        )
+        train_data_source_mock.as_dataset.assert_called_with(
+            announcement_config_mock.batch_size,
+            shuffle_buffer_size=TRAIN_SHUFFLE_BUFFER_SAMPLES
         )
         local_model_mock.set_weights.assert_called_with(baseline_model_weights)
         save_fl_model_weights_mock.assert_called_with(local_model_mock, local_model_trained_path)
         self.assertEqual(False, is_completed)
         self.assertDictEqual(rounds2history_expected, flt.rounds2history)
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.write_upload_manifest")
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
@@ -175,13 +202,14 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         return_value=None
     )
     def test_fit_local_model_first_round(self, federated_local_trainer_mock, save_fl_model_weights_mock,
-                                         local_model_mock, mkdir_mock, announcement_config_mock):
+                                         local_model_mock, mkdir_mock, announcement_config_mock, write_upload_manifest_mock):
         current_round = 0
         announcement_config_mock.fl_rounds = 2
         announcement_config_mock.epochs = 5
         announcement_config_mock.batch_size = 32
-        x_train = "train x"
-        y_train = "train y"
+        train_data_source_mock = MagicMock()
+        train_dataset = "train dataset"
+        train_data_source_mock.as_dataset.return_value = train_dataset
         local_model_weights_path = "participants/participant_0/"
         local_model_trained_path = local_model_weights_path + "weights_round_" + str(current_round) + ".json"
         expected_history = "history 1"
@@ -193,13 +221,18 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         }
         local_model_mock.fit.return_value = expected_history_mock
         flt = FederatedLocalTrainer()
-        flt.x_train = x_train
-        flt.y_train = y_train
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
+        flt.train_data_source = train_data_source_mock
         flt.current_round = current_round
         flt.local_model = local_model_mock
         flt.participant_id = 0
         flt.announcement_config = announcement_config_mock
         flt.local_model_weights_path = local_model_weights_path
+        flt.weights_compressor = None
+        flt.content_store = None
+        flt.global_model_weights_path = None
+        flt.train_samples = 64
         flt.rounds2history = {
             0: None,
             1: None
@@ -207,9 +240,12 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         # we pass None because it is the first round
         is_completed = flt.fit_local_model(None)
         local_model_mock.fit.assert_called_with(
-            x_train, y_train,
-            epochs=announcement_config_mock.epochs,
-            batch_size=announcement_config_mock.batch_size
+            train_dataset,
+            epochs=announcement_config_mock.epochs
+        )
+        train_data_source_mock.as_dataset.assert_called_with(
+            announcement_config_mock.batch_size,
+            shuffle_buffer_size=TRAIN_SHUFFLE_BUFFER_SAMPLES
         )
         save_fl_model_weights_mock.assert_called_with(local_model_mock, local_model_trained_path)
         self.assertEqual(False, is_completed)
@@ -227,12 +263,121 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         announcement_config_mock.fl_rounds = 2
         path_file_created = "validator/validator_weights_round_null.json"
         flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
         flt.current_round = current_round
         flt.announcement_config = announcement_config_mock
         flt.participant_id = 0
         is_completed = flt.fit_local_model(path_file_created)
         self.assertEqual(False, is_completed)
 
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.write_upload_manifest")
+    @patch(
+        "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
+    )
+    @patch.object(pathlib.Path, 'mkdir')
+    @patch("tensorflow.keras.Sequential")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.save_fl_model_weights")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.load_fl_model_weights")
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer.__init__",
+        return_value=None
+    )
+    def test_fit_local_model_skipped_rounds(self, federated_local_trainer_mock, load_fl_model_weights_mock,
+                                            save_fl_model_weights_mock, local_model_mock, mkdir_mock,
+                                            announcement_config_mock, write_upload_manifest_mock):
+        # the validator closed the round 1 without this participant
+        announcement_config_mock.fl_rounds = 3
+        path_file_created = "validator/validator_weights_round_2.json"
+        local_model_weights_path = "participants/participant_0/"
+        expected_history_mock = MagicMock()
+        expected_history_mock.history = "history 2"
+        local_model_mock.fit.return_value = expected_history_mock
+        flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
+        flt.train_data_source = MagicMock()
+        flt.current_round = 1
+        flt.local_model = local_model_mock
+        flt.participant_id = 0
+        flt.announcement_config = announcement_config_mock
+        flt.local_model_weights_path = local_model_weights_path
+        flt.weights_compressor = None
+        flt.content_store = None
+        flt.global_model_weights_path = None
+        flt.train_samples = 64
+        flt.rounds2history = {0: "history 0", 1: None, 2: None}
+        is_completed = flt.fit_local_model(path_file_created)
+        save_fl_model_weights_mock.assert_called_with(
+            local_model_mock, local_model_weights_path + "weights_round_2.json"
+        )
+        write_upload_manifest_mock.assert_called_with(
+            local_model_weights_path + "weights_round_2.json", 0, 2, 64
+        )
+        self.assertDictEqual({0: "history 0", 1: None, 2: "history 2"}, flt.rounds2history)
+        self.assertEqual(3, flt.current_round)
+        self.assertEqual(True, is_completed)
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.write_upload_manifest")
+    @patch(
+        "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
+    )
+    @patch.object(pathlib.Path, 'mkdir')
+    @patch("tensorflow.keras.Sequential")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.save_fl_model_weights")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.load_fl_model_weights")
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer.__init__",
+        return_value=None
+    )
+    def test_fit_local_model_multi_digit_round(self, federated_local_trainer_mock, load_fl_model_weights_mock,
+                                               save_fl_model_weights_mock, local_model_mock, mkdir_mock,
+                                               announcement_config_mock, write_upload_manifest_mock):
+        # the round is read from all the digits of the file name
+        announcement_config_mock.fl_rounds = 13
+        path_file_created = "validator/validator_weights_round_12.json"
+        local_model_weights_path = "participants/participant_0/"
+        expected_history_mock = MagicMock()
+        expected_history_mock.history = "history 12"
+        local_model_mock.fit.return_value = expected_history_mock
+        flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
+        flt.train_data_source = MagicMock()
+        flt.current_round = 12
+        flt.local_model = local_model_mock
+        flt.participant_id = 0
+        flt.announcement_config = announcement_config_mock
+        flt.local_model_weights_path = local_model_weights_path
+        flt.weights_compressor = None
+        flt.content_store = None
+        flt.global_model_weights_path = None
+        flt.train_samples = 64
+        flt.rounds2history = {12: None}
+        is_completed = flt.fit_local_model(path_file_created)
+        save_fl_model_weights_mock.assert_called_with(
+            local_model_mock, local_model_weights_path + "weights_round_12.json"
+        )
+        write_upload_manifest_mock.assert_called_with(
+            local_model_weights_path + "weights_round_12.json", 0, 12, 64
+        )
+        self.assertDictEqual({12: "history 12"}, flt.rounds2history)
+        self.assertEqual(13, flt.current_round)
+        self.assertEqual(True, is_completed)
+
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer.__init__",
+        return_value=None
+    )
+    def test_fit_local_model_final(self, federated_local_trainer_mock):
+        flt = FederatedLocalTrainer()
+        flt.participant_id = 0
+        flt.current_round = 1
+        flt.is_finished = False
+        # the validator finished the rounds without waiting for this participant
+        self.assertEqual(True, flt.fit_local_model("validator/validator_weights_final.json"))
+        self.assertEqual(1, flt.current_round)
+
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
@@ -245,12 +390,50 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         announcement_config_mock.fl_rounds = 2
         path_file_created = "validator/validator_weights_round_0.json"
         flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
         flt.current_round = current_round
         flt.announcement_config = announcement_config_mock
         flt.participant_id = 0
         is_completed = flt.fit_local_model(path_file_created)
         self.assertEqual(False, is_completed)
 
+    @patch(
+        "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
+    )
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.load_fl_model_weights")
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer.__init__",
+        return_value=None
+    )
+    def test_fit_local_model_not_selected(self, federated_local_trainer_mock, load_fl_model_weights_mock,
+                                          announcement_config_mock):
+        announcement_config_mock.fl_rounds = 2
+        with tempfile.TemporaryDirectory() as validator_path:
+            write_round_manifest(os.path.join(validator_path, round_manifest_file_name(0)), 0, [1, 2])
+            write_round_manifest(os.path.join(validator_path, round_manifest_file_name(1)), 1, [1, 2])
+            flt = FederatedLocalTrainer()
+            flt.instrumentation = RoundInstrumentation()
+            flt.local_model = MagicMock()
+            flt.current_round = 0
+            flt.is_finished = False
+            flt.announcement_config = announcement_config_mock
+            flt.participant_id = 0
+            flt.global_model_weights_path = validator_path
+            # the participant is not selected for the first round
+            self.assertEqual(False, flt.fit_local_model(None))
+            self.assertEqual(1, flt.current_round)
+            # the round manifests are read with their global model
+            self.assertEqual(False, flt.fit_local_model(
+                os.path.join(validator_path, round_manifest_file_name(1))
+            ))
+            self.assertEqual(True, flt.fit_local_model(
+                os.path.join(validator_path, "validator_weights_round_1.json")
+            ))
+        self.assertEqual(2, flt.current_round)
+        flt.local_model.fit.assert_not_called()
+        load_fl_model_weights_mock.assert_not_called()
+
     @patch(
         "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
     )
@@ -264,6 +447,8 @@ class TestFederatedLocalTrainer(unittest.TestCase):
         file_output_path = "test/output.json"
         announcement_config_mock.fl_rounds = 1
         flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.prometheus_textfile_path = None
         flt.announcement_config = announcement_config_mock
         flt.participant_id = 0
         flt.rounds2history = {
@@ -277,3 +462,35 @@ class TestFederatedLocalTrainer(unittest.TestCase):
             m_o.assert_called_with(file_output_path, "w")
             handle = m_o()
             json_dump_mock.assert_called_with(statistics_expected, handle, indent="\t")
+
+    @patch(
+        "decentralized_smart_grid_ml.contract_interactions.announcement_configuration.AnnouncementConfiguration"
+    )
+    @patch(
+        "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer.__init__",
+        return_value=None
+    )
+    def test_statistics_timings(self, federated_local_trainer_mock, announcement_config_mock):
+        flt = FederatedLocalTrainer()
+        flt.instrumentation = RoundInstrumentation()
+        flt.participant_id = 3
+        flt.rounds2history = {
+            0: {"loss": [0.5]},
+            1: None
+        }
+        flt.instrumentation.record(0, "local_training", 1.5, 1.25, 10, 20, 30)
+        statistics = flt.get_statistics()
+        self.assertIsNone(statistics[1])
+        self.assertListEqual([0.5], statistics[0]["loss"])
+        self.assertEqual(1.5, statistics[0]["timings"]["local_training"]["wall_time"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            flt.prometheus_textfile_path = os.path.join(tmp_dir, "participant.prom")
+            flt._export_instrumentation()
+            with open(flt.prometheus_textfile_path) as file_read:
+                prometheus_lines = file_read.read().splitlines()
+        self.assertIn("# TYPE decentralized_smart_grid_ml_round_phase_wall_seconds gauge", prometheus_lines)
+        self.assertIn(
+            'decentralized_smart_grid_ml_round_phase_wall_seconds'
+            '{role="participant",participant_id="3",round="0",phase="local_training"} 1.5',
+            prometheus_lines
+        )
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import AnnouncementConfiguration
+from decentralized_smart_grid_ml.federated_learning.federated_simulation import FederatedSimulation
+
+
+class TestFederatedSimulation(unittest.TestCase):
+
+    def setUp(self):
+        import tensorflow as tf
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+
+        def write_dataset(file_name, n_rows):
+            x = rng.normal(size=(n_rows, 2))
+            dataset_path = os.path.join(self.tmp_dir.name, file_name)
+            pd.DataFrame({
+                "x1": x[:, 0],
+                "x2": x[:, 1],
+                "y": (x[:, 0] + x[:, 1] > 0).astype(int)
+            }).to_csv(dataset_path, index=False)
+            return dataset_path
+
+        self.train_set_paths = [write_dataset("train_" + str(idx) + ".csv", 64) for idx in range(4)]
+        self.validation_set_path = write_dataset("validation.csv", 32)
+        self.test_set_path = write_dataset("test.csv", 32)
+        model = tf.keras.Sequential([
+            tf.keras.Input(shape=(2,)),
+            tf.keras.layers.Dense(1, activation="sigmoid")
+        ])
+        model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"])
+        model_path = os.path.join(self.tmp_dir.name, "model.keras")
+        model.save(model_path)
+        self.announcement_config = AnnouncementConfiguration(
+            "simulation task", "simulation task description", model_path, None, None,
+            {"features": ["x1", "x2"], "labels": "y"}, 2, 1, 16, "simple_average"
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run(self):
+        with patch(
+                "decentralized_smart_grid_ml.federated_learning.federated_local_trainer.load_fl_model"
+        ) as trainer_load_fl_model_mock:
+            simulation = FederatedSimulation(
+                self.announcement_config,
+                self.train_set_paths,
+                self.validation_set_path,
+                self.test_set_path
+            )
+        # the participants share the model loaded by the simulation
+        trainer_load_fl_model_mock.assert_not_called()
+        for trainer in simulation.trainers:
+            self.assertIs(simulation.shared_model, trainer.local_model)
+        contributions = simulation.run()
+        self.assertTrue(simulation.aggregator.is_finished)
+        self.assertEqual(4, len(contributions))
+        for idx_round in range(2):
+            self.assertListEqual([0, 1, 2, 3], simulation.aggregator.rounds2participants[idx_round]["participant_ids"])
+        self.assertListEqual([0, 1, 2, 3], sorted(simulation.participants_optimizer_states))
+        simulation.write_statistics(self.tmp_dir.name)
+        with open(os.path.join(self.tmp_dir.name, "participants_statistics.json")) as file_read:
+            participants_statistics = json.load(file_read)
+        self.assertListEqual(["0", "1", "2", "3"], sorted(participants_statistics))
+        self.assertIsNotNone(participants_statistics["0"]["1"])
+
+    def test_run_sampled_participants(self):
+        self.announcement_config.round_policy = {"participants_per_round": 2, "seed": 0}
+        simulation = FederatedSimulation(
+            self.announcement_config,
+            self.train_set_paths,
+            self.validation_set_path,
+            self.test_set_path
+        )
+        simulation.run()
+        for idx_round in range(2):
+            round_participants = simulation.aggregator.rounds2participants[idx_round]
+            self.assertEqual(2, len(round_participants["participant_ids"]))
+            self.assertListEqual(round_participants["valid_participant_ids"], round_participants["participant_ids"])
+
+    def test_no_participants(self):
+        with self.assertRaises(ValueError):
+            FederatedSimulation(self.announcement_config, [], self.validation_set_path, self.test_set_path)
@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import AnnouncementConfiguration
+from decentralized_smart_grid_ml.federated_learning.hierarchical_aggregation import RegionalAggregator, \
+    RootAggregator, load_partial_aggregate, save_partial_aggregate
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model_weights, \
+    load_fl_weights, save_fl_weights
+
+
+class TestHierarchicalAggregation(unittest.TestCase):
+
+    def setUp(self):
+        import tensorflow as tf
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+
+        def write_dataset(file_name, n_rows):
+            x = rng.normal(size=(n_rows, 2))
+            dataset_path = os.path.join(self.tmp_dir.name, file_name)
+            pd.DataFrame({
+                "x1": x[:, 0],
+                "x2": x[:, 1],
+                "y": (x[:, 0] + x[:, 1] > 0).astype(int)
+            }).to_csv(dataset_path, index=False)
+            return dataset_path
+
+        self.validation_set_path = write_dataset("validation.csv", 32)
+        self.test_set_path = write_dataset("test.csv", 32)
+        model = tf.keras.Sequential([
+            tf.keras.Input(shape=(2,)),
+            tf.keras.layers.Dense(1, activation="sigmoid")
+        ])
+        model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"])
+        model_path = os.path.join(self.tmp_dir.name, "model.keras")
+        model.save(model_path)
+        self.baseline_weights = model.get_weights()
+        self.announcement_config = AnnouncementConfiguration(
+            "hierarchical task", "hierarchical task description", model_path, None, None,
+            {"features": ["x1", "x2"], "labels": "y"}, 2, 1, 16, "simple_average"
+        )
+        self.sites_path = os.path.join(self.tmp_dir.name, "sites")
+        self.regions_path = os.path.join(self.tmp_dir.name, "regions")
+        self.validator_path = os.path.join(self.tmp_dir.name, "validator")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_site_weights(self, participant_id, idx_round, weights):
+        participant_path = os.path.join(self.sites_path, "participant_" + str(participant_id))
+        os.makedirs(participant_path, exist_ok=True)
+        weights_path = os.path.join(participant_path, "weights_round_" + str(idx_round) + ".flw")
+        save_fl_weights(weights, weights_path)
+        return weights_path
+
+    def test_partial_aggregate(self):
+        partial_aggregate_path = os.path.join(self.tmp_dir.name, "partial_aggregate_round_0.flw")
+        save_partial_aggregate(
+            [np.full(3, 1.5), np.ones(2)], partial_aggregate_path, 0, [1, 2], [0.5, 0.25]
+        )
+        # the partial sums are saved in float64
+        partial_sum, _ = load_fl_weights(partial_aggregate_path)
+        self.assertEqual(np.float64, partial_sum[0].dtype)
+        reference_weights = [np.zeros(3, dtype=np.float32), np.zeros(2, dtype=np.float32)]
+        regional_weights, attribution = load_partial_aggregate(partial_aggregate_path, reference_weights)
+        np.testing.assert_allclose(np.full(3, 2.0), regional_weights[0])
+        self.assertEqual(np.float32, regional_weights[0].dtype)
+        self.assertListEqual([1, 2], attribution["participant_ids"])
+        self.assertEqual(0.75, attribution["alpha_sum"])
+        # none of the region's participants contributed
+        save_partial_aggregate([np.zeros(3), np.zeros(2)], partial_aggregate_path, 0, [1, 2], [0.0, 0.0])
+        regional_weights, _ = load_partial_aggregate(partial_aggregate_path, reference_weights)
+        self.assertIs(reference_weights, regional_weights)
+
+    def test_hierarchical_rounds(self):
+        regions2participants = {0: [0, 1], 1: [2, 3]}
+        regional_aggregators = {
+            region_id: RegionalAggregator(
+                region_id, participant_ids, self.announcement_config, self.validation_set_path,
+                self.test_set_path, self.regions_path
+            )
+            for region_id, participant_ids in regions2participants.items()
+        }
+        root_aggregator = RootAggregator(
+            [0, 1], [0, 1, 2, 3], self.announcement_config, self.validation_set_path,
+            self.test_set_path, self.validator_path
+        )
+        try:
+            participants_weights = {
+                participant_id: [layer + participant_id for layer in self.baseline_weights]
+                for participant_id in range(4)
+            }
+            for region_id, regional_aggregator in regional_aggregators.items():
+                is_completed = False
+                for participant_id in regions2participants[region_id]:
+                    is_completed = regional_aggregator.add_participant_weights(
+                        self._write_site_weights(participant_id, 0, participants_weights[participant_id])
+                    )
+                self.assertTrue(is_completed)
+                regional_aggregator.update_global_model()
+                self.assertTrue(regional_aggregator.is_waiting_global_model)
+                self.assertEqual(1, regional_aggregator.current_round)
+                is_completed = root_aggregator.add_participant_weights(os.path.join(
+                    self.regions_path, "region_" + str(region_id), "partial_aggregate_round_0.flw"
+                ))
+            self.assertTrue(is_completed)
+            root_aggregator.update_global_model()
+            # the global model is the average of the regions' averages
+            global_model_path = os.path.join(self.validator_path, "validator_weights_round_1.json")
+            global_weights = load_fl_model_weights(global_model_path)
+            np.testing.assert_allclose(self.baseline_weights[0] + 1.5, global_weights[0], rtol=1e-5)
+            self.assertEqual(2, len(root_aggregator.rounds2participants[0]["region_attributions"]))
+
+            # an upload of the next round received before the global model is kept pending
+            regional_aggregator = regional_aggregators[0]
+            upload_path = self._write_site_weights(0, 1, global_weights)
+            self.assertFalse(regional_aggregator.add_participant_weights(upload_path))
+            self.assertListEqual([upload_path], regional_aggregator.pending_paths)
+            self.assertFalse(regional_aggregator.add_participant_weights(global_model_path))
+            self.assertFalse(regional_aggregator.is_waiting_global_model)
+            self.assertListEqual([], regional_aggregator.pending_paths)
+            self.assertListEqual([0], regional_aggregator.rounds2participants[1]["participant_ids"])
+            np.testing.assert_allclose(global_weights[0], regional_aggregator.reference_weights[0], rtol=1e-6)
+
+            # the contributions of the regions are split among their participants
+            self.assertListEqual([0, 1, 2, 3], root_aggregator._round_contributions(0)[0])
+            np.testing.assert_allclose([0.25] * 4, root_aggregator._round_contributions(0)[1])
+            self.assertListEqual([0.25] * 4, root_aggregator.get_participants_contributions())
+        finally:
+            root_aggregator.close()
+            for regional_aggregator in regional_aggregators.values():
+                regional_aggregator.close()
+
+    def test_regions_of_unequal_size(self):
+        regions2participants = {0: [0], 1: [1, 2, 3]}
+        regional_aggregators = {
+            region_id: RegionalAggregator(
+                region_id, participant_ids, self.announcement_config, self.validation_set_path,
+                self.test_set_path, self.regions_path
+            )
+            for region_id, participant_ids in regions2participants.items()
+        }
+        root_aggregator = RootAggregator(
+            [0, 1], [0, 1, 2, 3], self.announcement_config, self.validation_set_path,
+            self.test_set_path, self.validator_path
+        )
+        try:
+            for region_id, regional_aggregator in regional_aggregators.items():
+                for participant_id in regions2participants[region_id]:
+                    regional_aggregator.add_participant_weights(self._write_site_weights(
+                        participant_id, 0, [layer + participant_id for layer in self.baseline_weights]
+                    ))
+                regional_aggregator.update_global_model()
+                is_completed = root_aggregator.add_participant_weights(os.path.join(
+                    self.regions_path, "region_" + str(region_id), "partial_aggregate_round_0.flw"
+                ))
+            self.assertTrue(is_completed)
+            root_aggregator.update_global_model()
+            # the regions are weighted 1:3, as the flat average of the four participants
+            global_weights = load_fl_model_weights(
+                os.path.join(self.validator_path, "validator_weights_round_1.json")
+            )
+            np.testing.assert_allclose(self.baseline_weights[0] + 1.5, global_weights[0], rtol=1e-5)
+            np.testing.assert_allclose([0.25, 0.75], root_aggregator.rounds2participants[0]["alpha"])
+            np.testing.assert_allclose([0.25] * 4, root_aggregator._round_contributions(0)[1])
+        finally:
+            root_aggregator.close()
+            for regional_aggregator in regional_aggregators.values():
+                regional_aggregator.close()
@@ -1,11 +1,16 @@
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
-from unittest.mock import patch, mock_open
+from unittest.mock import MagicMock, patch, mock_open
 
 import numpy as np
 
-from decentralized_smart_grid_ml.exceptions import IncorrectExtensionFileError
+from decentralized_smart_grid_ml.exceptions import IncorrectExtensionFileError, MalformedWeightsFileError
 from decentralized_smart_grid_ml.federated_learning.models_reader_writer import save_fl_model, load_fl_model, \
-    save_fl_model_config, load_fl_model_config, save_fl_model_weights, load_fl_model_weights
+    save_fl_model_config, load_fl_model_config, save_fl_model_weights, load_fl_model_weights, WeightsLoadingPool, save_fl_weights, load_fl_weights
+from decentralized_smart_grid_ml.federated_learning.content_store import ContentAddressedStore
 
 
 class TestModelsReaderWriter(unittest.TestCase):
@@ -125,4 +130,93 @@ class TestModelsReaderWriter(unittest.TestCase):
     def test_load_fl_model_weights_no_json(self):
         model_weights_path = "/path/to/model_weights.txt"
         with self.assertRaises(IncorrectExtensionFileError):
-            load_fl_model_weights(model_weights_path)
\ No newline at end of file
+            load_fl_model_weights(model_weights_path)
+
+    def test_save_load_fl_model_weights_flw(self):
+        model_weights = [
+            np.arange(12, dtype=np.float32).reshape(3, 4),
+            np.array([1, 2, 3], dtype=np.float32),
+            np.zeros((0, 2), dtype=np.float32),
+            np.array([0.5, 1.5]),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_weights_path = os.path.join(tmp_dir, "model_weights.flw")
+            with patch("tensorflow.keras.Sequential") as model_mock:
+                model_mock.get_weights.return_value = model_weights
+                save_fl_model_weights(model_mock, model_weights_path)
+            loaded_model_weights = load_fl_model_weights(model_weights_path)
+            self.assertEqual(len(model_weights), len(loaded_model_weights))
+            for expected_layer_weights, layer_weights in zip(model_weights, loaded_model_weights):
+                # the float64 layer is saved in the float32 payload
+                self.assertEqual(np.float32, layer_weights.dtype)
+                np.testing.assert_array_equal(expected_layer_weights, layer_weights)
+            # the layers are read-only views on the memory-mapped file
+            self.assertFalse(loaded_model_weights[0].flags.writeable)
+            del loaded_model_weights
+
+    def test_load_fl_model_weights_flw_malformed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_weights_path = os.path.join(tmp_dir, "model_weights.flw")
+            with open(model_weights_path, "wb") as file_write:
+                file_write.write(b"[[1, 2, 3]]")
+            with self.assertRaises(MalformedWeightsFileError):
+                load_fl_model_weights(model_weights_path)
+
+    def test_weights_loading_pool(self):
+        model_weights = [
+            np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32),
+            np.array([1.0, 2.0], dtype=np.float32),
+        ]
+        weights_loading_pool = WeightsLoadingPool(max_workers=1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch("tensorflow.keras.Sequential") as model_mock:
+                model_mock.get_weights.return_value = model_weights
+                for extension in (".json", ".flw"):
+                    save_fl_model_weights(model_mock, os.path.join(tmp_dir, "model_weights" + extension))
+            futures = [
+                weights_loading_pool.submit(
+                    os.path.join(tmp_dir, "model_weights" + extension), load_fl_model_weights
+                )
+                for extension in (".json", ".flw")
+            ]
+            for future in futures:
+                for expected_layer_weights, layer_weights in zip(model_weights, future.result()):
+                    np.testing.assert_array_equal(expected_layer_weights, layer_weights)
+            weights_loading_pool.shutdown()
+            del futures
+
+    def test_weights_loading_pool_no_valid_extension(self):
+        weights_loading_pool = WeightsLoadingPool()
+        with self.assertRaises(IncorrectExtensionFileError):
+            weights_loading_pool.submit("/path/to/model_weights.txt", load_fl_model_weights)
+
+    def test_import_without_tensorflow(self):
+        # the federated learning modules do not load tensorflow (nor need BC_ADDRESS) at import time
+        environment = {key: value for key, value in os.environ.items() if key != "BC_ADDRESS"}
+        code = "import sys\n" \
+               "import decentralized_smart_grid_ml.federated_learning.federated_aggregator\n" \
+               "import decentralized_smart_grid_ml.federated_learning.federated_local_trainer\n" \
+               "import decentralized_smart_grid_ml.utils.fl_utility\n" \
+               "import decentralized_smart_grid_ml.utils.config\n" \
+               "assert 'tensorflow' not in sys.modules\n"
+        subprocess.run([sys.executable, "-c", code], check=True, env=environment)
+
+    def test_save_load_cid_weights(self):
+        weights = [np.ones((2, 2), dtype=np.float32), np.zeros(2, dtype=np.float32)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            content_store = ContentAddressedStore(os.path.join(tmp_dir, "store"))
+            weights_path = os.path.join(tmp_dir, "weights_round_0.cid")
+            save_fl_weights(weights, weights_path, {"update": "full"}, content_store)
+            loaded_weights, metadata = load_fl_weights(weights_path)
+            self.assertDictEqual({"update": "full"}, metadata)
+            for layer_weights, loaded_layer_weights in zip(weights, loaded_weights):
+                np.testing.assert_array_equal(layer_weights, loaded_layer_weights)
+            # without a store, the store in the directory of the pointer file is used
+            model_mock = MagicMock()
+            model_mock.get_weights.return_value = weights
+            save_fl_model_weights(model_mock, os.path.join(tmp_dir, "validator_weights_round_1.cid"))
+            self.assertTrue(os.path.isdir(os.path.join(tmp_dir, ".weights_store")))
+            loaded_weights = load_fl_model_weights(os.path.join(tmp_dir, "validator_weights_round_1.cid"))
+            np.testing.assert_array_equal(weights[0], loaded_weights[0])
+            with self.assertRaises(IncorrectExtensionFileError):
+                save_fl_weights(weights, os.path.join(tmp_dir, "weights.flw"), None, content_store)
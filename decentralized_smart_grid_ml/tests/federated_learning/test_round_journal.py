@@ -0,0 +1,186 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import AnnouncementConfiguration
+from decentralized_smart_grid_ml.exceptions import MalformedWeightsFileError
+from decentralized_smart_grid_ml.federated_learning.federated_aggregator import Aggregator
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import save_fl_weights
+from decentralized_smart_grid_ml.federated_learning.round_journal import RoundJournal, file_digest
+
+
+class TestRoundJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp_dir.name, "journal", "rounds.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records(self):
+        round_journal = RoundJournal(self.journal_path)
+        self.assertListEqual([], round_journal.read_records())
+        round_journal.append({"type": "round", "round": 0, "alpha": [np.float64(0.5), 0.5]})
+        round_journal.append({"type": "round", "round": 1, "alpha": np.array([1.0, 0.0])})
+        round_journal.rollback(1)
+        round_journal.append({"type": "round", "round": 1, "alpha": [0.0, 1.0]})
+        self.assertListEqual(
+            [
+                {"type": "round", "round": 0, "alpha": [0.5, 0.5]},
+                {"type": "round", "round": 1, "alpha": [0.0, 1.0]}
+            ],
+            round_journal.read_records()
+        )
+        # the record truncated by a crash is ignored
+        with open(self.journal_path, "a") as file_append:
+            file_append.write('{"type": "round", "rou')
+        self.assertEqual(2, len(round_journal.read_records()))
+        with self.assertRaises(ValueError):
+            RoundJournal(self.journal_path, checkpoint_interval=0)
+
+    def test_checkpoints(self):
+        round_journal = RoundJournal(self.journal_path, checkpoint_interval=2)
+        self.assertFalse(round_journal.is_checkpoint_round(0, False))
+        self.assertTrue(round_journal.is_checkpoint_round(1, False))
+        self.assertTrue(round_journal.is_checkpoint_round(2, True))
+        weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.ones(3, dtype=np.float32)]
+        checkpoints = [round_journal.write_checkpoint(idx_round, weights) for idx_round in range(3)]
+        # only the last checkpoints are kept
+        self.assertFalse(os.path.exists(checkpoints[0]["path"]))
+        for layer_weights, loaded_layer_weights in zip(
+                weights, RoundJournal.read_checkpoint(checkpoints[2])
+        ):
+            np.testing.assert_array_equal(layer_weights, loaded_layer_weights)
+        save_fl_weights([np.zeros(3)], checkpoints[1]["path"])
+        with self.assertRaises(MalformedWeightsFileError):
+            RoundJournal.read_checkpoint(checkpoints[1])
+
+
+class TestAggregatorResume(unittest.TestCase):
+
+    def setUp(self):
+        import tensorflow as tf
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+
+        def write_dataset(file_name, n_rows):
+            x = rng.normal(size=(n_rows, 2))
+            dataset_path = os.path.join(self.tmp_dir.name, file_name)
+            pd.DataFrame({
+                "x1": x[:, 0],
+                "x2": x[:, 1],
+                "y": (x[:, 0] + x[:, 1] > 0).astype(int)
+            }).to_csv(dataset_path, index=False)
+            return dataset_path
+
+        self.validation_set_path = write_dataset("validation.csv", 32)
+        self.test_set_path = write_dataset("test.csv", 32)
+        model = tf.keras.Sequential([
+            tf.keras.Input(shape=(2,)),
+            tf.keras.layers.Dense(1, activation="sigmoid")
+        ])
+        model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"])
+        model_path = os.path.join(self.tmp_dir.name, "model.keras")
+        model.save(model_path)
+        self.baseline_weights = model.get_weights()
+        self.announcement_config = AnnouncementConfiguration(
+            "journal task", "journal task description", model_path, None, None,
+            {"features": ["x1", "x2"], "labels": "y"}, 4, 1, 16, "simple_average"
+        )
+        self.participants_path = os.path.join(self.tmp_dir.name, "participants")
+        self.validator_path = os.path.join(self.tmp_dir.name, "validator")
+        self.journal_path = os.path.join(self.tmp_dir.name, "journal", "rounds.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _aggregator(self, resume):
+        return Aggregator(
+            [0, 1], self.announcement_config, self.validation_set_path, self.test_set_path,
+            self.validator_path, journal_path=self.journal_path, checkpoint_interval=2,
+            resume=resume
+        )
+
+    def _write_participant_weights(self, participant_id, idx_round):
+        participant_path = os.path.join(self.participants_path, "participant_" + str(participant_id))
+        os.makedirs(participant_path, exist_ok=True)
+        weights_path = os.path.join(participant_path, "weights_round_" + str(idx_round) + ".flw")
+        save_fl_weights(
+            [layer + participant_id + idx_round for layer in self.baseline_weights], weights_path
+        )
+        return weights_path
+
+    def test_resume(self):
+        aggregator = self._aggregator(resume=False)
+        try:
+            # the rounds 0 and 1 are checkpointed, the round 2 is replayed from the files
+            for idx_round in range(3):
+                for participant_id in [0, 1]:
+                    aggregator.add_participant_weights(
+                        self._write_participant_weights(participant_id, idx_round)
+                    )
+                aggregator.update_global_model()
+            pending_upload_path = self._write_participant_weights(0, 3)
+            aggregator.add_participant_weights(pending_upload_path)
+            global_weights = aggregator.global_model.get_weights()
+            validation_results = aggregator.rounds2participants[2]["validation_results"]
+        finally:
+            aggregator.close()
+
+        resumed_aggregator = self._aggregator(resume=True)
+        try:
+            self.assertEqual(3, resumed_aggregator.current_round)
+            self.assertFalse(resumed_aggregator.is_finished)
+            for layer_weights, resumed_layer_weights in zip(
+                    global_weights, resumed_aggregator.global_model.get_weights()
+            ):
+                np.testing.assert_allclose(layer_weights, resumed_layer_weights)
+            for idx_round in range(3):
+                round_participants = resumed_aggregator.rounds2participants[idx_round]
+                self.assertListEqual([0, 1], round_participants["participant_ids"])
+                self.assertListEqual([0.5, 0.5], round_participants["alpha"])
+                self.assertIn("test_results", round_participants)
+                self.assertIn("aggregation", resumed_aggregator.instrumentation.round_spans(idx_round))
+            np.testing.assert_allclose(
+                validation_results, resumed_aggregator.rounds2participants[2]["validation_results"]
+            )
+            self.assertAlmostEqual(1.5, resumed_aggregator.contribution_ledger.participant_contribution(0))
+            # the upload of the current round is added without retraining the participant
+            self.assertListEqual(
+                [pending_upload_path],
+                resumed_aggregator.current_round_uploads(self.participants_path)
+            )
+            self.assertFalse(resumed_aggregator.add_participant_weights(pending_upload_path))
+            self.assertTrue(resumed_aggregator.add_participant_weights(
+                self._write_participant_weights(1, 3)
+            ))
+            resumed_aggregator.update_global_model()
+            self.assertTrue(resumed_aggregator.is_finished)
+        finally:
+            resumed_aggregator.close()
+
+        # the last checkpoint is lost and a file of the replayed round has been modified
+        round_records = self._round_records()
+        os.remove(round_records[3]["checkpoint"]["path"])
+        modified_path = self._write_participant_weights(0, 2)
+        save_fl_weights([np.zeros(3)], modified_path)
+        self.assertEqual(2, round_records[2]["participant_files"]["0"]["round"])
+        self.assertNotEqual(round_records[2]["participant_files"]["0"]["hash"], file_digest(modified_path))
+        resumed_aggregator = self._aggregator(resume=True)
+        try:
+            self.assertEqual(2, resumed_aggregator.current_round)
+            self.assertListEqual([], resumed_aggregator.rounds2participants[2]["participant_ids"])
+            # the records of the rounds executed again are discarded
+            self.assertListEqual([0, 1], sorted(self._round_records()))
+        finally:
+            resumed_aggregator.close()
+
+    def _round_records(self):
+        return {
+            record["round"]: record for record in RoundJournal(self.journal_path).read_records()
+            if record["type"] == "round"
+        }
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedConfigurationJson
+from decentralized_smart_grid_ml.federated_learning.round_policy import RoundPolicy
+
+
+class TestRoundPolicy(unittest.TestCase):
+
+    def test_round_policy_not_valid(self):
+        with self.assertRaises(ValueError):
+            RoundPolicy(quorum=0.0)
+        with self.assertRaises(ValueError):
+            RoundPolicy(deadline=-1)
+        with self.assertRaises(ValueError):
+            RoundPolicy(participants_per_round=0)
+        with self.assertRaises(ValueError):
+            RoundPolicy(late_uploads="not valid")
+
+    def test_from_config(self):
+        round_policy = RoundPolicy.from_config({"quorum": 0.8, "deadline": 60})
+        self.assertEqual(0.8, round_policy.quorum)
+        self.assertEqual(60, round_policy.deadline)
+        self.assertEqual("drop", round_policy.late_uploads)
+        with self.assertRaises(MalformedConfigurationJson):
+            RoundPolicy.from_config({"not_existing_key": 1})
+
+    def test_sample_participants(self):
+        participant_ids = list(range(10))
+        self.assertListEqual(participant_ids, RoundPolicy().sample_participants(participant_ids, 0))
+        round_policy = RoundPolicy(participants_per_round=4, seed=3)
+        sampled_ids = round_policy.sample_participants(participant_ids, 0)
+        self.assertEqual(4, len(sampled_ids))
+        self.assertEqual(4, len(set(sampled_ids) & set(participant_ids)))
+        # the sampling of a round is reproducible
+        self.assertListEqual(sampled_ids, round_policy.sample_participants(participant_ids, 0))
+
+    def test_is_round_completed(self):
+        # default policy: all the participants are required
+        round_policy = RoundPolicy()
+        self.assertFalse(round_policy.is_round_completed(3, 4, 1000.0))
+        self.assertTrue(round_policy.is_round_completed(4, 4, 0.0))
+        # the round is closed as soon as the quorum is reached
+        round_policy = RoundPolicy(quorum=0.75)
+        self.assertEqual(3, round_policy.quorum_size(4))
+        self.assertFalse(round_policy.is_round_completed(2, 4, 0.0))
+        self.assertTrue(round_policy.is_round_completed(3, 4, 0.0))
+        # the round is closed with the quorum only after the deadline
+        round_policy = RoundPolicy(quorum=0.5, deadline=10.0)
+        self.assertFalse(round_policy.is_round_completed(2, 4, 5.0))
+        self.assertTrue(round_policy.is_round_completed(2, 4, 10.0))
+        self.assertFalse(round_policy.is_round_completed(1, 4, 100.0))
+        self.assertEqual(1, RoundPolicy(quorum=0.01).quorum_size(4))
+
+    def test_asynchronous(self):
+        participant_ids = list(range(10))
+        round_policy = RoundPolicy(asynchronous=True, buffer_size=4, participants_per_round=2)
+        # any participant can upload at any time
+        self.assertListEqual(participant_ids, round_policy.sample_participants(participant_ids, 0))
+        self.assertEqual(4, round_policy.round_size(10))
+        self.assertEqual(3, round_policy.round_size(3))
+        self.assertEqual(10, RoundPolicy(buffer_size=4).round_size(10))
+        np.testing.assert_allclose([1.0, 0.5, 1 / 3], RoundPolicy(staleness_exponent=1).staleness_weights([0, 1, 2]))
+        with self.assertRaises(ValueError):
+            RoundPolicy(asynchronous=True, buffer_size=0)
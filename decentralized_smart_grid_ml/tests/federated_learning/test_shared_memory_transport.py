@@ -0,0 +1,68 @@
+import os
+import secrets
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.shared_memory_transport import \
+    NotificationClient, NotificationServer, parse_notification_address, read_weights_segment, \
+    release_segment, write_weights_segment
+
+
+class TestSharedMemoryTransport(unittest.TestCase):
+
+    def test_parse_notification_address(self):
+        self.assertEqual(("localhost", 6000), parse_notification_address("localhost:6000"))
+        self.assertEqual("/tmp/validator.sock", parse_notification_address("/tmp/validator.sock"))
+
+    def test_weights_segment(self):
+        weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.ones(3, dtype=np.float64)]
+        segment_name = "dsg_test_" + secrets.token_hex(4)
+        segment = write_weights_segment(weights, segment_name, {"round": 1})
+        try:
+            reader_segment, loaded_weights, metadata = read_weights_segment(segment_name)
+            self.assertDictEqual({"round": 1}, metadata)
+            for layer_weights, loaded_layer_weights in zip(weights, loaded_weights):
+                np.testing.assert_array_equal(layer_weights, loaded_layer_weights)
+                self.assertEqual(layer_weights.dtype, loaded_layer_weights.dtype)
+                # the layers are views on the segment
+                self.assertFalse(loaded_layer_weights.flags.owndata)
+            del loaded_layer_weights, loaded_weights
+            release_segment(reader_segment)
+        finally:
+            release_segment(segment, unlink=True)
+        with self.assertRaises(FileNotFoundError):
+            read_weights_segment(segment_name)
+
+    def test_notification_channel(self):
+        received_messages = []
+        is_received = threading.Event()
+
+        def on_message(message):
+            received_messages.append(message)
+            is_received.set()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            address = os.path.join(tmp_dir, "validator.sock")
+            server = NotificationServer(address, b"secret", on_message)
+            client = NotificationClient(address, b"secret", connect_timeout=5)
+            client.send({"type": "local_update", "round": 0})
+            server_message = {"type": "global_model", "round": 1}
+            # the connection is registered by the server's thread
+            for _ in range(50):
+                server.broadcast(server_message)
+                message = client.receive(timeout=0.1)
+                if message is not None:
+                    break
+            self.assertEqual(server_message, message)
+            self.assertTrue(is_received.wait(5))
+            self.assertEqual([{"type": "local_update", "round": 0}], received_messages)
+            self.assertIsNone(client.receive(timeout=0.1))
+            client.close()
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import MalformedUploadManifestError
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model_weights, \
+    save_fl_weights
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import UploadIndex, UploadManifest, \
+    legacy_upload_manifest, load_verified_weights, read_round_participants, read_upload_manifest, round_from_file_name, \
+    round_manifest_file_name, upload_manifest_path, write_round_manifest, write_upload_manifest
+
+
+class TestUploadManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.weights_path = os.path.join(self.tmp_dir.name, "participant_12", "weights_round_10.flw")
+        os.makedirs(os.path.dirname(self.weights_path))
+        save_fl_weights([np.ones(3, dtype=np.float32)], self.weights_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_from_file_name(self):
+        self.assertEqual(10, round_from_file_name("validator_weights_round_10"))
+        self.assertIsNone(round_from_file_name("validator_weights_final"))
+        self.assertIsNone(round_from_file_name("weights_round_null"))
+
+    def test_write_read(self):
+        manifest_path = write_upload_manifest(self.weights_path, 12, 10, 250)
+        self.assertEqual(upload_manifest_path(self.weights_path), manifest_path)
+        self.assertTrue(manifest_path.endswith("weights_round_10.manifest"))
+        upload = read_upload_manifest(manifest_path)
+        self.assertEqual(12, upload.participant_id)
+        self.assertEqual(10, upload.round)
+        self.assertEqual(250, upload.sample_count)
+        self.assertEqual(self.weights_path, upload.weights_path)
+        self.assertEqual(".flw", upload.weights_format)
+        upload.verify_weights()
+        # the weights file has been replaced after the manifest was written
+        save_fl_weights([np.zeros(3, dtype=np.float32)], self.weights_path)
+        with self.assertRaises(MalformedUploadManifestError):
+            read_upload_manifest(manifest_path).verify_weights()
+
+    def test_load_verified_weights(self):
+        upload = read_upload_manifest(write_upload_manifest(self.weights_path, 12, 10))
+        weights = load_verified_weights(upload.weights_path, upload.weights_hash, load_fl_model_weights)
+        np.testing.assert_array_equal(np.ones(3), weights[0])
+        save_fl_weights([np.zeros(3, dtype=np.float32)], self.weights_path)
+        with self.assertRaises(MalformedUploadManifestError):
+            load_verified_weights(upload.weights_path, upload.weights_hash, load_fl_model_weights)
+
+    def test_read_malformed(self):
+        manifest_path = upload_manifest_path(self.weights_path)
+        for manifest in [
+            {"participant_id": 12, "round": 10},
+            {"participant_id": "12", "round": 10, "weights_file": "weights_round_10.flw",
+             "format": ".flw", "hash": None},
+            {"participant_id": 12, "round": 10, "weights_file": "../weights_round_10.flw",
+             "format": ".flw", "hash": None},
+            {"participant_id": 12, "round": 10, "weights_file": "weights_round_10.flw",
+             "format": ".json", "hash": None}
+        ]:
+            with open(manifest_path, "w") as file_write:
+                json.dump(manifest, file_write)
+            with self.assertRaises(MalformedUploadManifestError):
+                read_upload_manifest(manifest_path)
+        with open(manifest_path, "w") as file_write:
+            file_write.write("{")
+        with self.assertRaises(MalformedUploadManifestError):
+            read_upload_manifest(manifest_path)
+
+    def test_round_manifest(self):
+        self.assertEqual("validator_weights_round_3.round", round_manifest_file_name(3))
+        manifest_path = os.path.join(self.tmp_dir.name, round_manifest_file_name(3))
+        self.assertIsNone(read_round_participants(manifest_path))
+        write_round_manifest(manifest_path, 3, [np.int64(0), 2])
+        self.assertListEqual([0, 2], read_round_participants(manifest_path))
+        with open(manifest_path, "w") as file_write:
+            json.dump({"round": 3}, file_write)
+        with self.assertRaises(MalformedUploadManifestError):
+            read_round_participants(manifest_path)
+
+    def test_legacy_upload_manifest(self):
+        upload = legacy_upload_manifest(self.weights_path)
+        self.assertEqual(12, upload.participant_id)
+        self.assertEqual(10, upload.round)
+        self.assertIsNone(upload.weights_hash)
+        self.assertEqual(3, legacy_upload_manifest("/root/region_3/partial_aggregate_round_0.flw").participant_id)
+        self.assertIsNone(legacy_upload_manifest("/participants/weights_round_0.json"))
+        self.assertIsNone(legacy_upload_manifest("/participants/participant_1/statistics.json"))
+
+    def test_upload_index(self):
+        upload_index = UploadIndex()
+        self.assertTrue(upload_index.add(UploadManifest(12, 0, "participant_12/weights_round_0.json")))
+        self.assertFalse(upload_index.add(UploadManifest(12, 0, "participant_12/weights_round_0.json")))
+        deferred_upload = UploadManifest(120, 1, "participant_120/weights_round_1.json")
+        self.assertTrue(upload_index.defer(deferred_upload))
+        self.assertFalse(upload_index.defer(deferred_upload))
+        self.assertEqual(2, len(upload_index))
+        self.assertIs(deferred_upload, upload_index.get(1, 120))
+        self.assertIsNone(upload_index.get(1, 12))
+        self.assertListEqual([], upload_index.pop_deferred(0))
+        self.assertListEqual([deferred_upload], upload_index.pop_deferred(1))
+        self.assertListEqual([], upload_index.pop_deferred(1))
+        # the deferred upload is still indexed to discard its duplicates
+        self.assertListEqual([deferred_upload], upload_index.round_uploads(1))
+        upload_index.discard_rounds_before(1)
+        self.assertIsNone(upload_index.get(0, 12))
+        self.assertEqual(1, len(upload_index))
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from decentralized_smart_grid_ml.exceptions import NotValidCompressionMethod, IncorrectExtensionFileError
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import save_fl_weights, \
+    load_fl_weights
+from decentralized_smart_grid_ml.federated_learning.weights_compression import WeightsCompressorCreator, \
+    TopKCompressor, save_weights_update, load_weights_update
+
+
+class TestWeightsCompression(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.reference_weights = [
+            rng.normal(size=(4, 3)).astype(np.float32),
+            rng.normal(size=(3,)).astype(np.float32)
+        ]
+        self.local_weights = [
+            layer + rng.normal(scale=0.1, size=layer.shape).astype(np.float32)
+            for layer in self.reference_weights
+        ]
+
+    def _save_load_update(self, compressor):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            weights_path = os.path.join(tmp_dir, "weights_round_0.flw")
+            save_weights_update(self.local_weights, self.reference_weights, weights_path, compressor)
+            _, metadata = load_fl_weights(weights_path)
+            weights = load_weights_update(weights_path, self.reference_weights)
+        return weights, metadata
+
+    def test_factory_method_not_valid(self):
+        with self.assertRaises(NotValidCompressionMethod):
+            WeightsCompressorCreator.factory_method("not valid")
+
+    def test_save_load_update_none(self):
+        compressor = WeightsCompressorCreator.factory_method("none")
+        weights, metadata = self._save_load_update(compressor)
+        self.assertEqual("delta", metadata["update"])
+        self.assertEqual("none", metadata["compression"])
+        for expected_layer, layer in zip(self.local_weights, weights):
+            np.testing.assert_allclose(expected_layer, layer, atol=1e-6)
+            self.assertEqual(np.float32, layer.dtype)
+
+    def test_save_load_update_float16(self):
+        compressor = WeightsCompressorCreator.factory_method("float16")
+        weights, _ = self._save_load_update(compressor)
+        for expected_layer, layer in zip(self.local_weights, weights):
+            np.testing.assert_allclose(expected_layer, layer, atol=1e-3)
+
+    def test_save_load_update_int8(self):
+        compressor = WeightsCompressorCreator.factory_method("int8")
+        weights, metadata = self._save_load_update(compressor)
+        self.assertEqual(2, len(metadata["scales"]))
+        for expected_layer, reference_layer, layer, scale in zip(
+                self.local_weights, self.reference_weights, weights, metadata["scales"]
+        ):
+            self.assertEqual(reference_layer.shape, layer.shape)
+            np.testing.assert_allclose(expected_layer, layer, atol=scale)
+
+    def test_topk_error_feedback(self):
+        compressor = WeightsCompressorCreator.factory_method("topk", ratio=0.25)
+        delta_weights = [np.array([[0.1, -2.0], [0.3, 0.0]], dtype=np.float32)]
+        compressed_arrays, metadata = compressor.compress(delta_weights)
+        np.testing.assert_array_equal(np.array([1], dtype=np.uint32), compressed_arrays[0])
+        np.testing.assert_array_equal(np.array([-2.0], dtype=np.float32), compressed_arrays[1])
+        decompressed = TopKCompressor.decompress(compressed_arrays, metadata)
+        np.testing.assert_array_equal(np.array([[0.0, -2.0], [0.0, 0.0]]), decompressed[0])
+        # the entries not sent are accumulated in the residual and sent later
+        np.testing.assert_allclose(np.array([[0.1, 0.0], [0.3, 0.0]]), compressor.residuals[0])
+        compressed_arrays, _ = compressor.compress([np.zeros((2, 2), dtype=np.float32)])
+        np.testing.assert_array_equal(np.array([2], dtype=np.uint32), compressed_arrays[0])
+        np.testing.assert_allclose(np.array([0.3]), compressed_arrays[1])
+
+    def test_save_load_update_compressed_flw(self):
+        rng = np.random.default_rng(1)
+        reference_weights = [rng.normal(size=(64, 32)).astype(np.float32)]
+        local_weights = [reference_weights[0] + rng.normal(scale=0.1, size=(64, 32)).astype(np.float32)]
+        file_sizes = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for method, compression_params in [("none", {}), ("int8", {}), ("topk", {"ratio": 0.05})]:
+                compressor = WeightsCompressorCreator.factory_method(method, **compression_params)
+                weights_path = os.path.join(tmp_dir, "weights_round_" + method + ".flw")
+                save_weights_update(local_weights, reference_weights, weights_path, compressor)
+                file_sizes[method] = os.path.getsize(weights_path)
+                compressed_arrays, metadata = load_fl_weights(weights_path)
+                weights = load_weights_update(weights_path, reference_weights)
+                if method == "int8":
+                    self.assertEqual(np.int8, compressed_arrays[0].dtype)
+                    np.testing.assert_allclose(local_weights[0], weights[0], atol=metadata["scales"][0])
+                elif method == "topk":
+                    # the indices are kept as integers, so the delta is decoded at its entries
+                    self.assertEqual(np.uint32, compressed_arrays[0].dtype)
+                    indices = np.unravel_index(compressed_arrays[0], (64, 32))
+                    np.testing.assert_allclose(local_weights[0][indices], weights[0][indices], atol=1e-6)
+                    is_sent = np.zeros((64, 32), dtype=bool)
+                    is_sent[indices] = True
+                    np.testing.assert_array_equal(reference_weights[0][~is_sent], weights[0][~is_sent])
+                del compressed_arrays
+        # the compressed layers are saved in their own dtype
+        self.assertLess(file_sizes["int8"], file_sizes["none"] / 2)
+        self.assertLess(file_sizes["topk"], file_sizes["none"] / 4)
+
+    def test_topk_not_valid_ratio(self):
+        with self.assertRaises(ValueError):
+            WeightsCompressorCreator.factory_method("topk", ratio=0.0)
+
+    def test_load_weights_update_full_weights(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            weights_path = os.path.join(tmp_dir, "weights_round_0.flw")
+            save_fl_weights(self.local_weights, weights_path)
+            weights = load_weights_update(weights_path, self.reference_weights)
+        for expected_layer, layer in zip(self.local_weights, weights):
+            np.testing.assert_array_equal(expected_layer, layer)
+
+    def test_save_fl_weights_metadata_json(self):
+        with self.assertRaises(IncorrectExtensionFileError):
+            save_fl_weights(self.local_weights, "/path/to/weights.json", {"update": "delta"})
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from decentralized_smart_grid_ml.handlers.ingestion_queue import IngestionHandler, IngestionQueue
+
+
+class RecordingHandler(IngestionHandler):
+
+    def __init__(self):
+        self.processed_paths = []
+        # the files being written are checked explicitly by the tests
+        super().__init__(stability_interval=3600)
+
+    def process_path(self, path):
+        self.processed_paths.append(path)
+
+
+class TestIngestionQueue(unittest.TestCase):
+
+    def test_ingestion_queue_constructor_not_valid_workers(self):
+        with self.assertRaises(ValueError):
+            IngestionQueue(MagicMock(), n_workers=0)
+
+    def test_submit(self):
+        process_path_mock = MagicMock()
+        ingestion_queue = IngestionQueue(process_path_mock, n_workers=2)
+        paths = ["/path/to/weights_round_0.json", "/path/to/weights_round_1.json"]
+        for path in paths:
+            self.assertTrue(ingestion_queue.submit(path))
+        ingestion_queue.join()
+        self.assertCountEqual(paths, [call_args[0][0] for call_args in process_path_mock.call_args_list])
+        ingestion_queue.stop()
+
+    def test_submit_debounce(self):
+        release_worker = threading.Event()
+        processed_paths = []
+
+        def process_path(path):
+            release_worker.wait()
+            processed_paths.append(path)
+
+        ingestion_queue = IngestionQueue(process_path, n_workers=1)
+        # the first path keeps the worker busy
+        self.assertTrue(ingestion_queue.submit("/path/busy.json"))
+        self.assertTrue(ingestion_queue.submit("/path/to/weights.json"))
+        # the same path is still waiting in the queue
+        self.assertFalse(ingestion_queue.submit("/path/to/weights.json"))
+        release_worker.set()
+        ingestion_queue.join()
+        self.assertListEqual(["/path/busy.json", "/path/to/weights.json"], processed_paths)
+        ingestion_queue.stop()
+
+    def test_worker_error(self):
+        process_path_mock = MagicMock(side_effect=[ValueError("error"), None])
+        ingestion_queue = IngestionQueue(process_path_mock, n_workers=1)
+        ingestion_queue.submit("/path/error.json")
+        ingestion_queue.submit("/path/ok.json")
+        ingestion_queue.join()
+        # the worker keeps processing after an error
+        self.assertEqual(2, process_path_mock.call_count)
+        ingestion_queue.stop()
+
+
+class TestIngestionHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "weights_round_0.json")
+        self.handler = RecordingHandler()
+
+    def tearDown(self):
+        self.handler.stop()
+        self.tmp_dir.cleanup()
+
+    def _event(self, src_path):
+        event = MagicMock()
+        event.src_path = src_path
+        event.is_directory = False
+        return event
+
+    def test_created_file_stable_size(self):
+        with open(self.path, "w") as file_write:
+            file_write.write("[1, 2")
+        self.handler.on_created(self._event(self.path))
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        self.assertListEqual([], self.handler.processed_paths)
+        # the file is still being written
+        with open(self.path, "a") as file_write:
+            file_write.write(", 3]")
+        self.handler.on_modified(self._event(self.path))
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        self.assertListEqual([], self.handler.processed_paths)
+        # the size did not change since the previous check
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        self.assertListEqual([self.path], self.handler.processed_paths)
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        self.assertListEqual([self.path], self.handler.processed_paths)
+
+    def test_created_file_removed(self):
+        with open(self.path, "w") as file_write:
+            file_write.write("[1, 2, 3]")
+        self.handler.on_created(self._event(self.path))
+        os.remove(self.path)
+        self.handler._check_unstable_paths()
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        self.assertListEqual([], self.handler.processed_paths)
+
+    def test_closed_events_disable_fallback(self):
+        with open(self.path, "w") as file_write:
+            file_write.write("[1, 2, 3]")
+        self.handler.on_created(self._event(self.path))
+        self.handler.on_closed(self._event(self.path))
+        self.handler.join()
+        other_path = os.path.join(self.tmp_dir.name, "weights_round_1.json")
+        with open(other_path, "w") as file_write:
+            file_write.write("[1, 2, 3]")
+        self.handler.on_created(self._event(other_path))
+        self.handler._check_unstable_paths()
+        self.handler._check_unstable_paths()
+        self.handler.join()
+        # the file is enqueued once, when it is closed
+        self.assertListEqual([self.path], self.handler.processed_paths)
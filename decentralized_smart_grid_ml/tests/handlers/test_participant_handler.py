@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, call, MagicMock
 
 from decentralized_smart_grid_ml.handlers.participant_handler import ParticipantHandler
 
@@ -8,24 +8,66 @@ class TestParticipantHandler(unittest.TestCase):
 
     @patch("watchdog.events.FileSystemEvent")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer")
-    def test_on_created(self, trainer_mock, event_mock):
+    def test_on_closed(self, trainer_mock, event_mock):
         path_to_aggregated_weights = "/path/to/aggregated_weights.json"
         event_mock.src_path = path_to_aggregated_weights
+        event_mock.is_directory = False
         trainer_mock.is_finished = False
         trainer_mock.fit_local_model.return_value = False
-        val_handler = ParticipantHandler(trainer_mock)
-        val_handler.on_created(event_mock)
+        par_handler = ParticipantHandler(trainer_mock)
+        par_handler.on_closed(event_mock)
+        par_handler.join()
         trainer_mock.fit_local_model.assert_called_with(path_to_aggregated_weights)
         trainer_mock.is_finished = True
-        val_handler.on_created(event_mock)
+        par_handler.on_closed(event_mock)
+        par_handler.join()
+        trainer_mock.fit_local_model.assert_called_once()
+        par_handler.stop()
 
     @patch("watchdog.events.FileSystemEvent")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer")
-    def test_on_created_completed(self, trainer_mock, event_mock):
+    def test_on_closed_completed(self, trainer_mock, event_mock):
         path_to_aggregated_weights = "/path/to/aggregated_weights.json"
         event_mock.src_path = path_to_aggregated_weights
+        event_mock.is_directory = False
         trainer_mock.is_finished = False
         trainer_mock.fit_local_model.return_value = True
-        val_handler = ParticipantHandler(trainer_mock)
-        val_handler.on_created(event_mock)
+        par_handler = ParticipantHandler(trainer_mock)
+        par_handler.on_closed(event_mock)
+        par_handler.join()
         trainer_mock.fit_local_model.assert_called_with(path_to_aggregated_weights)
+        par_handler.stop()
+
+    @patch("watchdog.events.FileSystemEvent")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer")
+    def test_on_closed_directory(self, trainer_mock, event_mock):
+        event_mock.src_path = "/path/to/directory"
+        event_mock.is_directory = True
+        trainer_mock.is_finished = False
+        par_handler = ParticipantHandler(trainer_mock)
+        par_handler.on_closed(event_mock)
+        par_handler.join()
+        trainer_mock.fit_local_model.assert_not_called()
+        par_handler.stop()
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_local_trainer.FederatedLocalTrainer")
+    def test_newest_global_model(self, trainer_mock):
+        trainer_mock.is_finished = False
+        trainer_mock.fit_local_model.return_value = False
+        par_handler = ParticipantHandler(trainer_mock)
+        par_handler.stop()
+        # the files are processed after all of them have been completed
+        par_handler.ingestion_queue = MagicMock()
+        paths = [
+            "/path/to/validator_weights_round_1.json",
+            "/path/to/validator_weights_round_2.json",
+            "/path/to/metrics.prom"
+        ]
+        for path in paths:
+            par_handler.submit_path(path)
+            par_handler.ingestion_queue.submit.assert_called_with(path)
+        for path in paths:
+            par_handler.process_path(path)
+        # the superseded global model is not used
+        trainer_mock.fit_local_model.assert_has_calls([call(paths[1]), call(paths[2])])
+        self.assertEqual(2, trainer_mock.fit_local_model.call_count)
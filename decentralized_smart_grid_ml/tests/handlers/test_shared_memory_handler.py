@@ -0,0 +1,157 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from decentralized_smart_grid_ml.federated_learning.shared_memory_transport import \
+    GLOBAL_MODEL_MESSAGE, LOCAL_UPDATE_MESSAGE, read_weights_segment, release_segment, \
+    write_weights_segment
+from decentralized_smart_grid_ml.handlers.shared_memory_handler import \
+    ParticipantSharedMemoryHandler, ValidatorSharedMemoryHandler
+
+
+class TestValidatorSharedMemoryHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.tmp_dir.name, "validator.sock")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_process_message(self):
+        aggregator_mock = MagicMock()
+        aggregator_mock.is_finished = False
+        aggregator_mock.current_round = 0
+        aggregator_mock.add_participant_local_weights.return_value = True
+        aggregator_mock.global_model.get_weights.return_value = [np.zeros(2)]
+        val_handler = ValidatorSharedMemoryHandler(aggregator_mock, self.address, b"secret")
+        local_weights = [np.arange(3, dtype=np.float32)]
+        segment = write_weights_segment(local_weights, "dsg_test_p0_r0")
+        try:
+            val_handler.process_message({
+                "type": LOCAL_UPDATE_MESSAGE, "participant_id": 0, "round": 0,
+                "segment": "dsg_test_p0_r0"
+            })
+        finally:
+            release_segment(segment, unlink=True)
+        participant_id, added_weights, upload_round = \
+            aggregator_mock.add_participant_local_weights.call_args[0]
+        self.assertEqual(0, participant_id)
+        self.assertEqual(0, upload_round)
+        np.testing.assert_array_equal(local_weights[0], added_weights[0])
+        # the weights are copied, so they outlive the participant's segment
+        self.assertTrue(added_weights[0].flags.owndata)
+        aggregator_mock.update_global_model.assert_called_once()
+        self.assertEqual([0], list(val_handler._global_segments))
+        val_handler.stop()
+        self.assertEqual({}, val_handler._global_segments)
+
+    def test_process_message_late(self):
+        aggregator_mock = MagicMock()
+        aggregator_mock.is_finished = False
+        aggregator_mock.current_round = 1
+        aggregator_mock.add_participant_local_weights.return_value = False
+        val_handler = ValidatorSharedMemoryHandler(aggregator_mock, self.address, b"secret")
+        segment = write_weights_segment([np.ones(2)], "dsg_test_p0_r0")
+        try:
+            val_handler.process_message({
+                "type": LOCAL_UPDATE_MESSAGE, "participant_id": 0, "round": 0,
+                "segment": "dsg_test_p0_r0"
+            })
+        finally:
+            release_segment(segment, unlink=True)
+        # the late update is admitted by the aggregator's round policy
+        self.assertEqual(0, aggregator_mock.add_participant_local_weights.call_args[0][2])
+        aggregator_mock.update_global_model.assert_not_called()
+        val_handler.stop()
+
+    def test_process_message_skip(self):
+        aggregator_mock = MagicMock()
+        aggregator_mock.is_finished = False
+        aggregator_mock.current_round = 0
+        val_handler = ValidatorSharedMemoryHandler(aggregator_mock, self.address, b"secret")
+        val_handler.process_message({"type": GLOBAL_MODEL_MESSAGE})
+        val_handler.process_message({
+            "type": LOCAL_UPDATE_MESSAGE, "participant_id": 0, "round": 0,
+            "segment": "dsg_test_missing"
+        })
+        aggregator_mock.add_participant_local_weights.assert_not_called()
+        val_handler.stop()
+
+
+class TestParticipantSharedMemoryHandler(unittest.TestCase):
+
+    @patch("decentralized_smart_grid_ml.handlers.shared_memory_handler.NotificationClient")
+    def test_process_message(self, client_mock):
+        trainer_mock = MagicMock()
+        trainer_mock.participant_id = 1
+        trainer_mock.current_round = 1
+        trainer_mock.is_finished = False
+        trained_global_weights = []
+
+        def train_round(global_weights):
+            # the views on the global model's segment are copied, as the model does
+            trained_global_weights.extend(np.array(layer_weights) for layer_weights in global_weights)
+            return [np.ones(2)]
+
+        # a plain function, so the mock does not keep the views in its calls
+        trainer_mock.train_round = train_round
+        part_handler = ParticipantSharedMemoryHandler(trainer_mock, "validator.sock", b"secret")
+        global_weights = [np.arange(4, dtype=np.float32)]
+        segment = write_weights_segment(global_weights, "dsg_test_g2")
+        try:
+            part_handler.process_message({
+                "type": GLOBAL_MODEL_MESSAGE, "round": 2, "segment": "dsg_test_g2",
+                "is_final": False
+            })
+        finally:
+            release_segment(segment, unlink=True)
+        # the rounds closed without the participant are skipped
+        self.assertEqual(2, trainer_mock.current_round)
+        np.testing.assert_array_equal(global_weights[0], trained_global_weights[0])
+        message = part_handler.notification_client.send.call_args[0][0]
+        self.assertEqual(LOCAL_UPDATE_MESSAGE, message["type"])
+        self.assertEqual(1, message["participant_id"])
+        update_segment, update_weights, _ = read_weights_segment(message["segment"])
+        np.testing.assert_array_equal(np.ones(2), update_weights[0])
+        del update_weights
+        release_segment(update_segment)
+        part_handler.stop()
+        with self.assertRaises(FileNotFoundError):
+            read_weights_segment(message["segment"])
+
+    @patch("decentralized_smart_grid_ml.handlers.shared_memory_handler.NotificationClient")
+    def test_process_message_not_selected(self, client_mock):
+        trainer_mock = MagicMock()
+        trainer_mock.participant_id = 1
+        trainer_mock.current_round = 1
+        trainer_mock.is_finished = False
+        part_handler = ParticipantSharedMemoryHandler(trainer_mock, "validator.sock", b"secret")
+        part_handler.process_message({
+            "type": GLOBAL_MODEL_MESSAGE, "round": 1, "segment": "dsg_test_g1", "is_final": False,
+            "participant_ids": [0, 2]
+        })
+        self.assertEqual(2, trainer_mock.current_round)
+        trainer_mock.train_round.assert_not_called()
+        part_handler.notification_client.send.assert_not_called()
+        part_handler.stop()
+
+    @patch("decentralized_smart_grid_ml.handlers.shared_memory_handler.NotificationClient")
+    def test_process_message_final(self, client_mock):
+        trainer_mock = MagicMock()
+        trainer_mock.is_finished = False
+        part_handler = ParticipantSharedMemoryHandler(trainer_mock, "validator.sock", b"secret")
+        part_handler.process_message({
+            "type": GLOBAL_MODEL_MESSAGE, "round": 3, "segment": "dsg_test_g3", "is_final": True
+        })
+        self.assertTrue(trainer_mock.is_finished)
+        self.assertTrue(part_handler.is_final_model_received)
+        trainer_mock.train_round.assert_not_called()
+        part_handler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,28 +9,64 @@ class TestValidatorHandler(unittest.TestCase):
     def test_validator_constructor(self):
         val_handler = ValidatorHandler("aggregator")
         self.assertEqual(val_handler.aggregator, "aggregator")
+        val_handler.stop()
 
     @patch("watchdog.events.FileSystemEvent")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator")
-    def test_on_created_false(self, aggregator_mock, event_mock):
+    def test_on_closed_false(self, aggregator_mock, event_mock):
         path_to_local_weights = "/path/to/participant_weights.json"
         event_mock.src_path = path_to_local_weights
+        event_mock.is_directory = False
         aggregator_mock.is_finished = False
         aggregator_mock.add_participant_weights.return_value = False
         val_handler = ValidatorHandler(aggregator_mock)
-        val_handler.on_created(event_mock)
+        val_handler.on_closed(event_mock)
+        val_handler.join()
         aggregator_mock.add_participant_weights.assert_called_with(path_to_local_weights)
+        aggregator_mock.update_global_model.assert_not_called()
+        val_handler.stop()
 
     @patch("watchdog.events.FileSystemEvent")
     @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator")
-    def test_on_created(self, aggregator_mock, event_mock):
+    def test_on_closed(self, aggregator_mock, event_mock):
         path_to_local_weights = "/path/to/participant_weights.json"
         event_mock.src_path = path_to_local_weights
+        event_mock.is_directory = False
         aggregator_mock.is_finished = False
         aggregator_mock.add_participant_weights.return_value = True
         val_handler = ValidatorHandler(aggregator_mock)
-        val_handler.on_created(event_mock)
+        val_handler.on_closed(event_mock)
+        val_handler.join()
         aggregator_mock.add_participant_weights.assert_called_with(path_to_local_weights)
         aggregator_mock.update_global_model.assert_called_once()
         aggregator_mock.is_finished = True
-        val_handler.on_created(event_mock)
+        val_handler.on_closed(event_mock)
+        val_handler.join()
+        aggregator_mock.update_global_model.assert_called_once()
+        val_handler.stop()
+
+    @patch("watchdog.events.FileSystemMovedEvent")
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator")
+    def test_on_moved(self, aggregator_mock, event_mock):
+        path_to_local_weights = "/path/to/participant_weights.json"
+        event_mock.src_path = "/path/to/participant_weights.json.tmp"
+        event_mock.dest_path = path_to_local_weights
+        event_mock.is_directory = False
+        aggregator_mock.is_finished = False
+        aggregator_mock.add_participant_weights.return_value = False
+        val_handler = ValidatorHandler(aggregator_mock)
+        val_handler.on_moved(event_mock)
+        val_handler.join()
+        aggregator_mock.add_participant_weights.assert_called_with(path_to_local_weights)
+        val_handler.stop()
+
+    @patch("decentralized_smart_grid_ml.federated_learning.federated_aggregator.Aggregator")
+    def test_check_round_deadline(self, aggregator_mock):
+        aggregator_mock.is_round_closable.return_value = False
+        val_handler = ValidatorHandler(aggregator_mock)
+        val_handler.check_round_deadline()
+        aggregator_mock.update_global_model.assert_not_called()
+        aggregator_mock.is_round_closable.return_value = True
+        val_handler.check_round_deadline()
+        aggregator_mock.update_global_model.assert_called_once()
+        val_handler.stop()
@@ -8,12 +8,40 @@ import os
 CURRENT_PATH_SPLIT = os.path.dirname(os.path.abspath(__file__)).split("/")
 PROJECT_ABSOLUTE_PATH = "/".join(CURRENT_PATH_SPLIT[:-2])
 
-BLOCKCHAIN_ADDRESS = os.environ["BC_ADDRESS"]
 ANNOUNCEMENT_JSON_PATH = PROJECT_ABSOLUTE_PATH + "/build/contracts/Announcement.json"
 DEX_JSON_PATH = PROJECT_ABSOLUTE_PATH + "/build/contracts/GreenDEX.json"
 TOKEN_JSON_PATH = PROJECT_ABSOLUTE_PATH + "/build/contracts/GreenToken.json"
 
 
+def get_blockchain_address():
+    """
+    Returns the blockchain address defined by the environment variable BC_ADDRESS
+    :return: the blockchain address
+    """
+    return os.environ["BC_ADDRESS"]
+
+
+def get_transport_authkey():
+    """
+    Returns the key that authenticates the processes of the shared memory transport,
+    defined by the environment variable TRANSPORT_AUTHKEY
+    :return: the key as bytes
+    """
+    return os.environ["TRANSPORT_AUTHKEY"].encode("utf-8")
+
+
+def __getattr__(name):
+    """
+    Resolves lazily the config values that depend on the environment, so that the module
+    can be imported even if they are not defined
+    :param name: name of the attribute
+    :return: the value of the attribute
+    """
+    if name == "BLOCKCHAIN_ADDRESS":
+        return get_blockchain_address()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_addresses_contracts(contract_info_path):
     """
     Returns the address of the deployed contracts
@@ -5,7 +5,6 @@ import pathlib
 
 import numpy as np
 import pandas as pd
-from sklearn.utils import shuffle as sk_shuffle
 
 from decentralized_smart_grid_ml.exceptions import IncorrectExtensionFileError
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
@@ -44,6 +43,8 @@ def split_dataset_validator_participants(dataset_path, n_participants, validatio
         raise ValueError("The test size must be a value in the range (0.0, 1.0)")
     df_dataset = pd.read_csv(dataset_path)
     if shuffle:
+        # scikit-learn is imported only when it is needed
+        from sklearn.utils import shuffle as sk_shuffle  # pylint: disable=import-outside-toplevel
         df_dataset = sk_shuffle(df_dataset, random_state=random_state)
     # get the number of examples in the test split
     n_example_test = int(len(df_dataset) * test_size)
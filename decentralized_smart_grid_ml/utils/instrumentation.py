@@ -0,0 +1,187 @@
+"""
+This module contains the utilities used to measure the time and the resources
+spent in each phase of a federated round
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # the resource module is not available on Windows
+    resource = None
+
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+PROMETHEUS_METRICS_PREFIX = "decentralized_smart_grid_ml_round_phase_"
+
+# name, help text of the Prometheus metric and key of the span's measurement
+PROMETHEUS_METRICS = [
+    ("wall_seconds", "Wall time spent in the phase of the federated round", "wall_time"),
+    ("cpu_seconds", "CPU time of the process spent in the phase of the federated round",
+     "cpu_time"),
+    ("read_bytes", "Bytes read by the process during the phase of the federated round",
+     "bytes_read"),
+    ("written_bytes", "Bytes written by the process during the phase of the federated round",
+     "bytes_written"),
+    ("peak_rss_bytes", "Peak resident set size of the process at the end of the phase",
+     "peak_rss"),
+    ("count", "Number of times the phase has been carried out in the federated round",
+     "count"),
+]
+
+
+def _io_counters():
+    """
+    Returns the bytes read and written by the process (read and write system calls)
+    :return: (bytes read, bytes written), (0, 0) if the counters are not available
+    """
+    try:
+        with open("/proc/self/io", "r") as file_read:
+            counters = dict(line.split(": ") for line in file_read.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _peak_rss():
+    """
+    Returns the peak resident set size of the process
+    :return: peak resident set size in bytes, 0 if it is not available
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # the value is in kilobytes on Linux and in bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RoundInstrumentation:
+    """
+    This class collects the measurements (wall and CPU time, bytes read and written,
+    peak RSS) of the spans around the phases of each federated round. The spans of
+    the same phase in the same round are summed up
+    """
+
+    def __init__(self):
+        """
+        Initializes the instrumentation
+        """
+        self.rounds2spans = {}
+        self._lock = threading.Lock()
+
+    def record(self, idx_round, phase, wall_time, cpu_time=0.0, bytes_read=0,
+               bytes_written=0, peak_rss=0):
+        """
+        Records the measurements of a span
+        :param idx_round: round of the span
+        :param phase: name of the phase
+        :param wall_time: wall time (seconds)
+        :param cpu_time: CPU time of the process (seconds)
+        :param bytes_read: bytes read by the process
+        :param bytes_written: bytes written by the process
+        :param peak_rss: peak resident set size of the process (bytes)
+        :return:
+        """
+        with self._lock:
+            round_spans = self.rounds2spans.setdefault(idx_round, {})
+            phase_span = round_spans.setdefault(phase, {
+                "count": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "bytes_read": 0,
+                "bytes_written": 0,
+                "peak_rss": 0
+            })
+            phase_span["count"] += 1
+            phase_span["wall_time"] += wall_time
+            phase_span["cpu_time"] += cpu_time
+            phase_span["bytes_read"] += bytes_read
+            phase_span["bytes_written"] += bytes_written
+            phase_span["peak_rss"] = max(phase_span["peak_rss"], peak_rss)
+
+    @contextmanager
+    def span(self, idx_round, phase):
+        """
+        Measures the code executed in the context as a span of a phase
+        :param idx_round: round of the span
+        :param phase: name of the phase
+        :return:
+        """
+        bytes_read_start, bytes_written_start = _io_counters()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            bytes_read_end, bytes_written_end = _io_counters()
+            self.record(
+                idx_round, phase, wall_time, cpu_time,
+                bytes_read_end - bytes_read_start,
+                bytes_written_end - bytes_written_start,
+                _peak_rss()
+            )
+
+    def round_spans(self, idx_round):
+        """
+        Returns a copy of the measurements of a round
+        :param idx_round: round of the spans
+        :return: dictionary phase -> measurements
+        """
+        with self._lock:
+            return {
+                phase: dict(phase_span)
+                for phase, phase_span in self.rounds2spans.get(idx_round, {}).items()
+            }
+
+    def restore_round_spans(self, idx_round, round_spans):
+        """
+        Restores the measurements of a round, e.g. read from the journal of the rounds
+        :param idx_round: round of the spans
+        :param round_spans: dictionary phase -> measurements
+        :return:
+        """
+        with self._lock:
+            self.rounds2spans[idx_round] = {
+                phase: dict(phase_span) for phase, phase_span in round_spans.items()
+            }
+
+    def write_prometheus(self, output_file_path, labels=None):
+        """
+        Writes the measurements in the Prometheus text format, e.g. for the textfile
+        collector of the node exporter. The file is replaced atomically
+        :param output_file_path: output file path (.prom)
+        :param labels: (optional) dictionary of labels added to each sample
+        :return:
+        """
+        labels = labels or {}
+        with self._lock:
+            rounds2spans = {
+                idx_round: {phase: dict(span) for phase, span in round_spans.items()}
+                for idx_round, round_spans in self.rounds2spans.items()
+            }
+        lines = []
+        for metric_name, metric_help, measure in PROMETHEUS_METRICS:
+            full_name = PROMETHEUS_METRICS_PREFIX + metric_name
+            lines.append("# HELP " + full_name + " " + metric_help)
+            lines.append("# TYPE " + full_name + " gauge")
+            for idx_round in sorted(rounds2spans):
+                for phase, phase_span in sorted(rounds2spans[idx_round].items()):
+                    sample_labels = dict(labels, round=str(idx_round), phase=phase)
+                    labels_text = ",".join(
+                        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                        for name, value in sample_labels.items()
+                    )
+                    lines.append("%s{%s} %s" % (full_name, labels_text, repr(phase_span[measure])))
+        temporary_file_path = output_file_path + ".tmp"
+        with open(temporary_file_path, "w") as file_write:
+            file_write.write("\n".join(lines) + "\n")
+        os.replace(temporary_file_path, output_file_path)
+        logger.debug("Round instrumentation exported in %s", output_file_path)
@@ -4,14 +4,13 @@ This script permits the automatic initialization of an Announcement smart contra
 import argparse
 import json
 import sys
-import time
 
 import pandas as pd
-from web3 import Web3, HTTPProvider
 from tensorflow.keras.experimental import LinearModel
 from tensorflow.keras import layers, models
 
 from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import AnnouncementConfiguration
+from decentralized_smart_grid_ml.contract_interactions.contract_client import ContractClient
 from decentralized_smart_grid_ml.federated_learning.models_reader_writer import save_fl_model, \
     save_fl_model_config, save_fl_model_weights
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
@@ -132,23 +131,17 @@ if __name__ == '__main__':
     save_fl_model_weights(model, announcement_config.baseline_model_weights)
 
     # Client instance to interact with the blockchain
-    web3 = Web3(HTTPProvider(BLOCKCHAIN_ADDRESS))
-    logger.info("Connected to the blockchain %s", BLOCKCHAIN_ADDRESS)
-
-    with open(ANNOUNCEMENT_JSON_PATH) as file:
-        contract_json = json.load(file)  # load contract info as JSON
-        contract_abi = contract_json['abi']  # fetch contract's abi - necessary to call its functions
-
-    with open(DEX_JSON_PATH) as file:
-        dex_contract_json = json.load(file)  # load contract info as JSON
-        dex_contract_abi = dex_contract_json['abi']  # fetch contract's abi - necessary to call its functions
+    contract_client = ContractClient(BLOCKCHAIN_ADDRESS)
+    web3 = contract_client.web3
 
     # Fetch deployed Announcement contract reference
-    announcement_contract = web3.eth.contract(address=announcement_contract_address, abi=contract_abi)
+    announcement_contract = contract_client.contract_from_artifact(
+        announcement_contract_address, ANNOUNCEMENT_JSON_PATH
+    )
     logger.info("Fetched announcement contract from %s", announcement_contract_address)
 
     # Fetch deployed GreenDEX contract reference
-    dex_contract = web3.eth.contract(address=dex_contract_address, abi=dex_contract_abi)
+    dex_contract = contract_client.contract_from_artifact(dex_contract_address, DEX_JSON_PATH)
     logger.info("Fetched GreenDEX contract from %s", dex_contract_address)
 
     # automatically takes the first address
@@ -171,12 +164,8 @@ if __name__ == '__main__':
 
     token_contract_address = dex_contract.functions.greenToken().call({'from': manufacturer_address})
 
-    with open(TOKEN_JSON_PATH) as file:
-        token_contract_json = json.load(file)  # load contract info as JSON
-        token_contract_abi = token_contract_json['abi']  # fetch contract's abi
-
     # Fetch deployed GreenToken contract reference
-    dex_contract = web3.eth.contract(address=token_contract_address, abi=token_contract_abi)
+    dex_contract = contract_client.contract_from_artifact(token_contract_address, TOKEN_JSON_PATH)
     logger.info("Fetched GreenToken contract from %s", token_contract_address)
 
     # transfer of the tokens (reward) from the manufacturer to the announcement
@@ -190,15 +179,13 @@ if __name__ == '__main__':
     logger.info("Total reward for the validator: %s", validator_reward)
     logger.info("Total reward for the participants: %s", int(args.n_tokens_at_stake) - validator_reward)
 
-    is_finished = False
-
     try:
-        while not is_finished:
-            if announcement_contract.functions.isFinished().call({'from': manufacturer_address}):
-                is_finished = True
-            else:
-                logger.debug("Waiting the end of the task")
-                time.sleep(5)
+        logger.debug("Waiting the end of the task")
+        contract_client.wait_for_condition(
+            [(announcement_contract, "isFinished", [])],
+            manufacturer_address,
+            lambda results: results[0]
+        )
     except KeyboardInterrupt as e:
         logger.exception(e)
         logger.error("The manufacturer did not completed his work")
@@ -0,0 +1,76 @@
+"""
+This script simulates the Federated Learning life cycle of the validator and of all the
+participants in a single process, without the blockchain. The datasets have to be split
+with dataset_task_initialization.py
+"""
+import argparse
+import os
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import \
+    AnnouncementConfiguration
+from decentralized_smart_grid_ml.federated_learning.federated_simulation import FederatedSimulation
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--task_config_path',
+        dest='task_config_path',
+        metavar='task_config_path',
+        type=str,
+        help='The file path to the json configuration of the task',
+        required=True
+    )
+    parser.add_argument(
+        '--n_participants',
+        dest='n_participants',
+        metavar='n_participants',
+        type=int,
+        help='The number of participants',
+        required=True
+    )
+    parser.add_argument(
+        '--ml_task_directory_path',
+        dest='ml_task_directory_path',
+        metavar='ml_task_directory_path',
+        type=str,
+        help='The directory path to the ML task',
+        required=True
+    )
+    parser.add_argument(
+        '--output_directory_path',
+        dest='output_directory_path',
+        metavar='output_directory_path',
+        type=str,
+        help="The directory path to the statistics and the model's weights for each round",
+        required=True
+    )
+
+    args = parser.parse_args()
+    logger.info("Starting federated simulation script")
+
+    announcement_configuration = AnnouncementConfiguration.read_json_config(args.task_config_path)
+    task_name = announcement_configuration.task_name
+    train_set_paths = [
+        os.path.join(
+            args.ml_task_directory_path,
+            "participants/participant_" + str(idx_participant),
+            task_name + "_" + str(idx_participant) + ".csv"
+        )
+        for idx_participant in range(args.n_participants)
+    ]
+    validator_directory_path = os.path.join(args.ml_task_directory_path, "validator")
+
+    simulation = FederatedSimulation(
+        announcement_configuration,
+        train_set_paths,
+        os.path.join(validator_directory_path, task_name + "_validation.csv"),
+        os.path.join(validator_directory_path, task_name + "_test.csv"),
+        args.output_directory_path
+    )
+    participants_contributions = simulation.run()
+    logger.info("Final contributions: %s", participants_contributions)
+    simulation.write_statistics(args.output_directory_path)
+    logger.info("The simulation terminated with success")
@@ -2,25 +2,26 @@
 This script is a simple example for the local federated training in the dummy ML task
 """
 import argparse
-import json
 import os
 import sys
 import time
 from pathlib import Path
 
 from numpy.random import rand
-from web3 import HTTPProvider, Web3
 
 from watchdog.observers import Observer
 
 from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import AnnouncementConfiguration
+from decentralized_smart_grid_ml.contract_interactions.contract_client import ContractClient
 from decentralized_smart_grid_ml.federated_learning.federated_local_trainer import FederatedLocalTrainer
-from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model_weights, \
-    save_fl_model_weights
+from decentralized_smart_grid_ml.federated_learning.models_reader_writer import load_fl_model_weights
+from decentralized_smart_grid_ml.federated_learning.upload_manifest import round_from_file_name, \
+    round_manifest_file_name, ROUND_MANIFEST_FORMAT
 from decentralized_smart_grid_ml.handlers.participant_handler import ParticipantHandler
+from decentralized_smart_grid_ml.handlers.shared_memory_handler import ParticipantSharedMemoryHandler
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
 from decentralized_smart_grid_ml.utils.config import BLOCKCHAIN_ADDRESS, ANNOUNCEMENT_JSON_PATH, \
-    get_addresses_contracts, PROJECT_ABSOLUTE_PATH
+    get_addresses_contracts, get_transport_authkey, PROJECT_ABSOLUTE_PATH
 
 logger = create_logger(__name__)
 
@@ -30,47 +31,73 @@ class FakeFederatedLocalTrainer(FederatedLocalTrainer):
     local participant's model """
 
     def fit_local_model(self, path_file_created):
+        if path_file_created is not None and Path(path_file_created).stem.endswith("final"):
+            self.is_finished = True
+            return self.is_finished
+        if path_file_created is not None and Path(path_file_created).suffix == ROUND_MANIFEST_FORMAT:
+            return self.is_finished
         if path_file_created is not None:
             # try to load the aggregated new baseline model and start the local training
-            round_baseline_model = Path(path_file_created).stem[-1]
-            try:
-                if int(round_baseline_model) == self.current_round:
-                    aggregated_weights = load_fl_model_weights(path_file_created)
-                    fake_weights = []
-                    for weights in aggregated_weights:
-                        fake_weights.append(rand(*weights.shape))
-                    self.local_model.set_weights(fake_weights)
-                else:
-                    logger.warning(
-                        "The path %s does not correspond to the current round (%d), Skipping...",
-                        path_file_created, self.current_round
-                    )
-            except ValueError:
+            round_baseline_model = round_from_file_name(Path(path_file_created).stem)
+            if round_baseline_model is None:
                 logger.warning(
                     "Malformed path %s, Skipping...",
                     path_file_created
                 )
                 return self.is_finished
+            if round_baseline_model < self.current_round:
+                logger.warning(
+                    "The path %s does not correspond to the current round (%d), Skipping...",
+                    path_file_created, self.current_round
+                )
+                return self.is_finished
+            # the rounds closed by the validator without this participant are skipped
+            self.current_round = round_baseline_model
+            if not self._is_selected(os.path.join(
+                    os.path.dirname(path_file_created), round_manifest_file_name(round_baseline_model)
+            )):
+                self._skip_round()
+                self.is_finished = self.current_round == self.announcement_config.fl_rounds
+                return self.is_finished
+            aggregated_weights = load_fl_model_weights(path_file_created)
+            reference_weights = aggregated_weights
+            fake_weights = []
+            for weights in aggregated_weights:
+                fake_weights.append(rand(*weights.shape))
+            self.local_model.set_weights(fake_weights)
+        elif self.global_model_weights_path is not None and not self._is_selected(
+                os.path.join(self.global_model_weights_path, round_manifest_file_name(0))
+        ):
+            self._skip_round()
+            return self.is_finished
         else:
             # first round: the baseline model is in global_model_path
             aggregated_weights = self.local_model.get_weights()
+            reference_weights = aggregated_weights
             fake_weights = []
             for weights in aggregated_weights:
                 fake_weights.append(rand(*weights.shape))
             self.local_model.set_weights(fake_weights)
-        local_model_weights_path = os.path.join(
-            self.local_model_weights_path,
-            "weights_round_" + str(self.current_round) + ".json"
-        )
         output_folder = Path(self.local_model_weights_path)
         output_folder.mkdir(parents=True, exist_ok=True)
         self.rounds2history[self.current_round] = None
         logger.info("Participant %s: end FL round %s", self.participant_id, self.current_round)
         self.current_round += 1
-        save_fl_model_weights(self.local_model, local_model_weights_path)
+        self._save_local_model_weights(self.current_round - 1, reference_weights)
         self.is_finished = self.current_round == self.announcement_config.fl_rounds
         return self.is_finished
 
+    def train_round(self, global_weights):
+        fake_weights = []
+        for weights in global_weights:
+            fake_weights.append(rand(*weights.shape))
+        self.local_model.set_weights(fake_weights)
+        self.rounds2history[self.current_round] = None
+        logger.info("Participant %s: end FL round %s", self.participant_id, self.current_round)
+        self.current_round += 1
+        self.is_finished = self.current_round == self.announcement_config.fl_rounds
+        return self.local_model.get_weights()
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -105,6 +132,33 @@ if __name__ == '__main__':
         help="Flag used to indicates if you want to use fake weights",
         default=False
     )
+    parser.add_argument(
+        '--prometheus_textfile_path',
+        dest='prometheus_textfile_path',
+        metavar='prometheus_textfile_path',
+        type=str,
+        help="The file path in which the timings of the rounds are exported "
+             "in the Prometheus text format",
+        default=None
+    )
+    parser.add_argument(
+        '--content_store_path',
+        dest='content_store_path',
+        metavar='content_store_path',
+        type=str,
+        help="The directory path to the content-addressed store in which the local model's "
+             "weights are saved (referred by cid files)",
+        default=None
+    )
+    parser.add_argument(
+        '--notification_address',
+        dest='notification_address',
+        metavar='notification_address',
+        type=str,
+        help="The address (host:port or Unix socket path) of the validator's notification "
+             "channel, if it is provided the weights are exchanged in shared memory",
+        default=None
+    )
 
     args = parser.parse_args()
     logger.info("Starting participant script")
@@ -112,15 +166,13 @@ if __name__ == '__main__':
     announcement_contract_address, dex_contract_address = get_addresses_contracts(args.contract_info_path)
 
     # Client instance to interact with the blockchain
-    web3 = Web3(HTTPProvider(BLOCKCHAIN_ADDRESS))
-    logger.info("Connected to the blockchain %s", BLOCKCHAIN_ADDRESS)
-
-    with open(ANNOUNCEMENT_JSON_PATH) as file:
-        contract_json = json.load(file)  # load contract info as JSON
-        contract_abi = contract_json['abi']  # fetch contract's abi - necessary to call its functions
+    contract_client = ContractClient(BLOCKCHAIN_ADDRESS)
+    web3 = contract_client.web3
 
     # Fetch deployed contract reference
-    contract = web3.eth.contract(address=announcement_contract_address, abi=contract_abi)
+    contract = contract_client.contract_from_artifact(
+        announcement_contract_address, ANNOUNCEMENT_JSON_PATH
+    )
     logger.info("Fetched contract %s", announcement_contract_address)
 
     # automatically takes the idx + 1address
@@ -149,16 +201,12 @@ if __name__ == '__main__':
         announcement_configuration.task_name + "_" + str(participant_id) + ".csv"
     )
 
-    maximum_number_participants = contract.functions.maxNumberParticipant().call({"from": participant_address})
-    isStarted = False
-
-    while not isStarted:
-        number_participants = contract.functions.currentNumberParticipant().call({"from": participant_address})
-        if number_participants != maximum_number_participants:
-            logger.info("We need to wait that other participants subscribe to the task")
-            time.sleep(2)
-        else:
-            isStarted = True
+    logger.info("We need to wait that other participants subscribe to the task")
+    contract_client.wait_for_condition(
+        [(contract, "maxNumberParticipant", []), (contract, "currentNumberParticipant", [])],
+        participant_address,
+        lambda results: results[0] == results[1]
+    )
 
     time.sleep(2)
     logger.info("Starting participant federated learning")
@@ -168,15 +216,40 @@ if __name__ == '__main__':
             participant_id,
             announcement_configuration,
             local_dataset_path,
-            participant_directory_path
+            participant_directory_path,
+            prometheus_textfile_path=args.prometheus_textfile_path,
+            content_store_path=args.content_store_path,
+            global_model_weights_path=args.validator_directory_path
         )
     else:
         federated_local_trainer = FederatedLocalTrainer(
             participant_id,
             announcement_configuration,
             local_dataset_path,
-            participant_directory_path
+            participant_directory_path,
+            prometheus_textfile_path=args.prometheus_textfile_path,
+            content_store_path=args.content_store_path,
+            global_model_weights_path=args.validator_directory_path
+        )
+
+    if args.notification_address is not None:
+        # the validator runs on the same host: no weights file is written nor watched
+        participant_handler = ParticipantSharedMemoryHandler(
+            federated_local_trainer, args.notification_address, get_transport_authkey()
+        )
+        try:
+            participant_handler.run()
+        except KeyboardInterrupt as e:
+            participant_handler.stop()
+            logger.exception(e)
+            logger.error("The participant %s did not completed his work", participant_id)
+            sys.exit(-1)
+        participant_handler.stop()
+        federated_local_trainer.write_statistics(
+            os.path.join(participant_directory_path, "statistics.json")
         )
+        logger.info("The participant %s terminated his work with success", participant_id)
+        sys.exit(0)
 
     federated_local_trainer.fit_local_model(None)
 
@@ -193,6 +266,7 @@ if __name__ == '__main__':
         # stop and join the observer
         participant_observer.stop()
         participant_observer.join()
+        participant_handler.stop()
         logger.exception(e)
         logger.error("The participant %s did not completed his work", participant_id)
         sys.exit(-1)
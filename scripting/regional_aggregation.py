@@ -0,0 +1,144 @@
+"""
+This script runs the Federate Learning life cycle of a regional aggregator of the
+hierarchical topology: it pre-aggregates the weights of the region's participants and
+forwards the partial aggregate to the validator (root aggregator) at each round
+"""
+import argparse
+import os
+import sys
+import time
+
+from watchdog.observers import Observer
+
+from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import \
+    AnnouncementConfiguration
+from decentralized_smart_grid_ml.federated_learning.hierarchical_aggregation import \
+    RegionalAggregator
+from decentralized_smart_grid_ml.handlers.validator_handler import ValidatorHandler
+from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
+
+logger = create_logger(__name__)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--task_config_path',
+        dest='task_config_path',
+        metavar='task_config_path',
+        type=str,
+        help='The file path to the json configuration of the task',
+        required=True
+    )
+    parser.add_argument(
+        '--region_id',
+        dest='region_id',
+        metavar='region_id',
+        type=int,
+        help='The identifier of the region',
+        required=True
+    )
+    parser.add_argument(
+        '--participant_ids',
+        dest='participant_ids',
+        metavar='participant_ids',
+        type=int,
+        nargs='+',
+        help="The identifiers of the region's participants",
+        required=True
+    )
+    parser.add_argument(
+        '--validation_set_path',
+        dest='validation_set_path',
+        metavar='validation_set_path',
+        type=str,
+        help="The file path to the region's validation set",
+        required=True
+    )
+    parser.add_argument(
+        '--test_set_path',
+        dest='test_set_path',
+        metavar='test_set_path',
+        type=str,
+        help='The file path to the test set',
+        required=True
+    )
+    parser.add_argument(
+        '--model_weights_new_round_path',
+        dest='model_weights_new_round_path',
+        metavar='model_weights_new_round_path',
+        type=str,
+        help="The directory path to the validator's model's weights for each round",
+        required=True
+    )
+    parser.add_argument(
+        '--participant_weights_path',
+        dest='participant_weights_path',
+        metavar='participant_weights_path',
+        type=str,
+        help="The directory path that contains the sub-directories for the "
+             "weights of the local trained models of the region's participants",
+        required=True
+    )
+    parser.add_argument(
+        '--partial_aggregates_path',
+        dest='partial_aggregates_path',
+        metavar='partial_aggregates_path',
+        type=str,
+        help="The directory path watched by the validator, the partial aggregates "
+             "are saved in the sub-directory of the region",
+        required=True
+    )
+    parser.add_argument(
+        '--prometheus_textfile_path',
+        dest='prometheus_textfile_path',
+        metavar='prometheus_textfile_path',
+        type=str,
+        help="The file path in which the timings of the rounds are exported "
+             "in the Prometheus text format",
+        default=None
+    )
+
+    args = parser.parse_args()
+    logger.info("Starting regional aggregator job of region %d", args.region_id)
+
+    announcement_configuration = AnnouncementConfiguration.read_json_config(args.task_config_path)
+    aggregator = RegionalAggregator(
+        args.region_id,
+        args.participant_ids,
+        announcement_configuration,
+        args.validation_set_path,
+        args.test_set_path,
+        args.partial_aggregates_path,
+        prometheus_textfile_path=args.prometheus_textfile_path,
+        require_upload_manifests=True
+    )
+    aggregator_handler = ValidatorHandler(aggregator=aggregator)
+
+    # the validator may not have published the first global model yet
+    os.makedirs(args.model_weights_new_round_path, exist_ok=True)
+    # the handler receives both the participants' weights and the validator's global models
+    region_observer = Observer()
+    region_observer.schedule(aggregator_handler, args.participant_weights_path, recursive=True)
+    region_observer.schedule(aggregator_handler, args.model_weights_new_round_path, recursive=False)
+    logger.info("Starting the observer for the region %d", args.region_id)
+    region_observer.start()
+    try:
+        while not aggregator.is_finished:
+            time.sleep(1)
+            # the rounds may be closed by their deadline
+            aggregator_handler.check_round_deadline()
+    except KeyboardInterrupt as e:
+        region_observer.stop()
+        region_observer.join()
+        aggregator_handler.stop()
+        aggregator.close()
+        logger.exception(e)
+        logger.error("The regional aggregator did not completed his work")
+        sys.exit(-1)
+    region_observer.stop()
+    region_observer.join()
+    aggregator_handler.stop()
+    aggregator.close()
+    logger.info("The regional aggregator %d terminated his work with success", args.region_id)
+    sys.exit(0)
@@ -2,21 +2,23 @@
 This script runs the Federate Learning life cycle of the validator
 """
 import argparse
-import json
 import os
 import sys
 import time
 from random import randint
 
 from watchdog.observers import Observer
-from web3 import Web3, HTTPProvider
 
 from decentralized_smart_grid_ml.contract_interactions.announcement_configuration import \
     AnnouncementConfiguration
+from decentralized_smart_grid_ml.contract_interactions.contract_client import ContractClient
 from decentralized_smart_grid_ml.federated_learning.federated_aggregator import Aggregator
+from decentralized_smart_grid_ml.federated_learning.hierarchical_aggregation import RootAggregator
+from decentralized_smart_grid_ml.handlers.shared_memory_handler import ValidatorSharedMemoryHandler
 from decentralized_smart_grid_ml.handlers.validator_handler import ValidatorHandler
 from decentralized_smart_grid_ml.utils.bcai_logging import create_logger
-from decentralized_smart_grid_ml.utils.config import BLOCKCHAIN_ADDRESS, ANNOUNCEMENT_JSON_PATH, get_addresses_contracts
+from decentralized_smart_grid_ml.utils.config import BLOCKCHAIN_ADDRESS, ANNOUNCEMENT_JSON_PATH, \
+    get_addresses_contracts, get_transport_authkey
 
 logger = create_logger(__name__)
 
@@ -64,6 +66,66 @@ if __name__ == '__main__':
              "weights of the local trained participants' models",
         required=True
     )
+    parser.add_argument(
+        '--prometheus_textfile_path',
+        dest='prometheus_textfile_path',
+        metavar='prometheus_textfile_path',
+        type=str,
+        help="The file path in which the timings of the rounds are exported "
+             "in the Prometheus text format",
+        default=None
+    )
+    parser.add_argument(
+        '--n_regions',
+        dest='n_regions',
+        metavar='n_regions',
+        type=int,
+        help="The number of regional aggregators (hierarchical topology), the directory "
+             "of the participants' weights contains their partial aggregates",
+        default=None
+    )
+    parser.add_argument(
+        '--content_store_path',
+        dest='content_store_path',
+        metavar='content_store_path',
+        type=str,
+        help="The directory path to the content-addressed store in which the global model's "
+             "weights are saved (referred by cid files)",
+        default=None
+    )
+    parser.add_argument(
+        '--notification_address',
+        dest='notification_address',
+        metavar='notification_address',
+        type=str,
+        help="The address (host:port or Unix socket path) of the notification channel, if it "
+             "is provided the weights are exchanged in shared memory with the participants",
+        default=None
+    )
+    parser.add_argument(
+        '--journal_path',
+        dest='journal_path',
+        metavar='journal_path',
+        type=str,
+        help="The file path to the journal of the rounds, the checkpoints of the global "
+             "model's weights are saved in its directory",
+        default=None
+    )
+    parser.add_argument(
+        '--checkpoint_interval',
+        dest='checkpoint_interval',
+        metavar='checkpoint_interval',
+        type=int,
+        help="The number of rounds between two checkpoints of the global model's weights",
+        default=1
+    )
+    parser.add_argument(
+        '--resume',
+        dest='resume',
+        action='store_true',
+        help="Flag used to resume the federation from the journal of the rounds",
+        default=False
+    )
 
     args = parser.parse_args()
     logger.info("Starting validator job")
@@ -71,15 +133,13 @@ if __name__ == '__main__':
     announcement_contract_address, dex_contract_address = get_addresses_contracts(args.contract_info_path)
 
     # Client instance to interact with the blockchain
-    web3 = Web3(HTTPProvider(BLOCKCHAIN_ADDRESS))
-    logger.info("Connected to the blockchain %s", BLOCKCHAIN_ADDRESS)
-
-    with open(ANNOUNCEMENT_JSON_PATH) as file:
-        contract_json = json.load(file)  # load contract info as JSON
-        contract_abi = contract_json['abi']  # fetch contract's abi - necessary to call its functions
+    contract_client = ContractClient(BLOCKCHAIN_ADDRESS)
+    web3 = contract_client.web3
 
     # Fetch deployed contract reference
-    contract = web3.eth.contract(address=announcement_contract_address, abi=contract_abi)
+    contract = contract_client.contract_from_artifact(
+        announcement_contract_address, ANNOUNCEMENT_JSON_PATH
+    )
     logger.info("Fetched contract %s", announcement_contract_address)
 
     # automatically takes the last address
@@ -89,43 +149,79 @@ if __name__ == '__main__':
         validator_address, contract
     )
 
-    maximum_number_participants = contract.functions.maxNumberParticipant().call({"from": validator_address})
-    isStarted = False
-
-    while not isStarted:
-        number_participants = contract.functions.currentNumberParticipant().call({"from": validator_address})
-        if number_participants != maximum_number_participants:
-            logger.info("We need to wait that other participants subscribe to the task")
-            time.sleep(2)
-        else:
-            isStarted = True
-
-    aggregator = Aggregator(
-        list(range(number_participants)),
-        announcement_configuration,
-        args.validation_set_path,
-        args.test_set_path,
-        args.model_weights_new_round_path
-    )
-    aggregator_handler = ValidatorHandler(aggregator=aggregator)
-    path = "."
-    go_recursively = True
-
-    validator_observer = Observer()
-    validator_observer.schedule(aggregator_handler, args.participant_weights_path, recursive=True)
-    # start the observer
-    logger.info("Starting the observer for the validator")
-    validator_observer.start()
+    logger.info("We need to wait that other participants subscribe to the task")
+    maximum_number_participants, number_participants = contract_client.wait_for_condition(
+        [(contract, "maxNumberParticipant", []), (contract, "currentNumberParticipant", [])],
+        validator_address,
+        lambda results: results[0] == results[1]
+    )
+
+    if args.n_regions is None:
+        aggregator = Aggregator(
+            list(range(number_participants)),
+            announcement_configuration,
+            args.validation_set_path,
+            args.test_set_path,
+            args.model_weights_new_round_path,
+            prometheus_textfile_path=args.prometheus_textfile_path,
+            content_store_path=args.content_store_path,
+            journal_path=args.journal_path,
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+            require_upload_manifests=True
+        )
+    else:
+        # the regions pre-aggregate the participants' weights
+        aggregator = RootAggregator(
+            list(range(args.n_regions)),
+            list(range(number_participants)),
+            announcement_configuration,
+            args.validation_set_path,
+            args.test_set_path,
+            args.model_weights_new_round_path,
+            prometheus_textfile_path=args.prometheus_textfile_path,
+            content_store_path=args.content_store_path,
+            journal_path=args.journal_path,
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+            require_upload_manifests=True
+        )
+    if args.notification_address is not None:
+        # the participants run on the same host and are notified through the channel
+        aggregator_handler = ValidatorSharedMemoryHandler(
+            aggregator, args.notification_address, get_transport_authkey()
+        )
+        validator_observer = None
+    else:
+        aggregator_handler = ValidatorHandler(aggregator=aggregator)
+        validator_observer = Observer()
+        validator_observer.schedule(aggregator_handler, args.participant_weights_path, recursive=True)
+        # start the observer
+        logger.info("Starting the observer for the validator")
+        validator_observer.start()
+        if args.resume:
+            # the uploads of the current round received before the crash are not
+            # notified again, the duplicates of the observer are skipped
+            for path_file_created in aggregator.current_round_uploads(args.participant_weights_path):
+                aggregator_handler.process_path(path_file_created)
     try:
         while not aggregator.is_finished:
             time.sleep(1)
+            # the rounds may be closed by their deadline
+            aggregator_handler.check_round_deadline()
     except KeyboardInterrupt as e:
         # stop and join the observer
-        validator_observer.stop()
-        validator_observer.join()
+        if validator_observer is not None:
+            validator_observer.stop()
+            validator_observer.join()
+        aggregator_handler.stop()
+        aggregator.close()
         logger.exception(e)
         logger.error("The validator did not completed his work")
         sys.exit(-1)
+    if validator_observer is None:
+        aggregator_handler.stop()
+    aggregator.close()
     participants_contributions = aggregator.get_participants_contributions()
     logger.info("Participants identifiers: %s", aggregator.participant_ids)
     logger.info("Final contributions: %s", participants_contributions)
@@ -148,5 +244,9 @@ if __name__ == '__main__':
         "statistics.json"
     )
     aggregator.write_statistics(statistics_output_path)
+    aggregator.contribution_ledger.save(os.path.join(
+        args.model_weights_new_round_path,
+        "contribution_ledger.npz"
+    ))
     logger.info("The validator terminated his work with success")
     sys.exit(0)